@@ -3,7 +3,9 @@ from fastapi.responses import FileResponse, JSONResponse
 from typing import List, Optional
 
 from app.schemas.crawler import CrawlerRequest, CrawlerResponse, UrlToMarkdownRequest, UrlToMarkdownResponse, ExportLinksResponse
+from app.schemas.jobs import JobResponse
 from app.core.deps import get_api_key, get_project_id
+from app.core.job_scheduler import scheduler
 from app.services.crawler_service import CrawlerService
 from app.core.config import settings
 
@@ -27,7 +29,8 @@ async def crawl_links(
             exclude_patterns=request.exclude_patterns,
             crawl_strategy=request.crawl_strategy,
             force_refresh=request.force_refresh,
-            project_id=project_id
+            project_id=project_id,
+            priority=request.priority
         )
         return result
     except Exception as e:
@@ -85,7 +88,9 @@ async def convert_to_markdown(
             max_tokens=request.max_tokens,
             min_tokens=request.min_tokens,
             split_strategy=request.split_strategy,
-            project_id=project_id
+            project_id=project_id,
+            priority=request.priority,
+            capture_assets=request.capture_assets
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"转换任务创建失败: {str(e)}")
@@ -120,4 +125,36 @@ async def download_file(
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/jobs", response_model=JobResponse)
+async def list_jobs(
+    api_key: str = Depends(get_api_key),
+    project_id: Optional[str] = Depends(get_project_id)
+):
+    """获取任务列表（按项目过滤）"""
+    jobs = scheduler.list_jobs(project_id=project_id)
+    return {"status": "success", "message": f"共{len(jobs)}个任务", "jobs": jobs}
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: str,
+    api_key: str = Depends(get_api_key)
+):
+    """查询任务状态和进度"""
+    job = scheduler.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return {"status": "success", "message": job["message"], "job": job}
+
+@router.post("/jobs/{job_id}/cancel", response_model=JobResponse)
+async def cancel_job(
+    job_id: str,
+    api_key: str = Depends(get_api_key)
+):
+    """取消排队中或运行中的任务"""
+    if not scheduler.get_job(job_id):
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if not scheduler.cancel(job_id):
+        return {"status": "warning", "message": "任务已结束，无法取消", "job": scheduler.get_job(job_id)}
+    return {"status": "success", "message": "任务已取消", "job": scheduler.get_job(job_id)}
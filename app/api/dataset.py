@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Query
+from fastapi import APIRouter, HTTPException, Depends, Query
 from fastapi.responses import FileResponse
 import os
 from typing import Dict, Any, List, Optional
@@ -7,6 +7,8 @@ import os
 import logging
 from app.core.config import settings
 from app.core.deps import get_api_key, get_project_id
+from app.core.job_scheduler import scheduler
+from app.schemas.jobs import JobResponse
 from app.schemas.dataset import DeleteItemsRequest, DatasetListRequest, DatasetExportRequest, AddQAItemRequest, UpdateQAItemRequest
 from app.services.dataset_service import DatasetService, EXPORT_FORMATS, DATASET_STYLES, INPUT_FILE
 
@@ -175,31 +177,25 @@ async def update_qa_item(
 @router.post("/convert")
 async def convert_to_dataset(
     data: Dict[str, Any],
-    background_tasks: BackgroundTasks,
     api_key: str = Depends(get_api_key)
 ):
-    """将Markdown文件转换为数据集"""
+    """将Markdown文件转换为数据集，提交到任务调度器后返回任务ID，可通过 /convert/jobs 接口暂停、恢复和取消"""
     # 从请求体中获取 projectId
     project_id = data.get("projectId")
     print(f"project_id: {project_id}")
     
     files = data.get("files", [])
     output_file = data.get("output_file", "qa_dataset.jsonl")
+    # 为True时不使用缓存的大模型响应，重新生成
+    bypass_cache = bool(data.get("bypassCache", False))
+    # 为True时使用批量接口提交，适合不需要实时结果的大任务
+    batch_mode = bool(data.get("batchMode", False))
     
     if not files:
         raise HTTPException(status_code=400, detail="文件列表不能为空")
     try:
-        # 启动转换任务
-        result = DatasetService.save_conversion_task_status(files, output_file, project_id)
-        # 在后台执行转换任务，传入 api_key
-        background_tasks.add_task(
-            DatasetService.convert_files_to_dataset_task, 
-            files, 
-            output_file,
-            project_id
-        )
-        
-        return result
+        # 提交转换任务，由任务调度器在后台执行
+        return DatasetService.submit_conversion_job(files, output_file, project_id, bypass_cache, batch_mode)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -215,4 +211,60 @@ async def get_conversion_status(
     try:
         return DatasetService.get_conversion_state(output_file, project_id)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/convert/jobs", response_model=JobResponse)
+async def list_conversion_jobs(
+    api_key: str = Depends(get_api_key),
+    project_id: Optional[str] = Depends(get_project_id)
+):
+    """获取数据集生成任务列表（按项目过滤）"""
+    jobs = scheduler.list_jobs(project_id=project_id, kind="dataset")
+    return {"status": "success", "message": f"共{len(jobs)}个任务", "jobs": jobs}
+
+@router.get("/convert/jobs/{job_id}", response_model=JobResponse)
+async def get_conversion_job(
+    job_id: str,
+    api_key: str = Depends(get_api_key)
+):
+    """查询数据集生成任务的状态和进度（已完成的文件数、生成的数据数、使用的Token数）"""
+    job = scheduler.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return {"status": "success", "message": job["message"], "job": job}
+
+@router.post("/convert/jobs/{job_id}/pause", response_model=JobResponse)
+async def pause_conversion_job(
+    job_id: str,
+    api_key: str = Depends(get_api_key)
+):
+    """暂停排队中或运行中的数据集生成任务，进行中的请求被中断，已完成的文件保留"""
+    if not scheduler.get_job(job_id):
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if not scheduler.pause(job_id):
+        return {"status": "warning", "message": "任务不在运行或排队中，无法暂停", "job": scheduler.get_job(job_id)}
+    return {"status": "success", "message": "任务正在暂停", "job": scheduler.get_job(job_id)}
+
+@router.post("/convert/jobs/{job_id}/resume", response_model=JobResponse)
+async def resume_conversion_job(
+    job_id: str,
+    api_key: str = Depends(get_api_key)
+):
+    """恢复暂停的数据集生成任务，已完成的文件不再调用大模型"""
+    if not scheduler.get_job(job_id):
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if not scheduler.resume(job_id):
+        return {"status": "warning", "message": "任务未暂停，无法恢复", "job": scheduler.get_job(job_id)}
+    return {"status": "success", "message": "任务已恢复", "job": scheduler.get_job(job_id)}
+
+@router.post("/convert/jobs/{job_id}/cancel", response_model=JobResponse)
+async def cancel_conversion_job(
+    job_id: str,
+    api_key: str = Depends(get_api_key)
+):
+    """取消数据集生成任务，进行中的请求立即中断"""
+    if not scheduler.get_job(job_id):
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if not scheduler.cancel(job_id):
+        return {"status": "warning", "message": "任务已结束，无法取消", "job": scheduler.get_job(job_id)}
+    return {"status": "success", "message": "任务已取消", "job": scheduler.get_job(job_id)}
\ No newline at end of file
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Query, Depends
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Dict, Any, Optional
 import os
 from app.services.files_service import FilesService
@@ -53,7 +54,8 @@ async def upload_files(
                 "splitStrategy": splitStrategy
             }
         
-        return FilesService.upload_files(files, project_id, smart_split_config)
+        # 转换和分段都是CPU密集操作，放到线程池中执行，避免阻塞事件循环
+        return await run_in_threadpool(FilesService.upload_files, files, project_id, smart_split_config)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,157 @@
+import os
+import json
+import logging
+from typing import List, Dict, Any, Optional
+
+from app.core.markdown_splitter import MarkdownChunk
+
+TREE_SUFFIX = ".tree.json"
+TREE_VERSION = 2
+# 分段文件 xxx-1.md 的内容为标题行加分段正文
+CHUNK_FILE_HEADER = "# {title}\n\n"
+
+
+def chunk_file_content(chunk: MarkdownChunk) -> str:
+    """分段文件的内容"""
+    return CHUNK_FILE_HEADER.format(title=chunk.title) + chunk.content
+
+
+def build_chunk_tree(chunks: List[MarkdownChunk], chunk_files: Optional[List[str]] = None,
+                     title: str = "", separator: str = "/") -> Dict[str, Any]:
+    """
+    根据分段的标题栈构建文档的层级结构
+
+    每个节点对应一个标题，tokens为其下所有分段的Token总数；分段作为叶子挂在其标题栈对应的节点下，
+    并记录所属节点的路径。同名标题只有在文档中连续出现时才视为同一节点。
+    提供分段文件时，有重叠区域的分段（见 MarkdownSplitter.add_overlap）记录重叠内容在前一个分段文件中的位置。
+
+    Args:
+        chunks: 按顺序排列的分段
+        chunk_files: 与chunks对应的分段文件路径，只保存文件名
+        title: 根节点标题，通常为文档名
+        separator: 标题路径分隔符
+
+    Returns:
+        Dict[str, Any]: 根节点，节点包含title、level、path、tokens、chunks、children，
+        叶子包含order、title、tokens、path、file，有重叠区域时包含
+        overlap: {"file": 前一个分段文件名, "start": 起始偏移, "end": 结束偏移, "tokens": Token数}
+    """
+    root = _new_node(title, 0, "")
+    positions = {chunk.order: index for index, chunk in enumerate(chunks)}
+    for index, chunk in enumerate(chunks):
+        node = root
+        for level, header in chunk.metadata.get('header_stack') or []:
+            last = node['children'][-1] if node['children'] else None
+            if last is None or last['level'] != level or last['title'] != header:
+                path = f"{node['path']}{separator}{header}" if node['path'] else header
+                last = _new_node(header, level, path)
+                node['children'].append(last)
+            node = last
+
+        leaf = {
+            "order": chunk.order,
+            "title": chunk.title,
+            "tokens": chunk.estimated_tokens,
+            "path": node['path']
+        }
+        if chunk_files:
+            leaf["file"] = os.path.basename(chunk_files[index])
+            overlap = chunk.metadata.get('overlap')
+            if overlap and overlap['order'] in positions:
+                # 偏移相对于前一个分段的正文，换算为前一个分段文件中的字符偏移
+                previous = chunks[positions[overlap['order']]]
+                prefix = len(CHUNK_FILE_HEADER.format(title=previous.title))
+                leaf["overlap"] = {
+                    "file": os.path.basename(chunk_files[positions[overlap['order']]]),
+                    "start": prefix + overlap['start'],
+                    "end": prefix + overlap['end'],
+                    "tokens": overlap['tokens']
+                }
+        node['chunks'].append(leaf)
+
+    _sum_tokens(root)
+    return root
+
+
+def _new_node(title: str, level: int, path: str) -> Dict[str, Any]:
+    return {"title": title, "level": level, "path": path, "tokens": 0, "chunks": [], "children": []}
+
+
+def _sum_tokens(node: Dict[str, Any]) -> int:
+    node['tokens'] = sum(leaf['tokens'] for leaf in node['chunks']) + sum(_sum_tokens(child) for child in node['children'])
+    return node['tokens']
+
+
+def collect_leaves(node: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """按文档顺序返回节点下的所有分段"""
+    leaves = list(node['chunks'])
+    for child in node['children']:
+        leaves.extend(collect_leaves(child))
+    leaves.sort(key=lambda leaf: leaf['order'])
+    return leaves
+
+
+def select_chunk_groups(tree: Dict[str, Any], max_tokens: int) -> List[Dict[str, Any]]:
+    """
+    按Token预算选择粒度：节点总量不超过预算时整个小节作为一组，否则继续向下拆分，
+    最小粒度为单个分段
+
+    Args:
+        tree: build_chunk_tree 生成的根节点
+        max_tokens: 每组的Token预算
+
+    Returns:
+        List[Dict[str, Any]]: 按文档顺序排列的分组，包含path、title、tokens和chunks（分段序号）
+    """
+    groups = []
+
+    def visit(node: Dict[str, Any]):
+        if node['tokens'] <= max_tokens:
+            orders = [leaf['order'] for leaf in collect_leaves(node)]
+            if orders:
+                groups.append({"path": node['path'], "title": node['title'], "tokens": node['tokens'], "chunks": orders})
+            return
+        for leaf in node['chunks']:
+            groups.append({"path": leaf['path'], "title": leaf['title'], "tokens": leaf['tokens'], "chunks": [leaf['order']]})
+        for child in node['children']:
+            visit(child)
+
+    visit(tree)
+    groups.sort(key=lambda group: group['chunks'][0])
+    return groups
+
+
+def chunk_tree_path(output_dir: str, base_name: str) -> str:
+    """分段层级结构的保存路径，与分段文件 xxx-1.md 同目录，名为 xxx.tree.json"""
+    return os.path.join(output_dir, base_name + TREE_SUFFIX)
+
+
+def write_chunk_tree(output_dir: str, base_name: str, tree: Dict[str, Any]) -> bool:
+    """保存分段层级结构，使用紧凑的JSON格式"""
+    path = chunk_tree_path(output_dir, base_name)
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"version": TREE_VERSION, "tree": tree}, f, ensure_ascii=False, separators=(',', ':'))
+        return True
+    except Exception as e:
+        logging.error(f"保存分段层级结构失败 {path}: {str(e)}")
+        return False
+
+
+def load_chunk_tree(output_dir: str, base_name: str) -> Optional[Dict[str, Any]]:
+    """读取分段层级结构，不存在或版本不匹配时返回None"""
+    try:
+        with open(chunk_tree_path(output_dir, base_name), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") != TREE_VERSION:
+            return None
+        return data.get("tree")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def remove_chunk_tree(output_dir: str, base_name: str):
+    """删除分段层级结构"""
+    path = chunk_tree_path(output_dir, base_name)
+    if os.path.exists(path):
+        os.remove(path)
@@ -19,6 +19,51 @@ class Settings(BaseSettings):
     DEFAULT_MAX_DEPTH: int = 3
     DEFAULT_MAX_PAGES: int = 100
     DEFAULT_CRAWL_STRATEGY: str = "bfs"
+
+    # 大页面转换配置
+    LARGE_PAGE_THRESHOLD_BYTES: int = 2 * 1024 * 1024  # 页面超过该大小时流式写出Markdown
+    MAX_PAGE_BYTES: int = 64 * 1024 * 1024  # 单个页面的下载大小上限，超出则放弃该页面（解析后的文档树仍按整页在内存中）
+
+    # 图片资源采集配置
+    ASSET_MAX_BYTES: int = 10 * 1024 * 1024  # 单个图片的大小上限
+    ASSET_STORE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024  # 单个项目媒体库的大小上限
+    ASSET_CONCURRENCY: int = 8  # 同时下载的图片数
+    ASSET_TIMEOUT_SECONDS: int = 30  # 单个图片的下载超时时间
+
+    # 后台任务调度配置
+    JOBS_FILE: str = "jobs.json"  # 任务表文件，位于OUTPUT_DIR下
+    JOB_PARAMS_DIR: str = "job_params"  # 任务参数目录，位于OUTPUT_DIR下，参数只在提交时写入一次
+    JOB_MAX_CONCURRENCY: int = 2  # 全局同时运行的任务数
+    JOB_MAX_PER_PROJECT: int = 1  # 单个项目同时运行的任务数
+    JOB_INTERACTIVE_SLOTS: int = 1  # 额外为交互式任务保留的运行数，不受上面两个限制，小任务不用等待批量任务结束
+    JOB_AGING_SECONDS: float = 60.0  # 排队每满该秒数优先级提升一级
+    JOB_INTERACTIVE_MAX_ITEMS: int = 20  # 不超过该数量的任务视为交互式任务
+    JOB_BULK_MIN_ITEMS: int = 500  # 达到该数量的任务视为批量任务
+    JOB_HISTORY_LIMIT: int = 200  # 任务表中保留的已结束任务数
+    JOB_PROGRESS_SAVE_INTERVAL: float = 2.0  # 进度写入任务表的最小间隔（秒）
+    
+    # 数据集生成配置，models.json的模型配置中可以用concurrency、maxConcurrency、rpm、tpm覆盖
+    DATASET_CONCURRENCY: int = 4  # 同时调用大模型的文件数（初始值，请求顺利时自动增加）
+    DATASET_MAX_CONCURRENCY: int = 16  # 自动增加的并发数上限，模型配置中可用 maxConcurrency 覆盖
+    DATASET_DEFAULT_RPM: int = 0  # 每分钟请求数上限，0表示不限制
+    DATASET_DEFAULT_TPM: int = 0  # 每分钟Token数上限（输入加输出），0表示不限制
+    DATASET_STREAMING: bool = True  # 流式接收大模型响应，每个问答对生成后立即解析并推送进度
+    DATASET_BATCH_POLL_INTERVAL: float = 60.0  # 批量接口模式下查询任务状态的间隔（秒）
+    DATASET_JOURNAL_FSYNC_BATCH: int = 20  # 生成日志每写入该数量的文件落盘一次
+    DATASET_JOURNAL_FSYNC_INTERVAL: float = 1.0  # 生成日志的最长落盘间隔（秒）
+    DATASET_PACK_TOKENS: int = 0  # 相邻小文件合并为一个请求时每个请求的内容Token数上限，0表示不合并
+    DATASET_PACK_MAX_FILES: int = 8  # 每个合并请求最多包含的文件数
+    DATASET_ROUTER_MAX_ATTEMPTS: int = 5  # 一个请求最多尝试的次数（包括换模型和退避后的重试）
+    DATASET_RETRY_BASE_DELAY: float = 1.0  # 重试的初始退避时间（秒），每次重试翻倍并加随机抖动
+    DATASET_RETRY_MAX_DELAY: float = 60.0  # 重试的最长退避时间（秒）
+    DATASET_CIRCUIT_FAILURES: int = 3  # 模型连续失败该次数后熔断
+    DATASET_CIRCUIT_RESET_SECONDS: float = 30.0  # 熔断后经过该时间放行一个试探请求
+
+    # 大模型响应缓存配置，相同模型、提示词和内容的请求直接使用缓存的响应
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_DIR: str = "llm_cache"  # 缓存目录，位于OUTPUT_DIR下
+    LLM_CACHE_MAX_BYTES: int = 512 * 1024 * 1024  # 缓存总大小上限
+    LLM_CACHE_MAX_ENTRIES: int = 20000  # 缓存条数上限
     
     # 系统服务配置
     SYSTEM_CONFIG_DIR: str = "output/config"
@@ -32,6 +77,30 @@ class Settings(BaseSettings):
     DEFAULT_MAX_TOKENS: int = 8000
     DEFAULT_MIN_TOKENS: int = 300
     DEFAULT_SPLIT_STRATEGY: str = "balanced"
+    SPLIT_ENGINE: str = "heuristic"  # heuristic（多轮启发式合并）或 optimal（动态规划求最优切分）
+    CHUNK_OVERLAP_TOKENS: int = 0  # 分段与前一个分段重叠的Token数，生成数据集时作为上文提供给模型
+    CHUNK_OVERLAP_SENTENCES: int = 0  # 分段与前一个分段重叠的句子数
+    CHUNK_TREE_ENABLED: bool = False  # 分段时在分段文件旁保存 xxx.tree.json（标题层级、各节点Token总数、分段所属路径），启用分段重叠时总是保存
+    SPLIT_POOL_WORKERS: int = 0  # 分段进程池大小，0表示按CPU核数（最多4个），1表示不使用进程池
+
+    # 分段结果缓存配置
+    SPLIT_CACHE_ENABLED: bool = True
+    SPLIT_CACHE_DIR: str = "split_cache"  # 缓存目录，位于OUTPUT_DIR下
+    SPLIT_CACHE_MAX_BYTES: int = 256 * 1024 * 1024  # 缓存总大小上限
+    SPLIT_CACHE_MAX_ENTRIES: int = 5000  # 缓存条数上限
+
+    # Token计数配置
+    TOKEN_COUNTER: str = "heuristic"  # heuristic（启发式估算）或 bpe（本地分词器精确计数）
+    TOKENIZER_FILE: str = ""  # bpe模式使用的tokenizer.json路径
+    TOKEN_COUNT_CACHE_BYTES: int = 1024 * 1024  # Token计数缓存的内存上限（字节），缓存不持有文本
+
+    # 语义合并配置（可选，使用本地ONNX句向量模型判断相邻段落是否合并）
+    SEMANTIC_MERGE: bool = False
+    EMBEDDING_MODEL_FILE: str = ""  # ONNX模型路径
+    EMBEDDING_TOKENIZER_FILE: str = ""  # 模型对应的tokenizer.json路径
+    EMBEDDING_MAX_LENGTH: int = 256  # 单个段落参与计算的最大Token数
+    EMBEDDING_BATCH_SIZE: int = 32  # 每批计算的段落数
+    EMBEDDING_CACHE_SIZE: int = 2048  # 段落向量缓存条数
     
     # 使用Pydantic v2配置语法
     model_config = {
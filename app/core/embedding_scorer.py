@@ -0,0 +1,160 @@
+import os
+import math
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Optional
+
+from app.core.config import settings
+
+
+class EmbeddingScorer(ABC):
+    """
+    段落语义相似度评分基类
+
+    文本向量按内容哈希做LRU缓存，同一段落在多轮合并中只计算一次；
+    未缓存的文本按 batch_size 分批送入模型。向量在缓存前归一化，相似度即点积。
+    """
+
+    def __init__(self, batch_size: int = 32, cache_size: int = 2048, max_chars: int = 2048):
+        self.batch_size = max(1, batch_size)
+        self.cache_size = cache_size
+        # 模型输入长度有限，超出部分不参与计算，提前截断以减少分词开销
+        self.max_chars = max_chars
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        计算一组文本的归一化向量
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            List[List[float]]: 与texts顺序一致的向量
+        """
+        keys = [hashlib.sha1(text[:self.max_chars].encode('utf-8')).hexdigest() for text in texts]
+        vectors = {}
+        missing = {}
+        for key, text in zip(keys, texts):
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                vectors[key] = cached
+            elif key not in missing:
+                missing[key] = text[:self.max_chars]
+
+        missing_keys = list(missing)
+        for start in range(0, len(missing_keys), self.batch_size):
+            batch_keys = missing_keys[start:start + self.batch_size]
+            batch_vectors = self._encode([missing[key] for key in batch_keys])
+            for key, vector in zip(batch_keys, batch_vectors):
+                vector = self._normalize(vector)
+                vectors[key] = vector
+                self._cache[key] = vector
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return [vectors[key] for key in keys]
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> List[float]:
+        norm = math.sqrt(sum(value * value for value in vector))
+        if not norm:
+            return list(vector)
+        return [value / norm for value in vector]
+
+    @staticmethod
+    def similarity(vector1: List[float], vector2: List[float]) -> float:
+        """两个归一化向量的余弦相似度，截取到 [0, 1]"""
+        return min(1.0, max(0.0, sum(a * b for a, b in zip(vector1, vector2))))
+
+    @abstractmethod
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        """调用模型计算一批文本的向量"""
+        pass
+
+
+class OnnxEmbeddingScorer(EmbeddingScorer):
+    """
+    使用本地ONNX句向量模型（如导出的 all-MiniLM-L6-v2 / bge-small）计算相似度
+
+    需要onnxruntime和tokenizers，模型输出为逐Token隐状态时按attention mask做平均池化。
+    """
+
+    def __init__(self, model_file: str, tokenizer_file: str, max_length: int = 256,
+                 batch_size: int = 32, cache_size: int = 2048):
+        super().__init__(batch_size, cache_size, max_chars=max_length * 8)
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.session = onnxruntime.InferenceSession(model_file, providers=["CPUExecutionProvider"])
+        self.input_names = {item.name for item in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(tokenizer_file)
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        import numpy as np
+
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+
+        output = self.session.run(None, feeds)[0]
+        if output.ndim == 3:
+            # 平均池化，忽略padding位置
+            mask = attention_mask[:, :, None].astype(output.dtype)
+            output = (output * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return output.tolist()
+
+
+def create_embedding_scorer(model_file: Optional[str] = None, tokenizer_file: Optional[str] = None) -> Optional[EmbeddingScorer]:
+    """
+    根据配置创建语义评分器
+
+    Args:
+        model_file: ONNX模型路径，默认使用 settings.EMBEDDING_MODEL_FILE
+        tokenizer_file: 模型对应的tokenizer.json路径，默认使用 settings.EMBEDDING_TOKENIZER_FILE
+
+    Returns:
+        Optional[EmbeddingScorer]: 模型或依赖不可用时返回None，分段器回退为基于标题的相似度
+    """
+    model_file = model_file or settings.EMBEDDING_MODEL_FILE
+    tokenizer_file = tokenizer_file or settings.EMBEDDING_TOKENIZER_FILE
+    if not model_file or not os.path.exists(model_file) or not tokenizer_file or not os.path.exists(tokenizer_file):
+        print(f"语义模型文件不存在: {model_file}，使用基于标题的相似度")
+        return None
+
+    try:
+        return OnnxEmbeddingScorer(
+            model_file, tokenizer_file,
+            max_length=settings.EMBEDDING_MAX_LENGTH,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            cache_size=settings.EMBEDDING_CACHE_SIZE
+        )
+    except ImportError:
+        print("未安装onnxruntime或tokenizers，使用基于标题的相似度")
+    except Exception as e:
+        logging.error(f"加载语义模型失败 {model_file}: {str(e)}")
+        print(f"加载语义模型失败: {str(e)}，使用基于标题的相似度")
+    return None
+
+
+_default_scorer: Optional[EmbeddingScorer] = None
+_default_loaded = False
+
+
+def get_embedding_scorer() -> Optional[EmbeddingScorer]:
+    """获取按配置创建的共享语义评分器，未启用语义合并时返回None"""
+    global _default_scorer, _default_loaded
+    if not settings.SEMANTIC_MERGE:
+        return None
+    if not _default_loaded:
+        _default_scorer = create_embedding_scorer()
+        _default_loaded = True
+    return _default_scorer
@@ -0,0 +1,441 @@
+import time
+import uuid
+import asyncio
+import logging
+import contextvars
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+
+from app.core.config import settings
+from app.utils.file_utils import FileUtils
+from app.utils.path_utils import join_paths
+
+# 优先级数值越小越优先
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 5
+PRIORITY_BULK = 10
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_PAUSED = "paused"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FINISHED_STATUSES = {JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED}
+
+# 当前协程所属的任务ID，处理函数通过 report_progress 上报进度时使用
+_current_job_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_job_id", default=None)
+
+
+class JobScheduler:
+    """
+    后台任务调度器
+
+    所有爬取/转换任务都提交到调度器，由调度器统一控制全局并发数，并保证：
+    - 优先级：交互式的小任务优先于批量任务，排队时间越长有效优先级越高（老化），批量任务不会被饿死
+    - 项目间公平：优先调度当前运行任务最少的项目，且单个项目同时运行的任务数有上限
+    - 交互式任务通道：除普通并发数外额外保留 JOB_INTERACTIVE_SLOTS 个运行位置，只给交互式任务使用，
+      不受项目任务数上限限制，爬取、转换、数据集生成的大任务占满并发时小任务仍能立即运行
+    - 持久化：任务状态和进度保存在 jobs.json 中，任务参数在提交时单独写入一次，
+      服务重启后未完成的任务重新排队执行
+    - 暂停：运行中的任务被中断并标记为暂停，恢复后重新排队，处理函数重新执行，
+      需要处理函数能从中断处继续（如数据集生成的生成日志）
+    - 取消：运行中的任务被中断，之后调用任务类型注册的取消回调清理外部资源（如服务端的批量任务），
+      排队中或暂停的任务被取消时同样调用
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # 在交互式任务通道中运行的任务ID
+        self._interactive: set = set()
+        self._handlers: Dict[str, Callable[..., Awaitable[Any]]] = {}
+        self._cancel_hooks: Dict[str, Callable[..., Awaitable[Any]]] = {}
+        self._hook_tasks = set()
+        self._seq = 0
+        self._loaded = False
+        self._shutting_down = False
+        self._last_save = 0.0
+        self._pausing = set()
+
+    # ---------- 配置与持久化 ----------
+
+    @staticmethod
+    def _jobs_file() -> str:
+        return join_paths(settings.OUTPUT_DIR, settings.JOBS_FILE)
+
+    @staticmethod
+    def _params_file(job_id: str) -> str:
+        return join_paths(settings.OUTPUT_DIR, settings.JOB_PARAMS_DIR, f"{job_id}.json")
+
+    def _save(self, force: bool = True):
+        """保存任务表，只包含状态和进度，不含任务参数；进度更新只按时间间隔节流保存"""
+        now = time.monotonic()
+        if not force and now - self._last_save < settings.JOB_PROGRESS_SAVE_INTERVAL:
+            return
+        self._last_save = now
+        self._trim_history()
+        jobs = sorted(self._jobs.values(), key=lambda j: j["seq"])
+        FileUtils.write_json(self._jobs_file(), [{k: v for k, v in j.items() if k != "params"} for j in jobs])
+
+    def _trim_history(self):
+        """只保留最近的已结束任务"""
+        finished = [j for j in self._jobs.values() if j["status"] in FINISHED_STATUSES]
+        overflow = len(finished) - settings.JOB_HISTORY_LIMIT
+        if overflow > 0:
+            finished.sort(key=lambda j: j["seq"])
+            for job in finished[:overflow]:
+                del self._jobs[job["job_id"]]
+                FileUtils.safe_delete(self._params_file(job["job_id"]))
+
+    def load(self):
+        """从任务表恢复任务，中断的运行中任务重新排队"""
+        if self._loaded:
+            return
+        self._loaded = True
+        jobs = FileUtils.read_json(self._jobs_file(), [])
+        if not isinstance(jobs, list):
+            jobs = []
+        for job in jobs:
+            if not isinstance(job, dict) or "job_id" not in job:
+                continue
+            if "params" in job:
+                # 旧版任务表中参数和状态保存在一起，迁移到单独的参数文件
+                FileUtils.write_json(self._params_file(job["job_id"]), job["params"])
+            else:
+                job["params"] = FileUtils.read_json(self._params_file(job["job_id"]), {})
+            if job.get("status") == JOB_RUNNING:
+                job["status"] = JOB_QUEUED
+                job["restarts"] = job.get("restarts", 0) + 1
+                job["message"] = "服务重启，任务重新排队"
+            self._jobs[job["job_id"]] = job
+            self._seq = max(self._seq, job.get("seq", 0))
+        restored = sum(1 for j in self._jobs.values() if j["status"] == JOB_QUEUED)
+        if restored:
+            print(f"已从任务表恢复 {restored} 个待执行任务")
+
+    # ---------- 对外接口 ----------
+
+    def register_handler(self, kind: str, handler: Callable[..., Awaitable[Any]],
+                         on_cancel: Optional[Callable[..., Awaitable[Any]]] = None):
+        """
+        注册任务类型的处理函数，处理函数以任务参数作为关键字参数调用
+
+        Args:
+            kind: 任务类型
+            handler: 处理函数
+            on_cancel: 任务被取消后调用的清理函数，参数与处理函数相同；暂停和服务关闭时不调用
+        """
+        self._handlers[kind] = handler
+        if on_cancel is not None:
+            self._cancel_hooks[kind] = on_cancel
+
+    @staticmethod
+    def priority_for_size(size: int) -> int:
+        """根据任务规模给出默认优先级"""
+        if size <= settings.JOB_INTERACTIVE_MAX_ITEMS:
+            return PRIORITY_INTERACTIVE
+        if size >= settings.JOB_BULK_MIN_ITEMS:
+            return PRIORITY_BULK
+        return PRIORITY_NORMAL
+
+    def submit(self, kind: str, params: Dict[str, Any], project_id: Optional[str] = None,
+               priority: int = PRIORITY_NORMAL, description: str = "") -> Dict[str, Any]:
+        """
+        提交任务
+
+        Args:
+            kind: 任务类型，需已注册处理函数
+            params: 处理函数参数，需可JSON序列化以便持久化
+            project_id: 项目ID
+            priority: 优先级，数值越小越优先
+            description: 任务描述
+
+        Returns:
+            Dict[str, Any]: 任务信息
+        """
+        self.load()
+        self._seq += 1
+        job_id = f"{kind}_{project_id}_{uuid.uuid4().hex[:12]}"
+        job = {
+            "job_id": job_id,
+            "kind": kind,
+            "project_id": project_id,
+            "priority": priority,
+            "description": description,
+            "params": params,
+            "status": JOB_QUEUED,
+            "message": "任务排队中",
+            "progress": {"current": 0, "total": 0},
+            "seq": self._seq,
+            "restarts": 0,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None
+        }
+        self._jobs[job_id] = job
+        FileUtils.write_json(self._params_file(job_id), params)
+        self._save()
+        self._dispatch()
+        return self._public_view(job)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务状态"""
+        self.load()
+        job = self._jobs.get(job_id)
+        return self._public_view(job) if job else None
+
+    def list_jobs(self, project_id: Optional[str] = None, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """列出任务，按提交顺序倒序"""
+        self.load()
+        jobs = [
+            j for j in self._jobs.values()
+            if (project_id is None or j["project_id"] == project_id) and (kind is None or j["kind"] == kind)
+        ]
+        jobs.sort(key=lambda j: j["seq"], reverse=True)
+        return [self._public_view(j) for j in jobs]
+
+    def find_job(self, kind: str, project_id: Optional[str] = None, **params: Any) -> Optional[Dict[str, Any]]:
+        """查找指定类型、项目且参数匹配的最近一个任务"""
+        self.load()
+        jobs = [
+            j for j in self._jobs.values()
+            if j["kind"] == kind and j["project_id"] == project_id
+            and all(j["params"].get(k) == v for k, v in params.items())
+        ]
+        if not jobs:
+            return None
+        return self._public_view(max(jobs, key=lambda j: j["seq"]))
+
+    def cancel(self, job_id: str) -> bool:
+        """取消排队中或运行中的任务，返回是否成功"""
+        self.load()
+        job = self._jobs.get(job_id)
+        if not job or job["status"] in FINISHED_STATUSES:
+            return False
+        if job["status"] in (JOB_QUEUED, JOB_PAUSED):
+            self._finish(job, JOB_CANCELLED, "任务已取消")
+            self._spawn_cancel_hook(job)
+            return True
+        task = self._tasks.get(job_id)
+        if task and not task.done():
+            self._pausing.discard(job_id)
+            task.cancel()
+            return True
+        return False
+
+    def pause(self, job_id: str) -> bool:
+        """暂停排队中或运行中的任务，运行中的任务被中断，返回是否成功"""
+        self.load()
+        job = self._jobs.get(job_id)
+        if not job:
+            return False
+        if job["status"] == JOB_QUEUED:
+            job["status"] = JOB_PAUSED
+            job["message"] = "任务已暂停"
+            self._save()
+            return True
+        task = self._tasks.get(job_id)
+        if job["status"] == JOB_RUNNING and task and not task.done():
+            self._pausing.add(job_id)
+            task.cancel()
+            return True
+        return False
+
+    def resume(self, job_id: str) -> bool:
+        """恢复暂停的任务，重新排队执行，返回是否成功"""
+        self.load()
+        job = self._jobs.get(job_id)
+        if not job or job["status"] != JOB_PAUSED:
+            return False
+        job["status"] = JOB_QUEUED
+        job["message"] = "任务已恢复，等待运行"
+        self._save()
+        self._dispatch()
+        return True
+
+    def current_job(self) -> Optional[Dict[str, Any]]:
+        """在任务处理函数内部获取当前任务信息，不在调度器任务中调用时返回None"""
+        job_id = _current_job_id.get()
+        job = self._jobs.get(job_id) if job_id else None
+        return self._public_view(job) if job else None
+
+    def report_progress(self, current: int, total: int, message: Optional[str] = None, **stats: Any):
+        """
+        在任务处理函数内部上报进度，不在调度器任务中调用时忽略
+
+        Args:
+            current: 已完成的数量
+            total: 总数
+            message: 进度说明
+            stats: 其他统计信息（如生成的数据数、使用的Token数），与之前上报的统计合并保存
+        """
+        job_id = _current_job_id.get()
+        job = self._jobs.get(job_id) if job_id else None
+        if not job:
+            return
+        job["progress"] = {**job.get("progress", {}), **stats, "current": current, "total": total}
+        if message:
+            job["message"] = message
+        self._save(force=False)
+
+    def start(self):
+        """服务启动时调用：恢复任务表并开始调度"""
+        self._shutting_down = False
+        self.load()
+        self._dispatch()
+
+    async def shutdown(self):
+        """服务关闭时调用：中断运行中的任务，保持其状态以便重启后继续"""
+        self._shutting_down = True
+        tasks = [t for t in self._tasks.values() if not t.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._save()
+
+    # ---------- 调度 ----------
+
+    @staticmethod
+    def _public_view(job: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in job.items() if k not in ("params", "seq")}
+
+    def _running_by_project(self) -> Dict[Optional[str], int]:
+        """普通通道中各项目运行的任务数，交互式任务通道中的任务不计入"""
+        counts: Dict[Optional[str], int] = {}
+        for job_id in self._tasks:
+            if job_id in self._interactive:
+                continue
+            project_id = self._jobs[job_id]["project_id"]
+            counts[project_id] = counts.get(project_id, 0) + 1
+        return counts
+
+    def _effective_priority(self, job: Dict[str, Any], now: float) -> float:
+        """排队时间每满 JOB_AGING_SECONDS 秒，优先级提升一级"""
+        waited = max(0.0, now - job["created_at"])
+        return job["priority"] - waited / settings.JOB_AGING_SECONDS
+
+    def _next_job(self, interactive: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        选择下一个要运行的任务：运行任务最少的项目优先，其次按有效优先级和提交顺序
+
+        Args:
+            interactive: 为交互式任务通道选择，只选交互式任务，不受项目任务数上限限制
+        """
+        running = self._running_by_project()
+        now = time.time()
+        candidates = [
+            j for j in self._jobs.values()
+            if j["status"] == JOB_QUEUED
+            and (j["priority"] <= PRIORITY_INTERACTIVE if interactive
+                 else running.get(j["project_id"], 0) < settings.JOB_MAX_PER_PROJECT)
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda j: (
+            running.get(j["project_id"], 0),
+            self._effective_priority(j, now),
+            j["seq"]
+        ))
+
+    def _dispatch(self):
+        """在并发上限内启动排队中的任务"""
+        if self._shutting_down:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # 没有事件循环时（如同步调用）等待 start() 调度
+            return
+        for interactive in (False, True):
+            while self._has_free_slot(interactive):
+                job = self._next_job(interactive)
+                if job is None:
+                    break
+                handler = self._handlers.get(job["kind"])
+                if handler is None:
+                    self._finish(job, JOB_FAILED, f"未知的任务类型: {job['kind']}")
+                    continue
+                job["status"] = JOB_RUNNING
+                job["message"] = "任务运行中"
+                job["started_at"] = time.time()
+                if interactive:
+                    self._interactive.add(job["job_id"])
+                self._tasks[job["job_id"]] = asyncio.create_task(self._run(job, handler))
+                print(f"任务开始运行: {job['job_id']}")
+        self._save()
+
+    def _has_free_slot(self, interactive: bool) -> bool:
+        """普通通道或交互式任务通道是否还有空闲的运行位置"""
+        in_lane = len(self._interactive)
+        if interactive:
+            return in_lane < settings.JOB_INTERACTIVE_SLOTS
+        return len(self._tasks) - in_lane < settings.JOB_MAX_CONCURRENCY
+
+    async def _run(self, job: Dict[str, Any], handler: Callable[..., Awaitable[Any]]):
+        job_id = job["job_id"]
+        _current_job_id.set(job_id)
+        try:
+            await handler(**job["params"])
+            self._finish(job, JOB_COMPLETED, "任务已完成")
+            print(f"任务 {job_id} 成功完成")
+        except asyncio.CancelledError:
+            if job_id in self._pausing:
+                self._pausing.discard(job_id)
+                job["status"] = JOB_PAUSED
+                job["message"] = "任务已暂停"
+                self._save()
+                print(f"任务 {job_id} 已暂停")
+            elif self._shutting_down:
+                # 服务关闭导致的中断，保留为待执行，重启后重新排队
+                job["status"] = JOB_QUEUED
+                job["restarts"] = job.get("restarts", 0) + 1
+                job["message"] = "服务关闭，任务等待重启后继续"
+            else:
+                self._finish(job, JOB_CANCELLED, "任务已取消")
+                print(f"任务 {job_id} 已被取消")
+                await self._run_cancel_hook(job)
+        except Exception as e:
+            logging.error(f"任务 {job_id} 执行时发生异常: {str(e)}")
+            print(f"任务 {job_id} 执行失败: {str(e)}")
+            self._finish(job, JOB_FAILED, f"任务执行失败: {str(e)}")
+        finally:
+            self._tasks.pop(job_id, None)
+            self._interactive.discard(job_id)
+            self._dispatch()
+
+    async def _run_cancel_hook(self, job: Dict[str, Any]):
+        """调用任务类型的取消回调，回调失败只记录日志"""
+        hook = self._cancel_hooks.get(job["kind"])
+        if hook is None:
+            return
+        try:
+            await hook(**job["params"])
+        except Exception as e:
+            logging.error(f"任务 {job['job_id']} 取消后的清理失败: {str(e)}")
+            print(f"任务 {job['job_id']} 取消后的清理失败: {str(e)}")
+
+    def _spawn_cancel_hook(self, job: Dict[str, Any]):
+        """在后台调用取消回调，没有事件循环时同步执行"""
+        if job["kind"] not in self._cancel_hooks:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(self._run_cancel_hook(job))
+            return
+        task = loop.create_task(self._run_cancel_hook(job))
+        self._hook_tasks.add(task)
+        task.add_done_callback(self._hook_tasks.discard)
+
+    def _finish(self, job: Dict[str, Any], status: str, message: str):
+        job["status"] = status
+        job["message"] = message
+        job["finished_at"] = time.time()
+        self._save()
+
+
+# 全局任务调度器实例
+scheduler = JobScheduler()
@@ -0,0 +1,99 @@
+import os
+import json
+import hashlib
+import logging
+from typing import Dict, Any, Optional
+
+from app.core.config import settings
+from app.utils.file_utils import LRUFileIndex
+
+# 缓存格式变化时递增，旧缓存自动失效
+LLM_CACHE_VERSION = 1
+
+
+class LLMResponseCache:
+    """
+    大模型响应的持久化缓存
+
+    以（模型、接口地址、系统提示词哈希、输入内容哈希、请求参数）为键，每条缓存一个JSON文件。
+    提示词或内容的任何改动都会得到新的键。LRU顺序和总大小保存在内存索引中，超过条数或总大小上限时删除最久未用的条目。
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024, max_entries: int = 20000):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._index = LRUFileIndex(cache_dir, max_entries, max_bytes)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(model: str, base_url: str, system_prompt: str, content: str,
+                 params: Optional[Dict[str, Any]] = None) -> str:
+        """计算缓存键"""
+        key = {
+            "version": LLM_CACHE_VERSION,
+            "model": model,
+            "base_url": base_url,
+            "system": hashlib.sha256(system_prompt.encode('utf-8')).hexdigest(),
+            "content": hashlib.sha256(content.encode('utf-8')).hexdigest(),
+            "params": params or {}
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存的响应，包含content和finish_reason，未命中或缓存损坏时返回None"""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if entry.get("version") != LLM_CACHE_VERSION or not isinstance(entry.get("content"), str):
+                return None
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, AttributeError) as e:
+            logging.error(f"读取大模型响应缓存失败 {path}: {str(e)}")
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._index.touch(path)
+        return entry
+
+    def put(self, key: str, content: str, finish_reason: Optional[str] = None):
+        """保存响应，并按上限淘汰旧条目"""
+        entry = {"version": LLM_CACHE_VERSION, "content": content, "finish_reason": finish_reason}
+        path = self._entry_path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+            size = os.path.getsize(path)
+        except Exception as e:
+            logging.error(f"保存大模型响应缓存失败 {path}: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self._index.add(path, size)
+
+
+_default_cache: Optional[LLMResponseCache] = None
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """获取按配置创建的共享响应缓存，未启用时返回None"""
+    global _default_cache
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    if _default_cache is None:
+        _default_cache = LLMResponseCache(
+            os.path.join(settings.OUTPUT_DIR, settings.LLM_CACHE_DIR),
+            max_bytes=settings.LLM_CACHE_MAX_BYTES,
+            max_entries=settings.LLM_CACHE_MAX_ENTRIES
+        )
+    return _default_cache
@@ -0,0 +1,157 @@
+import re
+from typing import List, Dict, Any, Iterable, Optional, Callable
+
+from app.core.token_counter import get_token_counter
+from app.core.segmenter import HEADER_PATTERN
+
+# 块类型
+BLOCK_HEADING = "heading"
+BLOCK_CODE = "code"
+BLOCK_TABLE = "table"
+BLOCK_LIST = "list"
+BLOCK_QUOTE = "quote"
+BLOCK_PARAGRAPH = "paragraph"
+
+LIST_ITEM_PATTERN = re.compile(r'^([-*+]|\d+[.)])\s')
+
+
+def _line_type(stripped: str) -> str:
+    """判断非空行开始的块类型"""
+    if HEADER_PATTERN.match(stripped):
+        return BLOCK_HEADING
+    if stripped.startswith('|'):
+        return BLOCK_TABLE
+    if stripped.startswith('>'):
+        return BLOCK_QUOTE
+    if LIST_ITEM_PATTERN.match(stripped):
+        return BLOCK_LIST
+    return BLOCK_PARAGRAPH
+
+
+def extract_blocks(lines: Iterable[str], estimate_tokens: Optional[Callable[[str], int]] = None) -> List[Dict[str, Any]]:
+    """
+    将Markdown按行扫描为结构块
+
+    代码块从开始围栏到结束围栏为一个整体（包括其中的空行），连续的表格行为一个表格块，
+    标题单独成块，列表/引用/段落以空行或其他块的开始为界。
+
+    Args:
+        lines: Markdown的行（不含换行符），可以是文件行迭代器
+        estimate_tokens: Token估算函数，默认使用按配置创建的共享Token计数器
+
+    Returns:
+        List[Dict[str, Any]]: 块列表，包含type、start_line、end_line（含）、
+        start、end（字符偏移，end不含）、tokens，标题块包含level和text，代码块包含language
+    """
+    if estimate_tokens is None:
+        estimate_tokens = get_token_counter().count
+
+    blocks: List[Dict[str, Any]] = []
+    current: Optional[Dict[str, Any]] = None
+    current_lines: List[str] = []
+    fence = None
+    offset = 0
+
+    def close_block():
+        nonlocal current, current_lines
+        if current is not None:
+            text = '\n'.join(current_lines)
+            current['end'] = current['start'] + len(text)
+            current['tokens'] = estimate_tokens(text)
+            blocks.append(current)
+        current = None
+        current_lines = []
+
+    def open_block(block_type: str, index: int, start: int, **extra):
+        nonlocal current
+        close_block()
+        current = {'type': block_type, 'start_line': index, 'end_line': index, 'start': start}
+        current.update(extra)
+
+    for index, line in enumerate(lines):
+        line = line.rstrip('\r\n')
+        stripped = line.strip()
+        line_start = offset
+        offset += len(line) + 1
+
+        if fence is not None:
+            # 代码块内部，直到遇到结束围栏
+            current_lines.append(line)
+            current['end_line'] = index
+            if stripped.startswith(fence) and not stripped[len(fence):].strip('`'):
+                fence = None
+                close_block()
+            continue
+
+        if stripped.startswith('```'):
+            fence = '`' * (len(stripped) - len(stripped.lstrip('`')))
+            open_block(BLOCK_CODE, index, line_start, language=stripped[len(fence):].strip())
+            current_lines.append(line)
+            continue
+
+        if not stripped:
+            close_block()
+            continue
+
+        line_type = _line_type(stripped)
+        if line_type == BLOCK_HEADING:
+            match = HEADER_PATTERN.match(stripped)
+            open_block(BLOCK_HEADING, index, line_start,
+                       level=len(match.group(1)), text=match.group(2).strip())
+            current_lines.append(line)
+            close_block()
+            continue
+
+        if current is None:
+            open_block(line_type, index, line_start)
+        elif current['type'] == BLOCK_TABLE and line_type != BLOCK_TABLE:
+            # 表格结束
+            open_block(line_type, index, line_start)
+        elif current['type'] != BLOCK_TABLE and line_type == BLOCK_TABLE:
+            open_block(line_type, index, line_start)
+        elif current['type'] == BLOCK_PARAGRAPH and line_type in (BLOCK_LIST, BLOCK_QUOTE):
+            open_block(line_type, index, line_start)
+
+        current_lines.append(line)
+        current['end_line'] = index
+
+    # 未闭合的代码块延续到文档结尾
+    close_block()
+    return blocks
+
+
+def complete_blocks(lines: List[str], blocks: List[Dict[str, Any]],
+                    estimate_tokens: Optional[Callable[[str], int]] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    补全转换器产出的结构块（见 MarkdownStreamCleaner），按行号重新计算字符偏移并估算Token数
+
+    转换后替换资源链接等处理只改变行内内容、不改变行号，因此以行号为准。
+
+    Args:
+        lines: Markdown的行（不含换行符）
+        blocks: 转换器产出的结构块，包含type、start_line、end_line，标题块包含level和text，代码块包含language
+        estimate_tokens: Token估算函数，默认使用按配置创建的共享Token计数器
+
+    Returns:
+        Optional[List[Dict[str, Any]]]: 与 extract_blocks 格式一致的块列表，行号与内容不符时返回None
+    """
+    if estimate_tokens is None:
+        estimate_tokens = get_token_counter().count
+
+    line_starts = []
+    offset = 0
+    for line in lines:
+        line_starts.append(offset)
+        offset += len(line) + 1
+
+    completed = []
+    previous_end = -1
+    for block in blocks:
+        start_line, end_line = block['start_line'], block['end_line']
+        if start_line <= previous_end or end_line < start_line or end_line >= len(lines):
+            return None
+        text = '\n'.join(lines[start_line:end_line + 1])
+        start = line_starts[start_line]
+        completed.append(dict(block, start=start, end=start + len(text), tokens=estimate_tokens(text)))
+        previous_end = end_line
+    return completed
@@ -1,10 +1,17 @@
 import re
 import os
 import math
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator
 from dataclasses import dataclass, asdict
 from pathlib import Path
 
+from app.core.token_counter import TokenCounter, get_token_counter
+from app.core.embedding_scorer import EmbeddingScorer
+from app.core.segmenter import is_header_line, split_markdown_sentences
+
+# 重叠区域的切分位置：句末标点或换行之后
+OVERLAP_BOUNDARY_PATTERN = re.compile(r'[。！？.!?]+\s*|\n+')
+
 
 @dataclass
 class MarkdownChunk:
@@ -29,7 +36,9 @@ class MarkdownSplitter:
     - 保持文档结构完整性
     """
     
-    def __init__(self, max_tokens: int = 8000, min_tokens: int = 1000, header_path_separator: str = "/"):
+    def __init__(self, max_tokens: int = 8000, min_tokens: int = 1000, header_path_separator: str = "/",
+                 token_counter: Optional[TokenCounter] = None, embedding_scorer: Optional[EmbeddingScorer] = None,
+                 overlap_tokens: int = 0, overlap_sentences: int = 0):
         """
         初始化分段器
         
@@ -37,76 +46,77 @@ class MarkdownSplitter:
             max_tokens: 最大Token数限制
             min_tokens: 最小Token数限制
             header_path_separator: 标题路径分隔符
+            token_counter: Token计数器，默认按配置（TOKEN_COUNTER）使用启发式估算或BPE分词器
+            embedding_scorer: 可选的语义评分器，提供时按段落向量的余弦相似度评估相邻段落的相关性
+            overlap_tokens: 每个分段与前一个分段重叠的Token数（按句子边界取整），0表示不重叠
+            overlap_sentences: 每个分段与前一个分段重叠的句子数，与overlap_tokens同时设置时取较多者
         """
         self.max_tokens = max_tokens
         self.min_tokens = min_tokens
         self.header_path_separator = header_path_separator
+        self.token_counter = token_counter or get_token_counter()
+        self.embedding_scorer = embedding_scorer
+        self.overlap_tokens = overlap_tokens
+        self.overlap_sentences = overlap_sentences
     
     def estimate_tokens(self, text: str) -> int:
         """
         估算文本的Token数量
         
-        Token估算规则：
+        默认的启发式估算规则（见 HeuristicTokenCounter）：
         - 英文单词数 × 1.3
         - 中文字符数 × 1.6  
         - 代码字符数 × 1.8
         - 特殊符号数 × 0.5
         """
-        if not text:
-            return 0
-        
-        # 分离代码块
-        code_blocks = re.findall(r'```[\s\S]*?```', text)
-        text_without_code = re.sub(r'```[\s\S]*?```', '', text)
-        
-        # 计算代码块Token
-        code_tokens = 0
-        for code_block in code_blocks:
-            code_tokens += len(code_block) * 1.8
-        
-        # 计算中文字符数
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text_without_code))
-        chinese_tokens = chinese_chars * 1.6
-        
-        # 计算英文单词数
-        english_words = len(re.findall(r'\b[a-zA-Z]+\b', text_without_code))
-        english_tokens = english_words * 1.3
-        
-        # 计算特殊符号数
-        special_chars = len(re.findall(r'[^\u4e00-\u9fff\w\s]', text_without_code))
-        special_tokens = special_chars * 0.5
-        
-        total_tokens = code_tokens + chinese_tokens + english_tokens + special_tokens
-        return int(total_tokens)
+        return self.token_counter.count(text)
     
     def _is_header_line(self, line: str) -> Tuple[bool, int, str]:
         """检查是否为标题行，返回(是否为标题, 标题级别, 标题文本)"""
-        header_match = re.match(r'^(#{1,6})\s+(.+)', line.strip())
-        if header_match:
-            level = len(header_match.group(1))
-            text = header_match.group(2).strip()
-            return True, level, text
-        return False, 0, ""
+        return is_header_line(line)
     
     def _split_by_headers(self, text: str) -> List[Dict]:
         """基于标题分割文档，保持结构完整性"""
-        lines = text.split('\n')
-        sections = []
-        current_section = {
-            'content': '',
-            'header_stack': [],
-            'start_line': 0,
-            'end_line': 0
-        }
+        return list(self._iter_header_sections(text.split('\n')))
+    
+    def _iter_header_sections(self, lines: Iterable[str], max_section_chars: Optional[int] = None) -> Iterator[Dict]:
+        """
+        逐行读取文档，按标题产出段落
+        
+        Args:
+            lines: 文档的行，可以是文件对象等行迭代器
+            max_section_chars: 可选，段落累计超过该字符数时在代码块和表格之外的空行处截断，
+                截断后的部分沿用同一个标题栈，保证没有标题的超长文档也只占用有限内存
+        """
+        header_stack: List[Tuple[int, str]] = []
+        # 当前段落的行，段落结束时一次性拼接，避免逐行拼接字符串
+        section_lines: List[str] = []
+        section_chars = 0
+        section_start = 0
         
         in_code_block = False
         in_table = False
+        i = -1
+        
+        def build_section(end_line: int) -> Optional[Dict]:
+            content = ''.join(line + '\n' for line in section_lines)
+            if not content.strip():
+                return None
+            return {
+                'content': content,
+                'header_stack': header_stack.copy(),
+                'start_line': section_start,
+                'end_line': end_line
+            }
         
         for i, line in enumerate(lines):
+            line = line.rstrip('\n')
+            
             # 追踪代码块状态
             if line.strip().startswith('```'):
                 in_code_block = not in_code_block
-                current_section['content'] += line + '\n'
+                section_lines.append(line)
+                section_chars += len(line) + 1
                 continue
             
             # 追踪表格状态
@@ -120,40 +130,143 @@ class MarkdownSplitter:
                 is_header, level, header_text = self._is_header_line(line)
                 
                 if is_header:
-                    # 保存当前段落
-                    if current_section['content'].strip():
-                        current_section['end_line'] = i - 1
-                        # 深拷贝标题栈，确保每个分段独立
-                        section_copy = current_section.copy()
-                        section_copy['header_stack'] = current_section['header_stack'].copy()
-                        sections.append(section_copy)
+                    # 保存当前段落（复制标题栈，确保每个分段独立）
+                    section = build_section(i - 1)
+                    if section:
+                        yield section
                     
                     # 更新标题栈 - 保持正确的层级结构
                     # 移除同级或更高级的标题
-                    while (current_section['header_stack'] and 
-                           current_section['header_stack'][-1][0] >= level):
-                        current_section['header_stack'].pop()
+                    while header_stack and header_stack[-1][0] >= level:
+                        header_stack.pop()
                     
                     # 添加新标题
-                    current_section['header_stack'].append((level, header_text))
+                    header_stack.append((level, header_text))
                     
                     # 开始新段落
-                    current_section['content'] = line + '\n'
-                    current_section['start_line'] = i
+                    section_lines = [line]
+                    section_chars = len(line) + 1
+                    section_start = i
+                    continue
+                
+                if max_section_chars and section_chars > max_section_chars and not line.strip():
+                    # 超长段落在空行处截断
+                    section = build_section(i - 1)
+                    if section:
+                        yield section
+                    section_lines = []
+                    section_chars = 0
+                    section_start = i + 1
                     continue
             
-            current_section['content'] += line + '\n'
+            section_lines.append(line)
+            section_chars += len(line) + 1
         
         # 添加最后一个段落
-        if current_section['content'].strip():
-            current_section['end_line'] = len(lines) - 1
-            # 深拷贝标题栈，确保每个分段独立
-            section_copy = current_section.copy()
-            section_copy['header_stack'] = current_section['header_stack'].copy()
-            sections.append(section_copy)
+        section = build_section(i)
+        if section:
+            yield section
+    
+    def _split_by_header_blocks(self, lines: List[str], blocks: List[Dict[str, Any]]) -> List[Dict]:
+        """
+        基于结构块分割文档，结果与 _split_by_headers 一致
+
+        标题位置直接取自标题块，不再逐行匹配；代码块和表格由块边界精确界定。
+        每个段落额外记录 units：以空行分隔、但不会拆开代码块的段落单元，供按段落分割时使用。
+        """
+        sections = []
+        header_stack: List[Tuple[int, str]] = []
+        section_start = 0
+        section_blocks: List[Dict[str, Any]] = []
+        
+        def add_section(end: int):
+            content = ''.join(line + '\n' for line in lines[section_start:end])
+            if content.strip():
+                sections.append({
+                    'content': content,
+                    'header_stack': header_stack.copy(),
+                    'start_line': section_start,
+                    'end_line': end - 1,
+                    'units': self._group_block_units(lines, section_blocks)
+                })
+        
+        for block in blocks:
+            if block['type'] == 'heading':
+                add_section(block['start_line'])
+                
+                # 移除同级或更高级的标题
+                while header_stack and header_stack[-1][0] >= block['level']:
+                    header_stack.pop()
+                header_stack.append((block['level'], block['text']))
+                
+                section_start = block['start_line']
+                section_blocks = []
+            section_blocks.append(block)
         
+        add_section(len(lines))
         return sections
     
+    def _group_block_units(self, lines: List[str], blocks: List[Dict[str, Any]]) -> List[str]:
+        """将紧邻（中间没有空行）的块合并为一个段落单元"""
+        units = []
+        group_start = group_end = None
+        for block in blocks:
+            if group_end is not None and block['start_line'] == group_end + 1:
+                group_end = block['end_line']
+                continue
+            if group_start is not None:
+                units.append('\n'.join(lines[group_start:group_end + 1]))
+            group_start, group_end = block['start_line'], block['end_line']
+        if group_start is not None:
+            units.append('\n'.join(lines[group_start:group_end + 1]))
+        return units
+    
+    def _extend_units(self, target: Dict, other: Dict):
+        """合并段落时同步合并段落单元，任一方没有单元信息时丢弃"""
+        if 'units' in target and 'units' in other:
+            target['units'].extend(other['units'])
+        else:
+            target.pop('units', None)
+    
+    def _section_tokens(self, section: Dict) -> int:
+        """段落的Token数，计算后缓存在段落中，合并时累加而不是重新计算"""
+        tokens = section.get('tokens')
+        if tokens is None:
+            tokens = self.estimate_tokens(self._section_content(section))
+            section['tokens'] = tokens
+        return tokens
+    
+    def _section_content(self, section: Dict) -> str:
+        """获取段落内容，合并时追加的片段在这里一次性拼接"""
+        pending = section.pop('pending', None)
+        if pending:
+            section['content'] = ''.join([section['content']] + pending)
+        return section['content']
+    
+    def _append_section(self, target: Dict, other: Dict, separator: str):
+        """
+        将other的内容追加到target
+
+        内容片段只记录引用，在读取内容时才拼接，多轮合并的总开销保持线性；
+        Token数为两段之和。
+        """
+        tokens = self._section_tokens(target) + self._section_tokens(other)
+        pending = target.setdefault('pending', [])
+        pending.append(separator)
+        pending.append(other['content'])
+        pending.extend(other.get('pending', []))
+        target['tokens'] = tokens
+    
+    def _concat_sections(self, section1: Dict, section2: Dict, separator: str) -> Dict:
+        """创建由两个段落拼接而成的新段落（不含标题栈等元信息）"""
+        merged = {
+            'content': section1['content'],
+            'pending': list(section1.get('pending', [])),
+            'tokens': self._section_tokens(section1)
+        }
+        self._append_section(merged, section2, separator)
+        return merged
+    
     def _merge_small_sections(self, sections: List[Dict]) -> List[Dict]:
         """合并过小的段落，改进合并逻辑"""
         if not sections:
@@ -162,14 +275,14 @@ class MarkdownSplitter:
         merged = []
         
         for current in sections:
-            current_tokens = self.estimate_tokens(current['content'])
+            current_tokens = self._section_tokens(current)
             
             # 如果合并列表为空，直接添加
             if not merged:
                 merged.append(current)
                 continue
             
-            last_tokens = self.estimate_tokens(merged[-1]['content'])
+            last_tokens = self._section_tokens(merged[-1])
             
             # 检查是否应该合并
             should_merge = (
@@ -180,8 +293,10 @@ class MarkdownSplitter:
             )
             
             if should_merge:
-                merged[-1]['content'] += '\n' + current['content']
+                self._append_section(merged[-1], current, '\n')
                 merged[-1]['end_line'] = current['end_line']
+                # 单行换行连接的内容不是独立的段落单元
+                merged[-1].pop('units', None)
                 # 智能合并标题栈
                 merged[-1]['header_stack'] = self._merge_header_stacks(
                     merged[-1]['header_stack'], current['header_stack']
@@ -202,20 +317,24 @@ class MarkdownSplitter:
         target_max_tokens = adaptive_params.get('max_tokens', self.max_tokens)
         
         # 计算目标Token数
-        total_tokens = sum(self.estimate_tokens(section['content']) for section in sections)
+        total_tokens = sum(self._section_tokens(section) for section in sections)
         target_avg_tokens = total_tokens // len(sections) if sections else 0
         
+        # 启用语义评分时一次性批量计算所有段落的向量
+        if self.embedding_scorer is not None:
+            self._attach_embeddings(sections)
+        
         merged = []
         
         for current in sections:
-            current_tokens = self.estimate_tokens(current['content'])
+            current_tokens = self._section_tokens(current)
             
             # 如果合并列表为空，直接添加
             if not merged:
                 merged.append(current)
                 continue
             
-            last_tokens = self.estimate_tokens(merged[-1]['content'])
+            last_tokens = self._section_tokens(merged[-1])
             
             # 智能合并决策
             should_merge = self._should_merge_smartly(
@@ -226,13 +345,27 @@ class MarkdownSplitter:
             )
             
             if should_merge:
-                # 执行智能合并
+                # 执行智能合并，合并后的段落以末尾段落的向量与下一个段落比较
                 merged[-1] = self._merge_sections_smartly(merged[-1], current)
+                if 'embedding' in current:
+                    merged[-1]['embedding'] = current['embedding']
             else:
                 merged.append(current)
         
+        for section in merged:
+            section.pop('embedding', None)
         return merged
     
+    def _attach_embeddings(self, sections: List[Dict]):
+        """批量计算段落向量并记录在段落中，计算失败时回退为基于标题的相似度"""
+        try:
+            vectors = self.embedding_scorer.embed([self._section_content(section) for section in sections])
+        except Exception as e:
+            print(f"计算段落向量失败，使用基于标题的相似度: {str(e)}")
+            return
+        for section, vector in zip(sections, vectors):
+            section['embedding'] = vector
+    
     def _should_merge_smartly(self, section1: Dict, section2: Dict, 
                              tokens1: int, tokens2: int,
                              target_avg: int, target_min: int, target_max: int,
@@ -282,6 +415,10 @@ class MarkdownSplitter:
     
     def _calculate_semantic_similarity(self, section1: Dict, section2: Dict) -> float:
         """计算两个段落的语义相似度"""
+        # 有段落向量时使用余弦相似度
+        if 'embedding' in section1 and 'embedding' in section2:
+            return self.embedding_scorer.similarity(section1['embedding'], section2['embedding'])
+        
         # 基于标题栈的相似度计算
         stack1 = section1['header_stack']
         stack2 = section2['header_stack']
@@ -330,19 +467,17 @@ class MarkdownSplitter:
     def _merge_sections_smartly(self, section1: Dict, section2: Dict) -> Dict:
         """智能合并两个段落"""
         # 合并内容
-        merged_content = section1['content'] + '\n\n' + section2['content']
+        merged = self._concat_sections(section1, section2, '\n\n')
         
         # 智能合并标题栈
-        merged_header_stack = self._merge_header_stacks(
+        merged['header_stack'] = self._merge_header_stacks(
             section1['header_stack'], section2['header_stack']
         )
-        
-        return {
-            'content': merged_content,
-            'header_stack': merged_header_stack,
-            'start_line': section1['start_line'],
-            'end_line': section2['end_line']
-        }
+        merged['start_line'] = section1['start_line']
+        merged['end_line'] = section2['end_line']
+        if 'units' in section1 and 'units' in section2:
+            merged['units'] = section1['units'] + section2['units']
+        return merged
     
     def _can_merge_sections(self, section1: Dict, section2: Dict) -> bool:
         """判断两个段落是否可以合并（改进版：更完善的层级兼容性检查）"""
@@ -433,13 +568,14 @@ class MarkdownSplitter:
         result = []
         
         for section in sections:
-            tokens = self.estimate_tokens(section['content'])
+            tokens = self._section_tokens(section)
             
             if tokens <= self.max_tokens:
                 result.append(section)
                 continue
             
             # 使用多级分割策略
+            self._section_content(section)
             split_chunks = self._split_section_multilevel(section)
             result.extend(split_chunks)
         
@@ -447,9 +583,6 @@ class MarkdownSplitter:
     
     def _split_section_multilevel(self, section: Dict) -> List[Dict]:
         """多级分割策略：段落→句子→词语"""
-        content = section['content']
-        tokens = self.estimate_tokens(content)
-        
         # 策略1：按段落分割
         paragraph_chunks = self._split_by_paragraphs(section)
         if len(paragraph_chunks) > 1:
@@ -467,35 +600,31 @@ class MarkdownSplitter:
     def _split_by_paragraphs(self, section: Dict) -> List[Dict]:
         """按段落分割，保持语义完整性"""
         content = section['content']
-        paragraphs = content.split('\n\n')
+        # 有结构块信息时使用段落单元，代码块和表格不会被拆开
+        paragraphs = section.get('units') or content.split('\n\n')
         
         if len(paragraphs) <= 1:
             return [section]  # 只有一个段落，无法分割
         
         chunks = []
-        current_chunk = ''
+        # 当前chunk的片段列表和累计Token数，避免反复拼接和重新估算整个chunk
+        current_parts: List[str] = []
+        current_tokens = 0
         chunk_counter = 0
         
-        # 提取标题行
-        lines = content.split('\n')
-        header_line = ''
-        for i, line in enumerate(lines):
-            if line.strip().startswith('#'):
-                header_line = line + '\n'
-                break
+        header_line = self._find_first_header_line(content)
         
         for paragraph in paragraphs:
             if not paragraph.strip():
                 continue
             
             paragraph_tokens = self.estimate_tokens(paragraph)
-            current_tokens = self.estimate_tokens(current_chunk)
             
             # 如果添加这个段落会超出限制，并且当前chunk不为空
-            if (current_tokens + paragraph_tokens > self.max_tokens and 
-                current_chunk.strip()):
+            if current_tokens + paragraph_tokens > self.max_tokens and current_parts:
                 
                 # 保存当前chunk
+                current_chunk = ''.join(current_parts)
                 chunk_content = header_line + current_chunk if chunk_counter == 0 else current_chunk
                 if chunk_content.strip():
                     chunks.append({
@@ -506,12 +635,16 @@ class MarkdownSplitter:
                     })
                 
                 # 开始新chunk
-                current_chunk = paragraph + '\n\n'
+                current_parts = [paragraph, '\n\n']
+                current_tokens = paragraph_tokens
                 chunk_counter += 1
             else:
-                current_chunk += paragraph + '\n\n'
+                current_parts.append(paragraph)
+                current_parts.append('\n\n')
+                current_tokens += paragraph_tokens
         
         # 添加最后一个chunk
+        current_chunk = ''.join(current_parts)
         if current_chunk.strip():
             chunk_content = header_line + current_chunk if chunk_counter == 0 else current_chunk
             chunks.append({
@@ -532,26 +665,22 @@ class MarkdownSplitter:
             return [section]  # 只有一个句子，无法分割
         
         chunks = []
-        current_chunk = ''
+        # 当前chunk的句子列表和累计Token数
+        current_parts: List[str] = []
+        current_tokens = 0
+        current_has_text = False
         chunk_counter = 0
         
-        # 提取标题行
-        lines = content.split('\n')
-        header_line = ''
-        for i, line in enumerate(lines):
-            if line.strip().startswith('#'):
-                header_line = line + '\n'
-                break
+        header_line = self._find_first_header_line(content)
         
         for sentence in sentences:
             sentence_tokens = self.estimate_tokens(sentence)
-            current_tokens = self.estimate_tokens(current_chunk)
             
             # 如果添加这个句子会超出限制，并且当前chunk不为空
-            if (current_tokens + sentence_tokens > self.max_tokens and 
-                current_chunk.strip()):
+            if current_tokens + sentence_tokens > self.max_tokens and current_has_text:
                 
                 # 保存当前chunk
+                current_chunk = ''.join(current_parts)
                 chunk_content = header_line + current_chunk if chunk_counter == 0 else current_chunk
                 if chunk_content.strip():
                     chunks.append({
@@ -562,12 +691,17 @@ class MarkdownSplitter:
                     })
                 
                 # 开始新chunk
-                current_chunk = sentence
+                current_parts = [sentence]
+                current_tokens = sentence_tokens
+                current_has_text = bool(sentence.strip())
                 chunk_counter += 1
             else:
-                current_chunk += sentence
+                current_parts.append(sentence)
+                current_tokens += sentence_tokens
+                current_has_text = current_has_text or bool(sentence.strip())
         
         # 添加最后一个chunk
+        current_chunk = ''.join(current_parts)
         if current_chunk.strip():
             chunk_content = header_line + current_chunk if chunk_counter == 0 else current_chunk
             chunks.append({
@@ -588,27 +722,23 @@ class MarkdownSplitter:
             return [section]
         
         chunks = []
-        current_chunk = ''
+        # 当前chunk的词语列表和累计Token数
+        current_words: List[str] = []
+        current_tokens = 0
         chunk_counter = 0
         word_count = 0
         
-        # 提取标题行
-        lines = content.split('\n')
-        header_line = ''
-        for i, line in enumerate(lines):
-            if line.strip().startswith('#'):
-                header_line = line + '\n'
-                break
+        header_line = self._find_first_header_line(content)
         
         for word in words:
             word_tokens = self.estimate_tokens(word + ' ')
-            current_tokens = self.estimate_tokens(current_chunk)
             
             # 如果添加这个词语会超出限制，并且当前chunk不为空
             if (current_tokens + word_tokens > self.max_tokens and 
-                current_chunk.strip() and word_count > 50):  # 确保每个chunk至少有50个词
+                current_words and word_count > 50):  # 确保每个chunk至少有50个词
                 
                 # 保存当前chunk
+                current_chunk = ''.join(word + ' ' for word in current_words)
                 chunk_content = header_line + current_chunk if chunk_counter == 0 else current_chunk
                 if chunk_content.strip():
                     chunks.append({
@@ -619,14 +749,17 @@ class MarkdownSplitter:
                     })
                 
                 # 开始新chunk
-                current_chunk = word + ' '
+                current_words = [word]
+                current_tokens = word_tokens
                 chunk_counter += 1
                 word_count = 1
             else:
-                current_chunk += word + ' '
+                current_words.append(word)
+                current_tokens += word_tokens
                 word_count += 1
         
         # 添加最后一个chunk
+        current_chunk = ''.join(word + ' ' for word in current_words)
         if current_chunk.strip():
             chunk_content = header_line + current_chunk if chunk_counter == 0 else current_chunk
             chunks.append({
@@ -639,39 +772,20 @@ class MarkdownSplitter:
         return chunks if len(chunks) > 1 else [section]
     
     def _split_into_sentences_improved(self, text: str) -> List[str]:
-        """改进的句子分割算法"""
-        # 先按双换行分割段落
-        paragraphs = text.split('\n\n')
-        sentences = []
-        
-        for paragraph in paragraphs:
-            if not paragraph.strip():
-                continue
-            
-            # 改进的句子分割正则表达式
-            # 考虑更多的句子结束标记和特殊情况
-            para_sentences = re.split(r'([。！？.!?]+\s*)', paragraph)
-            
-            current_sentence = ''
-            for i in range(0, len(para_sentences), 2):
-                if i < len(para_sentences):
-                    current_sentence += para_sentences[i]
-                    if i + 1 < len(para_sentences):
-                        current_sentence += para_sentences[i + 1]
-                    
-                    if current_sentence.strip():
-                        sentences.append(current_sentence + '\n')
-                        current_sentence = ''
-            
-            # 处理最后一个句子（如果没有标点符号）
-            if current_sentence.strip():
-                sentences.append(current_sentence + '\n')
-            
-            # 添加段落分隔
-            if sentences:
-                sentences.append('\n')
+        """
+        改进的句子分割算法，见 app.core.segmenter
         
-        return sentences
+        中文句末标点总是句子边界；英文句末标点只有后接空白时才是边界，
+        并排除常见缩写、小数、行内代码和链接地址中的标点。
+        """
+        return split_markdown_sentences(text)
+    
+    def _find_first_header_line(self, content: str) -> str:
+        """找到内容中的第一个标题行（含换行符），没有时返回空字符串"""
+        for line in content.split('\n'):
+            if line.strip().startswith('#'):
+                return line + '\n'
+        return ''
     
     def _find_last_header(self, lines: List[str]) -> Optional[str]:
         """在行列表中找到最后一个标题行"""
@@ -705,12 +819,14 @@ class MarkdownSplitter:
                     return header_text
         return "未分类内容"
     
-    def create_chunks(self, content: str) -> List[MarkdownChunk]:
+    def create_chunks(self, content: str, blocks: Optional[List[Dict[str, Any]]] = None) -> List[MarkdownChunk]:
         """
         创建分段（优化版）
         
         Args:
             content: Markdown内容
+            blocks: 可选，转换时生成的结构块（见 app.core.markdown_blocks），
+                提供时直接使用块边界识别标题、代码块和表格，不再逐行扫描
             
         Returns:
             List[MarkdownChunk]: 分段列表
@@ -718,12 +834,20 @@ class MarkdownSplitter:
         if not content.strip():
             return []
         
+        lines = content.split('\n') if blocks else None
+        
         # 1. 分析文档结构
-        structure_info = self._analyze_document_structure(content)
+        if blocks:
+            structure_info = self._analyze_block_structure(lines, blocks)
+        else:
+            structure_info = self._analyze_document_structure(content)
         adaptive_params = self._get_adaptive_parameters(structure_info)
         
         # 2. 基于标题分割
-        sections = self._split_by_headers(content)
+        if blocks:
+            sections = self._split_by_header_blocks(lines, blocks)
+        else:
+            sections = self._split_by_headers(content)
         
         # 3. 智能合并过小段落
         sections = self._smart_merge_sections(sections, adaptive_params)
@@ -738,27 +862,14 @@ class MarkdownSplitter:
         sections = self._final_cleanup(sections)
         
         # 7. 构建MarkdownChunk对象
-        chunks = []
-        for i, section in enumerate(sections):
-            # 从内容中提取实际的标题
-            actual_title = self._get_section_title_from_content(section['content'])
-            
-            chunk = MarkdownChunk(
-                content=section['content'].strip(),
-                title=actual_title,
-                order=i + 1,
-                estimated_tokens=self.estimate_tokens(section['content']),
-                start_line=section['start_line'],
-                end_line=section['end_line'],
-                metadata={
-                    'header_path': self._build_header_path(section['header_stack']),
-                    'header_stack': section['header_stack'],
-                    'split_method': 'intelligent_adaptive',
-                    'structure_type': structure_info['structure_type'],
-                    'adaptive_params': adaptive_params
-                }
-            )
-            chunks.append(chunk)
+        chunks = [
+            self._build_chunk(section, i + 1, {
+                'split_method': 'intelligent_adaptive',
+                'structure_type': structure_info['structure_type'],
+                'adaptive_params': adaptive_params
+            })
+            for i, section in enumerate(sections)
+        ]
         
         # 8. Token分布监控和优化
         distribution_info = self._check_token_distribution(chunks)
@@ -766,8 +877,166 @@ class MarkdownSplitter:
             # 如果分布质量不佳，尝试重新优化
             chunks = self._optimize_token_distribution(chunks, adaptive_params)
         
+        # 9. 记录与前一个分段的重叠区域
+        return self.add_overlap(chunks)
+    
+    def _build_chunk(self, section: Dict, order: int, metadata: Dict[str, Any]) -> MarkdownChunk:
+        """由段落构建MarkdownChunk，metadata为附加的元数据"""
+        # 合并过程中只累加了片段，这里一次性拼接出最终内容
+        content = self._section_content(section)
+        
+        return MarkdownChunk(
+            content=content.strip(),
+            # 从内容中提取实际的标题
+            title=self._get_section_title_from_content(content),
+            order=order,
+            estimated_tokens=self.estimate_tokens(content),
+            start_line=section['start_line'],
+            end_line=section['end_line'],
+            metadata={
+                'header_path': self._build_header_path(section['header_stack']),
+                'header_stack': section['header_stack'],
+                **metadata
+            }
+        )
+    
+    def iter_chunks(self, lines: Iterable[str]) -> Iterator[MarkdownChunk]:
+        """
+        流式分段，逐行读取文档并在分段边界确定后立即产出分段
+        
+        与 create_chunks 相比不做全文结构分析，直接使用 max_tokens/min_tokens；
+        过小的段落只与相邻段落合并，最多缓存两个段落，内存占用与文档长度无关。
+        
+        Args:
+            lines: 文档的行，可以直接传入打开的文件对象
+            
+        Returns:
+            Iterator[MarkdownChunk]: 按顺序产出的分段
+        """
+        previous = None
+        for chunk in self._iter_stream_chunks(lines):
+            if previous is not None:
+                self._set_overlap(previous, chunk)
+            yield chunk
+            previous = chunk
+    
+    def _iter_stream_chunks(self, lines: Iterable[str]) -> Iterator[MarkdownChunk]:
+        """流式分段的实现，不含重叠区域"""
+        metadata = {'split_method': 'streaming'}
+        order = 0
+        # ready: 边界已确定、暂缓输出的段落，用于吸收文末的过小段落
+        # pending: 仍可能与后续段落合并的段落
+        ready: Optional[Dict] = None
+        pending: Optional[Dict] = None
+        
+        # 超长段落按字符数截断，英文约4个字符一个Token，留出余量
+        sections = self._iter_header_sections(lines, max_section_chars=self.max_tokens * 8)
+        for section in sections:
+            for piece in self._split_large_sections([section]):
+                if pending is None:
+                    pending = piece
+                elif self._can_stream_merge(pending, piece):
+                    self._stream_merge(pending, piece)
+                else:
+                    if ready is not None:
+                        order += 1
+                        yield self._build_chunk(ready, order, metadata)
+                    ready, pending = pending, piece
+        
+        # 最终清理：文末过小的段落强制合并到前一个段落
+        if ready is not None and pending is not None and self._section_tokens(pending) < self.min_tokens:
+            self._stream_merge(ready, pending)
+            pending = None
+        
+        for section in (ready, pending):
+            if section is not None:
+                order += 1
+                yield self._build_chunk(section, order, metadata)
+    
+    def add_overlap(self, chunks: List[MarkdownChunk]) -> List[MarkdownChunk]:
+        """
+        为每个分段记录与前一个分段的重叠区域（滑动窗口）
+        
+        重叠内容不复制到分段中，只在 metadata['overlap'] 中记录前一个分段的序号和字符区间：
+        {'order': 前一个分段序号, 'start': 起始偏移, 'end': 结束偏移, 'tokens': 重叠Token数}，
+        需要时通过 get_overlap_text 取出。
+        
+        Args:
+            chunks: 按顺序排列的分段
+            
+        Returns:
+            List[MarkdownChunk]: 原分段列表
+        """
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self._set_overlap(previous, chunk)
         return chunks
     
+    def _set_overlap(self, previous: MarkdownChunk, chunk: MarkdownChunk):
+        """记录chunk与previous末尾的重叠区间"""
+        if not self.overlap_tokens and not self.overlap_sentences:
+            return
+        start = self.find_overlap_start(previous.content, self.overlap_tokens, self.overlap_sentences)
+        if start >= len(previous.content):
+            return
+        chunk.metadata['overlap'] = {
+            'order': previous.order,
+            'start': start,
+            'end': len(previous.content),
+            'tokens': self.estimate_tokens(previous.content[start:])
+        }
+    
+    def find_overlap_start(self, text: str, overlap_tokens: int = 0, overlap_sentences: int = 0) -> int:
+        """
+        计算文本末尾重叠区域的起始偏移，重叠区域从句子边界开始
+        
+        Args:
+            text: 前一个分段的内容
+            overlap_tokens: 至少包含的Token数
+            overlap_sentences: 至少包含的句子数
+            
+        Returns:
+            int: 起始偏移，等于len(text)时表示没有重叠
+        """
+        # 句子起始位置，最后一个边界之后为空时不计入
+        starts = [0] + [match.end() for match in OVERLAP_BOUNDARY_PATTERN.finditer(text) if match.end() < len(text)]
+        
+        start = len(text)
+        sentences = 0
+        tokens = 0
+        for sentence_start in reversed(starts):
+            if sentences >= overlap_sentences and tokens >= overlap_tokens:
+                break
+            tokens += self.estimate_tokens(text[sentence_start:start])
+            sentences += 1
+            start = sentence_start
+        return start
+    
+    @staticmethod
+    def get_overlap_text(chunks: List[MarkdownChunk], chunk: MarkdownChunk) -> str:
+        """取出分段的重叠内容（前一个分段末尾的片段），没有重叠时返回空字符串"""
+        overlap = chunk.metadata.get('overlap')
+        if not overlap:
+            return ''
+        for previous in chunks:
+            if previous.order == overlap['order']:
+                return previous.content[overlap['start']:overlap['end']]
+        return ''
+    
+    def _can_stream_merge(self, section1: Dict, section2: Dict) -> bool:
+        """流式分段时两个相邻段落是否合并：其中一个过小且合并后不超限"""
+        tokens1 = self._section_tokens(section1)
+        tokens2 = self._section_tokens(section2)
+        if tokens1 + tokens2 > self.max_tokens:
+            return False
+        return tokens1 < self.min_tokens or tokens2 < self.min_tokens
+    
+    def _stream_merge(self, target: Dict, other: Dict):
+        """将other合并到target"""
+        self._append_section(target, other, '\n\n')
+        target['end_line'] = other['end_line']
+        self._extend_units(target, other)
+        target['header_stack'] = self._merge_header_stacks(target['header_stack'], other['header_stack'])
+    
     def _optimize_token_distribution(self, chunks: List[MarkdownChunk], 
                                    adaptive_params: Dict[str, int]) -> List[MarkdownChunk]:
         """优化Token分布"""
@@ -836,7 +1105,7 @@ class MarkdownSplitter:
         for iteration in range(max_iterations):
             # 检查是否还有过小的段落
             has_small_sections = any(
-                self.estimate_tokens(section['content']) < self.min_tokens 
+                self._section_tokens(section) < self.min_tokens 
                 for section in result
             )
             
@@ -858,7 +1127,7 @@ class MarkdownSplitter:
         
         while i < len(sections):
             current = sections[i]
-            current_tokens = self.estimate_tokens(current['content'])
+            current_tokens = self._section_tokens(current)
             
             # 如果当前段落过小，尝试合并
             if current_tokens < self.min_tokens:
@@ -866,11 +1135,12 @@ class MarkdownSplitter:
                 
                 # 策略1：向前合并（与前一个段落合并）
                 if merged and not merged_successfully:
-                    last_tokens = self.estimate_tokens(merged[-1]['content'])
+                    last_tokens = self._section_tokens(merged[-1])
                     if last_tokens + current_tokens <= self.max_tokens:
                         # 执行向前合并
-                        merged[-1]['content'] += '\n\n' + current['content']
+                        self._append_section(merged[-1], current, '\n\n')
                         merged[-1]['end_line'] = current['end_line']
+                        self._extend_units(merged[-1], current)
                         # 智能合并标题栈
                         merged[-1]['header_stack'] = self._merge_header_stacks(
                             merged[-1]['header_stack'], current['header_stack']
@@ -880,18 +1150,17 @@ class MarkdownSplitter:
                 # 策略2：向后合并（与后一个段落合并）
                 if not merged_successfully and i + 1 < len(sections):
                     next_section = sections[i + 1]
-                    next_tokens = self.estimate_tokens(next_section['content'])
+                    next_tokens = self._section_tokens(next_section)
                     if current_tokens + next_tokens <= self.max_tokens:
                         # 执行向后合并
-                        merged_content = current['content'] + '\n\n' + next_section['content']
-                        merged_section = {
-                            'content': merged_content,
-                            'header_stack': self._merge_header_stacks(
-                                current['header_stack'], next_section['header_stack']
-                            ),
-                            'start_line': current['start_line'],
-                            'end_line': next_section['end_line']
-                        }
+                        merged_section = self._concat_sections(current, next_section, '\n\n')
+                        merged_section['header_stack'] = self._merge_header_stacks(
+                            current['header_stack'], next_section['header_stack']
+                        )
+                        merged_section['start_line'] = current['start_line']
+                        merged_section['end_line'] = next_section['end_line']
+                        if 'units' in current and 'units' in next_section:
+                            merged_section['units'] = current['units'] + next_section['units']
                         merged.append(merged_section)
                         i += 2  # 跳过下一个段落
                         merged_successfully = True
@@ -901,23 +1170,23 @@ class MarkdownSplitter:
                     # 更激进的合并策略
                     if merged:
                         # 强制与前一个合并，即使会稍微超限
-                        last_tokens = self.estimate_tokens(merged[-1]['content'])
+                        last_tokens = self._section_tokens(merged[-1])
                         if last_tokens + current_tokens <= self.max_tokens * 1.2:  # 允许超限20%
-                            merged[-1]['content'] += '\n\n' + current['content']
+                            self._append_section(merged[-1], current, '\n\n')
                             merged[-1]['end_line'] = current['end_line']
+                            self._extend_units(merged[-1], current)
                             merged_successfully = True
                     elif i + 1 < len(sections):
                         # 强制与后一个合并
                         next_section = sections[i + 1]
-                        merged_content = current['content'] + '\n\n' + next_section['content']
-                        merged_section = {
-                            'content': merged_content,
-                            'header_stack': self._merge_header_stacks(
-                                current['header_stack'], next_section['header_stack']
-                            ),
-                            'start_line': current['start_line'],
-                            'end_line': next_section['end_line']
-                        }
+                        merged_section = self._concat_sections(current, next_section, '\n\n')
+                        merged_section['header_stack'] = self._merge_header_stacks(
+                            current['header_stack'], next_section['header_stack']
+                        )
+                        merged_section['start_line'] = current['start_line']
+                        merged_section['end_line'] = next_section['end_line']
+                        if 'units' in current and 'units' in next_section:
+                            merged_section['units'] = current['units'] + next_section['units']
                         merged.append(merged_section)
                         i += 2
                         merged_successfully = True
@@ -941,14 +1210,15 @@ class MarkdownSplitter:
         result = []
         
         for section in sections:
-            tokens = self.estimate_tokens(section['content'])
+            tokens = self._section_tokens(section)
             
             if tokens < self.min_tokens:
                 # 过小段落的最终处理策略
                 if result:
                     # 强制合并到前一个段落，不管是否超限
-                    result[-1]['content'] += '\n\n' + section['content']
+                    self._append_section(result[-1], section, '\n\n')
                     result[-1]['end_line'] = section['end_line']
+                    self._extend_units(result[-1], section)
                 else:
                     # 如果是第一个段落且过小，保留它（总比丢失内容好）
                     result.append(section)
@@ -1131,6 +1401,31 @@ class MarkdownSplitter:
             'structure_type': self._classify_structure(header_count, header_density, max_header_level)
         }
     
+    def _analyze_block_structure(self, lines: List[str], blocks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """根据结构块统计文档结构特征，字段与 _analyze_document_structure 一致"""
+        header_levels = [block['level'] for block in blocks if block['type'] == 'heading']
+        header_count = len(header_levels)
+        code_blocks = sum(1 for block in blocks if block['type'] == 'code')
+        tables = sum(block['end_line'] - block['start_line'] + 1 for block in blocks if block['type'] == 'table')
+        non_empty_lines = sum(1 for line in lines if line.strip())
+        content_lines = max(0, non_empty_lines - header_count - tables - code_blocks * 2)
+        
+        avg_header_level = sum(header_levels) / len(header_levels) if header_levels else 0
+        max_header_level = max(header_levels) if header_levels else 0
+        header_density = header_count / len(lines) if lines else 0
+        
+        return {
+            'total_lines': len(lines),
+            'header_count': header_count,
+            'content_lines': content_lines,
+            'code_blocks': code_blocks,
+            'tables': tables,
+            'avg_header_level': avg_header_level,
+            'max_header_level': max_header_level,
+            'header_density': header_density,
+            'structure_type': self._classify_structure(header_count, header_density, max_header_level)
+        }
+    
     def _classify_structure(self, header_count: int, header_density: float, max_level: int) -> str:
         """分类文档结构类型"""
         if header_count == 0:
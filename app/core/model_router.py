@@ -0,0 +1,283 @@
+import time
+import random
+import asyncio
+import logging
+from typing import List, Dict, Any, Optional, Callable, Awaitable, TypeVar
+
+import openai
+from openai import AsyncOpenAI
+
+from app.core.config import settings
+from app.core.rate_limiter import (
+    RateLimiter, AdaptiveConcurrency, get_rate_limiter, get_adaptive_concurrency, retry_after_seconds, backoff_delay
+)
+
+T = TypeVar("T")
+
+# 熔断器状态
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+# 可以重试的HTTP状态码：超时、冲突、限流和服务端错误
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """连接失败、超时、限流和服务端错误可以重试，请求本身有误（如400、422）时重试没有意义"""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+    return isinstance(error, openai.APIError)
+
+
+def _error_headers(error: BaseException):
+    return getattr(getattr(error, "response", None), "headers", None)
+
+
+class CircuitBreaker:
+    """
+    连续失败达到阈值后熔断，冷却时间内不再向该后端发送请求；
+    冷却结束后放行一个试探请求，成功则恢复，失败则重新熔断
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_seconds: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        """当前是否可以向该后端发送请求"""
+        if self.state == CIRCUIT_CLOSED:
+            return True
+        if self.state == CIRCUIT_OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = CIRCUIT_HALF_OPEN
+        return self.state == CIRCUIT_HALF_OPEN and not self._probing
+
+    def begin(self):
+        """开始一个请求，半开状态下只允许一个试探请求"""
+        if self.state == CIRCUIT_HALF_OPEN:
+            self._probing = True
+
+    def release(self):
+        """请求因与后端无关的原因结束，不计入成功或失败"""
+        self._probing = False
+
+    def record_success(self):
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == CIRCUIT_HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = CIRCUIT_OPEN
+            self.opened_at = time.monotonic()
+
+
+class ModelBackend:
+    """
+    一个模型配置对应的后端：客户端、限流器、自适应并发、熔断器和运行统计
+
+    客户端不做内部重试，每个响应的限流响应头用于调整限流器，重试和退避由 ModelRouter 负责。
+    并发数从模型配置的 concurrency 开始，请求顺利时逐步增加到 maxConcurrency，被限流时减半。
+    限流器和自适应并发按接口地址加模型名共享，同一模型的多个任务共用额度和并发名额。
+    """
+
+    # 延迟和错误率的指数滑动平均系数
+    EWMA_ALPHA = 0.3
+
+    def __init__(self, config: Dict[str, Any], client: Optional[AsyncOpenAI] = None):
+        self.config = config
+        self.name = config.get("name") or config.get("model", "")
+        self.model = config.get("model", "deepseek-chat")
+        self.base_url = config.get("apiEndpoint", "https://api.deepseek.com")
+        self.client = client or AsyncOpenAI(
+            api_key=config.get("apiKey") or settings.DEEPSEEK_API_KEY,
+            base_url=self.base_url,
+            max_retries=0,
+            http_client=self._create_http_client()
+        )
+        key = f"{self.base_url}|{self.model}"
+        self.limiter: RateLimiter = get_rate_limiter(
+            key,
+            rpm=config.get("rpm", settings.DATASET_DEFAULT_RPM),
+            tpm=config.get("tpm", settings.DATASET_DEFAULT_TPM)
+        )
+        concurrency = max(1, int(config.get("concurrency", settings.DATASET_CONCURRENCY)))
+        self.slots: AdaptiveConcurrency = get_adaptive_concurrency(
+            key, concurrency, max(concurrency, int(config.get("maxConcurrency", settings.DATASET_MAX_CONCURRENCY)))
+        )
+        self.breaker = CircuitBreaker(settings.DATASET_CIRCUIT_FAILURES, settings.DATASET_CIRCUIT_RESET_SECONDS)
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.active = 0
+
+    def _create_http_client(self):
+        """创建带响应钩子的HTTP客户端，旧版本openai没有 DefaultAsyncHttpxClient 时使用默认客户端"""
+        http_client_class = getattr(openai, "DefaultAsyncHttpxClient", None)
+        if http_client_class is None:
+            return None
+        return http_client_class(event_hooks={"response": [self._on_response]})
+
+    async def _on_response(self, response):
+        self.observe_headers(response.headers)
+
+    def observe_headers(self, headers):
+        """根据响应头调整限流器，额度用完时暂停发送到重置时间"""
+        pause = self.limiter.update_from_headers(headers)
+        if pause > 0:
+            self.slots.pause(pause)
+
+    def throttle(self, retry_after: Optional[float]):
+        """被限流（429）：并发减半并按 retry-after 暂停，不计入熔断"""
+        self.slots.on_throttle(retry_after)
+        self.breaker.release()
+
+    def weight(self, default_latency: float = 1.0) -> float:
+        """
+        路由权重：延迟越低、错误率越低、剩余额度越多、排队请求越少权重越高
+
+        Args:
+            default_latency: 还没有延迟统计时使用的延迟（秒）
+        """
+        latency = self.latency if self.latency is not None else default_latency
+        load = self.slots.limit / (self.slots.limit + self.active)
+        return (1.0 / max(latency, 0.05)) * (1.0 - self.error_rate) * self.limiter.available_fraction() * load
+
+    def record(self, success: bool, latency: float):
+        alpha = self.EWMA_ALPHA
+        self.error_rate = (1 - alpha) * self.error_rate + alpha * (0.0 if success else 1.0)
+        if success:
+            self.latency = latency if self.latency is None else (1 - alpha) * self.latency + alpha * latency
+            self.breaker.record_success()
+            self.slots.on_success()
+        else:
+            self.breaker.record_failure()
+
+
+class ModelRouter:
+    """
+    在多个模型后端之间分配请求
+
+    每次请求按权重随机选择一个可用后端（熔断中的后端不参与），可重试的错误（见 is_retryable）
+    优先换一个没有尝试过的后端立即重试；所有后端都尝试过后按指数退避加随机抖动等待后重试，
+    服务端返回 retry-after 时至少等待该时间。最多尝试 max_attempts 次。
+    """
+
+    def __init__(self, backends: List[ModelBackend], max_attempts: int = 3):
+        if not backends:
+            raise ValueError("没有可用的模型配置")
+        self.backends = backends
+        self.max_attempts = max(1, max_attempts)
+
+    @property
+    def primary(self) -> ModelBackend:
+        """第一个后端（默认模型），批量模式等只使用单个后端的场景使用"""
+        return self.backends[0]
+
+    @property
+    def concurrency(self) -> int:
+        """所有后端的最大并发数之和"""
+        return sum(backend.slots.maximum for backend in self.backends)
+
+    def choose(self, exclude: Optional[List[ModelBackend]] = None) -> Optional[ModelBackend]:
+        """按权重选择一个可用的后端，没有可用后端时返回None"""
+        candidates = [backend for backend in self.backends
+                      if backend not in (exclude or []) and backend.breaker.allow()]
+        if not candidates:
+            return None
+        # 未统计延迟的后端使用已知后端的平均延迟，避免新后端权重过高或过低
+        known = [backend.latency for backend in self.backends if backend.latency is not None]
+        default_latency = sum(known) / len(known) if known else 1.0
+        weights = [max(backend.weight(default_latency), 1e-6) for backend in candidates]
+        return random.choices(candidates, weights=weights)[0]
+
+    async def call(self, request: Callable[[ModelBackend], Awaitable[T]]) -> T:
+        """
+        选择后端执行请求，后端故障时换一个后端重试
+
+        Args:
+            request: 接收后端、发起请求的协程函数
+
+        Returns:
+            请求的返回值；所有尝试都失败时抛出最后一个异常
+        """
+        tried: List[ModelBackend] = []
+        last_error: Optional[BaseException] = None
+        retry_after: Optional[float] = None
+        retries = 0
+        for _ in range(self.max_attempts):
+            backend = self.choose(exclude=tried) or self.choose()
+            if backend is None:
+                break
+            if backend in tried:
+                # 所有可用的后端都已尝试过，退避后重试
+                await asyncio.sleep(backoff_delay(
+                    retries, settings.DATASET_RETRY_BASE_DELAY, settings.DATASET_RETRY_MAX_DELAY, retry_after
+                ))
+                retries += 1
+            tried.append(backend)
+            backend.breaker.begin()
+            # 排队中的请求也计入负载，后续请求优先分配给空闲的后端
+            backend.active += 1
+            started = time.monotonic()
+            try:
+                await backend.slots.acquire()
+                try:
+                    started = time.monotonic()
+                    result = await request(backend)
+                    # 释放名额之前记录成功，自适应并发据此判断并发是否已用满
+                    backend.record(True, time.monotonic() - started)
+                finally:
+                    backend.slots.release()
+            except BaseException as e:
+                if not isinstance(e, Exception) or not is_retryable(e):
+                    # 与后端状态无关的错误（如读取文件失败、请求参数有误）不影响熔断器
+                    backend.breaker.release()
+                    raise
+                last_error = e
+                retry_after = retry_after_seconds(_error_headers(e))
+                if getattr(e, "status_code", None) == 429:
+                    backend.throttle(retry_after)
+                else:
+                    backend.record(False, time.monotonic() - started)
+                logging.error(f"模型 {backend.name} 请求失败: {str(e)}，准备重试")
+                continue
+            finally:
+                backend.active -= 1
+            return result
+
+        if last_error is not None:
+            raise last_error
+        raise RuntimeError("所有模型都处于熔断状态")
+
+    async def close(self):
+        for backend in self.backends:
+            await backend.client.close()
+
+
+def create_model_router(default_model: Dict[str, Any], models_list: List[Dict[str, Any]]) -> ModelRouter:
+    """
+    创建模型路由：默认模型在前，models_list中设置了 "routing": true 且配置了API密钥的其他模型参与分配
+
+    Args:
+        default_model: 默认模型配置
+        models_list: models.json中的模型配置列表
+
+    Returns:
+        ModelRouter: 模型路由
+    """
+    configs = [default_model]
+    for model in models_list:
+        if model.get("isDefault", False) or not model.get("routing", False) or not model.get("apiKey"):
+            continue
+        if model.get("id") is not None and model.get("id") == default_model.get("id"):
+            continue
+        configs.append(model)
+    return ModelRouter([ModelBackend(config) for config in configs], max_attempts=settings.DATASET_ROUTER_MAX_ATTEMPTS)
@@ -0,0 +1,242 @@
+import math
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.core.config import settings
+from app.core.token_counter import TokenCounter
+from app.core.embedding_scorer import get_embedding_scorer
+from app.core.markdown_blocks import extract_blocks, BLOCK_HEADING
+from app.core.markdown_splitter import MarkdownSplitter, MarkdownChunk
+from app.core.segmenter import split_sentences
+
+
+class OptimalMarkdownSplitter(MarkdownSplitter):
+    """
+    基于动态规划的Markdown分段器
+
+    以结构块（见 app.core.markdown_blocks）为最小单元，一次性计算每个候选边界的代价：
+    - 边界代价：在高级别标题前切分代价最低，段落之间次之，标题之后（标题与正文分离）代价最高；
+      代码块、表格等结构块不会被拆开，只有超过 max_tokens 的单个块才按行/句子拆分
+    - 分段代价：分段Token数偏离目标值的平方，低于 min_tokens 时额外惩罚
+
+    然后求总代价最小的切分方案。每个位置只需向前考虑 max_tokens 以内的单元，复杂度为 O(n·k)，
+    取代默认分段器的多轮贪心合并。
+    """
+
+    HEADING_BOUNDARY_COSTS = {1: 0.0, 2: 0.05, 3: 0.1, 4: 0.2, 5: 0.25, 6: 0.25}
+    BLOCK_BOUNDARY_COST = 0.3  # 普通结构块之间切分
+    SPLIT_BLOCK_BOUNDARY_COST = 1.0  # 在超长结构块内部切分
+    ORPHAN_HEADING_COST = 5.0  # 标题之后立即切分
+    SMALL_CHUNK_PENALTY = 4.0  # 分段低于 min_tokens 的惩罚系数
+
+    def __init__(self, max_tokens: int = 8000, min_tokens: int = 1000, header_path_separator: str = "/",
+                 token_counter: Optional[TokenCounter] = None, target_tokens: Optional[int] = None,
+                 overlap_tokens: int = 0, overlap_sentences: int = 0):
+        """
+        初始化分段器
+
+        Args:
+            max_tokens: 最大Token数限制
+            min_tokens: 最小Token数限制
+            header_path_separator: 标题路径分隔符
+            token_counter: Token计数器
+            target_tokens: 分段的目标Token数，默认按文档总长度平均分配
+            overlap_tokens: 与前一个分段重叠的Token数
+            overlap_sentences: 与前一个分段重叠的句子数
+        """
+        super().__init__(max_tokens, min_tokens, header_path_separator, token_counter,
+                         overlap_tokens=overlap_tokens, overlap_sentences=overlap_sentences)
+        self.target_tokens = target_tokens
+
+    def create_chunks(self, content: str, blocks: Optional[List[Dict[str, Any]]] = None) -> List[MarkdownChunk]:
+        """
+        创建分段
+
+        Args:
+            content: Markdown内容
+            blocks: 可选，转换时生成的结构块，未提供时从内容中提取
+
+        Returns:
+            List[MarkdownChunk]: 分段列表
+        """
+        if not content.strip():
+            return []
+
+        lines = content.split('\n')
+        if blocks is None:
+            blocks = extract_blocks(lines, self.estimate_tokens)
+
+        units = self._build_units(lines, blocks)
+        if not units:
+            return []
+
+        boundaries = self._solve_boundaries(units)
+        return self.add_overlap([
+            self._build_chunk(self._units_to_section(units[start:end]), order, {'split_method': 'optimal'})
+            for order, (start, end) in enumerate(zip(boundaries, boundaries[1:]), start=1)
+        ])
+
+    def _build_units(self, lines: List[str], blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """将结构块转换为分段单元，超长的块拆分为多个单元"""
+        units = []
+        header_stack: List[Tuple[int, str]] = []
+
+        for block in blocks:
+            if block['type'] == BLOCK_HEADING:
+                while header_stack and header_stack[-1][0] >= block['level']:
+                    header_stack.pop()
+                header_stack.append((block['level'], block['text']))
+
+            text = '\n'.join(lines[block['start_line']:block['end_line'] + 1])
+            unit = {
+                'text': text,
+                'tokens': block['tokens'],
+                'type': block['type'],
+                'level': block.get('level', 0),
+                'start_line': block['start_line'],
+                'end_line': block['end_line'],
+                'header_stack': header_stack.copy(),
+                'continued': False
+            }
+
+            if block['tokens'] <= self.max_tokens:
+                units.append(unit)
+                continue
+
+            for index, piece in enumerate(self._split_oversized_text(text)):
+                units.append(dict(unit, text=piece, tokens=self.estimate_tokens(piece), continued=index > 0))
+
+        return units
+
+    def _split_oversized_text(self, text: str) -> List[str]:
+        """按行拆分超长块，单行仍然超长时按句子、再按词拆分"""
+        items = []
+        for line in text.split('\n'):
+            if self.estimate_tokens(line) <= self.max_tokens:
+                items.append((line, '\n'))
+                continue
+            for sentence in split_sentences(line):
+                sentence = sentence.rstrip()
+                if self.estimate_tokens(sentence) <= self.max_tokens:
+                    items.append((sentence, ' '))
+                else:
+                    items.extend((word, ' ') for word in sentence.split())
+
+        pieces = []
+        parts: List[str] = []
+        tokens = 0
+        for item, joiner in items:
+            # 估算值按条取整，拼接后的Token数可能略大，每条预留1个Token
+            item_tokens = self.estimate_tokens(item) + 1
+            if parts and tokens + item_tokens > self.max_tokens:
+                pieces.append(''.join(parts).rstrip())
+                parts, tokens = [], 0
+            parts.append(item + joiner)
+            tokens += item_tokens
+        if parts:
+            pieces.append(''.join(parts).rstrip())
+        return [piece for piece in pieces if piece.strip()]
+
+    def _boundary_cost(self, units: List[Dict[str, Any]], index: int) -> float:
+        """在第index个单元之前切分的代价"""
+        if index == 0:
+            return 0.0
+        if units[index - 1]['type'] == BLOCK_HEADING:
+            return self.ORPHAN_HEADING_COST
+        unit = units[index]
+        if unit['continued']:
+            return self.SPLIT_BLOCK_BOUNDARY_COST
+        if unit['type'] == BLOCK_HEADING:
+            return self.HEADING_BOUNDARY_COSTS.get(unit['level'], self.BLOCK_BOUNDARY_COST)
+        return self.BLOCK_BOUNDARY_COST
+
+    def _segment_cost(self, tokens: int, target: float) -> float:
+        """单个分段的代价：偏离目标Token数的平方，过小分段额外惩罚"""
+        deviation = (tokens - target) / target
+        cost = deviation * deviation
+        if tokens < self.min_tokens:
+            cost += self.SMALL_CHUNK_PENALTY * (self.min_tokens - tokens) / max(self.min_tokens, 1)
+        return cost
+
+    def _solve_boundaries(self, units: List[Dict[str, Any]]) -> List[int]:
+        """
+        动态规划求最小代价的切分
+
+        best[j] 为前j个单元的最小代价，分段 units[i:j] 的Token数不超过 max_tokens，
+        因此每个j只需向前扫描到累计Token数超限为止。
+
+        Returns:
+            List[int]: 切分位置，首尾分别为0和len(units)
+        """
+        count = len(units)
+        prefix = [0]
+        for unit in units:
+            prefix.append(prefix[-1] + unit['tokens'])
+
+        target = self.target_tokens
+        if not target:
+            # 按文档总长度平均分配，得到大小均衡的分段
+            chunk_count = max(1, math.ceil(prefix[-1] / (self.max_tokens * 0.9)))
+            target = max(prefix[-1] / chunk_count, 1)
+
+        boundary_costs = [self._boundary_cost(units, i) for i in range(count)]
+        best = [0.0] + [math.inf] * count
+        previous = [0] * (count + 1)
+
+        for end in range(1, count + 1):
+            start = end - 1
+            while start >= 0:
+                tokens = prefix[end] - prefix[start]
+                # 单个单元总是允许成段，其余分段不能超过上限
+                if tokens > self.max_tokens and start < end - 1:
+                    break
+                cost = best[start] + boundary_costs[start] + self._segment_cost(tokens, target)
+                if cost < best[end]:
+                    best[end] = cost
+                    previous[end] = start
+                start -= 1
+
+        boundaries = [count]
+        while boundaries[-1] > 0:
+            boundaries.append(previous[boundaries[-1]])
+        return boundaries[::-1]
+
+    def _units_to_section(self, units: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """将连续的单元拼接为段落，相邻的块保持原有的空行关系"""
+        parts = [units[0]['text']]
+        for prev, unit in zip(units, units[1:]):
+            adjacent = unit['continued'] or unit['start_line'] == prev['end_line'] + 1
+            parts.append('\n' if adjacent else '\n\n')
+            parts.append(unit['text'])
+        return {
+            'content': ''.join(parts),
+            'header_stack': units[0]['header_stack'],
+            'start_line': units[0]['start_line'],
+            'end_line': units[-1]['end_line']
+        }
+
+
+def create_splitter(max_tokens: int = 8000, min_tokens: int = 1000, engine: Optional[str] = None,
+                    token_counter: Optional[TokenCounter] = None) -> MarkdownSplitter:
+    """
+    根据配置创建分段器
+
+    Args:
+        max_tokens: 最大Token数限制
+        min_tokens: 最小Token数限制
+        engine: "heuristic"（多轮启发式合并）或 "optimal"（动态规划），默认使用 settings.SPLIT_ENGINE
+        token_counter: Token计数器
+
+    Returns:
+        MarkdownSplitter: 分段器
+    """
+    engine = (engine or settings.SPLIT_ENGINE).lower()
+    overlap = {
+        'overlap_tokens': settings.CHUNK_OVERLAP_TOKENS,
+        'overlap_sentences': settings.CHUNK_OVERLAP_SENTENCES
+    }
+    if engine == "optimal":
+        return OptimalMarkdownSplitter(max_tokens=max_tokens, min_tokens=min_tokens, token_counter=token_counter, **overlap)
+    if engine != "heuristic":
+        print(f"未知的分段引擎: {engine}，使用启发式分段")
+    return MarkdownSplitter(max_tokens=max_tokens, min_tokens=min_tokens, token_counter=token_counter,
+                            embedding_scorer=get_embedding_scorer(), **overlap)
@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import logging
+from typing import List, Dict, Any, Optional
+
+JOURNAL_SUFFIX = ".journal"
+
+
+class QAJournal:
+    """
+    数据集生成的追加式日志
+
+    每个文件生成的问答对先写一行 {"file", "pairs"}，再写一行 {"file", "done": true} 作为完成标记，
+    只有带完成标记的文件在恢复时被视为已完成。写入按条数或时间间隔批量fsync，
+    进程崩溃时最多丢失最近一批尚未落盘的文件，这些文件在恢复时重新生成。
+    写入数据集之前先记录数据集当前的大小（begin_commit），写入后再写入提交标记并删除日志；
+    带提交标记的日志是已完成任务的残留，恢复时忽略。只有开始标记没有提交标记时，
+    上次运行可能已经把部分或全部结果写入了数据集，恢复时先把数据集截断到记录的大小再重新写入，不会产生重复的问答对。
+    """
+
+    def __init__(self, path: str, fsync_batch: int = 20, fsync_interval: float = 1.0):
+        self.path = path
+        self.fsync_batch = max(1, fsync_batch)
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self.interrupted_commit: Optional[int] = None  # 上次运行开始写入数据集时数据集的大小，由load读取
+
+    def load(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        读取日志中已完成的文件
+
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: 文件路径到问答对的映射，日志不存在或已提交时为空
+        """
+        pairs: Dict[str, List[Dict[str, Any]]] = {}
+        completed: Dict[str, List[Dict[str, Any]]] = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 崩溃时未写完的最后一行
+                        continue
+                    if record.get("committed"):
+                        self.interrupted_commit = None
+                        return {}
+                    if record.get("committing"):
+                        self.interrupted_commit = record.get("offset")
+                        continue
+                    file_path = record.get("file")
+                    if "pairs" in record:
+                        pairs[file_path] = record["pairs"]
+                    elif record.get("done") and file_path in pairs:
+                        completed[file_path] = pairs[file_path]
+        except FileNotFoundError:
+            return {}
+        except OSError as e:
+            logging.error(f"读取生成日志失败 {self.path}: {str(e)}")
+            return {}
+        return completed
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        return self._file
+
+    def _write(self, record: Dict[str, Any]):
+        self._open().write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def record(self, file_path: str, qa_pairs: List[Dict[str, Any]]):
+        """追加一个文件的问答对和完成标记，按批量或时间间隔落盘"""
+        self._write({"file": file_path, "pairs": qa_pairs})
+        self._write({"file": file_path, "done": True})
+        self._pending += 1
+        if self._pending >= self.fsync_batch or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        """将已写入的记录刷新到磁盘"""
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        """落盘并关闭日志文件"""
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def begin_commit(self, dataset_size: int):
+        """开始把结果写入数据集：记录并落盘数据集当前的大小，写入中断时恢复据此截断"""
+        self._write({"committing": True, "offset": dataset_size})
+        self.sync()
+
+    def commit(self):
+        """结果已写入数据集：写入提交标记后删除日志"""
+        self._write({"committed": True})
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,288 @@
+import re
+import time
+import random
+import asyncio
+from collections import deque
+from typing import Dict, Tuple, Optional, Mapping, Deque
+
+# 限流响应头中的时长，如 "1s"、"6m0s"、"20ms"
+_DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """解析限流响应头中的时长（秒），纯数字按秒处理，无法解析时返回None"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def _header_int(headers: Mapping[str, str], name: str) -> Optional[int]:
+    try:
+        return int(float(headers.get(name)))
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_seconds(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """读取 retry-after-ms / retry-after 响应头，没有或为HTTP日期格式时返回None"""
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000.0)
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+    return None
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[float] = None) -> float:
+    """
+    指数退避加随机抖动（full jitter）的等待时间
+
+    Args:
+        attempt: 第几次重试，从0开始
+        base: 第一次重试的最长等待时间（秒）
+        cap: 最长等待时间（秒）
+        retry_after: 服务端要求的等待时间，有则至少等待该时间
+
+    Returns:
+        float: 等待的秒数
+    """
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap))
+    return delay
+
+
+class RateLimiter:
+    """
+    按每分钟请求数（RPM）和每分钟Token数（TPM）限流
+
+    两个令牌桶按速率连续补充，容量为一分钟的额度。请求前按估算的Token数预占额度，
+    响应后用实际用量修正。等待的请求按到达顺序依次放行，限额为0表示不限制。
+    """
+
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self.rpm = max(0, int(rpm or 0))
+        self.tpm = max(0, int(tpm or 0))
+        self._requests = float(self.rpm)
+        self._tokens = float(self.tpm)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(float(self.rpm), self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tokens = min(float(self.tpm), self._tokens + elapsed * self.tpm / 60.0)
+
+    def _wait_seconds(self, tokens: int) -> float:
+        """额度不足时需要等待的秒数"""
+        wait = 0.0
+        if self.rpm and self._requests < 1:
+            wait = (1 - self._requests) * 60.0 / self.rpm
+        if self.tpm:
+            # 单个请求超过一分钟额度时，等待桶满后放行
+            needed = min(tokens, self.tpm)
+            if self._tokens < needed:
+                wait = max(wait, (needed - self._tokens) * 60.0 / self.tpm)
+        return wait
+
+    async def acquire(self, tokens: int = 0):
+        """
+        等待直到有足够的额度，并预占一个请求和tokens个Token
+
+        Args:
+            tokens: 本次请求估算的Token数
+        """
+        if not self.rpm and not self.tpm:
+            return
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = self._wait_seconds(tokens)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= tokens
+
+    def available_fraction(self) -> float:
+        """当前剩余额度占一分钟额度的比例，不限流时为1"""
+        self._refill()
+        fractions = [1.0]
+        if self.rpm:
+            fractions.append(max(0.0, self._requests) / self.rpm)
+        if self.tpm:
+            fractions.append(max(0.0, self._tokens) / self.tpm)
+        return min(fractions)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """用接口返回的实际Token用量修正预占的额度"""
+        if not self.tpm or actual_tokens is None:
+            return
+        self._refill()
+        self._tokens = min(float(self.tpm), self._tokens + estimated_tokens - actual_tokens)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> float:
+        """
+        根据接口返回的限流响应头（x-ratelimit-limit-*、x-ratelimit-remaining-*、x-ratelimit-reset-*）调整额度
+
+        未配置限额或接口的限额更低时采用接口的限额，剩余额度少于本地估算时以接口为准。
+
+        Returns:
+            float: 额度已用完时距离重置的秒数，否则为0
+        """
+        self._refill()
+        pause = 0.0
+        for kind, limit_attr, count_attr in (("requests", "rpm", "_requests"), ("tokens", "tpm", "_tokens")):
+            limit = _header_int(headers, f"x-ratelimit-limit-{kind}")
+            remaining = _header_int(headers, f"x-ratelimit-remaining-{kind}")
+            current = getattr(self, limit_attr)
+            if limit and limit > 0 and (not current or limit < current):
+                setattr(self, limit_attr, limit)
+                setattr(self, count_attr, min(getattr(self, count_attr), float(limit)) if current else float(limit))
+            if remaining is not None and getattr(self, limit_attr):
+                setattr(self, count_attr, min(getattr(self, count_attr), float(remaining)))
+            if remaining is not None and remaining <= 0:
+                pause = max(pause, parse_duration(headers.get(f"x-ratelimit-reset-{kind}")) or 0.0)
+        return pause
+
+
+class AdaptiveConcurrency:
+    """
+    按加性增、乘性减（AIMD）自动调整并发数
+
+    请求成功且并发已用满时并发上限缓慢增加（每个上限数量的成功请求约加1），
+    被限流时上限减半并在服务端要求的时间内暂停发送。上限在 [minimum, maximum] 之间。
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: Optional[int] = None):
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(initial), int(maximum or initial))
+        self.limit = float(min(max(int(initial), self.minimum), self.maximum))
+        self.active = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self):
+        """等待空闲的并发名额"""
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            if self.active < int(self.limit):
+                self.active += 1
+                return
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def release(self):
+        self.active -= 1
+        self._wake()
+
+    def _wake(self):
+        free = int(self.limit) - self.active
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def on_success(self):
+        """请求成功，并发已用满时增加上限"""
+        if self.active >= int(self.limit) and self.limit < self.maximum:
+            self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self._wake()
+
+    def on_throttle(self, pause: Optional[float] = None):
+        """
+        被限流，上限减半；同一时间段内的多个限流响应只减半一次
+
+        Args:
+            pause: 暂停发送的秒数，通常来自 retry-after 响应头
+        """
+        now = time.monotonic()
+        if now - self._last_decrease >= max(1.0, pause or 0.0):
+            self.limit = max(float(self.minimum), self.limit / 2)
+            self._last_decrease = now
+        if pause:
+            self.pause(pause)
+
+    def pause(self, seconds: float):
+        """在seconds秒内不再放行新的请求"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+_limiters: Dict[str, Tuple[Tuple[int, int], RateLimiter]] = {}
+
+
+def get_rate_limiter(key: str, rpm: int = 0, tpm: int = 0) -> RateLimiter:
+    """
+    获取共享的限流器，同一模型的多个任务共用额度
+
+    Args:
+        key: 限流器标识，通常为接口地址加模型名
+        rpm: 每分钟请求数上限
+        tpm: 每分钟Token数上限
+
+    Returns:
+        RateLimiter: 限流器，限额变化时重新创建
+    """
+    limits = (int(rpm or 0), int(tpm or 0))
+    entry = _limiters.get(key)
+    if entry is None or entry[0] != limits:
+        entry = (limits, RateLimiter(*limits))
+        _limiters[key] = entry
+    return entry[1]
+
+
+_concurrency: Dict[str, Tuple[Tuple[int, int], AdaptiveConcurrency]] = {}
+
+
+def get_adaptive_concurrency(key: str, initial: int, maximum: int) -> AdaptiveConcurrency:
+    """
+    获取共享的自适应并发，同一模型的多个任务共用并发名额，调整后的上限在任务之间保留
+
+    Args:
+        key: 标识，通常为接口地址加模型名
+        initial: 初始并发数
+        maximum: 并发上限
+
+    Returns:
+        AdaptiveConcurrency: 自适应并发，初始并发数或上限变化时重新创建
+    """
+    limits = (int(initial), int(maximum))
+    entry = _concurrency.get(key)
+    if entry is None or entry[0] != limits:
+        entry = (limits, AdaptiveConcurrency(limits[0], maximum=limits[1]))
+        _concurrency[key] = entry
+    return entry[1]
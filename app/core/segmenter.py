@@ -0,0 +1,124 @@
+import re
+from typing import List, Iterator, Tuple
+
+# Markdown结构
+HEADER_PATTERN = re.compile(r'^(#{1,6})\s+(.+)')
+PARAGRAPH_SEPARATOR = '\n\n'
+
+# 句点不表示句子结束的常见英文缩写（小写，不含末尾句点）
+ABBREVIATIONS = frozenset({
+    "e.g", "i.e", "vs", "cf", "al", "approx", "fig", "figs", "eq", "no", "nos", "vol", "pp",
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "inc", "ltd", "co", "corp", "dept",
+    "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec"
+})
+
+
+def _abbreviation_lookbehinds() -> str:
+    """生成排除缩写的反向预查，Python的反向预查要求定长，按缩写长度分组"""
+    groups = {}
+    for abbreviation in sorted(ABBREVIATIONS):
+        groups.setdefault(len(abbreviation), []).append(re.escape(abbreviation))
+    # 单字母缩写，如 J. Smith
+    lookbehinds = [r'(?<!\b[A-Za-z]\.)']
+    for length in sorted(groups):
+        lookbehinds.append(r'(?<!\b(?i:%s)\.)' % '|'.join(groups[length]))
+    return ''.join(lookbehinds)
+
+
+# 句子边界扫描，每次匹配从一个候选字符开始，整个扫描在正则引擎内完成：
+# 1. 行内代码和链接地址，整体跳过，其中的标点不是句子边界
+# 2. 中文句末标点（可带右引号/括号），总是句子边界
+# 3. 英文问号、感叹号，只有后面是空白或文本结尾时才是句子边界（排除域名、文件名）
+# 4. 英文句点，另外排除前面是缩写的情况（排除小数、e.g.、Dr.）
+SENTENCE_BOUNDARY_PATTERN = re.compile(
+    r'[`\]。！？.!?](?:'
+    r'(?<=`)[^`\n]*`'
+    r'|(?<=\])\([^)\s]*\)'
+    r'|(?<=[。！？])[。！？]*[”’」』）)]*\s*'
+    r'|(?<=[!?])[.!?]*["\')\]]*(?:\s+|$)'
+    r'|(?<=\.)' + _abbreviation_lookbehinds() + r'[.!?]*["\')\]]*(?:\s+|$)'
+    r')'
+)
+
+
+def is_header_line(line: str) -> Tuple[bool, int, str]:
+    """检查是否为标题行，返回(是否为标题, 标题级别, 标题文本)"""
+    line = line.strip()
+    if not line.startswith('#'):
+        return False, 0, ""
+    match = HEADER_PATTERN.match(line)
+    if not match:
+        return False, 0, ""
+    return True, len(match.group(1)), match.group(2).strip()
+
+
+def sentence_ends(text: str) -> List[int]:
+    """
+    扫描单个段落中每个句子的结束偏移，句末标点和其后的空白属于该句子
+
+    Args:
+        text: 单个段落的文本
+
+    Returns:
+        List[int]: 递增的结束偏移，最后一个为文本长度（文本以空白结尾时除外）
+    """
+    ends = []
+    last = 0
+    for match in SENTENCE_BOUNDARY_PATTERN.finditer(text):
+        # 以反引号或右方括号开始的匹配是行内代码和链接
+        if text[match.start()] in '`]':
+            continue
+        last = match.end()
+        ends.append(last)
+    if last < len(text):
+        ends.append(len(text))
+    return ends
+
+
+def iter_sentence_spans(text: str) -> Iterator[Tuple[int, int]]:
+    """
+    扫描文本中的句子区间
+
+    Args:
+        text: 单个段落的文本
+
+    Returns:
+        Iterator[Tuple[int, int]]: 非空白句子的 (起始, 结束) 偏移
+    """
+    start = 0
+    for end in sentence_ends(text):
+        if not text[start:end].isspace():
+            yield start, end
+        start = end
+
+
+def split_sentences(text: str) -> List[str]:
+    """将单个段落切分为句子，句子保留原有的标点和空白"""
+    return [text[start:end] for start, end in iter_sentence_spans(text)]
+
+
+def split_markdown_sentences(text: str) -> List[str]:
+    """
+    按段落和句子切分Markdown文本，输出格式与 MarkdownSplitter 的句子分割一致：
+    每个句子末尾追加换行，段落之间插入单独的换行
+
+    Args:
+        text: Markdown文本
+
+    Returns:
+        List[str]: 句子列表，拼接后即为分割后的文本
+    """
+    sentences: List[str] = []
+    for paragraph in text.split(PARAGRAPH_SEPARATOR):
+        if not paragraph or paragraph.isspace():
+            continue
+        start = 0
+        for end in sentence_ends(paragraph):
+            sentence = paragraph[start:end]
+            if not sentence.isspace():
+                sentences.append(sentence + '\n')
+            start = end
+        # 添加段落分隔
+        if sentences:
+            sentences.append('\n')
+    return sentences
@@ -0,0 +1,224 @@
+import os
+import json
+import hashlib
+import logging
+from functools import lru_cache
+from typing import List, Dict, Any, Optional
+
+from app.core.config import settings
+from app.utils.file_utils import LRUFileIndex
+from app.core.markdown_splitter import MarkdownSplitter, MarkdownChunk
+
+# 缓存格式变化时递增，旧缓存自动失效
+SPLIT_CACHE_VERSION = 2
+
+# 决定分段结果的模块，源码变化时旧缓存自动失效，不依赖手动递增版本号
+SPLITTER_MODULES = (
+    "markdown_splitter", "optimal_splitter", "markdown_blocks", "segmenter",
+    "token_counter", "embedding_scorer", "split_cache"
+)
+
+
+@lru_cache(maxsize=1)
+def splitter_code_version() -> str:
+    """分段相关模块源码的哈希，进程内只计算一次"""
+    digest = hashlib.sha256()
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in SPLITTER_MODULES:
+        try:
+            with open(os.path.join(module_dir, f"{name}.py"), 'rb') as f:
+                digest.update(f.read())
+        except OSError:
+            digest.update(name.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def model_file_identity(path: str) -> Optional[List[Any]]:
+    """模型文件的标识（绝对路径、修改时间、大小），替换文件后缓存失效；未配置时返回None"""
+    if not path:
+        return None
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return [path, None, None]
+    return [path, stat.st_mtime_ns, stat.st_size]
+
+
+class SplitCache:
+    """
+    分段结果的持久化缓存
+
+    以（内容哈希、分段器类型与参数、Token计数方式、分词器和向量模型文件、分段模块源码、缓存版本）为键，
+    每条缓存一个JSON文件。
+    分段内容能在原文中按顺序找到时只保存字符偏移，读取时从原文切片还原，缓存文件很小。
+    LRU顺序和总大小保存在内存索引中，超过条数或总大小上限时删除最久未用的条目；
+    命中时同时更新文件修改时间，重启或重新扫描目录后仍能恢复使用顺序。
+    多个进程可以共享同一个缓存目录：写入使用临时文件加原子替换，删除时忽略已不存在的文件。
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024 * 1024, max_entries: int = 5000):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._index = LRUFileIndex(cache_dir, max_entries, max_bytes)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, splitter: MarkdownSplitter, content: str,
+                 blocks: Optional[List[Dict[str, Any]]] = None) -> str:
+        """计算缓存键，提供结构块时包含块的类型和行范围"""
+        semantic = splitter.embedding_scorer is not None
+        params = {
+            "version": SPLIT_CACHE_VERSION,
+            "code_version": splitter_code_version(),
+            "splitter": type(splitter).__name__,
+            "max_tokens": splitter.max_tokens,
+            "min_tokens": splitter.min_tokens,
+            "header_path_separator": splitter.header_path_separator,
+            "overlap_tokens": splitter.overlap_tokens,
+            "overlap_sentences": splitter.overlap_sentences,
+            "token_counter": type(splitter.token_counter).__name__,
+            "tokenizer_file": model_file_identity(settings.TOKENIZER_FILE),
+            "semantic": semantic,
+            "embedding_files": [
+                model_file_identity(settings.EMBEDDING_MODEL_FILE),
+                model_file_identity(settings.EMBEDDING_TOKENIZER_FILE)
+            ] if semantic else None,
+            "blocks": [(block['type'], block['start_line'], block['end_line']) for block in blocks or []]
+        }
+        digest = hashlib.sha256(content.encode('utf-8'))
+        digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str, content: str) -> Optional[List[MarkdownChunk]]:
+        """读取缓存的分段，未命中或缓存损坏时返回None"""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            chunks = [self._decode_chunk(item, content) for item in entry["chunks"]]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.error(f"读取分段缓存失败 {path}: {str(e)}")
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._index.touch(path)
+        return chunks
+
+    def put(self, key: str, content: str, chunks: List[MarkdownChunk]):
+        """保存分段结果，并按上限淘汰旧条目"""
+        entry = {"version": SPLIT_CACHE_VERSION, "chunks": self._encode_chunks(chunks, content)}
+        path = self._entry_path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+            size = os.path.getsize(path)
+        except Exception as e:
+            logging.error(f"保存分段缓存失败 {path}: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self._index.add(path, size)
+
+    def get_or_split(self, splitter: MarkdownSplitter, content: str,
+                     blocks: Optional[List[Dict[str, Any]]] = None) -> List[MarkdownChunk]:
+        """
+        优先从缓存读取分段结果，未命中时分段并写入缓存
+
+        Args:
+            splitter: 分段器
+            content: Markdown内容
+            blocks: 可选的结构块，传给 create_chunks
+
+        Returns:
+            List[MarkdownChunk]: 分段列表
+        """
+        key = self.make_key(splitter, content, blocks)
+        chunks = self.get(key, content)
+        if chunks is not None:
+            return chunks
+        chunks = splitter.create_chunks(content, blocks=blocks)
+        self.put(key, content, chunks)
+        return chunks
+
+    @staticmethod
+    def _encode_chunks(chunks: List[MarkdownChunk], content: str) -> List[Dict[str, Any]]:
+        """分段内容能在原文中顺序找到时记录偏移，否则保存原文本"""
+        encoded = []
+        cursor = 0
+        for chunk in chunks:
+            item = {
+                "title": chunk.title,
+                "order": chunk.order,
+                "estimated_tokens": chunk.estimated_tokens,
+                "start_line": chunk.start_line,
+                "end_line": chunk.end_line,
+                "metadata": chunk.metadata
+            }
+            position = content.find(chunk.content, cursor)
+            if position == -1:
+                position = content.find(chunk.content)
+            if position != -1 and chunk.content:
+                item["span"] = [position, position + len(chunk.content)]
+                cursor = position
+            else:
+                item["content"] = chunk.content
+            encoded.append(item)
+        return encoded
+
+    @staticmethod
+    def _decode_chunk(item: Dict[str, Any], content: str) -> MarkdownChunk:
+        if "span" in item:
+            start, end = item["span"]
+            chunk_content = content[start:end]
+        else:
+            chunk_content = item["content"]
+        metadata = item["metadata"]
+        # JSON中的元组被保存为列表
+        if "header_stack" in metadata:
+            metadata["header_stack"] = [tuple(header) for header in metadata["header_stack"]]
+        return MarkdownChunk(
+            content=chunk_content,
+            title=item["title"],
+            order=item["order"],
+            estimated_tokens=item["estimated_tokens"],
+            start_line=item["start_line"],
+            end_line=item["end_line"],
+            metadata=metadata
+        )
+
+
+_default_cache: Optional[SplitCache] = None
+
+
+def get_split_cache() -> Optional[SplitCache]:
+    """获取按配置创建的共享分段缓存，未启用时返回None"""
+    global _default_cache
+    if not settings.SPLIT_CACHE_ENABLED:
+        return None
+    if _default_cache is None:
+        _default_cache = SplitCache(
+            os.path.join(settings.OUTPUT_DIR, settings.SPLIT_CACHE_DIR),
+            max_bytes=settings.SPLIT_CACHE_MAX_BYTES,
+            max_entries=settings.SPLIT_CACHE_MAX_ENTRIES
+        )
+    return _default_cache
+
+
+def split_with_cache(splitter: MarkdownSplitter, content: str,
+                     blocks: Optional[List[Dict[str, Any]]] = None) -> List[MarkdownChunk]:
+    """使用共享分段缓存执行分段，未启用缓存时直接分段"""
+    cache = get_split_cache()
+    if cache is None:
+        return splitter.create_chunks(content, blocks=blocks)
+    return cache.get_or_split(splitter, content, blocks)
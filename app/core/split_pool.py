@@ -0,0 +1,264 @@
+import os
+import asyncio
+import logging
+import multiprocessing
+from dataclasses import replace
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, Optional, Tuple, Callable, Sequence
+
+from app.core.config import settings
+from app.core.markdown_splitter import MarkdownChunk
+from app.core.optimal_splitter import create_splitter
+from app.core.split_cache import split_with_cache
+from app.core.markdown_blocks import complete_blocks
+from app.core.chunk_tree import build_chunk_tree, write_chunk_tree, chunk_file_content
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def resolve_split_tokens(max_tokens: int, min_tokens: int, strategy: str = "balanced") -> Tuple[int, int]:
+    """
+    根据分段策略调整Token范围
+
+    Args:
+        max_tokens: 每段最大Token数
+        min_tokens: 每段最小Token数
+        strategy: 分段策略 ('conservative', 'balanced', 'aggressive')
+
+    Returns:
+        Tuple[int, int]: 调整后的 (max_tokens, min_tokens)
+    """
+    if strategy == "conservative":
+        return int(max_tokens * 1.2), int(min_tokens * 1.5)  # 更大的分段
+    if strategy == "aggressive":
+        return int(max_tokens * 0.8), int(min_tokens * 0.7)  # 更小的分段
+    return max_tokens, min_tokens
+
+
+def split_markdown(content: str, max_tokens: int, min_tokens: int,
+                   blocks: Optional[List[Dict[str, Any]]] = None) -> List[MarkdownChunk]:
+    """
+    对单篇Markdown执行分段，在工作进程中运行，参数和返回值都可以pickle
+
+    相同内容和参数的分段结果从分段缓存中读取。
+
+    Args:
+        content: Markdown内容
+        max_tokens: 每段最大Token数
+        min_tokens: 每段最小Token数
+        blocks: 可选，HTML转换时产出的结构块（见 BeautifulSoupCrawler._convert_with_blocks），
+            提供时直接按块边界分段，不再扫描Markdown；与内容不符时忽略
+
+    Returns:
+        List[MarkdownChunk]: 分段列表
+    """
+    splitter = create_splitter(max_tokens=max_tokens, min_tokens=min_tokens)
+    if blocks:
+        blocks = complete_blocks(content.split('\n'), blocks, splitter.estimate_tokens)
+    return split_with_cache(splitter, content, blocks)
+
+
+def write_chunk_file(output_dir: str, base_name: str, chunk: MarkdownChunk) -> str:
+    """
+    保存单个分段为 xxx-1.md、xxx-2.md 格式的文件
+
+    Returns:
+        str: 分段文件路径
+    """
+    chunk_filepath = os.path.join(output_dir, f"{base_name}-{chunk.order}.md")
+    with open(chunk_filepath, 'w', encoding='utf-8') as f:
+        f.write(chunk_file_content(chunk))
+    return chunk_filepath
+
+
+def remove_chunk_file(chunk_filepath: str):
+    """删除分段文件"""
+    if os.path.exists(chunk_filepath):
+        os.remove(chunk_filepath)
+
+
+def split_markdown_file(markdown_path: str, output_dir: str, base_name: str,
+                        max_tokens: int, min_tokens: int) -> List[str]:
+    """
+    流式分段磁盘上的Markdown文件，每个分段边界确定后立即写出
+
+    文件按行读取，内存占用与文件大小无关，适合超大页面和整本书籍。
+
+    Args:
+        markdown_path: Markdown文件路径
+        output_dir: 分段文件目录
+        base_name: 分段文件名前缀
+        max_tokens: 每段最大Token数
+        min_tokens: 每段最小Token数
+
+    Returns:
+        List[str]: 按顺序排列的分段文件路径
+    """
+    splitter = create_splitter(max_tokens=max_tokens, min_tokens=min_tokens)
+    chunk_paths = []
+    # 层级结构只需要标题栈和Token数，不保留分段内容
+    written_chunks = []
+    with open(markdown_path, 'r', encoding='utf-8') as f:
+        for chunk in splitter.iter_chunks(f):
+            chunk_paths.append(write_chunk_file(output_dir, base_name, chunk))
+            written_chunks.append(replace(chunk, content=''))
+    if len(chunk_paths) > 1:
+        save_chunk_tree(output_dir, base_name, written_chunks, chunk_paths)
+    return chunk_paths
+
+
+def save_chunk_tree(output_dir: str, base_name: str, chunks: List[MarkdownChunk], chunk_paths: List[str]):
+    """
+    启用 CHUNK_TREE_ENABLED 或分段重叠时，在分段文件旁保存分段的层级结构
+
+    生成数据集时从中读取每个分段与前一个分段的重叠位置（见 DatasetService.get_previous_chunk_context）
+    """
+    if settings.CHUNK_TREE_ENABLED or settings.CHUNK_OVERLAP_TOKENS or settings.CHUNK_OVERLAP_SENTENCES:
+        write_chunk_tree(output_dir, base_name, build_chunk_tree(chunks, chunk_paths, title=base_name))
+
+
+def _pool_workers() -> int:
+    """进程池大小，配置为0时按CPU核数确定"""
+    if settings.SPLIT_POOL_WORKERS > 0:
+        return settings.SPLIT_POOL_WORKERS
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+def get_split_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    获取共享的分段进程池，首次使用时创建，上传文件的格式转换也在其中并行执行
+
+    使用spawn方式启动工作进程，避免在多线程的服务进程中fork。
+    进程池无法创建时返回None，调用方在当前进程内分段。
+    """
+    global _pool
+    if _pool is None and _pool_workers() > 1:
+        try:
+            _pool = ProcessPoolExecutor(
+                max_workers=_pool_workers(),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        except Exception as e:
+            logging.error(f"创建分段进程池失败: {str(e)}")
+            print(f"创建分段进程池失败，将在当前进程内分段: {str(e)}")
+    return _pool
+
+
+def shutdown_split_pool():
+    """关闭分段进程池"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _discard_broken_pool(pool: ProcessPoolExecutor):
+    """工作进程崩溃后进程池不能再使用，关闭并丢弃，下次使用时重新创建"""
+    global _pool
+    logging.error("分段进程池的工作进程异常退出，重建进程池")
+    print("分段进程池的工作进程异常退出，重建进程池")
+    if _pool is pool:
+        _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_batch(func: Callable[..., Any], args_list: Sequence[Tuple]) -> List[Tuple[Any, Optional[Exception]]]:
+    """
+    在进程池中并行执行一批任务，进程池不可用或只有一个任务时在当前进程内执行
+
+    工作进程崩溃导致进程池损坏时，重建进程池并重试受影响的任务一次。
+
+    Args:
+        func: 可以pickle的模块级函数
+        args_list: 每个任务的参数元组
+
+    Returns:
+        List[Tuple[Any, Optional[Exception]]]: 与args_list顺序一致的 (结果, 异常)，成功时异常为None
+    """
+    results: List[Tuple[Any, Optional[Exception]]] = [(None, None)] * len(args_list)
+    pending = list(range(len(args_list)))
+    pool = get_split_pool() if len(args_list) > 1 else None
+    for attempt in range(2):
+        if pool is None:
+            for i in pending:
+                try:
+                    results[i] = (func(*args_list[i]), None)
+                except Exception as e:
+                    results[i] = (None, e)
+            return results
+
+        futures = {}
+        broken = []
+        for i in pending:
+            try:
+                futures[i] = pool.submit(func, *args_list[i])
+            except BrokenProcessPool as e:
+                broken.append(i)
+                results[i] = (None, e)
+        for i, future in futures.items():
+            try:
+                results[i] = (future.result(), None)
+            except BrokenProcessPool as e:
+                broken.append(i)
+                results[i] = (None, e)
+            except Exception as e:
+                results[i] = (None, e)
+        if not broken or attempt:
+            break
+        _discard_broken_pool(pool)
+        pool = get_split_pool()
+        pending = sorted(broken)
+    return results
+
+
+async def _run_in_pool(func: Callable[..., Any], *args: Any) -> Any:
+    """在进程池中执行单个任务，不阻塞事件循环；进程池损坏时重建并重试一次，进程池不可用时在线程池中执行"""
+    loop = asyncio.get_running_loop()
+    pool = get_split_pool()
+    try:
+        return await loop.run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        _discard_broken_pool(pool)
+        return await loop.run_in_executor(get_split_pool(), func, *args)
+
+
+def split_markdown_batch(contents: List[str], max_tokens: int = 8000, min_tokens: int = 500,
+                         strategy: str = "balanced") -> List[List[MarkdownChunk]]:
+    """
+    批量分段，多篇文档分发到进程池并行处理
+
+    Args:
+        contents: Markdown内容列表
+        max_tokens: 每段最大Token数
+        min_tokens: 每段最小Token数
+        strategy: 分段策略
+
+    Returns:
+        List[List[MarkdownChunk]]: 与contents顺序一致的分段结果，单篇失败时该项为空列表
+    """
+    actual_max_tokens, actual_min_tokens = resolve_split_tokens(max_tokens, min_tokens, strategy)
+    results = []
+    for result, error in run_batch(split_markdown, [(content, actual_max_tokens, actual_min_tokens) for content in contents]):
+        if error is not None:
+            print(f"智能分段失败: {str(error)}")
+            results.append([])
+        else:
+            results.append(result)
+    return results
+
+
+async def split_markdown_async(content: str, max_tokens: int, min_tokens: int,
+                               blocks: Optional[List[Dict[str, Any]]] = None) -> List[MarkdownChunk]:
+    """
+    在进程池中分段单篇文档，不阻塞事件循环
+
+    参数与返回值同 split_markdown，进程池不可用时在线程池中执行。
+    """
+    return await _run_in_pool(split_markdown, content, max_tokens, min_tokens, blocks)
+
+
+async def split_markdown_file_async(markdown_path: str, output_dir: str, base_name: str,
+                                    max_tokens: int, min_tokens: int) -> List[str]:
+    """在进程池中流式分段Markdown文件，参数与返回值同 split_markdown_file"""
+    return await _run_in_pool(split_markdown_file, markdown_path, output_dir, base_name, max_tokens, min_tokens)
@@ -4,6 +4,8 @@ from fastapi.staticfiles import StaticFiles
 
 from app.api import crawler, files, system, dataset, project
 from app.core.config import settings
+from app.core.job_scheduler import scheduler
+from app.core.split_pool import shutdown_split_pool
 
 app = FastAPI(
     title="数据集生成与大模型微调工具",
@@ -27,6 +29,17 @@ app.include_router(dataset.router, prefix="/api/dataset", tags=["数据集管理
 app.include_router(system.router, prefix="/api/system", tags=["系统配置"])
 app.include_router(project.router, prefix="/api/project", tags=["项目管理"])
 
+@app.on_event("startup")
+async def start_scheduler():
+    """恢复任务表中未完成的任务"""
+    scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    """中断运行中的任务，重启后继续执行"""
+    await scheduler.shutdown()
+    shutdown_split_pool()
+
 # 挂载静态文件
 app.mount("/output", StaticFiles(directory=settings.OUTPUT_DIR), name="output")
 
@@ -12,6 +12,7 @@ class CrawlerRequest(BaseModel):
     crawl_strategy: Literal["bfs", "dfs"] = settings.DEFAULT_CRAWL_STRATEGY
     force_refresh: bool = False
     projectId: Optional[str] = None
+    priority: Optional[int] = None  # 任务优先级，数值越小越优先，默认按任务规模确定
     
 class UrlItem(BaseModel):
     id: int
@@ -24,6 +25,7 @@ class CrawlerResponse(BaseModel):
     message: str
     urls: Optional[List[Union[str, Dict[str, Any], UrlItem]]] = None
     count: Optional[int] = None
+    job_id: Optional[str] = None
     
 class UrlToMarkdownRequest(BaseModel):
     urls: List[str]
@@ -37,15 +39,22 @@ class UrlToMarkdownRequest(BaseModel):
     max_tokens: Optional[int] = 8000
     min_tokens: Optional[int] = 500
     split_strategy: Optional[str] = "balanced"  # conservative, aggressive, balanced
+    
+    # 任务优先级，数值越小越优先，默认按URL数量确定
+    priority: Optional[int] = None
+    
+    # 下载页面引用的图片到项目媒体库，并将链接改写为本地路径
+    capture_assets: bool = False
 
 class UrlToMarkdownResponse(BaseModel):
     status: str
     message: str
     files: Optional[List[str]] = None
     count: Optional[int] = None
+    job_id: Optional[str] = None
 
 class ExportLinksResponse(BaseModel):
     status: str
     message: str
     file_path: Optional[str] = None
-    download_url: Optional[str] = None 
\ No newline at end of file
+    download_url: Optional[str] = None 
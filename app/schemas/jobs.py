@@ -0,0 +1,22 @@
+from pydantic import BaseModel
+from typing import List, Optional, Dict, Any
+
+class JobInfo(BaseModel):
+    job_id: str
+    kind: str
+    project_id: Optional[str] = None
+    priority: int
+    description: Optional[str] = ""
+    status: str  # queued, running, paused, completed, failed, cancelled
+    message: Optional[str] = None
+    progress: Dict[str, Any] = {}
+    restarts: int = 0
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+class JobResponse(BaseModel):
+    status: str
+    message: str
+    job: Optional[JobInfo] = None
+    jobs: Optional[List[JobInfo]] = None
@@ -0,0 +1,248 @@
+import os
+import re
+import uuid
+import asyncio
+import hashlib
+import logging
+import mimetypes
+from typing import Dict, Any, Iterable, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+import aiohttp
+
+from app.core.config import settings
+from app.utils.file_utils import FileUtils
+from app.utils.path_utils import get_project_output_path, ensure_dir
+
+# Markdown图片语法：![alt](url "title")，链接可以用尖括号包围，也可以包含成对的括号（如 img_(1).png）
+IMAGE_PATTERN = re.compile(r'!\[([^\]]*)\]\((<[^<>\n]*>|(?:[^\s()]|\([^\s()]*\))+)(\s+"[^"]*")?\)')
+
+# 无法从Content-Type推断扩展名时允许使用URL中的扩展名
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg', '.bmp', '.ico', '.avif'}
+
+
+class MediaStore:
+    """
+    项目级媒体库，保存转换页面中引用的图片
+
+    图片按内容的sha256去重保存为 media/{sha256}{ext}，media_index.json 记录
+    URL到文件的映射，已下载过的URL不会重复下载。Markdown中的图片链接改写为
+    相对于Markdown文件的本地路径，下载失败或超过大小限制的图片保留原链接。
+    """
+
+    INDEX_FILE = "media_index.json"
+
+    def __init__(self, project_id: Optional[str] = None, max_bytes: int = None,
+                 store_max_bytes: int = None, concurrency: int = None):
+        """
+        初始化媒体库
+
+        Args:
+            project_id: 项目ID
+            max_bytes: 单个图片的大小上限
+            store_max_bytes: 媒体库总大小上限
+            concurrency: 同时下载的图片数
+        """
+        self.project_id = project_id
+        self.max_bytes = max_bytes if max_bytes is not None else settings.ASSET_MAX_BYTES
+        self.store_max_bytes = store_max_bytes if store_max_bytes is not None else settings.ASSET_STORE_MAX_BYTES
+        self.media_dir = ensure_dir(get_project_output_path(project_id, "media"))
+        self.index_path = os.path.join(self.media_dir, self.INDEX_FILE)
+        self._semaphore = asyncio.Semaphore(concurrency or settings.ASSET_CONCURRENCY)
+        # 同一URL只下载一次，并发请求共享同一个下载任务
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        index = FileUtils.read_json(self.index_path, {})
+        if not isinstance(index, dict):
+            index = {}
+        self.urls: Dict[str, str] = index.get("urls", {})
+        self.files: Dict[str, Dict[str, Any]] = index.get("files", {})
+        self.total_bytes: int = sum(item.get("size", 0) for item in self.files.values())
+        self._dirty = False
+
+    def save_index(self) -> bool:
+        """保存媒体索引"""
+        if not self._dirty:
+            return True
+        self._dirty = False
+        return FileUtils.write_json(self.index_path, {"urls": self.urls, "files": self.files})
+
+    @staticmethod
+    def _guess_extension(url: str, content_type: str) -> str:
+        ext = mimetypes.guess_extension(content_type) if content_type else None
+        if ext == '.jpe':
+            ext = '.jpg'
+        if not ext:
+            url_ext = os.path.splitext(urlparse(url).path)[1].lower()
+            ext = url_ext if url_ext in IMAGE_EXTENSIONS else ''
+        return ext
+
+    async def _download(self, session: aiohttp.ClientSession, url: str) -> Optional[str]:
+        """下载图片到媒体库，返回文件名，失败返回None"""
+        tmp_path = os.path.join(self.media_dir, f".{uuid.uuid4().hex}.part")
+        try:
+            async with self._semaphore:
+                timeout = aiohttp.ClientTimeout(total=settings.ASSET_TIMEOUT_SECONDS)
+                async with session.get(url, timeout=timeout) as response:
+                    if response.status != 200:
+                        print(f"下载图片失败 {url}: HTTP {response.status}")
+                        return None
+                    content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+                    if content_type and not content_type.startswith('image/'):
+                        print(f"跳过非图片资源 {url}: {content_type}")
+                        return None
+                    if response.content_length and response.content_length > self.max_bytes:
+                        print(f"跳过过大的图片 {url}: {response.content_length} 字节")
+                        return None
+
+                    # 边下载边计算哈希，超过大小限制立即放弃
+                    sha256 = hashlib.sha256()
+                    size = 0
+                    with open(tmp_path, 'wb') as f:
+                        async for block in response.content.iter_chunked(64 * 1024):
+                            size += len(block)
+                            if size > self.max_bytes:
+                                print(f"跳过过大的图片 {url}: 超过 {self.max_bytes} 字节")
+                                return None
+                            sha256.update(block)
+                            f.write(block)
+
+            digest = sha256.hexdigest()
+            filename = f"{digest}{self._guess_extension(url, content_type)}"
+            if filename in self.files:
+                # 内容相同的图片已存在
+                return filename
+            if self.total_bytes + size > self.store_max_bytes:
+                print(f"媒体库已达到大小上限，跳过图片: {url}")
+                return None
+            os.replace(tmp_path, os.path.join(self.media_dir, filename))
+            self.files[filename] = {"size": size, "content_type": content_type, "sha256": digest}
+            self.total_bytes += size
+            return filename
+        except Exception as e:
+            logging.error(f"下载图片失败 {url}: {str(e)}")
+            print(f"下载图片失败 {url}: {str(e)}")
+            return None
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    async def fetch(self, session: aiohttp.ClientSession, url: str) -> Optional[str]:
+        """获取图片对应的本地文件名，必要时下载"""
+        filename = self.urls.get(url)
+        if filename and os.path.exists(os.path.join(self.media_dir, filename)):
+            return filename
+        if url in self._inflight:
+            return await self._inflight[url]
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[url] = future
+        try:
+            filename = await self._download(session, url)
+            if filename:
+                self.urls[url] = filename
+                self._dirty = True
+            future.set_result(filename)
+            return filename
+        finally:
+            if not future.done():
+                future.cancel()
+            del self._inflight[url]
+
+    async def localize_markdown(self, session: aiohttp.ClientSession, markdown: str, page_url: str,
+                                markdown_dir: str) -> Tuple[str, Dict[str, int]]:
+        """
+        下载Markdown中引用的图片并将链接改写为本地路径
+
+        Args:
+            session: aiohttp会话
+            markdown: Markdown内容
+            page_url: 页面URL，用于解析相对链接
+            markdown_dir: Markdown文件所在目录，本地链接相对于该目录
+
+        Returns:
+            Tuple[str, Dict[str, int]]: 改写后的Markdown和统计信息
+        """
+        sources = self._collect_sources([markdown], page_url)
+        replacements, stats = await self._download_sources(session, sources, markdown_dir)
+        if not replacements:
+            return markdown, stats
+        return self._rewrite(markdown, replacements), stats
+
+    async def localize_markdown_file(self, session: aiohttp.ClientSession, markdown_path: str, page_url: str,
+                                     markdown_dir: str) -> Dict[str, int]:
+        """
+        下载Markdown文件中引用的图片并改写文件中的链接，按行流式读写，不把整个文件读入内存
+
+        用于大页面模式写出的Markdown文件，参数和统计信息同 localize_markdown
+        """
+        with open(markdown_path, 'r', encoding='utf-8') as f:
+            sources = self._collect_sources(f, page_url)
+        replacements, stats = await self._download_sources(session, sources, markdown_dir)
+        if not replacements:
+            return stats
+
+        temp_path = f"{markdown_path}.{os.getpid()}.tmp"
+        try:
+            with open(markdown_path, 'r', encoding='utf-8') as src, open(temp_path, 'w', encoding='utf-8') as dst:
+                for line in src:
+                    dst.write(self._rewrite(line, replacements))
+            os.replace(temp_path, markdown_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return stats
+
+    @staticmethod
+    def _image_source(match: re.Match) -> str:
+        """图片链接，去掉尖括号"""
+        src = match.group(2)
+        if src.startswith('<') and src.endswith('>'):
+            return src[1:-1]
+        return src
+
+    @staticmethod
+    def _collect_sources(texts: Iterable[str], page_url: str) -> Dict[str, str]:
+        """收集图片链接到绝对URL的映射，跳过data URI和非HTTP链接"""
+        sources = {}
+        for text in texts:
+            for match in IMAGE_PATTERN.finditer(text):
+                src = MediaStore._image_source(match)
+                if not src or src.startswith('data:'):
+                    continue
+                absolute = urljoin(page_url, src)
+                if urlparse(absolute).scheme in ('http', 'https'):
+                    sources[src] = absolute
+        return sources
+
+    async def _download_sources(self, session: aiohttp.ClientSession, sources: Dict[str, str],
+                                markdown_dir: str) -> Tuple[Dict[str, str], Dict[str, int]]:
+        """下载图片，返回原链接到本地相对路径的映射和统计信息"""
+        stats = {"images": len(sources), "localized": 0, "failed": 0}
+        if not sources:
+            return {}, stats
+
+        unique_urls = list(set(sources.values()))
+        results = await asyncio.gather(*(self.fetch(session, url) for url in unique_urls))
+        local_files = dict(zip(unique_urls, results))
+
+        relative_dir = os.path.relpath(self.media_dir, markdown_dir).replace('\\', '/')
+        replacements = {}
+        for src, absolute in sources.items():
+            filename = local_files.get(absolute)
+            if filename:
+                replacements[src] = f"{relative_dir}/{filename}"
+                stats["localized"] += 1
+            else:
+                stats["failed"] += 1
+        return replacements, stats
+
+    @staticmethod
+    def _rewrite(text: str, replacements: Dict[str, str]) -> str:
+        def _replace(match):
+            local = replacements.get(MediaStore._image_source(match))
+            if not local:
+                return match.group(0)
+            return f"![{match.group(1)}]({local}{match.group(3) or ''})"
+
+        return IMAGE_PATTERN.sub(_replace, text)
@@ -0,0 +1,154 @@
+import os
+import json
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+
+from openai import AsyncOpenAI
+
+# 批量任务状态文件：数据集路径加该后缀，记录已提交的批量任务，中断后继续等待这些任务
+BATCH_STATE_SUFFIX = ".batch.json"
+BATCH_ENDPOINT = "/v1/chat/completions"
+# 批量任务的最终状态
+BATCH_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchService:
+    """OpenAI风格的批量接口：生成JSONL请求文件、提交、轮询状态并读取结果"""
+
+    @staticmethod
+    def build_request(custom_id: str, model: str, messages: List[Dict[str, str]], **params) -> Dict[str, Any]:
+        """构建批量请求文件中的一行"""
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {"model": model, "messages": messages, **params}
+        }
+
+    @staticmethod
+    async def submit(client: AsyncOpenAI, requests: List[Dict[str, Any]], metadata: Optional[Dict[str, str]] = None) -> str:
+        """
+        上传请求文件并创建批量任务
+
+        Args:
+            client: 异步OpenAI客户端
+            requests: build_request 生成的请求
+            metadata: 附加在批量任务上的描述信息
+
+        Returns:
+            str: 批量任务ID
+        """
+        content = "".join(json.dumps(request, ensure_ascii=False) + "\n" for request in requests)
+        input_file = await client.files.create(file=("batch_input.jsonl", content.encode("utf-8")), purpose="batch")
+        params = {"metadata": metadata} if metadata else {}
+        batch = await client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window="24h",
+            **params
+        )
+        print(f"已提交批量任务 {batch.id}，共 {len(requests)} 个请求")
+        return batch.id
+
+    @staticmethod
+    async def wait(client: AsyncOpenAI, batch_id: str, poll_interval: float,
+                   on_poll: Optional[Callable[[Any], Awaitable[None]]] = None) -> Any:
+        """
+        轮询批量任务直到结束
+
+        Args:
+            client: 异步OpenAI客户端
+            batch_id: 批量任务ID
+            poll_interval: 轮询间隔（秒）
+            on_poll: 每次查询到状态后调用
+
+        Returns:
+            Batch: 结束状态的批量任务
+        """
+        while True:
+            batch = await client.batches.retrieve(batch_id)
+            if on_poll is not None:
+                await on_poll(batch)
+            if batch.status in BATCH_FINAL_STATUSES:
+                return batch
+            await asyncio.sleep(poll_interval)
+
+    @staticmethod
+    async def fetch_results(client: AsyncOpenAI, batch: Any) -> Dict[str, Dict[str, Any]]:
+        """
+        读取批量任务的结果，过期或取消的任务返回已完成部分
+
+        Returns:
+            Dict[str, Dict[str, Any]]: custom_id 到结果的映射，结果包含content、finish_reason，
+            失败的请求包含error
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        for file_id in [getattr(batch, "output_file_id", None), getattr(batch, "error_file_id", None)]:
+            if not file_id:
+                continue
+            response = await client.files.content(file_id)
+            for line in response.text.splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    custom_id = record["custom_id"]
+                except (ValueError, KeyError) as e:
+                    logging.error(f"批量结果格式错误: {str(e)}")
+                    continue
+                response_record = record.get("response") or {}
+                body = response_record.get("body") or {}
+                if record.get("error") or response_record.get("status_code", 200) != 200 or not body.get("choices"):
+                    results[custom_id] = {"error": record.get("error") or body.get("error") or "empty response"}
+                    continue
+                choice = body["choices"][0]
+                results[custom_id] = {
+                    "content": (choice.get("message") or {}).get("content") or "",
+                    "finish_reason": choice.get("finish_reason")
+                }
+        return results
+
+    @staticmethod
+    async def cancel(client: AsyncOpenAI, batch_id: str) -> bool:
+        """取消服务端的批量任务，返回是否成功；任务已经结束时服务端会返回错误"""
+        try:
+            await client.batches.cancel(batch_id)
+            print(f"已取消批量任务 {batch_id}")
+            return True
+        except Exception as e:
+            logging.error(f"取消批量任务 {batch_id} 失败: {str(e)}")
+            return False
+
+    @staticmethod
+    def save_state(path: str, batches: List[Dict[str, Any]]):
+        """
+        保存已提交的批量任务
+
+        Args:
+            path: 状态文件路径
+            batches: 每个批量任务的 {"batch_id": 任务ID, "requests": custom_id 到文件路径的映射}
+        """
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"batches": batches}, f, ensure_ascii=False)
+        except Exception as e:
+            logging.error(f"保存批量任务状态失败 {path}: {str(e)}")
+
+    @staticmethod
+    def load_state(path: str) -> List[Dict[str, Any]]:
+        """读取已提交的批量任务列表，不存在或损坏时返回空列表；兼容只记录一个任务的旧格式"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            batches = state.get("batches", [state] if "batch_id" in state else [])
+            return [batch for batch in batches
+                    if isinstance(batch, dict) and batch.get("batch_id") and isinstance(batch.get("requests"), dict)]
+        except (OSError, ValueError, AttributeError):
+            return []
+
+    @staticmethod
+    def remove_state(path: str):
+        """批量任务的结果已写入日志或任务被取消后删除状态文件"""
+        if os.path.exists(path):
+            os.remove(path)
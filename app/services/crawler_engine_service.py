@@ -1,11 +1,23 @@
+import os
+import re
 import aiohttp
-from bs4 import BeautifulSoup
+import chardet
+from bs4 import BeautifulSoup, Tag, NavigableString, Comment, Doctype
 from urllib.parse import urljoin, urlparse
-from typing import Dict, Any, List, Set
+from typing import Dict, Any, List, Set, Optional, Tuple, Iterator
 import markdownify
 from abc import ABC, abstractmethod
 from collections import deque
 
+from app.core.segmenter import HEADER_PATTERN
+from app.core.markdown_blocks import (
+    BLOCK_HEADING, BLOCK_CODE, BLOCK_TABLE, BLOCK_LIST, BLOCK_QUOTE, BLOCK_PARAGRAPH
+)
+
+# HTML开头声明的编码，如 <meta charset="gbk"> 或 <meta http-equiv="Content-Type" content="text/html; charset=gbk">
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([a-zA-Z0-9_\-]+)', re.IGNORECASE)
+
+
 class CrawlStrategy(ABC):
     """爬取策略抽象基类"""
     def __init__(self, max_depth: int, max_pages: int):
@@ -73,22 +85,273 @@ class DFSCrawlStrategy(CrawlStrategy):
         return None
 
 
+# 代码语言标记，如 language-python、lang-js、highlight-source-go、brush: java
+CODE_LANGUAGE_PATTERN = re.compile(r'(?:^|\s)(?:(?:language|lang|highlight-source)-|brush:\s*)([\w+#.-]+)', re.IGNORECASE)
+
+# 未转义的竖线
+UNESCAPED_PIPE_PATTERN = re.compile(r'(?<!\\)\|')
+
+
+class StructuredMarkdownConverter(markdownify.MarkdownConverter):
+    """
+    保留代码语言和表格结构的Markdown转换器
+
+    - 代码块：从pre/code的class或data-lang属性识别语言，输出 ```python 形式的围栏
+    - 表格：单元格内的换行和竖线会被转义，colspan展开为多个单元格，嵌套表格压平为文本，
+      保证每一行表格都是一行合法的Markdown，下游按行识别表格时不会出错
+    """
+
+    @staticmethod
+    def _code_language(el) -> str:
+        candidates = [el]
+        code = el.find('code')
+        if code is not None:
+            candidates.append(code)
+        for node in candidates:
+            for attr in ('data-lang', 'data-language'):
+                if node.get(attr):
+                    return node.get(attr).strip().lower()
+            match = CODE_LANGUAGE_PATTERN.search(' '.join(node.get('class', [])))
+            if match:
+                return match.group(1).lower()
+        return ''
+
+    def convert_pre(self, el, text, convert_as_inline):
+        if not text:
+            return ''
+        code_language = self._code_language(el) or self.options['code_language']
+        # 代码本身包含```时使用更长的围栏
+        fence = '```'
+        while fence in text:
+            fence += '`'
+        return '\n%s%s\n%s\n%s\n' % (fence, code_language, text, fence)
+
+    @staticmethod
+    def _colspan(el) -> int:
+        try:
+            return max(1, min(int(el.get('colspan', 1)), 100))
+        except (TypeError, ValueError):
+            return 1
+
+    def _convert_cell(self, el, text):
+        text = UNESCAPED_PIPE_PATTERN.sub(r'\\|', ' '.join(text.split()))
+        return ' ' + text + ' |' + ' |' * (self._colspan(el) - 1)
+
+    def convert_br(self, el, text, convert_as_inline):
+        if convert_as_inline:
+            # 单元格和标题内的换行保留为空格，避免相邻文字粘连
+            return ' '
+        return super().convert_br(el, text, convert_as_inline)
+
+    def convert_td(self, el, text, convert_as_inline):
+        return self._convert_cell(el, text)
+
+    def convert_th(self, el, text, convert_as_inline):
+        return self._convert_cell(el, text)
+
+    def convert_table(self, el, text, convert_as_inline):
+        if convert_as_inline:
+            # 嵌套在单元格中的表格压平为一行文本
+            return ' '.join(UNESCAPED_PIPE_PATTERN.sub(' ', text).split())
+        return '\n\n' + text + '\n'
+
+    def convert_tr(self, el, text, convert_as_inline):
+        if convert_as_inline:
+            return text + ' '
+        cells = el.find_all(['td', 'th'], recursive=False)
+        width = sum(self._colspan(cell) for cell in cells)
+        is_headrow = bool(cells) and all(cell.name == 'th' for cell in cells)
+        overline = ''
+        underline = ''
+        if is_headrow and not el.previous_sibling:
+            underline += '| ' + ' | '.join(['---'] * width) + ' |' + '\n'
+        elif (not el.previous_sibling
+              and (el.parent.name == 'table'
+                   or (el.parent.name == 'tbody'
+                       and not el.parent.previous_sibling))):
+            overline += '| ' + ' | '.join([''] * width) + ' |' + '\n'
+            overline += '| ' + ' | '.join(['---'] * width) + ' |' + '\n'
+        return overline + '|' + text + '\n' + underline
+
+
+def create_markdown_converter() -> StructuredMarkdownConverter:
+    """创建页面转换使用的Markdown转换器"""
+    return StructuredMarkdownConverter(
+        heading_style="ATX",
+        bullets="-",
+        strip=['script', 'style']
+    )
+
+
+class MarkdownStreamCleaner:
+    """
+    流式版本的Markdown清理，结果与 BeautifulSoupCrawler._clean_markdown 对整段文本的处理一致
+
+    片段之间可能在行中间断开，未结束的行会保留到下一个片段再处理。
+
+    record_blocks为True时，同时按片段所属的节点记录清理后文本中的结构块（见 app.core.markdown_blocks）：
+    每个片段附带其节点的块信息，同一节点产出的行组成一个块，分段时直接使用，不需要重新扫描Markdown。
+    行在哪个片段中开始就属于哪个节点。块中的Token数由分段时补全（见 complete_blocks）。
+    """
+
+    def __init__(self, record_blocks: bool = False):
+        self._partial = ""
+        self._partial_owner: Optional[Dict[str, Any]] = None
+        self._started = False
+        self._pending_blank = False
+        self._line_index = -1
+        self._offset = 0
+        self._owner: Optional[Dict[str, Any]] = None
+        self.blocks: Optional[List[Dict[str, Any]]] = [] if record_blocks else None
+
+    def _emit_line(self, line: str, owner: Optional[Dict[str, Any]] = None) -> str:
+        line = line.strip()
+        if not line:
+            # 空行只在已有内容后记录，连续空行合并为一个
+            if self._started:
+                self._pending_blank = True
+            return ""
+        separator = ""
+        if self._started:
+            separator = "\n\n" if self._pending_blank else "\n"
+        self._started = True
+        self._pending_blank = False
+        self._line_index += separator.count("\n") if separator else 1
+        start = self._offset + len(separator)
+        self._offset = start + len(line)
+        if self.blocks is not None:
+            self._record_line(line, owner, start, separator == "\n\n")
+        return separator + line
+
+    def _record_line(self, line: str, owner: Optional[Dict[str, Any]], start: int, after_blank: bool):
+        # 同一节点的后续行归入当前块，普通段落在空行处分开；不同节点的文本之间没有空行时在Markdown中属于同一段落
+        block_type = (owner or {'type': BLOCK_PARAGRAPH})['type']
+        if owner is not None and owner is self._owner and self.blocks:
+            same_block = not (after_blank and block_type == BLOCK_PARAGRAPH)
+        else:
+            same_block = (bool(self.blocks) and not after_blank and block_type == BLOCK_PARAGRAPH
+                          and self.blocks[-1]['type'] == BLOCK_PARAGRAPH)
+        self._owner = owner
+        if same_block:
+            block = self.blocks[-1]
+            block['end_line'] = self._line_index
+            block['end'] = self._offset
+            return
+        block = dict(owner or {'type': BLOCK_PARAGRAPH})
+        if block['type'] == BLOCK_HEADING:
+            match = HEADER_PATTERN.match(line)
+            if match:
+                block.update(level=len(match.group(1)), text=match.group(2).strip())
+            else:
+                block = {'type': BLOCK_PARAGRAPH}
+        block.update(start_line=self._line_index, end_line=self._line_index, start=start, end=self._offset)
+        self.blocks.append(block)
+
+    def feed(self, fragment: str, block: Optional[Dict[str, Any]] = None) -> str:
+        """
+        输入一个Markdown片段，返回可以写出的清理后文本
+
+        Args:
+            fragment: Markdown片段
+            block: 片段所属节点的块信息（type，标题的level，代码块的language），只在record_blocks时使用
+        """
+        if not fragment:
+            return ""
+        if not self._partial.strip():
+            self._partial_owner = block
+        lines = (self._partial + fragment).split('\n')
+        self._partial = lines.pop()
+        text = "".join(
+            self._emit_line(line, self._partial_owner if index == 0 else block)
+            for index, line in enumerate(lines)
+        )
+        if lines:
+            self._partial_owner = block
+        return text
+
+    def close(self) -> str:
+        """处理剩余内容，结尾的空行会被丢弃"""
+        text = self._emit_line(self._partial, self._partial_owner)
+        self._partial = ""
+        return text
+
+
 class BeautifulSoupCrawler:
     """基于BeautifulSoup的网页爬虫"""
     
-    def __init__(self, session: aiohttp.ClientSession):
+    def __init__(self, session: aiohttp.ClientSession, large_page_threshold: int = 0,
+                 max_page_bytes: int = 0):
+        """
+        初始化爬虫
+
+        Args:
+            session: aiohttp会话
+            large_page_threshold: 页面字节数达到该值时启用大页面模式（流式写出Markdown），0表示不启用
+            max_page_bytes: 单个页面允许下载的最大字节数，超出则放弃该页面，0表示不限制
+
+        页面HTML仍会完整解析为文档树，max_page_bytes限制的是下载大小，内存峰值约为该大小的数倍；
+        大页面模式省去的是整页HTML字符串和Markdown字符串，而不是文档树本身。
+        """
         self.session = session
+        self.large_page_threshold = large_page_threshold
+        self.max_page_bytes = max_page_bytes
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
 
-    async def fetch_page(self, url: str) -> Dict[str, Any]:
-        """获取单个页面的内容"""
+    async def _read_body(self, response: aiohttp.ClientResponse) -> bytes:
+        """分块读取响应体，超过单页大小上限时抛出异常"""
+        if self.max_page_bytes and response.content_length and response.content_length > self.max_page_bytes:
+            raise ValueError(f"页面大小 {response.content_length} 字节超过上限 {self.max_page_bytes} 字节")
+        body = bytearray()
+        async for block in response.content.iter_chunked(64 * 1024):
+            body.extend(block)
+            if self.max_page_bytes and len(body) > self.max_page_bytes:
+                raise ValueError(f"页面大小超过上限 {self.max_page_bytes} 字节")
+        return bytes(body)
+
+    @staticmethod
+    def _decode_body(body: bytes, charset: Optional[str]) -> str:
+        """
+        按响应头的charset解码页面，没有时依次使用HTML中meta声明的编码、UTF-8和chardet检测的编码
+
+        响应体已经分块读取，不能再调用 response.get_encoding()（它需要aiohttp自己读取的响应体）。
+        """
+        match = None if charset else META_CHARSET_PATTERN.search(body[:4096])
+        encoding = charset or (match.group(1).decode('ascii') if match else None)
+        if encoding:
+            try:
+                return body.decode(encoding, errors='replace')
+            except LookupError:
+                pass  # 无法识别的编码名
+        try:
+            return body.decode('utf-8')
+        except UnicodeDecodeError:
+            pass
+        detected = chardet.detect(body[:64 * 1024]).get('encoding') or 'utf-8'
+        try:
+            return body.decode(detected, errors='replace')
+        except LookupError:
+            return body.decode('utf-8', errors='replace')
+
+    async def fetch_page(self, url: str, keep_html: bool = True) -> Dict[str, Any]:
+        """
+        获取单个页面的内容
+
+        Args:
+            url: 页面URL
+            keep_html: 是否在结果中保留原始HTML，转换时不需要原始HTML，可以尽早释放
+        """
         try:
             async with self.session.get(url, headers=self.headers, timeout=30) as response:
                 if response.status == 200:
-                    html = await response.text()
+                    body = await self._read_body(response)
+                    page_bytes = len(body)
+                    html = self._decode_body(body, response.charset)
+                    del body
                     soup = BeautifulSoup(html, 'html.parser')
+                    if not keep_html:
+                        html = ""
                     
                     # 提取标题
                     title_tag = soup.find('title')
@@ -108,6 +371,7 @@ class BeautifulSoupCrawler:
                         'links': links,
                         'html': html,
                         'soup': soup,
+                        'page_bytes': page_bytes,
                         'success': True,
                         'status_code': response.status
                     }
@@ -161,12 +425,22 @@ class BeautifulSoupCrawler:
         except:
             return False
     
-    async def convert_to_markdown(self, url: str, included_selector: str = None, 
-                                excluded_selector: str = None) -> Dict[str, Any]:
-        """将URL转换为Markdown"""
+    async def convert_to_markdown(self, url: str, included_selector: str = None,
+                                excluded_selector: str = None,
+                                output_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        将URL转换为Markdown
+
+        Args:
+            url: 页面URL
+            included_selector: 包含的选择器
+            excluded_selector: 排除的选择器
+            output_path: 大页面模式下Markdown的写出路径；页面达到large_page_threshold时，
+                Markdown按顶层元素逐块转换并直接写入该文件，结果中返回markdown_path而不是markdown字符串
+        """
         try:
-            page_data = await self.fetch_page(url)
-            
+            page_data = await self.fetch_page(url, keep_html=False)
+
             if not page_data['success']:
                 return {
                     'url': url,
@@ -178,6 +452,8 @@ class BeautifulSoupCrawler:
                 }
             
             soup = page_data['soup']
+            # 解除结果字典对整棵文档树的引用，选出正文后即可释放其余部分
+            page_data['soup'] = None
             
             # 应用选择器过滤
             content_soup = soup
@@ -219,7 +495,8 @@ class BeautifulSoupCrawler:
                         # 选择最大的元素作为主要内容
                         largest_element = max(elements, key=lambda x: len(x.get_text()))
                         if len(largest_element.get_text().strip()) > 100:  # 确保有足够的内容
-                            content_soup = largest_element
+                            # 从文档树中摘出正文子树，便于释放页面其余部分
+                            content_soup = largest_element.extract()
                             used_selector = selector
                             print(f"智能选择器: {selector}")
                             break
@@ -231,6 +508,10 @@ class BeautifulSoupCrawler:
                 for tag in soup(['script', 'style', 'nav', 'footer', 'header', 'aside', 'menu']):
                     tag.decompose()
                 content_soup = soup
+            else:
+                # 正文已独立于原文档树，释放页面其余部分
+                soup.decompose()
+            soup = None
             
             # 应用排除选择器
             if excluded_selector:
@@ -240,20 +521,41 @@ class BeautifulSoupCrawler:
                 except Exception as e:
                     print(f"应用排除选择器失败 {excluded_selector}: {e}")
             
-            # 转换为Markdown
-            markdown = markdownify.markdownify(
-                str(content_soup),
-                heading_style="ATX",
-                bullets="-",
-                strip=['script', 'style']
-            )
+            # 大页面模式：逐块转换并直接写入磁盘，不在内存中保留整页的HTML字符串和Markdown字符串
+            if (output_path and self.large_page_threshold and
+                    page_data.get('page_bytes', 0) >= self.large_page_threshold):
+                print(f"大页面模式: {url} ({page_data['page_bytes']} 字节)，流式写入 {output_path}")
+                written = self._stream_markdown_to_file(content_soup, output_path)
+                content_soup = None
+                if not written:
+                    # 没有任何内容，删除空文件
+                    if os.path.exists(output_path):
+                        os.remove(output_path)
+                    return {
+                        'url': url,
+                        'markdown': "",
+                        'title': page_data['title'],
+                        'success': True,
+                        'status_code': page_data['status_code']
+                    }
+                return {
+                    'url': url,
+                    'markdown': "",
+                    'markdown_path': output_path,
+                    'large_page': True,
+                    'title': page_data['title'],
+                    'success': True,
+                    'status_code': page_data['status_code']
+                }
             
-            # 清理Markdown内容
-            markdown = self._clean_markdown(markdown)
+            # 按顶层节点转换已解析的文档树并清理，同时记录每个节点的结构块，分段时直接使用
+            markdown, blocks = self._convert_with_blocks(content_soup)
+            content_soup = None
             
             return {
                 'url': url,
                 'markdown': markdown,
+                'blocks': blocks,
                 'title': page_data['title'],
                 'success': True,
                 'status_code': page_data['status_code']
@@ -269,6 +571,84 @@ class BeautifulSoupCrawler:
                 'status_code': 0
             }
     
+    def _iter_top_level_nodes(self, content_soup):
+        """
+        逐个产出正文的顶层节点
+
+        只穿透没有Markdown语义的容器标签（html/body/div等），列表、表格等节点作为整体转换，
+        保证逐块转换的结果与整体转换一致。
+        """
+        container_tags = {'[document]', 'html', 'body', 'main', 'div', 'article', 'section'}
+        stack = [content_soup]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Tag) and node.name in container_tags:
+                # 逆序压栈，保证按文档顺序产出
+                stack.extend(reversed(list(node.children)))
+            else:
+                yield node
+
+    @staticmethod
+    def _node_block(node) -> Dict[str, Any]:
+        """顶层节点对应的块类型，标题记录级别，代码块记录语言"""
+        name = node.name if isinstance(node, Tag) else None
+        if name in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+            return {'type': BLOCK_HEADING, 'level': int(name[1])}
+        if name == 'pre':
+            return {'type': BLOCK_CODE, 'language': StructuredMarkdownConverter._code_language(node)}
+        if name == 'table':
+            return {'type': BLOCK_TABLE}
+        if name in ('ul', 'ol'):
+            return {'type': BLOCK_LIST}
+        if name == 'blockquote':
+            return {'type': BLOCK_QUOTE}
+        return {'type': BLOCK_PARAGRAPH}
+
+    def _iter_markdown_fragments(self, content_soup) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """逐个顶层节点转换为Markdown，产出 (片段, 块信息)，转换后的节点从树中移除"""
+        converter = create_markdown_converter()
+        for node in self._iter_top_level_nodes(content_soup):
+            block = self._node_block(node)
+            if isinstance(node, (Comment, Doctype)):
+                fragment = ""
+            elif isinstance(node, NavigableString):
+                fragment = converter.process_text(node)
+            else:
+                fragment = converter.process_tag(node, convert_as_inline=False)
+            # 转换完成后立即从树中移除该节点，释放内存
+            node.extract()
+            if isinstance(node, Tag):
+                node.decompose()
+            yield fragment, block
+
+    def _convert_with_blocks(self, content_soup) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        转换为清理后的Markdown，同时得到转换器产出的结构块
+
+        Returns:
+            Tuple[str, List[Dict[str, Any]]]: (Markdown, 结构块)，结构块的行号和字符偏移对应返回的Markdown
+        """
+        cleaner = MarkdownStreamCleaner(record_blocks=True)
+        parts = [cleaner.feed(fragment, block) for fragment, block in self._iter_markdown_fragments(content_soup)]
+        parts.append(cleaner.close())
+        return "".join(parts), cleaner.blocks
+
+    def _stream_markdown_to_file(self, content_soup, output_path: str) -> int:
+        """按顶层节点逐块转换为Markdown并写入文件，返回写入的字符数"""
+        cleaner = MarkdownStreamCleaner()
+        written = 0
+        with open(output_path, 'w', encoding='utf-8') as f:
+            for fragment, _ in self._iter_markdown_fragments(content_soup):
+                text = cleaner.feed(fragment)
+                if text:
+                    f.write(text)
+                    written += len(text)
+            text = cleaner.close()
+            if text:
+                f.write(text)
+                written += len(text)
+        return written
+
     def _clean_markdown(self, markdown: str) -> str:
         """清理Markdown内容"""
         if not markdown:
@@ -309,9 +689,10 @@ class CrawlerEngineService:
             return BFSCrawlStrategy(max_depth, max_pages)
     
     @staticmethod
-    def create_crawler(session: aiohttp.ClientSession) -> BeautifulSoupCrawler:
+    def create_crawler(session: aiohttp.ClientSession, large_page_threshold: int = 0,
+                       max_page_bytes: int = 0) -> BeautifulSoupCrawler:
         """创建爬虫实例"""
-        return BeautifulSoupCrawler(session)
+        return BeautifulSoupCrawler(session, large_page_threshold, max_page_bytes)
     
     @staticmethod
     def process_url(url: str) -> str:
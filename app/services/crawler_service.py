@@ -12,7 +12,10 @@ from concurrent.futures import ThreadPoolExecutor
 import uuid
 import re
 from app.core.config import settings
+from app.core.job_scheduler import scheduler
 from app.services.system_service import SystemService
+from app.services.registry_service import RegistryWriter
+from app.services.asset_service import MediaStore
 from app.services.notification_service import (
     send_convert_start,
     send_convert_progress,
@@ -30,7 +33,10 @@ from app.utils.path_utils import (
 import aiohttp
 
 # 导入智能分段工具
-from app.core.markdown_splitter import MarkdownSplitter
+from app.core.split_pool import (
+    split_markdown_async, split_markdown_file_async, resolve_split_tokens, write_chunk_file, remove_chunk_file,
+    save_chunk_tree
+)
 
 # 导入爬虫引擎服务
 from app.services.crawler_engine_service import (
@@ -44,9 +50,6 @@ from app.services.crawler_engine_service import (
 
 class CrawlerService:
     """爬虫服务类，提供爬虫相关的业务逻辑"""
-    
-    # 类变量用于跟踪运行中的任务
-    _running_tasks: Dict[str, asyncio.Task] = {}
 
     @staticmethod
     async def start_crawl_task(
@@ -57,69 +60,43 @@ class CrawlerService:
         exclude_patterns: Optional[List[str]] = None,
         crawl_strategy: str = settings.DEFAULT_CRAWL_STRATEGY,
         force_refresh: bool = False,
-        project_id: Optional[str] = None
+        project_id: Optional[str] = None,
+        priority: Optional[int] = None
     ) -> Dict[str, Any]:
-        """启动爬虫异步任务，爬取指定URL的链接"""
+        """提交爬虫任务到任务调度器，爬取指定URL的链接"""
         try:
-            # 生成任务ID
-            task_id = f"crawl_{project_id}_{int(time.time())}"
-            
-            # 创建爬虫异步任务
-            task = asyncio.create_task(
-                CrawlerService.crawl_urls_async(
-                    start_url=url,
-                    max_depth=max_depth,
-                    max_pages=max_pages,
-                    include_patterns=include_patterns,
-                    exclude_patterns=exclude_patterns,
-                    crawl_strategy=crawl_strategy,
-                    force_refresh=force_refresh,
-                    project_id=project_id
-                )
+            job = scheduler.submit(
+                "crawl",
+                {
+                    "start_url": url,
+                    "max_depth": max_depth,
+                    "max_pages": max_pages,
+                    "include_patterns": include_patterns,
+                    "exclude_patterns": exclude_patterns,
+                    "crawl_strategy": crawl_strategy,
+                    "force_refresh": force_refresh,
+                    "project_id": project_id
+                },
+                project_id=project_id,
+                priority=priority if priority is not None else scheduler.priority_for_size(max_pages),
+                description=f"爬取链接: {url}"
             )
-            
-            # 保存任务引用
-            CrawlerService._running_tasks[task_id] = task
+            task_id = job["job_id"]
             
             # 将任务信息保存到文件
             with open(get_project_output_path(project_id, "crawler_task.json"), "w") as f:
                 json.dump({"task_id": task_id, "start_time": time.time()}, f)
             
-            # 设置任务完成回调
-            task.add_done_callback(lambda t: CrawlerService._cleanup_task(task_id))
-            
-            print(f"后台异步任务创建成功，任务ID: {task_id}")
+            print(f"爬虫任务已提交，任务ID: {task_id}")
             return {
                 "status": "success",
-                "message": f"爬虫任务已开始，使用{crawl_strategy}策略，请稍后查看结果"
+                "message": f"爬虫任务已开始，使用{crawl_strategy}策略，请稍后查看结果",
+                "job_id": task_id
             }
         except Exception as e:
             logging.error(f"启动爬虫任务失败: {str(e)}")
             raise
 
-    @staticmethod
-    def _cleanup_task(task_id: str):
-        """清理完成的任务"""
-        try:
-            if task_id in CrawlerService._running_tasks:
-                task = CrawlerService._running_tasks[task_id]
-                # 检查任务是否有异常
-                if task.done() and not task.cancelled():
-                    try:
-                        # 获取任务结果，如果有异常会被抛出
-                        task.result()
-                        print(f"任务 {task_id} 成功完成")
-                    except Exception as e:
-                        logging.error(f"任务 {task_id} 执行时发生异常: {str(e)}")
-                        print(f"任务 {task_id} 执行失败: {str(e)}")
-                elif task.cancelled():
-                    print(f"任务 {task_id} 已被取消")
-                
-                del CrawlerService._running_tasks[task_id]
-                print(f"已清理任务: {task_id}")
-        except Exception as e:
-            logging.error(f"清理任务时出错: {str(e)}")
-
     @staticmethod
     def stop_crawl(project_id: Optional[str] = None) -> Dict[str, Any]:
         """强制停止当前运行的爬虫任务"""
@@ -145,17 +122,9 @@ class CrawlerService:
         
         # 检查任务是否存在并且正在运行
         task_found = False
-        if task_id and task_id in CrawlerService._running_tasks:
-            task = CrawlerService._running_tasks[task_id]
-            if not task.done():
-                # 取消任务
-                task.cancel()
-                task_found = True
-                print(f"已取消运行中的任务: {task_id}")
-            else:
-                # 任务已完成，清理引用
-                del CrawlerService._running_tasks[task_id]
-                print(f"任务已完成: {task_id}")
+        if task_id and scheduler.cancel(task_id):
+            task_found = True
+            print(f"已取消爬虫任务: {task_id}")
         
         if not task_found:
             # 删除任务信息文件
@@ -319,9 +288,11 @@ class CrawlerService:
         max_tokens: Optional[int] = 8000,
         min_tokens: Optional[int] = 500,
         split_strategy: Optional[str] = "balanced",
-        project_id: Optional[str] = None
+        project_id: Optional[str] = None,
+        priority: Optional[int] = None,
+        capture_assets: bool = False
     ) -> Dict[str, Any]:
-        """启动URL转换为Markdown的异步任务"""
+        """提交URL转换为Markdown的任务到任务调度器"""
         if not urls:
             print("没有需要转换的URL")
             return {
@@ -337,40 +308,37 @@ class CrawlerService:
         # 设置默认输出目录
         output_dir = join_paths(settings.OUTPUT_DIR, str(project_id), "markdown")
         try:
-            # 生成任务ID
-            task_id = f"convert_{project_id}_{int(time.time())}"
-            
-            # 创建异步任务
-            task = asyncio.create_task(
-                CrawlerService.convert_urls_to_markdown(
-                    urls=urls,
-                    output_dir=output_dir,
-                    included_selector=included_selector,
-                    excluded_selector=excluded_selector,
-                    enable_smart_split=enable_smart_split,
-                    max_tokens=max_tokens,
-                    min_tokens=min_tokens,
-                    split_strategy=split_strategy,
-                    project_id=project_id
-                )
+            job = scheduler.submit(
+                "convert",
+                {
+                    "urls": urls,
+                    "output_dir": output_dir,
+                    "included_selector": included_selector,
+                    "excluded_selector": excluded_selector,
+                    "enable_smart_split": enable_smart_split,
+                    "max_tokens": max_tokens,
+                    "min_tokens": min_tokens,
+                    "split_strategy": split_strategy,
+                    "project_id": project_id,
+                    "capture_assets": capture_assets
+                },
+                project_id=project_id,
+                priority=priority if priority is not None else scheduler.priority_for_size(len(urls)),
+                description=f"转换{len(urls)}个URL"
             )
-            
-            # 保存任务引用
-            CrawlerService._running_tasks[task_id] = task
+            task_id = job["job_id"]
             
             # 将任务信息保存到文件
             with open(get_project_output_path(project_id, "convert_task.json"), "w") as f:
                 json.dump({"task_id": task_id, "start_time": time.time()}, f)
             
-            # 设置任务完成回调
-            task.add_done_callback(lambda t: CrawlerService._cleanup_task(task_id))
-            
             smart_split_info = f"，智能分段: {'开启' if enable_smart_split else '关闭'}"
-            print(f"转换任务已开始，任务ID: {task_id}{smart_split_info}")
+            print(f"转换任务已提交，任务ID: {task_id}{smart_split_info}")
             
             return {
                 "status": "success",
-                "message": f"转换任务已开始，共{len(urls)}个URL{smart_split_info}，请稍后查看结果"
+                "message": f"转换任务已开始，共{len(urls)}个URL{smart_split_info}，请稍后查看结果",
+                "job_id": task_id
             }
         except Exception as e:
             logging.error(f"启动转换任务失败: {str(e)}")
@@ -541,6 +509,8 @@ class CrawlerService:
                             with open(output_json_file, "w", encoding="utf-8") as f:
                                 json.dump(crawled_data, f, ensure_ascii=False, indent=2)
                             
+                            scheduler.report_progress(count, max_pages)
+                            
                             # 检查是否达到最大页面数
                             if count >= max_pages:
                                 print(f"爬取完成，共找到 {count} 个URL")
@@ -572,6 +542,8 @@ class CrawlerService:
             # 记录错误状态
             with open(get_project_output_path(project_id, "crawler_status.json"), "w", encoding="utf-8") as f:
                 json.dump({"status": "failed", "message": f"爬虫任务失败: {error_msg}"}, f)
+            # 抛出异常，由任务调度器将任务记录为失败
+            raise
         
         return crawled_urls
 
@@ -585,7 +557,8 @@ class CrawlerService:
         max_tokens: Optional[int] = 8000,
         min_tokens: Optional[int] = 500,
         split_strategy: Optional[str] = "balanced",
-        project_id: Optional[str] = None
+        project_id: Optional[str] = None,
+        capture_assets: bool = False
     ) -> List[str]:
         """
         将URL列表转换为Markdown文件
@@ -600,6 +573,7 @@ class CrawlerService:
             min_tokens: 最小分段长度
             split_strategy: 分段策略
             project_id: 项目ID
+            capture_assets: 是否下载页面引用的图片到项目媒体库并改写为本地链接
         
         Returns:
             List[str]: 生成的文件路径列表
@@ -621,6 +595,11 @@ class CrawlerService:
         notification_service = await send_convert_start(project_id, total_urls)
         print(f"通知服务初始化成功，任务ID: {notification_service.get_task_id()}")
 
+        # 注册表批量写入器，避免每个文件都完整读写一次注册表
+        registry_writer = RegistryWriter(project_id)
+        # 项目媒体库，仅在采集图片时使用
+        media_store = MediaStore(project_id) if capture_assets else None
+
         try:
             print("开始创建aiohttp ClientSession...")
             async with aiohttp.ClientSession(
@@ -628,7 +607,11 @@ class CrawlerService:
                 connector=aiohttp.TCPConnector(limit=3, ttl_dns_cache=300, use_dns_cache=True)
             ) as session:
                 print("ClientSession创建成功，初始化爬虫...")
-                crawler = CrawlerEngineService.create_crawler(session)
+                crawler = CrawlerEngineService.create_crawler(
+                    session,
+                    large_page_threshold=settings.LARGE_PAGE_THRESHOLD_BYTES,
+                    max_page_bytes=settings.MAX_PAGE_BYTES
+                )
                 
                 # 并发处理URL，但限制并发数
                 semaphore = asyncio.Semaphore(1)  # 降低并发数到1，避免死锁
@@ -641,13 +624,15 @@ class CrawlerService:
                         processed_urls += 1
                         
                         print(f"[{processed_urls}/{total_urls}] 开始转换链接: {url}")
+                        scheduler.report_progress(processed_urls - 1, total_urls)
                         
                         try:
                             # 转换URL为Markdown
                             result = await crawler.convert_to_markdown(
                                 url, 
                                 included_selector=included_selector,
-                                excluded_selector=excluded_selector
+                                excluded_selector=excluded_selector,
+                                output_path=join_paths(output_dir, CrawlerService.url_to_filename(url))
                             )
                             print(f"转换完成: {url} - 成功: {result['success']}")
                         except Exception as e:
@@ -660,71 +645,70 @@ class CrawlerService:
                                 'title': ''
                             }
                         
-                        if result['success'] and result['markdown'] and result['markdown'].strip():
+                        # 大页面模式下Markdown已直接写入磁盘
+                        large_page_path = result.get('markdown_path')
+                        has_content = bool(large_page_path) or bool(result['markdown'] and result['markdown'].strip())
+                        
+                        if result['success'] and has_content:
                             successful_urls += 1
                             
-                            # 根据分段策略调整参数
-                            actual_max_tokens = max_tokens
-                            actual_min_tokens = min_tokens
+                            if media_store:
+                                await CrawlerService._capture_result_assets(media_store, session, result, output_dir)
                             
-                            if split_strategy == "conservative":
-                                actual_max_tokens = int(max_tokens * 1.2)  # 更大的分段
-                                actual_min_tokens = int(min_tokens * 1.5)
-                            elif split_strategy == "aggressive":
-                                actual_max_tokens = int(max_tokens * 0.8)  # 更小的分段
-                                actual_min_tokens = int(min_tokens * 0.7)
+                            # 根据分段策略调整参数
+                            actual_max_tokens, actual_min_tokens = resolve_split_tokens(max_tokens, min_tokens, split_strategy)
                             
                             if enable_smart_split:
                                 # 启用智能分段
                                 try:
                                     print(f"对 {result['url']} 启用智能分段 (策略: {split_strategy}, Token范围: {actual_min_tokens}-{actual_max_tokens})")
                                     
-                                    # 创建智能分段器
-                                    splitter = MarkdownSplitter(
-                                        max_tokens=actual_max_tokens,
-                                        min_tokens=actual_min_tokens
-                                    )
+                                    # 获取基础文件名（不含扩展名），分段文件命名：xxx-1.md, xxx-2.md
+                                    base_filename = CrawlerService.url_to_filename(result['url'])
+                                    base_name = base_filename.replace('.md', '')
                                     
-                                    # 执行分段
-                                    chunks = splitter.create_chunks(result['markdown'])
+                                    # 分段在进程池中执行，不阻塞事件循环
+                                    if large_page_path:
+                                        # 大页面从磁盘流式分段，分段确定后立即写出，不把整页读入内存
+                                        chunk_paths = await split_markdown_file_async(
+                                            large_page_path, output_dir, base_name, actual_max_tokens, actual_min_tokens
+                                        )
+                                    else:
+                                        # 直接使用转换时产出的结构块的边界分段
+                                        chunks = await split_markdown_async(
+                                            result['markdown'], actual_max_tokens, actual_min_tokens, blocks=result.get('blocks')
+                                        )
+                                        chunk_paths = []
+                                        if len(chunks) > 1:
+                                            chunk_paths = [write_chunk_file(output_dir, base_name, chunk) for chunk in chunks]
+                                            save_chunk_tree(output_dir, base_name, chunks, chunk_paths)
                                     
-                                    if chunks and len(chunks) > 1:
-                                        # 获取基础文件名（不含扩展名）
-                                        base_filename = CrawlerService.url_to_filename(result['url'])
-                                        base_name = base_filename.replace('.md', '')
+                                    if len(chunk_paths) > 1:
+                                        # 为每个分段创建注册表条目（基于文件路径）
+                                        for chunk_filepath in chunk_paths:
+                                            registry_writer.update_markdown_registry_for_chunk(result['url'], chunk_filepath)
                                         
-                                        # 保存每个分段到原目录
-                                        for chunk in chunks:
-                                            # 简化文件命名：xxx-1.md, xxx-2.md
-                                            chunk_filename = f"{base_name}-{chunk.order}.md"
-                                            chunk_filepath = join_paths(output_dir, chunk_filename)
-                                            
-                                            # 直接保存分段内容，不添加复杂的元数据
-                                            chunk_content = f"# {chunk.title}\n\n{chunk.content}"
-                                            
-                                            with open(chunk_filepath, 'w', encoding='utf-8') as f:
-                                                f.write(chunk_content)
-                                            
-                                            # 为每个分段创建注册表条目（基于文件路径）
-                                            CrawlerService.update_markdown_registry_for_chunk(result['url'], chunk_filepath, project_id)
+                                        print(f"已保存智能分段内容: {len(chunk_paths)} 个分段文件到 {output_dir}")
                                         
-                                        print(f"已保存智能分段内容: {len(chunks)} 个分段文件到 {output_dir}")
+                                        # 大页面的未分段文件已被分段文件替代
+                                        if large_page_path and os.path.exists(large_page_path):
+                                            os.remove(large_page_path)
                                         
                                         # 更新爬取URL的文件路径（指向第一个分段）
-                                        first_chunk_filepath = join_paths(output_dir, f"{base_name}-1.md")
-                                        CrawlerService.update_crawled_url_filepath(result['url'], first_chunk_filepath, project_id)
+                                        registry_writer.update_crawled_url_filepath(result['url'], chunk_paths[0])
                                         
                                     else:
                                         # 分段结果少于2个，保存原始内容
+                                        for chunk_filepath in chunk_paths:
+                                            remove_chunk_file(chunk_filepath)
                                         filename = CrawlerService.url_to_filename(result['url'])
                                         filepath = join_paths(output_dir, filename)
                                         
-                                        with open(filepath, 'w', encoding='utf-8') as f:
-                                            f.write(result['markdown'])
+                                        CrawlerService._save_markdown_result(result, filepath)
                                         print(f"智能分段未产生多个分段，保存原始内容到: {filepath}")
                                         
-                                        CrawlerService.update_markdown_registry(result['url'], filepath, project_id)
-                                        CrawlerService.update_crawled_url_filepath(result['url'], filepath, project_id)
+                                        registry_writer.update_markdown_registry(result['url'], filepath)
+                                        registry_writer.update_crawled_url_filepath(result['url'], filepath)
                                         
                                 except Exception as e:
                                     print(f"智能分段失败 {result['url']}: {str(e)}，将保存原始内容")
@@ -732,23 +716,21 @@ class CrawlerService:
                                     filename = CrawlerService.url_to_filename(result['url'])
                                     filepath = join_paths(output_dir, filename)
                                     
-                                    with open(filepath, 'w', encoding='utf-8') as f:
-                                        f.write(result['markdown'])
+                                    CrawlerService._save_markdown_result(result, filepath)
                                     print(f"已保存原始内容到: {filepath}")
                                     
-                                    CrawlerService.update_markdown_registry(result['url'], filepath, project_id)
-                                    CrawlerService.update_crawled_url_filepath(result['url'], filepath, project_id)
+                                    registry_writer.update_markdown_registry(result['url'], filepath)
+                                    registry_writer.update_crawled_url_filepath(result['url'], filepath)
                             else:
                                 # 未启用智能分段，保存原始内容
                                 filename = CrawlerService.url_to_filename(result['url'])
                                 filepath = join_paths(output_dir, filename)
                                 
-                                with open(filepath, 'w', encoding='utf-8') as f:
-                                    f.write(result['markdown'])
+                                CrawlerService._save_markdown_result(result, filepath)
                                 print(f"已保存内容到: {filepath}")
                                 
-                                CrawlerService.update_markdown_registry(result['url'], filepath, project_id)
-                                CrawlerService.update_crawled_url_filepath(result['url'], filepath, project_id)
+                                registry_writer.update_markdown_registry(result['url'], filepath)
+                                registry_writer.update_crawled_url_filepath(result['url'], filepath)
                             
                             # 发送成功通知
                             success_message = f"已成功转换URL: {result['url']}"
@@ -808,6 +790,12 @@ class CrawlerService:
                 results = await asyncio.gather(*tasks, return_exceptions=True)
                 print(f"所有URL处理完成，结果: {len(results)}")
 
+            # 写入剩余的注册表变更
+            registry_writer.flush()
+            if media_store:
+                media_store.save_index()
+            scheduler.report_progress(processed_urls, total_urls)
+
             # 发送完成通知
             print(f"任务完成，发送完成通知...")
             await send_convert_complete(
@@ -825,6 +813,10 @@ class CrawlerService:
             error_msg = str(e)
             logging.error(f"转换任务失败: {error_msg}")
             print(f"转换任务失败: {error_msg}")
+            # 已保存的文件仍需登记到注册表
+            registry_writer.flush()
+            if media_store:
+                media_store.save_index()
             # 记录错误状态
             with open(get_project_output_path(project_id, "convert_status.json"), "w", encoding="utf-8") as f:
                 json.dump({"status": "failed", "message": f"转换任务失败: {error_msg}"}, f)
@@ -837,9 +829,40 @@ class CrawlerService:
                 total_urls,
                 error_msg
             )
+            # 抛出异常，由任务调度器将任务记录为失败
+            raise
 
         return urls
 
+    @staticmethod
+    def _save_markdown_result(result: Dict[str, Any], filepath: str):
+        """保存转换结果，大页面模式下内容已写入磁盘，必要时移动到目标路径"""
+        large_page_path = result.get('markdown_path')
+        if large_page_path:
+            if os.path.abspath(large_page_path) != os.path.abspath(filepath):
+                os.replace(large_page_path, filepath)
+        else:
+            with open(filepath, 'w', encoding='utf-8') as f:
+                f.write(result['markdown'])
+
+    @staticmethod
+    async def _capture_result_assets(media_store: MediaStore, session: aiohttp.ClientSession,
+                                     result: Dict[str, Any], output_dir: str):
+        """下载转换结果中引用的图片并改写链接，失败时保留原始链接；大页面模式下按行流式处理磁盘上的文件"""
+        try:
+            if result.get('markdown_path'):
+                stats = await media_store.localize_markdown_file(session, result['markdown_path'], result['url'], output_dir)
+            else:
+                result['markdown'], stats = await media_store.localize_markdown(
+                    session, result['markdown'], result['url'], output_dir
+                )
+            if not stats["images"]:
+                return
+            print(f"图片采集完成 {result['url']}: 本地化 {stats['localized']} 个，失败 {stats['failed']} 个")
+        except Exception as e:
+            logging.error(f"图片采集失败 {result['url']}: {str(e)}")
+            print(f"图片采集失败 {result['url']}: {str(e)}")
+
     @staticmethod
     def update_crawled_url_filepath(url, filepath, project_id: Optional[str] = None):
         """更新爬取的URL的文件路径"""
@@ -1157,3 +1180,8 @@ class CrawlerService:
             export_dir = os.path.join(settings.EXPORT_DIR)
             os.makedirs(export_dir, exist_ok=True)
             return export_dir
+
+
+# 注册后台任务处理函数
+scheduler.register_handler("crawl", CrawlerService.crawl_urls_async)
+scheduler.register_handler("convert", CrawlerService.convert_urls_to_markdown)
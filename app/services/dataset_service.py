@@ -1,22 +1,42 @@
 import os
+import re
 import json
 import logging
 import shutil
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
 from datetime import datetime
 import uuid
+from functools import lru_cache
 import aiohttp
 import asyncio
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 from app.core.config import settings
 from app.services.system_service import SystemService
 from app.core.websocket import manager
+from app.core.chunk_tree import load_chunk_tree, chunk_tree_path, collect_leaves
+from app.core.token_counter import get_token_counter
+from app.core.rate_limiter import RateLimiter
+from app.core.model_router import create_model_router
+from app.core.job_scheduler import scheduler
+from app.core.qa_journal import QAJournal, JOURNAL_SUFFIX
+from app.core.llm_cache import LLMResponseCache, get_llm_cache
+from app.utils.json_stream import QAPairStreamParser
+from app.utils.tolerant_json import tolerant_parse
+from app.services.batch_service import BatchService, BATCH_STATE_SUFFIX
 
 # 常量定义 - 使用settings中的配置
 EXPORT_FORMATS = settings.SUPPORTED_FORMATS
 DATASET_STYLES = settings.SUPPORTED_STYLES
 INPUT_FILE = os.path.join(settings.OUTPUT_DIR, "qa_dataset.jsonl")
+# 智能分段生成的分段文件：xxx-1.md, xxx-2.md，是否为分段文件以 xxx.tree.json 中的记录为准
+CHUNK_FILE_PATTERN = re.compile(r'^(.*)-(\d+)\.md$')
+# 多个小文件合并为一个请求时追加到系统提示词后的说明
+PACKED_PROMPT = (
+    '\n用户消息包含多个文档，每个文档以“【文档 编号 开始】”开头、以“【文档 编号 结束】”结尾。'
+    '请分别为每个文档生成问答对，问答对只能来自对应文档的内容，'
+    '并在每个问答对中增加 "doc_id" 字段，值为该文档的编号（如 "D1"）。'
+)
 
 # 在内存中存储转换状态
 conversion_state = {}
@@ -333,7 +353,8 @@ class DatasetService:
     # Markdown转换相关功能
     
     @staticmethod
-    def save_conversion_task_status(files: List[str], output_file: str, project_id: Optional[str] = None) -> Dict[str, Any]:
+    def save_conversion_task_status(files: List[str], output_file: str, project_id: Optional[str] = None,
+                                    job_id: Optional[str] = None) -> Dict[str, Any]:
         """启动文件转换任务"""
         # 用项目ID作为状态的key，以支持不同项目的并行转换
         task_key = output_file
@@ -346,64 +367,162 @@ class DatasetService:
             "message": "转换任务正在进行中...",
             "progress": 0,
             "total": len(files),
-            "project_id": project_id
+            "project_id": project_id,
+            "job_id": job_id
         }
         
-        return {"status": "success", "message": "转换任务已开始"}
+        return {"status": "success", "message": "转换任务已开始", "job_id": job_id}
     
     @staticmethod
-    async def convert_files_to_dataset_task(files: List[str], output_file: str, project_id: Optional[str] = None):
-        """转换文件到数据集的后台任务"""
+    def submit_conversion_job(files: List[str], output_file: str, project_id: Optional[str] = None,
+                              bypass_cache: bool = False, batch_mode: bool = False) -> Dict[str, Any]:
+        """
+        提交转换任务到任务调度器
+        
+        任务可以暂停、恢复和取消（见 JobScheduler），暂停或服务重启后恢复时，
+        生成日志中已完成的文件不再调用大模型。
+        
+        Returns:
+            Dict[str, Any]: 提交结果，包含任务ID
+        """
+        job = scheduler.submit(
+            "dataset",
+            {
+                "files": files,
+                "output_file": output_file,
+                "project_id": project_id,
+                "bypass_cache": bypass_cache,
+                "batch_mode": batch_mode
+            },
+            project_id=project_id,
+            priority=scheduler.priority_for_size(len(files)),
+            description=f"生成数据集: {output_file}"
+        )
+        return DatasetService.save_conversion_task_status(files, output_file, project_id, job["job_id"])
+    
+    @staticmethod
+    async def convert_files_to_dataset_task(files: List[str], output_file: str, project_id: Optional[str] = None,
+                                            bypass_cache: bool = False, batch_mode: bool = False):
+        """转换文件到数据集的调度器任务，失败时抛出异常，由调度器记录任务状态"""
         # 用项目ID作为状态的key
         task_key = output_file
         if project_id:
             task_key = f"{project_id}_{output_file}"
+        # 恢复暂停的任务或服务重启后重新运行时，内存中的转换状态需要重新建立
+        job = scheduler.current_job()
+        DatasetService.save_conversion_task_status(files, output_file, project_id, job["job_id"] if job else None)
             
         print(f"正在转换 {len(files)} 个文件, 项目ID: {project_id}")
         try:
-            await DatasetService.convert_files_to_dataset(files, output_file, project_id)
+            await DatasetService.convert_files_to_dataset(files, output_file, project_id, bypass_cache=bypass_cache,
+                                                          batch_mode=batch_mode)
             conversion_state[task_key]["status"] = "completed"
             conversion_state[task_key]["message"] = "转换任务已完成"
             conversion_state[task_key]["progress"] = conversion_state[task_key]["total"]
+        except asyncio.CancelledError:
+            # 暂停或取消：进行中的请求被中断，已完成的文件保留在生成日志中
+            conversion_state[task_key]["status"] = "interrupted"
+            conversion_state[task_key]["message"] = "转换任务已中断"
+            raise
         except Exception as e:
             conversion_state[task_key]["status"] = "failed"
             conversion_state[task_key]["message"] = f"转换任务失败: {str(e)}"
-            logging.error(f"转换任务失败: {str(e)}")
+            raise
+    
+    @staticmethod
+    async def cancel_conversion_job(files: List[str], output_file: str, project_id: Optional[str] = None,
+                                    bypass_cache: bool = False, batch_mode: bool = False):
+        """
+        转换任务被取消后调用（见 JobScheduler.register_handler）：取消服务端仍在运行的批量任务并删除批量任务状态文件
+
+        暂停时不调用，批量任务保留，恢复后继续等待。参数与 convert_files_to_dataset_task 相同。
+        """
+        state_path = DatasetService.get_conversion_output_path(output_file, project_id) + BATCH_STATE_SUFFIX
+        batches = BatchService.load_state(state_path)
+        if not batches:
+            return
+        default_model = DatasetService.get_default_model_config()
+        client = AsyncOpenAI(
+            api_key=default_model.get("apiKey") or settings.DEEPSEEK_API_KEY,
+            base_url=default_model.get("apiEndpoint", "https://api.deepseek.com")
+        )
+        try:
+            for batch_state in batches:
+                await BatchService.cancel(client, batch_state["batch_id"])
+        finally:
+            await client.close()
+            # 取消失败（如任务已经结束）时也删除状态，之后写入同一数据集的任务不再等待这些批量任务
+            BatchService.remove_state(state_path)
+    
+    @staticmethod
+    def get_conversion_output_path(output_file: str, project_id: Optional[str] = None) -> str:
+        """转换任务的数据集路径：项目目录下的output_file，没有项目ID时位于output目录"""
+        if project_id:
+            return os.path.join(settings.OUTPUT_DIR, str(project_id), output_file)
+        return os.path.join("output", output_file)
+    
+    @staticmethod
+    def get_default_model_config() -> Dict[str, Any]:
+        """读取models.json中的默认模型配置，未设置默认模型时返回空字典"""
+        models_list = SystemService._read_json_file(SystemService.MODELS_CONFIG_FILE, [])
+        for model_config in models_list:
+            if model_config.get("isDefault", False):
+                return model_config
+        return {}
+    
+    @staticmethod
+    def get_model_configs() -> List[Dict[str, Any]]:
+        """读取models.json中的全部模型配置（API密钥不做掩码处理）"""
+        return SystemService._read_json_file(SystemService.MODELS_CONFIG_FILE, [])
     
     @staticmethod
     async def convert_files_to_dataset(
         files: List[str],
         output_file: str = "qa_dataset.jsonl",
-        project_id: Optional[str] = None
+        project_id: Optional[str] = None,
+        bypass_cache: bool = False,
+        batch_mode: bool = False
     ) -> str:
-        """将Markdown文件转换为问答数据集"""
+        """
+        将Markdown文件转换为问答数据集
+        
+        多个文件并发调用大模型，并发数和每分钟请求数/Token数可以在models.json的模型配置中设置
+        （concurrency、rpm、tpm），未设置时使用 DATASET_CONCURRENCY / DATASET_DEFAULT_RPM / DATASET_DEFAULT_TPM。
+        并发数随请求顺利自动增加（不超过maxConcurrency / DATASET_MAX_CONCURRENCY），被限流时减半；
+        接口返回的限流响应头用于修正每分钟额度，限流和服务端错误按指数退避重试。
+        models.json中设置了 "routing": true 的模型和默认模型一起分担请求，按延迟、错误率和剩余额度分配，
+        某个模型出错时自动换一个模型重试，连续出错的模型暂时熔断（见 ModelRouter）。
+        每个文件的结果生成后立即写入追加式日志（数据集路径加 .journal），任务中断后用相同的输出文件重新转换时，
+        日志中已完成的文件直接使用已生成的结果。全部完成后问答对按文件顺序写入数据集。
+        
+        启用 LLM_CACHE_ENABLED 时，相同模型、提示词和内容的响应从缓存读取，不再调用大模型；
+        bypass_cache为True时不读取缓存，新的响应仍会写入缓存。
+        
+        DATASET_PACK_TOKENS大于0时，相邻的小文件合并为一个请求（见 pack_files、generate_packed_qa_pairs），
+        合并请求中没有得到问答对的文件再单独生成。
+        
+        batch_mode为True时使用批量接口（见 generate_batch），适合不需要实时结果的大任务。
+        
+        在任务调度器中运行时，已完成的文件数、生成的数据数和使用的Token数随进度保存到任务表，
+        任务暂停后恢复时Token数在之前的基础上累计。
+        """
         if not files:
             raise ValueError("文件列表不能为空")
         
         # 根据项目ID确定输出路径 - 修改路径结构
-        if project_id:
-            project_dir = os.path.join(settings.OUTPUT_DIR, str(project_id))
-            os.makedirs(project_dir, exist_ok=True)
-            output_path = os.path.join(project_dir, output_file)
-        else:
-            output_path = os.path.join("output", output_file)
+        output_path = DatasetService.get_conversion_output_path(output_file, project_id)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
             
-        results = []
         print(f"开始转换 {len(files)} 个文件, 项目ID: {project_id}")
         
         # 获取默认模型配置
-        models_list = SystemService._read_json_file(SystemService.MODELS_CONFIG_FILE, [])
-        default_model = {}
-        for model_config in models_list:
-            if model_config.get("isDefault", False):
-                default_model = model_config
-                break
+        default_model = DatasetService.get_default_model_config()
                 
         # 如果找到默认模型，使用其配置
         model_name = default_model.get("model", "deepseek-chat")
         base_url = default_model.get("apiEndpoint", "https://api.deepseek.com")
         api_key = default_model.get("apiKey", settings.DEEPSEEK_API_KEY)
-        print(f"model_name: {model_name}, base_url: {base_url}, api_key: {api_key}", {settings.DEEPSEEK_API_KEY})
+        print(f"model_name: {model_name}, base_url: {base_url}")
         # 如果API密钥仍为空，返回错误
         if not api_key:
             raise ValueError("未配置API密钥，请在系统设置中配置默认模型API密钥或在函数调用时提供API密钥")
@@ -432,186 +551,200 @@ class DatasetService:
         }, project_id)
         print(f"开始调用大模型转换md文件为数据集, 项目ID: {project_id}")
         
-        for i, file_path in enumerate(files):
-            try:
-                # 读取文件内容
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-                
-                # 调用API
-                client = OpenAI(api_key=api_key, base_url=base_url)
-                response = client.chat.completions.create(
-                    model=model_name,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": content}
-                    ],
-                    stream=False
-                )
-                print(f"response ok: {file_path}")
-                generated_text = response.choices[0].message.content
-                finish_reason = response.choices[0].finish_reason
-                print(f"获取到大模型的第 {i + 1} 个文件结果，长度为: {len(generated_text)}")
-                # 如果该值为 length，则表明当前模型生成内容所包含的 Tokens 数量超过请求中的 max_tokens 参数
-                print(f"finish_reason: {finish_reason}")
-                # 检查返回结果是否完整
-                if not generated_text:
-                    logging.warning(f"大模型返回空内容，跳过文件: {file_path}")
-                    continue
-
-                # 解析JSON响应，先简单处理返回的格式问题，如果返回的JSON格式不正确，则尝试多次修复
-                try:
-                    # 去除可能的Markdown代码块标记
-                    if generated_text.startswith("```"):
-                        # 查找第一个和最后一个```
-                        first_ticks = generated_text.find("\n", generated_text.find("```"))
-                        last_ticks = generated_text.rfind("```")
-                        if first_ticks != -1 and last_ticks != -1:
-                            # 提取```之间的内容
-                            generated_text = generated_text[first_ticks+1:last_ticks].strip()
-
-                    # 检查返回结果是否被截断
-                    is_truncated = not generated_text.strip().endswith('}') and '{' in generated_text
-                    if is_truncated:
-                        print(f"检测到第 {i + 1} 个文件的返回结果可能被截断，尝试修复...")
-                        logging.warning(f"大模型返回结果可能被截断: 文件 {file_path}")
-                        generated_text = DatasetService.fix_truncated_json(generated_text)
-                    result = json.loads(generated_text)
-                    
-                    # 处理qa_pairs字段
-                    if 'qa_pairs' in result and isinstance(result['qa_pairs'], list):
-                        for qa_pair in result['qa_pairs']:
-                            if isinstance(qa_pair, dict) and "question" in qa_pair and "answer" in qa_pair:
-                                # 标准化处理QA对字段
-                                standardized_qa_pair = DatasetService.standardize_qa_pair(qa_pair)
-                                standardized_qa_pair["source"] = file_path
-                                results.append(standardized_qa_pair)
-                        # 更新进度
-                        print(f"成功处理第 {i + 1} 个文件，生成 {len(results)} 个数据")
-                        await manager.send_json({
-                            "task_id": task_id,
-                            "type": "md_to_dataset_convert_progress",
-                            "status": "processing",
-                            "progress": i + 1,
-                            "total": len(files),
-                            "processed": i + 1,
-                            "successful": i + 1,
-                            "message": f"成功处理第 {i + 1} 个文件，生成 {len(results)} 个数据"
-                        }, project_id)
-                    else:
-                        logging.warning(f"API返回的JSON缺少'qa_pairs'字段或格式不符合预期")
-                        # 更新进度
-                        await manager.send_json({
-                            "task_id": task_id,
-                            "type": "md_to_dataset_convert_progress",
-                            "status": "processing",
-                            "progress": i + 1,
-                            "total": len(files),
-                            "processed": i + 1,
-                            "successful": i + 1,
-                            "message": f"第{i + 1} 个文件，大模型返回的字段或格式不符合预期"
-                        }, project_id)
-                except json.JSONDecodeError as e:
-                    logging.error(f"JSON解析错误: {str(e)}")
-                    
-                    # 尝试更高级的JSON修复
-                    try:
-                        print(f"成功修复并处理第 {i + 1} 个文件：{generated_text}")
-                        fixed_json = DatasetService.fix_complex_json_format(generated_text)
-                        result = json.loads(fixed_json)
-                        # print(f"成功修复并处理第 {i + 1} 个文件：{result}")
-                        
-                        # 处理qa_pairs字段
-                        if 'qa_pairs' in result and isinstance(result['qa_pairs'], list):
-                            for qa_pair in result['qa_pairs']:
-                                if isinstance(qa_pair, dict) and "question" in qa_pair and "answer" in qa_pair:
-                                    # 标准化处理QA对字段
-                                    standardized_qa_pair = DatasetService.standardize_qa_pair(qa_pair)
-                                    standardized_qa_pair["source"] = file_path
-                                    results.append(standardized_qa_pair)
-                            # 更新进度
-                            print(f"成功修复并处理第 {i + 1} 个文件，生成 {len(results)} 个数据")
-                            await manager.send_json({
-                                "task_id": task_id,
-                                "type": "md_to_dataset_convert_progress",
-                                "status": "processing",
-                                "progress": i + 1,
-                                "total": len(files),
-                                "processed": i + 1,
-                                "successful": i + 1,
-                                "message": f"成功修复并处理第 {i + 1} 个文件，生成 {len(results)} 个数据"
-                            }, project_id)
-                            continue
-                    except Exception:
-                        pass
-                    
-                    # 如果JSON修复失败，回退到基本的问答提取
-                    questions = []
-                    answers = []
-                    current_answer = ""
-                    
-                    for line in generated_text.split("\n"):
-                        if line.startswith("问题") or line.startswith("Q:"):
-                            if current_answer and questions:
-                                answers.append(current_answer.strip())
-                                current_answer = ""
-                            questions.append(line.split(":", 1)[1].strip())
-                        elif line.startswith("答案") or line.startswith("A:"):
-                            current_answer = line.split(":", 1)[1].strip()
-                        elif current_answer:
-                            current_answer += " " + line.strip()
-                    
-                    if current_answer:
-                        answers.append(current_answer.strip())
-                    
-                    # 将提取的问答对添加到结果中
-                    for i in range(min(len(questions), len(answers))):
-                        qa_pair = {
-                            "question": questions[i],
-                            "answer": answers[i],
-                            "source": file_path,
-                            "label": "未分类"
-                        }
-                        # 标准化处理QA对字段
-                        standardized_qa_pair = DatasetService.standardize_qa_pair(qa_pair)
-                        results.append(standardized_qa_pair)
-                        # 更新进度
-                        await manager.send_json({
-                            "task_id": task_id,
-                            "type": "md_to_dataset_convert_progress",
-                            "status": "processing",
-                            "progress": i + 1,
-                            "total": len(files),
-                            "processed": i + 1,
-                            "successful": i + 1,
-                            "message": f"成功处理 {i + 1} 个文件，生成 {len(results)} 个数据"
-                        }, project_id)
+        # 每个模型在整个任务中共用一个异步客户端，同一模型的多个任务共用限流额度
+        default_model = {**default_model, "apiKey": api_key}
+        router = create_model_router(default_model, DatasetService.get_model_configs())
+        if len(router.backends) > 1:
+            print(f"使用 {len(router.backends)} 个模型分配请求: {', '.join(backend.name for backend in router.backends)}")
+        client = router.primary.client
+        semaphore = asyncio.Semaphore(router.concurrency)
+        cache = get_llm_cache()
+        
+        # 恢复中断的任务：日志中已完成的文件不再调用大模型
+        journal = QAJournal(
+            output_path + JOURNAL_SUFFIX,
+            fsync_batch=settings.DATASET_JOURNAL_FSYNC_BATCH,
+            fsync_interval=settings.DATASET_JOURNAL_FSYNC_INTERVAL
+        )
+        completed = journal.load()
+        file_pairs = {file_path: completed[file_path] for file_path in files if file_path in completed}
+        if file_pairs:
+            print(f"从生成日志恢复 {len(file_pairs)} 个已完成的文件")
+        counts = {"processed": len(file_pairs), "successful": len(file_pairs), "pairs": 0,
+                  "saved": sum(len(qa_pairs) for qa_pairs in file_pairs.values()), "tokens": 0}
+        # 暂停后恢复的任务，Token数在之前的基础上累计
+        job = scheduler.current_job()
+        if job:
+            counts["tokens"] = job["progress"].get("tokens", 0)
+        positions = {file_path: i for i, file_path in enumerate(files)}
+        conversion_state[task_key]["progress"] = counts["processed"]
+        
+        def report_progress(message: Optional[str] = None):
+            # 保存到任务表，服务重启后仍可查询
+            scheduler.report_progress(
+                counts["processed"], len(files), message,
+                successful=counts["successful"], pairs=counts["saved"], tokens=counts["tokens"]
+            )
+        
+        def on_usage(tokens: int):
+            counts["tokens"] += tokens
+        
+        report_progress()
+        
+        async def on_pair(qa_pair: Dict[str, Any]):
+            # 每生成一个问答对推送一次，流式接收时不必等待整个文件完成
+            counts["pairs"] += 1
+            await manager.send_json({
+                "task_id": task_id,
+                "type": "md_to_dataset_convert_progress",
+                "status": "processing",
+                "progress": counts["processed"],
+                "total": len(files),
+                "processed": counts["processed"],
+                "successful": counts["successful"],
+                "generated": counts["pairs"],
+                "message": f"已生成 {counts['pairs']} 个数据"
+            }, project_id)
+        
+        def counted_attempt(generate: Callable[[Any, Callable[[Dict[str, Any]], Awaitable[None]]], Awaitable[Any]]):
+            # 路由器重试时，失败的尝试已经推送过的问答对不计入生成数，避免进度虚高
+            async def attempt(backend: Any):
+                emitted = 0
                 
-                # 更新进度
-                conversion_state[task_key]["progress"] = i + 1
-                
-                # 避免API速率限制
-                await asyncio.sleep(1)
+                async def on_attempt_pair(qa_pair: Dict[str, Any]):
+                    nonlocal emitted
+                    emitted += 1
+                    await on_pair(qa_pair)
                 
+                try:
+                    return await generate(backend, on_attempt_pair)
+                except BaseException:
+                    counts["pairs"] -= emitted
+                    raise
+            return attempt
+        
+        async def finish_file(index: int, file_path: str, qa_pairs: Optional[List[Dict[str, Any]]],
+                              error: Optional[Exception] = None):
+            try:
+                if error is not None:
+                    raise error
+                journal.record(file_path, qa_pairs)
+                file_pairs[file_path] = qa_pairs
+                counts["successful"] += 1
+                counts["saved"] += len(qa_pairs)
+                message = f"成功处理第 {index + 1} 个文件，生成 {len(qa_pairs)} 个数据"
             except Exception as e:
                 logging.error(f"处理文件 {file_path} 时出错: {str(e)}")
-                # 更新进度
-                await manager.send_json({
-                    "task_id": task_id,
-                    "type": "md_to_dataset_convert_progress",
-                    "status": "processing",
-                    "progress": i + 1,
-                    "total": len(files),
-                    "processed": i + 1,
-                    "successful": i + 1,
-                    "message": f"处理文件第{i + 1} 个文件时出错"
-                }, project_id)
+                message = f"处理文件第{index + 1} 个文件时出错"
+            
+            # 更新进度，并发处理时按完成的文件数计算
+            counts["processed"] += 1
+            conversion_state[task_key]["progress"] = counts["processed"]
+            report_progress(message)
+            await manager.send_json({
+                "task_id": task_id,
+                "type": "md_to_dataset_convert_progress",
+                "status": "processing",
+                "progress": counts["processed"],
+                "total": len(files),
+                "processed": counts["processed"],
+                "successful": counts["successful"],
+                "message": message
+            }, project_id)
+        
+        async def process_file(index: int, file_path: str):
+            try:
+                async with semaphore:
+                    qa_pairs = await router.call(counted_attempt(lambda backend, pair_callback: DatasetService.generate_qa_pairs(
+                        backend.client, backend.limiter, backend.model, system_prompt, file_path, index,
+                        cache=cache, bypass_cache=bypass_cache, on_pair=pair_callback, on_usage=on_usage
+                    )))
+            except Exception as e:
+                await finish_file(index, file_path, None, e)
+                return
+            await finish_file(index, file_path, qa_pairs)
+        
+        async def process_group(documents: List[Tuple[str, Optional[str]]]):
+            index = positions[documents[0][0]]
+            if len(documents) == 1:
+                await process_file(index, documents[0][0])
+                return
+            try:
+                async with semaphore:
+                    group_pairs = await router.call(counted_attempt(lambda backend, pair_callback: DatasetService.generate_packed_qa_pairs(
+                        backend.client, backend.limiter, backend.model, system_prompt, documents, index,
+                        cache=cache, bypass_cache=bypass_cache, on_pair=pair_callback, on_usage=on_usage
+                    )))
+            except Exception as e:
+                logging.error(f"合并请求 {len(documents)} 个文件时出错: {str(e)}，改为逐个文件生成")
+                group_pairs = {}
+            # 响应被截断或问答对无法对应到文件时，没有得到问答对的文件单独重新生成
+            retry_files = []
+            for file_path, _ in documents:
+                if group_pairs.get(file_path):
+                    await finish_file(positions[file_path], file_path, group_pairs[file_path])
+                else:
+                    retry_files.append(file_path)
+            await asyncio.gather(*(process_file(positions[file_path], file_path) for file_path in retry_files))
+        
+        async def on_batch_result(file_path: str, qa_pairs: List[Dict[str, Any]]):
+            journal.record(file_path, qa_pairs)
+            file_pairs[file_path] = qa_pairs
+            counts["processed"] += 1
+            counts["successful"] += 1
+            counts["saved"] += len(qa_pairs)
+            conversion_state[task_key]["progress"] = counts["processed"]
+            report_progress()
+        
+        async def on_batch_poll(batch: Any):
+            request_counts = getattr(batch, "request_counts", None)
+            completed_count = getattr(request_counts, "completed", 0) or 0
+            await manager.send_json({
+                "task_id": task_id,
+                "type": "md_to_dataset_convert_progress",
+                "status": "processing",
+                "progress": counts["processed"],
+                "total": len(files),
+                "processed": counts["processed"],
+                "successful": counts["successful"],
+                "message": f"批量任务状态: {batch.status}，已完成 {completed_count} 个请求"
+            }, project_id)
+        
+        try:
+            pending_files = [file_path for file_path in files if file_path not in file_pairs]
+            if batch_mode:
+                await DatasetService.generate_batch(
+                    client, model_name, system_prompt, pending_files, output_path + BATCH_STATE_SUFFIX,
+                    on_batch_result, on_poll=on_batch_poll, cache=cache, bypass_cache=bypass_cache
+                )
+            elif settings.DATASET_PACK_TOKENS > 0:
+                # 相邻的小文件合并为一个请求，减少请求数和重复发送的系统提示词
+                groups = DatasetService.pack_files(pending_files, settings.DATASET_PACK_TOKENS, settings.DATASET_PACK_MAX_FILES)
+                print(f"{len(pending_files)} 个文件合并为 {len(groups)} 个请求")
+                await asyncio.gather(*(process_group(documents) for documents in groups))
+            else:
+                await asyncio.gather(*(process_file(positions[file_path], file_path) for file_path in pending_files))
+        finally:
+            await router.close()
+            # 中断时已生成的结果保留在日志中
+            journal.close()
+        results = [qa_pair for file_path in files for qa_pair in file_pairs.get(file_path, [])]
         
         # 确保输出目录存在并以追加模式写入文件
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         with open(output_path, "a", encoding="utf-8") as f:
+            dataset_size = os.fstat(f.fileno()).st_size
+            if journal.interrupted_commit is not None and dataset_size > journal.interrupted_commit:
+                # 上次运行写入数据集后、写入提交标记前中断，去掉那次写入的内容后重新写入
+                print(f"数据集 {output_path} 有未提交的写入，截断到 {journal.interrupted_commit} 字节")
+                os.ftruncate(f.fileno(), journal.interrupted_commit)
+                dataset_size = journal.interrupted_commit
+            journal.begin_commit(dataset_size)
             for item in results:
                 f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        journal.commit()
         
         # 更新markdown_manager.json中相应文件的isDataset状态
         DatasetService.update_markdown_dataset_status(files, project_id)
@@ -628,11 +761,480 @@ class DatasetService:
             "progress": len(files),
             "total": len(files),
             "processed": len(files),
-            "successful": len(files),
+            "successful": counts["successful"],
             "message": f"成功提取 {len(results)} 数据"
         }, project_id)
         return output_path
     
+    @staticmethod
+    async def generate_qa_pairs(
+        client: AsyncOpenAI,
+        limiter: RateLimiter,
+        model_name: str,
+        system_prompt: str,
+        file_path: str,
+        index: int = 0,
+        cache: Optional[LLMResponseCache] = None,
+        bypass_cache: bool = False,
+        on_pair: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+        on_usage: Optional[Callable[[int], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        调用大模型为单个文件生成问答对
+        
+        Args:
+            client: 异步OpenAI客户端
+            limiter: 模型的限流器
+            model_name: 模型名称
+            system_prompt: 系统提示词
+            file_path: Markdown文件路径
+            index: 文件在任务中的序号，用于日志
+            cache: 响应缓存，为None时不使用缓存
+            bypass_cache: 为True时不读取缓存，仍写入新的响应
+            on_pair: 每解析出一个问答对时调用，启用 DATASET_STREAMING 时在响应结束前就会调用
+            on_usage: 调用大模型后以本次使用的Token数调用，读取缓存时不调用
+            
+        Returns:
+            List[Dict[str, Any]]: 标准化后的问答对，大模型返回空内容时为空列表
+        """
+        content = DatasetService.build_user_content(file_path)
+        qa_pairs: List[Dict[str, Any]] = []
+        
+        async def on_items(items: List[Dict[str, Any]]):
+            await DatasetService._collect_qa_pairs(items, file_path, qa_pairs, on_pair)
+        
+        generated_text, finished = await DatasetService._generate_items(
+            client, limiter, model_name, system_prompt, content, file_path, index, on_items, cache, bypass_cache, on_usage
+        )
+        # 检查返回结果是否完整
+        if not generated_text:
+            logging.warning(f"大模型返回空内容，跳过文件: {file_path}")
+            return []
+        
+        if qa_pairs or finished:
+            # 被截断时已闭合的问答对都已解析，不需要修复JSON
+            return qa_pairs
+        # 不是预期的JSON结构，使用原有的修复和提取逻辑
+        qa_pairs = DatasetService.parse_qa_pairs(generated_text, file_path)
+        if on_pair is not None:
+            for qa_pair in qa_pairs:
+                await on_pair(qa_pair)
+        return qa_pairs
+    
+    @staticmethod
+    async def generate_packed_qa_pairs(
+        client: AsyncOpenAI,
+        limiter: RateLimiter,
+        model_name: str,
+        system_prompt: str,
+        documents: List[Tuple[str, str]],
+        index: int = 0,
+        cache: Optional[LLMResponseCache] = None,
+        bypass_cache: bool = False,
+        on_pair: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+        on_usage: Optional[Callable[[int], None]] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        一次请求为多个小文件生成问答对
+        
+        每个文件的内容用文档编号分隔后放在同一条用户消息中，要求大模型在每个问答对中用doc_id标明来源文档，
+        解析时按doc_id把问答对对应回文件。没有doc_id或doc_id无法识别的问答对丢弃。
+        
+        Args:
+            documents: (文件路径, 用户消息内容) 列表，见 pack_files
+            其余参数同 generate_qa_pairs，index为第一个文件在任务中的序号
+            
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: 文件路径到问答对的映射，每个文件都有对应的列表（可能为空）
+        """
+        doc_ids = {f"D{i + 1}": file_path for i, (file_path, _) in enumerate(documents)}
+        file_pairs: Dict[str, List[Dict[str, Any]]] = {file_path: [] for file_path, _ in documents}
+        unmatched = []
+        
+        async def on_items(items: List[Dict[str, Any]]):
+            for item in items:
+                file_path = doc_ids.get(str(item.get("doc_id", "")).strip())
+                if file_path is None:
+                    unmatched.append(item)
+                    continue
+                await DatasetService._collect_qa_pairs([item], file_path, file_pairs[file_path], on_pair)
+        
+        await DatasetService._generate_items(
+            client, limiter, model_name, system_prompt + PACKED_PROMPT, DatasetService.build_packed_content(documents),
+            f"{len(documents)} 个合并的文件", index, on_items, cache, bypass_cache, on_usage
+        )
+        if unmatched:
+            logging.warning(f"合并请求中有 {len(unmatched)} 个问答对无法对应到文件，已丢弃")
+        return file_pairs
+    
+    @staticmethod
+    async def _generate_items(
+        client: AsyncOpenAI,
+        limiter: RateLimiter,
+        model_name: str,
+        system_prompt: str,
+        content: str,
+        label: str,
+        index: int,
+        on_items: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+        cache: Optional[LLMResponseCache] = None,
+        bypass_cache: bool = False,
+        on_usage: Optional[Callable[[int], None]] = None
+    ) -> Tuple[str, bool]:
+        """
+        调用大模型（或读取缓存）并增量解析响应，每解析出一批问答对象调用一次on_items
+        
+        Returns:
+            Tuple[str, bool]: 响应文本，以及响应是否为完整闭合的问答对JSON
+        """
+        request_params: Dict[str, Any] = {}
+        cache_key = None
+        cached = None
+        if cache is not None:
+            cache_key = LLMResponseCache.make_key(model_name, str(getattr(client, "base_url", "")), system_prompt, content, request_params)
+            if not bypass_cache:
+                cached = cache.get(cache_key)
+        
+        parser = QAPairStreamParser()
+        if cached is not None:
+            print(f"使用缓存的响应: {label}")
+            generated_text = cached["content"]
+            finish_reason = cached.get("finish_reason")
+            await on_items(parser.feed(generated_text))
+        else:
+            # 按输入Token数预占额度，响应后按实际用量修正
+            estimated_tokens = get_token_counter().count(system_prompt) + get_token_counter().count(content)
+            await limiter.acquire(estimated_tokens)
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": content}
+            ]
+            usage = None
+            if settings.DATASET_STREAMING:
+                # 流式接收，每个问答对闭合后立即解析
+                finish_reason = None
+                stream = await client.chat.completions.create(model=model_name, messages=messages, stream=True, **request_params)
+                async for chunk in stream:
+                    usage = getattr(chunk, "usage", None) or usage
+                    if not chunk.choices:
+                        continue
+                    choice = chunk.choices[0]
+                    delta = getattr(choice.delta, "content", None)
+                    if delta:
+                        await on_items(parser.feed(delta))
+                    if choice.finish_reason:
+                        finish_reason = choice.finish_reason
+                generated_text = parser.text
+            else:
+                response = await client.chat.completions.create(model=model_name, messages=messages, stream=False, **request_params)
+                usage = getattr(response, "usage", None)
+                generated_text = response.choices[0].message.content
+                finish_reason = response.choices[0].finish_reason
+                if generated_text:
+                    await on_items(parser.feed(generated_text))
+            used_tokens = getattr(usage, "total_tokens", None)
+            limiter.record_usage(estimated_tokens, used_tokens)
+            if on_usage is not None:
+                on_usage(used_tokens if used_tokens is not None else estimated_tokens)
+            
+            print(f"response ok: {label}")
+            # 被截断的响应不缓存，下次重新生成
+            if cache is not None and generated_text and finish_reason != "length":
+                cache.put(cache_key, generated_text, finish_reason)
+        # 如果该值为 length，则表明当前模型生成内容所包含的 Tokens 数量超过请求中的 max_tokens 参数
+        print(f"获取到大模型的第 {index + 1} 个文件结果，长度为: {len(generated_text or '')}, finish_reason: {finish_reason}")
+        return generated_text or "", parser.finished
+    
+    @staticmethod
+    def build_user_content(file_path: str) -> str:
+        """读取文件内容作为用户消息，分段文件附带前一个分段末尾的重叠内容作为上文，避免分段边界处丢失上下文"""
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        
+        context = DatasetService.get_previous_chunk_context(file_path)
+        if context:
+            content = f"【上文，仅用于理解正文，不要据此生成问答】\n{context}\n\n【正文】\n{content}"
+        return content
+    
+    @staticmethod
+    def build_packed_content(documents: List[Tuple[str, str]]) -> str:
+        """把多个文件的内容合并为一条用户消息，每个文件用文档编号D1、D2……分隔"""
+        return "\n\n".join(
+            f"【文档 D{i + 1} 开始】\n{content}\n【文档 D{i + 1} 结束】" for i, (_, content) in enumerate(documents)
+        )
+    
+    @staticmethod
+    def pack_files(files: List[str], token_budget: int, max_files: int) -> List[List[Tuple[str, Optional[str]]]]:
+        """
+        按顺序把相邻的小文件合并为一组，每组内容的Token数不超过token_budget、文件数不超过max_files
+        
+        Args:
+            files: 文件路径列表
+            token_budget: 每组用户消息的Token数上限
+            max_files: 每组的文件数上限
+            
+        Returns:
+            List[List[Tuple[str, Optional[str]]]]: 分组后的 (文件路径, 用户消息内容)，
+            超过预算的文件单独成组，读取失败的文件单独成组且内容为None
+        """
+        groups: List[List[Tuple[str, Optional[str]]]] = []
+        current: List[Tuple[str, Optional[str]]] = []
+        current_tokens = 0
+        for file_path in files:
+            try:
+                content = DatasetService.build_user_content(file_path)
+            except Exception as e:
+                logging.error(f"读取文件 {file_path} 时出错: {str(e)}")
+                # 读取失败的文件单独成组，逐个生成时记录错误
+                content, tokens = None, token_budget + 1
+            else:
+                tokens = get_token_counter().count(content)
+            if current and (current_tokens + tokens > token_budget or len(current) >= max_files):
+                groups.append(current)
+                current, current_tokens = [], 0
+            if tokens > token_budget:
+                groups.append([(file_path, content)])
+                continue
+            current.append((file_path, content))
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        return groups
+    
+    @staticmethod
+    def _standardize_items(items: List[Dict[str, Any]], file_path: str) -> List[Dict[str, Any]]:
+        """标准化解析出的问答对象，跳过缺少问题或答案的对象"""
+        qa_pairs = []
+        for item in items:
+            if "question" in item and "answer" in item:
+                # 标准化处理QA对字段
+                qa_pair = DatasetService.standardize_qa_pair(item)
+                qa_pair["source"] = file_path
+                qa_pairs.append(qa_pair)
+        return qa_pairs
+    
+    @staticmethod
+    async def _collect_qa_pairs(items: List[Dict[str, Any]], file_path: str, qa_pairs: List[Dict[str, Any]],
+                                on_pair: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None):
+        """标准化解析出的问答对象并加入qa_pairs，每个问答对通知一次on_pair"""
+        for qa_pair in DatasetService._standardize_items(items, file_path):
+            qa_pairs.append(qa_pair)
+            if on_pair is not None:
+                await on_pair(qa_pair)
+    
+    @staticmethod
+    def qa_pairs_from_text(generated_text: str, file_path: str) -> List[Dict[str, Any]]:
+        """解析完整的响应文本，与流式解析结果一致；不是预期的JSON结构时使用原有的修复和提取逻辑"""
+        parser = QAPairStreamParser()
+        qa_pairs = DatasetService._standardize_items(parser.feed(generated_text), file_path)
+        if qa_pairs or parser.finished:
+            return qa_pairs
+        return DatasetService.parse_qa_pairs(generated_text, file_path)
+    
+    @staticmethod
+    async def generate_batch(
+        client: AsyncOpenAI,
+        model_name: str,
+        system_prompt: str,
+        files: List[str],
+        state_path: str,
+        on_result: Callable[[str, List[Dict[str, Any]]], Awaitable[None]],
+        on_poll: Optional[Callable[[Any], Awaitable[None]]] = None,
+        cache: Optional[LLMResponseCache] = None,
+        bypass_cache: bool = False
+    ):
+        """
+        使用批量接口为一组文件生成问答对
+        
+        所有文件的请求写入一个JSONL文件提交为批量任务，轮询到任务结束后读取结果，
+        解析和标准化与逐个调用时相同。已提交的任务记录在state_path中，任务中断后再次转换时继续等待这些任务，不会重复提交；
+        已提交的任务没有包含的文件（如再次转换时新加入的文件）另外提交一个批量任务。
+        
+        Args:
+            client: 异步OpenAI客户端
+            model_name: 模型名称
+            system_prompt: 系统提示词
+            files: 需要生成的文件
+            state_path: 批量任务状态文件路径
+            on_result: 每个文件得到结果时调用，参数为文件路径和问答对
+            on_poll: 每次查询批量任务状态后调用
+            cache: 响应缓存，命中的文件不提交
+            bypass_cache: 为True时不读取缓存，仍写入新的响应
+        """
+        base_url = str(getattr(client, "base_url", ""))
+        batches = []
+        submitted = set()
+        for batch_state in BatchService.load_state(state_path):
+            requests = {custom_id: file_path for custom_id, file_path in batch_state["requests"].items() if file_path in files}
+            if requests:
+                print(f"继续等待已提交的批量任务 {batch_state['batch_id']}")
+                batches.append({"batch_id": batch_state["batch_id"], "requests": requests})
+                submitted.update(requests.values())
+        
+        batch_requests = []
+        requests = {}
+        for index, file_path in enumerate(files):
+            if file_path in submitted:
+                continue
+            try:
+                content = DatasetService.build_user_content(file_path)
+            except Exception as e:
+                logging.error(f"读取文件 {file_path} 时出错: {str(e)}")
+                continue
+            if cache is not None and not bypass_cache:
+                cached = cache.get(LLMResponseCache.make_key(model_name, base_url, system_prompt, content, {}))
+                if cached is not None:
+                    await on_result(file_path, DatasetService.qa_pairs_from_text(cached["content"], file_path))
+                    continue
+            custom_id = f"file-{index}"
+            requests[custom_id] = file_path
+            batch_requests.append(BatchService.build_request(custom_id, model_name, [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": content}
+            ]))
+        if batch_requests:
+            batch_id = await BatchService.submit(client, batch_requests, metadata={"source": "qa_dataset"})
+            batches.append({"batch_id": batch_id, "requests": requests})
+            BatchService.save_state(state_path, batches)
+        
+        await asyncio.gather(*(
+            DatasetService._collect_batch_results(
+                client, model_name, system_prompt, batch_state["batch_id"], batch_state["requests"], on_result, on_poll, cache
+            ) for batch_state in batches
+        ))
+        BatchService.remove_state(state_path)
+    
+    @staticmethod
+    async def _collect_batch_results(
+        client: AsyncOpenAI,
+        model_name: str,
+        system_prompt: str,
+        batch_id: str,
+        requests: Dict[str, str],
+        on_result: Callable[[str, List[Dict[str, Any]]], Awaitable[None]],
+        on_poll: Optional[Callable[[Any], Awaitable[None]]] = None,
+        cache: Optional[LLMResponseCache] = None
+    ):
+        """等待一个批量任务结束，解析每个文件的结果并调用on_result，参数同 generate_batch"""
+        base_url = str(getattr(client, "base_url", ""))
+        batch = await BatchService.wait(client, batch_id, settings.DATASET_BATCH_POLL_INTERVAL, on_poll)
+        if batch.status != "completed":
+            logging.error(f"批量任务 {batch_id} 未完成，状态: {batch.status}，只读取已完成的结果")
+        results = await BatchService.fetch_results(client, batch)
+        
+        for custom_id, file_path in requests.items():
+            result = results.get(custom_id)
+            if result is None or "error" in result:
+                logging.error(f"批量任务中文件 {file_path} 生成失败: {result.get('error') if result else '没有结果'}")
+                continue
+            generated_text = result["content"]
+            if cache is not None and generated_text and result.get("finish_reason") != "length":
+                content = DatasetService.build_user_content(file_path)
+                cache.put(LLMResponseCache.make_key(model_name, base_url, system_prompt, content, {}),
+                          generated_text, result.get("finish_reason"))
+            await on_result(file_path, DatasetService.qa_pairs_from_text(generated_text, file_path) if generated_text else [])
+    
+    @staticmethod
+    def parse_qa_pairs(generated_text: str, file_path: str) -> List[Dict[str, Any]]:
+        """
+        解析大模型返回的问答对，使用容错解析器处理不规范或被截断的JSON，
+        没有问答对JSON时回退到按“问题/答案”行提取
+        
+        Args:
+            generated_text: 大模型返回的文本
+            file_path: 来源文件路径
+            
+        Returns:
+            List[Dict[str, Any]]: 标准化后的问答对
+        """
+        result, complete = tolerant_parse(generated_text)
+        if result is not None and not complete:
+            logging.warning(f"大模型返回结果可能被截断: 文件 {file_path}")
+        
+        items = None
+        if isinstance(result, dict) and isinstance(result.get('qa_pairs'), list):
+            items = result['qa_pairs']
+        elif isinstance(result, list):
+            items = result
+        if items is not None:
+            return DatasetService._standardize_items([item for item in items if isinstance(item, dict)], file_path)
+        if result is not None:
+            logging.warning(f"API返回的JSON缺少'qa_pairs'字段或格式不符合预期")
+        
+        # 不是问答对JSON，回退到基本的问答提取
+        questions = []
+        answers = []
+        current_answer = ""
+        
+        for line in generated_text.split("\n"):
+            if line.startswith("问题") or line.startswith("Q:"):
+                if current_answer and questions:
+                    answers.append(current_answer.strip())
+                    current_answer = ""
+                questions.append(line.split(":", 1)[1].strip())
+            elif line.startswith("答案") or line.startswith("A:"):
+                current_answer = line.split(":", 1)[1].strip()
+            elif current_answer:
+                current_answer += " " + line.strip()
+        
+        if current_answer:
+            answers.append(current_answer.strip())
+        
+        # 将提取的问答对添加到结果中
+        return [
+            DatasetService.standardize_qa_pair({
+                "question": question,
+                "answer": answer,
+                "source": file_path,
+                "label": "未分类"
+            })
+            for question, answer in zip(questions, answers)
+        ]
+    
+    @staticmethod
+    def get_previous_chunk_context(file_path: str) -> str:
+        """
+        获取分段文件的上文：前一个分段文件末尾的重叠部分
+        
+        重叠位置在分段时计算（CHUNK_OVERLAP_TOKENS / CHUNK_OVERLAP_SENTENCES，按句子边界截取），
+        保存在分段文件旁的 xxx.tree.json 中（见 build_chunk_tree）。
+        
+        Args:
+            file_path: 分段文件路径，如 xxx-2.md
+            
+        Returns:
+            str: 上文内容，不是分段文件、分段时未开启重叠或前一个分段不存在时返回空字符串
+        """
+        directory, filename = os.path.split(file_path)
+        match = CHUNK_FILE_PATTERN.match(filename)
+        if not match:
+            return ""
+        try:
+            mtime = os.path.getmtime(chunk_tree_path(directory, match.group(1)))
+        except OSError:
+            return ""
+        overlap = DatasetService._load_chunk_overlaps(directory, match.group(1), mtime).get(filename)
+        if not overlap:
+            return ""
+        
+        previous_path = os.path.join(directory, overlap["file"])
+        try:
+            with open(previous_path, "r", encoding="utf-8") as f:
+                previous_content = f.read()
+        except Exception as e:
+            logging.error(f"读取前一个分段失败 {previous_path}: {str(e)}")
+            return ""
+        return previous_content[overlap["start"]:overlap["end"]].strip()
+    
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _load_chunk_overlaps(directory: str, base_name: str, mtime: float) -> Dict[str, Dict[str, Any]]:
+        """读取分段层级结构中记录的重叠位置（分段文件名 -> 重叠位置），按文件修改时间缓存"""
+        tree = load_chunk_tree(directory, base_name)
+        if not tree:
+            return {}
+        return {leaf["file"]: leaf["overlap"] for leaf in collect_leaves(tree) if leaf.get("file") and leaf.get("overlap")}
+    
     @staticmethod
     def update_markdown_dataset_status(files: List[str], project_id: Optional[str] = None) -> bool:
         """
@@ -711,7 +1313,9 @@ class DatasetService:
         if project_id:
             task_key = f"{project_id}_{output_file}"
             
-        if task_key not in conversion_state:
+        # 任务状态（排队、暂停、取消等）以任务表为准，服务重启后内存中没有的状态也从任务表读取
+        job = scheduler.find_job("dataset", project_id, output_file=output_file)
+        if task_key not in conversion_state and job is None:
             return {
                 "status": "not_found",
                 "message": "没有找到对应的转换任务",
@@ -719,7 +1323,18 @@ class DatasetService:
                 "total": 0
             }
         
-        return conversion_state[task_key]
+        state = dict(conversion_state.get(task_key) or {})
+        if job is not None and state.get("job_id") in (None, job["job_id"]):
+            state.setdefault("progress", job["progress"].get("current", 0))
+            state.setdefault("total", job["progress"].get("total", 0))
+            state.update({
+                "status": job["status"],
+                "message": job["message"],
+                "project_id": project_id,
+                "job_id": job["job_id"],
+                "stats": job["progress"]
+            })
+        return state
     
     @staticmethod
     def add_qa_item(
@@ -1006,299 +1621,6 @@ class DatasetService:
             json.dump(data, f, ensure_ascii=False, indent=2)
         return True
     
-    @staticmethod
-    def fix_json_format(json_text):
-        """修复常见的JSON格式问题"""
-        import re
-        
-        # 如果输入为空，返回有效的空JSON对象
-        if not json_text or not json_text.strip():
-            return "{}"
-            
-        # 1. 替换单引号为双引号
-        result = json_text.replace("'", "\"")
-        
-        # 2. 确保属性名使用双引号
-        result = re.sub(r'([{,])\s*([a-zA-Z0-9_]+)\s*:', r'\1"\2":', result)
-        
-        # 3. 修复尾部逗号问题
-        result = re.sub(r',\s*}', '}', result)
-        result = re.sub(r',\s*]', ']', result)
-        
-        # 4. 删除注释
-        result = re.sub(r'//.*?\n', '\n', result)
-        result = re.sub(r'/\*.*?\*/', '', result, flags=re.DOTALL)
-        
-        # 5. 全面处理无效的控制字符（包括不可见控制字符和无效Unicode）
-        # 仅保留合法的字符：可打印字符、换行、回车、制表符
-        result = ''.join(ch for ch in result if (ch >= ' ' and ord(ch) < 127) or ch in ['\n', '\r', '\t'])
-        
-        # 6. 替换不规范的转义序列
-        result = re.sub(r'\\([^"\\/bfnrtu])', r'\1', result)
-        
-        # 7. 修复常见编码问题，替换非ASCII字符
-        result = re.sub(r'[\x80-\xff]', ' ', result)
-        
-        # 8. 修复缺少逗号的问题 - 在任何一个右括号或右引号后面跟着左引号的地方插入逗号
-        result = re.sub(r'([\}\]])\s*(\")', r'\1,\2', result)
-        result = re.sub(r'(\")(\s*\"[^\"]*\":\s*)', r'\1,\2', result)  # "key": "value" "key2": "value2" => "key": "value", "key2": "value2"
-        
-        return result
-    
-    @staticmethod
-    def fix_truncated_json(json_text):
-        """修复被截断的JSON字符串"""
-        import re
-        
-        if not json_text:
-            return json_text
-        
-        # 移除首尾空白
-        json_text = json_text.strip()
-        
-        # 如果JSON以{开始但没有以}结束，说明可能被截断
-        if json_text.startswith('{') and not json_text.endswith('}'):
-            # 尝试找到最后一个完整的对象或数组
-            
-            # 1. 找到最后一个完整的键值对
-            last_complete_pair_pos = -1
-            brace_count = 0
-            in_string = False
-            escape_next = False
-            
-            for i, char in enumerate(json_text):
-                if escape_next:
-                    escape_next = False
-                    continue
-                    
-                if char == '\\':
-                    escape_next = True
-                    continue
-                    
-                if char == '"' and not escape_next:
-                    in_string = not in_string
-                    continue
-                    
-                if in_string:
-                    continue
-                    
-                if char == '{':
-                    brace_count += 1
-                elif char == '}':
-                    brace_count -= 1
-                    if brace_count == 1:  # 回到主对象层级
-                        last_complete_pair_pos = i
-                elif char == ',' and brace_count == 1:
-                    last_complete_pair_pos = i
-            
-            # 2. 如果找到了最后完整的位置，截断到那里
-            if last_complete_pair_pos > 0:
-                # 检查最后是否是逗号，如果是则移除它
-                truncated = json_text[:last_complete_pair_pos].rstrip()
-                if truncated.endswith(','):
-                    truncated = truncated[:-1]
-                json_text = truncated
-            
-            # 3. 处理未闭合的字符串
-            quote_count = json_text.count('"')
-            # 计算转义字符的影响
-            escaped_quotes = len(re.findall(r'\\"', json_text))
-            actual_quotes = quote_count - escaped_quotes
-            
-            if actual_quotes % 2 != 0:
-                # 有未闭合的字符串，在适当位置添加闭合引号
-                json_text += '"'
-            
-            # 4. 添加缺失的右花括号和方括号
-            open_braces = json_text.count('{') - json_text.count('}')
-            open_brackets = json_text.count('[') - json_text.count(']')
-            
-            # 先闭合数组，再闭合对象
-            json_text += ']' * open_brackets
-            json_text += '}' * open_braces
-            
-        return json_text
-    
-    @staticmethod
-    def fix_complex_json_format(json_text):
-        """处理更复杂的JSON格式问题"""
-        print(f"仍然解析失败，尝试提取文本中的问答对")
-        import re
-        
-        # 0. 尝试保存原始输入，以便在所有修复尝试失败时使用基本文本提取
-        original_text = json_text
-
-        # 1. 首先应用基本修复
-        result = DatasetService.fix_json_format(json_text)
-        
-        # 2. 尝试从文本中提取JSON部分
-        # 查找 { 开始到最后一个 } 的内容
-        json_match = re.search(r'({.*})', result, re.DOTALL)
-        if json_match:
-            result = json_match.group(1)
-        
-        # 3. 检查并补全缺失的引号
-        # 查找可能缺少引号的键
-        result = re.sub(r'([{,])\s*([a-zA-Z0-9_]+)\s*:', r'\1"\2":', result)
-        
-        # 4. 修复未终止的字符串（如果引号数量为奇数）
-        # 计算双引号出现次数
-        quote_count = result.count('"')
-        if quote_count % 2 != 0:
-            # 找到最后一个未闭合的引号位置
-            open_quotes = []
-            for i, char in enumerate(result):
-                if char == '"' and (i == 0 or result[i-1] != '\\'):
-                    if len(open_quotes) == 0:
-                        open_quotes.append(i)
-                    else:
-                        open_quotes.pop()
-            
-            # 如果存在未闭合的引号，在其后添加一个闭合引号
-            if open_quotes:
-                last_open = open_quotes[-1]
-                next_comma = result.find(',', last_open)
-                next_closing = result.find('}', last_open)
-                next_bracket = result.find(']', last_open)
-                
-                insertion_point = len(result)
-                if next_comma > 0:
-                    insertion_point = min(insertion_point, next_comma)
-                if next_closing > 0:
-                    insertion_point = min(insertion_point, next_closing)
-                if next_bracket > 0:
-                    insertion_point = min(insertion_point, next_bracket)
-                
-                result = result[:insertion_point] + '"' + result[insertion_point:]
-        
-        # 5. 添加缺失的逗号
-        # 更复杂的逗号修复 - 使用正则表达式查找缺失逗号的模式
-        # 在右括号或引号后面跟着左引号的地方添加逗号
-        result = re.sub(r'(["\d}])\s*(")', r'\1,\2', result)
-        # 修复JSON对象中键值对之间缺少的逗号
-        result = re.sub(r'(:\s*["\w\d.\[\]{}]+)\s+(")', r'\1,\2', result)
-        
-        # 5.5 修复缺少冒号分隔符的情况 - 处理 "Expecting ':' delimiter" 错误
-        # 查找键名后面缺少冒号的模式
-        result = re.sub(r'(["]\s*[a-zA-Z0-9_]+\s*["]\s*)(\s*["{[])', r'\1:\2', result)
-        # 查找键值对中间缺少冒号的模式 - 引号内的键名与引号值之间
-        result = re.sub(r'(["]\s*[a-zA-Z0-9_]+\s*["]\s*)([^:{\[])', r'\1:\2', result)
-        # 处理无引号的键名和值之间缺少冒号的情况
-        result = re.sub(r'([a-zA-Z0-9_"]+)\s+([a-zA-Z0-9_"{[])', r'\1:\2', result)
-        
-        # 6. 修复嵌套结构中的错误
-        # 添加缺失的右括号
-        # 计算左右括号数量
-        left_braces = result.count('{')
-        right_braces = result.count('}')
-        if left_braces > right_braces:
-            result += '}' * (left_braces - right_braces)
-        
-        # 计算左右方括号数量
-        left_brackets = result.count('[')
-        right_brackets = result.count(']')
-        if left_brackets > right_brackets:
-            result += ']' * (left_brackets - right_brackets)
-        
-        # 7. 如果JSON格式仍有问题，尝试提取问答对
-        try:
-            # 尝试解析修复后的结果
-            json.loads(result)
-        except Exception:
-            # 如果仍然解析失败，尝试提取文本中的问答对
-            try:
-                # 清除之前的修复尝试，从原始文本中提取问答对
-                qa_pairs = DatasetService.extract_qa_pairs_from_text(original_text)
-                if qa_pairs:
-                    return json.dumps({"qa_pairs": qa_pairs}, ensure_ascii=False)
-            except Exception:
-                pass
-        
-        # 8. 最后，尝试一次自动修复 - 将结果解析为Python对象然后重新序列化为JSON
-        try:
-            # 尝试解析修复后的结果
-            parsed_data = json.loads(result)
-            # 然后重新序列化为标准JSON，确保格式正确
-            result = json.dumps(parsed_data, ensure_ascii=False)
-        except Exception:
-            # 如果仍然解析失败，保留现有的修复结果
-            pass
-        
-        return result
-
-    @staticmethod
-    def extract_qa_pairs_from_text(text):
-        """从非JSON文本中提取问答对"""
-        import re
-        
-        # 如果文本为空，返回空列表
-        if not text or not text.strip():
-            return []
-        
-        qa_pairs = []
-        
-        # 首先尝试使用常见问答格式（问题：答案：）
-        questions = []
-        answers = []
-        current_answer = ""
-        current_question = None
-        
-        # 处理中文冒号和英文冒号
-        for line in text.split('\n'):
-            # 去除首尾空白
-            line = line.strip()
-            if not line:
-                continue
-                
-            # 检查是否是问题行
-            q_match = re.search(r'^(问题|Q|Question)[:：]?\s*(.*)', line, re.IGNORECASE)
-            if q_match:
-                # 如果已有问题和答案，保存前一对
-                if current_question and current_answer:
-                    qa_pairs.append({
-                        "question": current_question.strip(),
-                        "answer": current_answer.strip()
-                    })
-                
-                # 开始新的问答对
-                current_question = q_match.group(2).strip()
-                current_answer = ""
-                continue
-                
-            # 检查是否是答案行
-            a_match = re.search(r'^(答案|A|Answer)[:：]?\s*(.*)', line, re.IGNORECASE)
-            if a_match:
-                # 如果已有问题，设置答案
-                if current_question:
-                    current_answer = a_match.group(2).strip()
-                continue
-                
-            # 如果不是问题或答案开头，添加到当前答案
-            if current_question and line:
-                if current_answer:
-                    current_answer += " " + line
-                else:
-                    current_answer = line
-        
-        # 添加最后一对问答
-        if current_question and current_answer:
-            qa_pairs.append({
-                "question": current_question.strip(),
-                "answer": current_answer.strip()
-            })
-        
-        # 如果没有找到问答对，尝试其他提取方法
-        if not qa_pairs:
-            # 寻找可能的问题-答案模式
-            pairs = re.findall(r'["《]([^"》]+)["》][：:]\s*["《]([^"》]+)["》]', text)
-            for q, a in pairs:
-                qa_pairs.append({
-                    "question": q.strip(),
-                    "answer": a.strip()
-                })
-        
-        return qa_pairs
-
     # 添加新的静态方法用于标准化问答对字段
     @staticmethod
     def standardize_qa_pair(qa_pair: Dict) -> Dict:
@@ -1382,3 +1704,8 @@ class DatasetService:
         else:
             result["timestamp"] = qa_pair["timestamp"]
         return result
+
+
+# 注册后台任务处理函数
+scheduler.register_handler("dataset", DatasetService.convert_files_to_dataset_task,
+                           on_cancel=DatasetService.cancel_conversion_job)
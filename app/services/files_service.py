@@ -6,7 +6,10 @@ from typing import List, Dict, Any, Optional
 
 from app.utils.path_utils import get_project_output_path, ensure_dir, join_paths
 from app.core.config import settings
-from app.core.markdown_splitter import MarkdownSplitter
+from app.core.optimal_splitter import create_splitter
+from app.core.split_cache import split_with_cache
+from app.core.split_pool import split_markdown_batch, resolve_split_tokens, save_chunk_tree, run_batch
+from app.core.chunk_tree import chunk_file_content
 
 class FilesService:
     """文件服务类，处理所有与文件相关的业务逻辑"""
@@ -126,7 +129,12 @@ class FilesService:
     
     @staticmethod
     def upload_files(files: List[Any], project_id: Optional[str] = None, smart_split_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """上传文件，非Markdown文件会被自动转换"""
+        """
+        上传文件，非Markdown文件会被自动转换
+
+        先保存全部文件，非Markdown文件交给进程池并行转换，启用智能分段时再把所有文档一次性交给进程池并行分段，
+        最后按上传顺序写出分段文件和注册表。
+        """
         # 确保目录存在
         upload_dir = get_project_output_path(project_id, "upload")
         markdown_dir = get_project_output_path(project_id, "markdown")
@@ -136,7 +144,10 @@ class FilesService:
         
         uploaded_files = []
         converted_files = []
+        enable_smart_split = bool(smart_split_config and smart_split_config.get("enableSmartSplit", False))
         
+        # 第一步：保存原始文件，非Markdown文件在进程池中并行转换为Markdown
+        entries = []
         for file in files:
             # 原始文件保存路径
             original_path = os.path.join(upload_dir, file.filename)
@@ -150,23 +161,69 @@ class FilesService:
                 # 如果已经是Markdown，直接复制到markdown目录
                 markdown_path = os.path.join(markdown_dir, file.filename)
                 shutil.copy2(original_path, markdown_path)
-                
+                entries.append({"filename": file.filename, "original_path": original_path,
+                                "markdown_path": markdown_path, "is_markdown": True, "error": None})
+            else:
+                # 非Markdown文件，需要转换
+                entries.append({"filename": file.filename, "original_path": original_path,
+                                "markdown_path": None, "is_markdown": False, "error": None})
+        
+        convert_entries = [entry for entry in entries if not entry["is_markdown"]]
+        if convert_entries:
+            results = run_batch(
+                FilesService._write_converted_markdown,
+                [(entry["original_path"], markdown_dir, entry["filename"]) for entry in convert_entries]
+            )
+            for entry, (markdown_path, error) in zip(convert_entries, results):
+                if error is not None:
+                    print(f"转换文件 {entry['filename']} 失败: {str(error)}")
+                    entry["error"] = str(error)
+                else:
+                    entry["markdown_path"] = markdown_path
+        
+        # 第二步：所有文档批量分段
+        chunk_lists: List[Optional[List[Any]]] = [None] * len(entries)
+        if enable_smart_split:
+            split_entries = [i for i, entry in enumerate(entries) if entry["markdown_path"]]
+            contents = []
+            for i in split_entries:
+                with open(entries[i]["markdown_path"], "r", encoding="utf-8") as f:
+                    contents.append(f.read())
+            print(f"批量智能分段 {len(contents)} 个文件")
+            results = split_markdown_batch(
+                contents,
+                smart_split_config.get("maxTokens", 8000),
+                smart_split_config.get("minTokens", 500),
+                smart_split_config.get("splitStrategy", "balanced")
+            )
+            contents = None
+            for i, chunks in zip(split_entries, results):
+                chunk_lists[i] = chunks
+        
+        # 第三步：写出分段文件并更新注册表
+        for entry, chunks in zip(entries, chunk_lists):
+            filename = entry["filename"]
+            original_path = entry["original_path"]
+            markdown_path = entry["markdown_path"]
+            
+            if entry["is_markdown"]:
                 # 如果启用智能分段，处理Markdown文件
-                if smart_split_config and smart_split_config.get("enableSmartSplit", False):
+                if enable_smart_split:
                     try:
                         split_result = FilesService.apply_smart_split_to_markdown(
                             markdown_path, 
                             smart_split_config,
-                            project_id
+                            project_id,
+                            chunks=chunks
                         )
                         if split_result["success"]:
                             uploaded_files.extend(split_result["files"])
                         else:
                             # 智能分段失败，使用原文件
-                            base_name = os.path.splitext(file.filename)[0]
+                            base_name = os.path.splitext(filename)[0]
                             FilesService.update_markdown_registry(original_path, markdown_path, base_name, is_converted=False, project_id=project_id)
                             uploaded_files.append({
-                                "filename": file.filename,
+                                "filename": filename,
                                 "path": markdown_path,
                                 "size": os.stat(markdown_path).st_size,
                                 "converted": False,
@@ -174,10 +231,10 @@ class FilesService:
                             })
                     except Exception as e:
                         # 智能分段出错，使用原文件
-                        base_name = os.path.splitext(file.filename)[0]
+                        base_name = os.path.splitext(filename)[0]
                         FilesService.update_markdown_registry(original_path, markdown_path, base_name, is_converted=False, project_id=project_id)
                         uploaded_files.append({
-                            "filename": file.filename,
+                            "filename": filename,
                             "path": markdown_path,
                             "size": os.stat(markdown_path).st_size,
                             "converted": False,
@@ -185,37 +242,36 @@ class FilesService:
                         })
                 else:
                     # 不启用智能分段，直接注册文件
-                    base_name = os.path.splitext(file.filename)[0]
+                    base_name = os.path.splitext(filename)[0]
                     FilesService.update_markdown_registry(original_path, markdown_path, base_name, is_converted=False, project_id=project_id)
                     uploaded_files.append({
-                        "filename": file.filename,
+                        "filename": filename,
                         "path": markdown_path,
                         "size": os.stat(markdown_path).st_size,
                         "converted": False
                     })
-            else:
-                # 非Markdown文件，需要转换
-                conversion_result = FilesService.convert_to_markdown(
+            elif markdown_path:
+                conversion_result = FilesService._register_converted_markdown(
                     original_path=original_path,
-                    markdown_dir=markdown_dir,
-                    filename=file.filename,
+                    markdown_path=markdown_path,
+                    filename=filename,
                     project_id=project_id,
-                    smart_split_config=smart_split_config
+                    smart_split_config=smart_split_config,
+                    chunks=chunks
                 )
                 
-                if conversion_result["success"]:
-                    if smart_split_config and smart_split_config.get("enableSmartSplit", False):
-                        converted_files.extend(conversion_result["files"])
-                    else:
-                        converted_files.append(conversion_result["file_info"])
+                if enable_smart_split and "files" in conversion_result:
+                    converted_files.extend(conversion_result["files"])
                 else:
-                    uploaded_files.append({
-                        "filename": file.filename,
-                        "path": original_path,
-                        "size": os.stat(original_path).st_size,
-                        "converted": False,
-                        "error": conversion_result["error"]
-                    })
+                    converted_files.append(conversion_result["file_info"])
+            else:
+                uploaded_files.append({
+                    "filename": filename,
+                    "path": original_path,
+                    "size": os.stat(original_path).st_size,
+                    "converted": False,
+                    "error": entry["error"]
+                })
         
         return {
             "status": "success",
@@ -242,89 +298,110 @@ class FilesService:
           - error: 转换失败时的错误信息
         """
         try:        
-            # 引入MarkItDown库
-            from markitdown import MarkItDown
-            md = MarkItDown()
-            # 使用MarkItDown转换
-            result = md.convert(original_path)
-            
-            # 创建新的Markdown文件名
-            base_name = os.path.splitext(filename)[0]
-            markdown_filename = f"{base_name}.md"
-            markdown_path = os.path.join(markdown_dir, markdown_filename)
-            
-            # 写入转换后的内容
-            with open(markdown_path, "w", encoding="utf-8") as f:
-                f.write(result.text_content)
-            
-            # 如果启用智能分段，处理转换后的Markdown文件
-            if smart_split_config and smart_split_config.get("enableSmartSplit", False):
-                try:
-                    split_result = FilesService.apply_smart_split_to_markdown(
-                        markdown_path, 
-                        smart_split_config,
-                        project_id
-                    )
-                    if split_result["success"]:
-                        return {
-                            "success": True,
-                            "files": split_result["files"],
-                            "error": None
-                        }
-                    else:
-                        # 智能分段失败，使用原转换文件
-                        FilesService.update_markdown_registry(original_path, markdown_path, base_name, is_converted=True, project_id=project_id)
-                        file_info = {
-                            "original_filename": filename,
-                            "markdown_filename": markdown_filename,
-                            "path": markdown_path,
-                            "size": os.stat(markdown_path).st_size,
-                            "error": f"智能分段失败: {split_result.get('error')}"
-                        }
-                        return {
-                            "success": True,
-                            "file_info": file_info,
-                            "error": None
-                        }
-                except Exception as e:
-                    # 智能分段出错，使用原转换文件
+            markdown_path = FilesService._write_converted_markdown(original_path, markdown_dir, filename)
+        except Exception as e:
+            print(f"转换文件 {filename} 失败: {str(e)}")
+            return {
+                "success": False,
+                "file_info": None,
+                "error": str(e)
+            }
+        
+        return FilesService._register_converted_markdown(
+            original_path, markdown_path, filename, project_id, smart_split_config
+        )
+    
+    @staticmethod
+    def _write_converted_markdown(original_path: str, markdown_dir: str, filename: str) -> str:
+        """使用MarkItDown转换文件并写入markdown目录，返回Markdown文件路径"""
+        # 引入MarkItDown库
+        from markitdown import MarkItDown
+        md = MarkItDown()
+        # 使用MarkItDown转换
+        result = md.convert(original_path)
+        
+        # 创建新的Markdown文件名
+        base_name = os.path.splitext(filename)[0]
+        markdown_path = os.path.join(markdown_dir, f"{base_name}.md")
+        
+        # 写入转换后的内容
+        with open(markdown_path, "w", encoding="utf-8") as f:
+            f.write(result.text_content)
+        return markdown_path
+    
+    @staticmethod
+    def _register_converted_markdown(original_path: str, markdown_path: str, filename: str, project_id: Optional[str] = None,
+                                     smart_split_config: Optional[Dict[str, Any]] = None, chunks: Optional[List[Any]] = None) -> Dict[str, Any]:
+        """
+        对转换得到的Markdown文件分段（如启用）并更新注册表
+
+        参数:
+        - chunks: 已经批量计算好的分段结果，为None时在此处分段
+        """
+        base_name = os.path.splitext(filename)[0]
+        markdown_filename = os.path.basename(markdown_path)
+        
+        # 如果启用智能分段，处理转换后的Markdown文件
+        if smart_split_config and smart_split_config.get("enableSmartSplit", False):
+            try:
+                split_result = FilesService.apply_smart_split_to_markdown(
+                    markdown_path, 
+                    smart_split_config,
+                    project_id,
+                    chunks=chunks
+                )
+                if split_result["success"]:
+                    return {
+                        "success": True,
+                        "files": split_result["files"],
+                        "error": None
+                    }
+                else:
+                    # 智能分段失败，使用原转换文件
                     FilesService.update_markdown_registry(original_path, markdown_path, base_name, is_converted=True, project_id=project_id)
                     file_info = {
                         "original_filename": filename,
                         "markdown_filename": markdown_filename,
                         "path": markdown_path,
                         "size": os.stat(markdown_path).st_size,
-                        "error": f"智能分段失败: {str(e)}"
+                        "error": f"智能分段失败: {split_result.get('error')}"
                     }
                     return {
                         "success": True,
                         "file_info": file_info,
                         "error": None
                     }
-            else:
-                # 不启用智能分段，直接返回转换结果
+            except Exception as e:
+                # 智能分段出错，使用原转换文件
+                FilesService.update_markdown_registry(original_path, markdown_path, base_name, is_converted=True, project_id=project_id)
                 file_info = {
                     "original_filename": filename,
                     "markdown_filename": markdown_filename,
                     "path": markdown_path,
-                    "size": os.stat(markdown_path).st_size
+                    "size": os.stat(markdown_path).st_size,
+                    "error": f"智能分段失败: {str(e)}"
                 }
-                
-                # 更新markdown_manager.json
-                FilesService.update_markdown_registry(original_path, markdown_path, base_name, is_converted=True, project_id=project_id)
-                
                 return {
                     "success": True,
                     "file_info": file_info,
                     "error": None
                 }
+        else:
+            # 不启用智能分段，直接返回转换结果
+            file_info = {
+                "original_filename": filename,
+                "markdown_filename": markdown_filename,
+                "path": markdown_path,
+                "size": os.stat(markdown_path).st_size
+            }
+            
+            # 更新markdown_manager.json
+            FilesService.update_markdown_registry(original_path, markdown_path, base_name, is_converted=True, project_id=project_id)
             
-        except Exception as e:
-            print(f"转换文件 {filename} 失败: {str(e)}")
             return {
-                "success": False,
-                "file_info": None,
-                "error": str(e)
+                "success": True,
+                "file_info": file_info,
+                "error": None
             }
     
     @staticmethod
@@ -546,24 +623,16 @@ class FilesService:
         """
         try:
             # 根据分段策略调整参数
-            actual_max_tokens = max_tokens
-            actual_min_tokens = min_tokens
-            
-            if strategy == "conservative":
-                actual_max_tokens = int(max_tokens * 1.2)  # 更大的分段
-                actual_min_tokens = int(min_tokens * 1.5)
-            elif strategy == "aggressive":
-                actual_max_tokens = int(max_tokens * 0.8)  # 更小的分段
-                actual_min_tokens = int(min_tokens * 0.7)
+            actual_max_tokens, actual_min_tokens = resolve_split_tokens(max_tokens, min_tokens, strategy)
             
             # 创建智能分段器
-            splitter = MarkdownSplitter(
+            splitter = create_splitter(
                 max_tokens=actual_max_tokens,
                 min_tokens=actual_min_tokens
             )
             
-            # 执行分段
-            chunks = splitter.create_chunks(content)
+            # 执行分段，相同内容和参数的结果直接从缓存读取
+            chunks = split_with_cache(splitter, content)
             
             return chunks if chunks else []
             
@@ -577,7 +646,8 @@ class FilesService:
             })()]
     
     @staticmethod
-    def apply_smart_split_to_markdown(markdown_path: str, smart_split_config: Dict[str, Any], project_id: Optional[str] = None) -> Dict[str, Any]:
+    def apply_smart_split_to_markdown(markdown_path: str, smart_split_config: Dict[str, Any], project_id: Optional[str] = None,
+                                      chunks: Optional[List[Any]] = None) -> Dict[str, Any]:
         """
         对Markdown文件应用智能分段，使用MarkdownSplitter
         
@@ -585,24 +655,26 @@ class FilesService:
         - markdown_path: Markdown文件路径
         - smart_split_config: 智能分段配置
         - project_id: 项目ID
+        - chunks: 批量分段时已经计算好的分段结果，为None时读取文件并分段
         
         返回:
         - Dict: 包含分段结果的字典
         """
         try:
-            # 读取原始文件内容
-            with open(markdown_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            
-            # 获取配置参数
-            max_tokens = smart_split_config.get("maxTokens", 8000)
-            min_tokens = smart_split_config.get("minTokens", 500)
-            strategy = smart_split_config.get("splitStrategy", "balanced")
-            
-            print(f"对文件 {markdown_path} 启用智能分段 (策略: {strategy}, Token范围: {min_tokens}-{max_tokens})")
-            
-            # 应用智能分段
-            chunks = FilesService.smart_split_content(content, max_tokens, min_tokens, strategy)
+            if chunks is None:
+                # 读取原始文件内容
+                with open(markdown_path, "r", encoding="utf-8") as f:
+                    content = f.read()
+                
+                # 获取配置参数
+                max_tokens = smart_split_config.get("maxTokens", 8000)
+                min_tokens = smart_split_config.get("minTokens", 500)
+                strategy = smart_split_config.get("splitStrategy", "balanced")
+                
+                print(f"对文件 {markdown_path} 启用智能分段 (策略: {strategy}, Token范围: {min_tokens}-{max_tokens})")
+                
+                # 应用智能分段
+                chunks = FilesService.smart_split_content(content, max_tokens, min_tokens, strategy)
             
             if not chunks or len(chunks) <= 1:
                 # 如果分段后只有一个块或没有分段，保持原文件
@@ -635,9 +707,8 @@ class FilesService:
                 split_path = os.path.join(markdown_dir, split_filename)
                 
                 # 写入分段内容，格式与crawler_service保持一致
-                chunk_content = f"# {chunk.title}\n\n{chunk.content}"
                 with open(split_path, "w", encoding="utf-8") as f:
-                    f.write(chunk_content)
+                    f.write(chunk_file_content(chunk))
                 
                 # 更新registry
                 FilesService.update_markdown_registry(
@@ -657,6 +728,8 @@ class FilesService:
                     "total_splits": len(chunks)
                 })
             
+            save_chunk_tree(markdown_dir, base_name, chunks, [item["path"] for item in files])
+            
             print(f"已保存智能分段内容: {len(chunks)} 个分段文件到 {markdown_dir}")
             
             # 删除原始文件
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.utils.path_utils import get_project_output_path
+
+
+class RegistryWriter:
+    """
+    批量写入 markdown_manager.json 和 crawled_urls.json 的注册表写入器
+
+    转换任务中每个页面/分段都会更新一次注册表，如果每次都完整读取、线性查找并重写文件，
+    整个任务的I/O是O(n²)。该写入器把变更先缓存在内存中（按URL/文件路径建立索引合并重复更新），
+    按时间间隔或批量大小触发一次落盘，任务结束时调用flush()写入剩余变更。
+
+    落盘时会重新读取文件再应用变更，避免覆盖其他接口（如删除文件、爬虫）在此期间写入的内容。
+    """
+
+    def __init__(self, project_id: Optional[str] = None, flush_interval: float = 2.0, batch_size: int = 200):
+        """
+        初始化写入器
+
+        Args:
+            project_id: 项目ID
+            flush_interval: 距上次落盘超过该秒数时自动落盘
+            batch_size: 缓存的变更数达到该值时自动落盘
+        """
+        self.project_id = project_id
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.registry_path = get_project_output_path(project_id, "markdown_manager.json")
+        self.crawled_urls_path = get_project_output_path(project_id, "crawled_urls.json")
+
+        # 待写入的注册表记录：按URL去重（整页）和按文件路径去重（分段）
+        self._pending_by_url: Dict[str, Dict[str, Any]] = {}
+        self._pending_by_path: Dict[str, Dict[str, Any]] = {}
+        # 记录写入顺序，保证新增记录的id与逐条写入时一致
+        self._pending_order: List[Tuple[str, str]] = []
+        # 待写入的 crawled_urls.json 文件路径更新：url -> filePath
+        self._pending_crawled: Dict[str, str] = {}
+
+        self._last_flush = time.monotonic()
+
+    @staticmethod
+    def _normalize_path(filepath: str) -> str:
+        """确保路径格式一致"""
+        return filepath.replace('\\', '/')
+
+    @staticmethod
+    def _build_record(url: str, relative_path: str) -> Dict[str, Any]:
+        """创建基本文件记录"""
+        return {
+            "url": url,
+            "filePath": relative_path,
+            "timestamp": datetime.now().isoformat(),
+            "isDataset": False
+        }
+
+    def update_markdown_registry(self, url: str, filepath: str):
+        """缓存一条按URL去重的注册表更新，语义同 CrawlerService.update_markdown_registry"""
+        relative_path = self._normalize_path(filepath)
+        if url not in self._pending_by_url:
+            self._pending_order.append(("url", url))
+        self._pending_by_url[url] = self._build_record(url, relative_path)
+        self._maybe_flush()
+
+    def update_markdown_registry_for_chunk(self, url: str, filepath: str):
+        """缓存一条按文件路径去重的注册表更新，语义同 CrawlerService.update_markdown_registry_for_chunk"""
+        relative_path = self._normalize_path(filepath)
+        if relative_path not in self._pending_by_path:
+            self._pending_order.append(("path", relative_path))
+        self._pending_by_path[relative_path] = self._build_record(url, relative_path)
+        self._maybe_flush()
+
+    def update_crawled_url_filepath(self, url: str, filepath: str):
+        """缓存一条 crawled_urls.json 的文件路径更新"""
+        self._pending_crawled[url] = self._normalize_path(filepath)
+        self._maybe_flush()
+
+    def pending_count(self) -> int:
+        """当前缓存的变更数量"""
+        return len(self._pending_order) + len(self._pending_crawled)
+
+    def _maybe_flush(self):
+        """达到批量大小或时间间隔时落盘"""
+        if (self.pending_count() >= self.batch_size or
+                time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self) -> bool:
+        """将缓存的变更写入磁盘，每个文件只读写一次"""
+        success = True
+        if self._pending_order:
+            success = self._flush_markdown_registry() and success
+        if self._pending_crawled:
+            success = self._flush_crawled_urls() and success
+        self._last_flush = time.monotonic()
+        return success
+
+    def _flush_markdown_registry(self) -> bool:
+        """应用缓存的注册表记录"""
+        registry_data = []
+        if os.path.exists(self.registry_path):
+            with open(self.registry_path, 'r', encoding='utf-8') as f:
+                try:
+                    registry_data = json.load(f)
+                    if not isinstance(registry_data, list):
+                        registry_data = []
+                except json.JSONDecodeError:
+                    # 文件内容不是有效的JSON
+                    registry_data = []
+
+        # 建立索引：保留每个URL/文件路径第一次出现的位置，与线性查找的结果一致
+        url_index: Dict[str, int] = {}
+        path_index: Dict[str, int] = {}
+        for i, item in enumerate(registry_data):
+            if isinstance(item, dict):
+                url_index.setdefault(item.get('url'), i)
+                path_index.setdefault(item.get('filePath'), i)
+
+        try:
+            for kind, key in self._pending_order:
+                if kind == "url":
+                    file_record = self._pending_by_url[key]
+                    index = url_index.get(key)
+                else:
+                    file_record = self._pending_by_path[key]
+                    index = path_index.get(key)
+
+                if index is not None:
+                    # 更新现有记录
+                    item = registry_data[index]
+                    old_path = item.get('filePath')
+                    item.update(file_record)
+                    if old_path != item['filePath'] and path_index.get(old_path) == index:
+                        del path_index[old_path]
+                    path_index.setdefault(item['filePath'], index)
+                else:
+                    # 添加新记录
+                    file_record['id'] = len(registry_data) + 1
+                    registry_data.append(file_record)
+                    index = len(registry_data) - 1
+                    url_index.setdefault(file_record['url'], index)
+                    path_index.setdefault(file_record['filePath'], index)
+
+            with open(self.registry_path, 'w', encoding='utf-8') as f:
+                json.dump(registry_data, f, ensure_ascii=False, indent=2)
+
+            self._pending_by_url.clear()
+            self._pending_by_path.clear()
+            self._pending_order.clear()
+            return True
+        except Exception as e:
+            print(f"批量更新Markdown注册表时出错: {str(e)}")
+            logging.error(f"批量更新Markdown注册表时出错: {str(e)}")
+            return False
+
+    def _flush_crawled_urls(self) -> bool:
+        """应用缓存的 crawled_urls.json 文件路径更新"""
+        if not os.path.exists(self.crawled_urls_path):
+            self._pending_crawled.clear()
+            return True
+        try:
+            with open(self.crawled_urls_path, 'r', encoding='utf-8') as f:
+                crawled_data = json.load(f)
+
+            updated = False
+            remaining = dict(self._pending_crawled)
+            for item in crawled_data:
+                if not remaining:
+                    break
+                if isinstance(item, dict) and item.get('url') in remaining:
+                    item['filePath'] = remaining.pop(item['url'])
+                    updated = True
+
+            if updated:
+                with open(self.crawled_urls_path, 'w', encoding='utf-8') as f:
+                    json.dump(crawled_data, f, ensure_ascii=False, indent=2)
+
+            self._pending_crawled.clear()
+            return True
+        except Exception as e:
+            print(f"批量更新crawled_urls.json时出错: {str(e)}")
+            return False
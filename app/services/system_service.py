@@ -193,6 +193,10 @@ class SystemService:
             
             # 处理可选字段
             custom_item["isDefault"] = model_data.get("isDefault", False)
+            # 并发数、每分钟请求数/Token数限制和是否参与多模型分配，生成数据集时使用
+            for field in ["concurrency", "maxConcurrency", "rpm", "tpm", "routing"]:
+                if field in model_data:
+                    custom_item[field] = model_data[field]
         except KeyError as e:
             return {"status": "error", "message": f"缺少必要字段: {str(e)}"}
         except Exception as e:
@@ -1,6 +1,8 @@
 import os
 import json
 import logging
+import threading
+from collections import OrderedDict
 from typing import Any, Optional, Union
 from pathlib import Path
 
@@ -118,4 +120,87 @@ class FileUtils:
             return False
         except Exception as e:
             logging.error(f"删除失败 {path}: {str(e)}")
-            return False 
\ No newline at end of file
+            return False 
+
+
+class LRUFileIndex:
+    """
+    缓存目录的内存索引，按最近使用顺序记录每个文件的大小，写入时无需扫描整个目录即可淘汰
+    
+    首次使用时扫描一次目录，按修改时间排序；多个进程共享目录时，其他进程写入的文件不在索引中，
+    每写入 rescan_interval 个文件重新扫描一次目录以纠正偏差。删除时忽略已被其他进程删除的文件。
+    """
+    
+    def __init__(self, directory: Union[str, Path], max_entries: int, max_bytes: int,
+                 suffix: str = ".json", rescan_interval: int = 1000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.rescan_interval = rescan_interval
+        self.total_bytes = 0
+        self._entries: Optional[OrderedDict] = None
+        self._adds = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries) if self._entries is not None else 0
+    
+    def _scan(self):
+        """扫描目录，按修改时间从旧到新重建索引"""
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.name.endswith(self.suffix):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        except OSError as e:
+            logging.error(f"扫描缓存目录失败 {self.directory}: {str(e)}")
+        entries.sort()
+        self._entries = OrderedDict((path, size) for _, path, size in entries)
+        self.total_bytes = sum(self._entries.values())
+        self._adds = 0
+    
+    def touch(self, path: str):
+        """缓存命中时标记为最近使用"""
+        with self._lock:
+            if self._entries is not None and path in self._entries:
+                self._entries.move_to_end(path)
+    
+    def add(self, path: str, size: int) -> int:
+        """
+        记录新写入的文件，超过条数或总大小上限时删除最久未用的文件
+        
+        Args:
+            path: 文件路径
+            size: 文件大小
+            
+        Returns:
+            int: 删除的文件数
+        """
+        removed = []
+        with self._lock:
+            if self._entries is None or self._adds >= self.rescan_interval:
+                self._scan()
+            self._adds += 1
+            self.total_bytes += size - self._entries.pop(path, 0)
+            self._entries[path] = size
+            while self._entries and (len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes):
+                oldest, oldest_size = self._entries.popitem(last=False)
+                self.total_bytes -= oldest_size
+                removed.append(oldest)
+        
+        for oldest in removed:
+            try:
+                os.remove(oldest)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.error(f"删除缓存文件失败 {oldest}: {str(e)}")
+        return len(removed)
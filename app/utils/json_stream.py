@@ -0,0 +1,140 @@
+import json
+import logging
+from typing import List, Dict, Any, Optional
+
+from app.utils.tolerant_json import tolerant_parse
+
+
+class QAPairStreamParser:
+    """
+    增量解析大模型流式返回的问答对JSON
+
+    逐段喂入文本，每当 {"qa_pairs": [...]} 数组（或顶层数组）中的一个对象闭合时立即解析并返回该对象，
+    不需要等待完整响应。第一个 { 或 [ 之前的内容（如 ```json 代码块标记）被忽略；
+    响应被截断时，已经闭合的问答对都能得到，未闭合的最后一个对象被丢弃。
+    每次只扫描新喂入的文本，只保留尚未闭合的问答对象（或字符串）所在的片段用于解析。
+    """
+
+    ARRAY_KEY = "qa_pairs"
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self._pos = 0
+        self._pending = ""  # 从 _pending_start 开始、解析时还需要的文本
+        self._pending_start = 0
+        self._started = False
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._key: Optional[str] = None
+        self._array_depth: Optional[int] = None
+        self._item_start: Optional[int] = None
+        self.finished = False  # 问答对数组已经闭合
+
+    @property
+    def text(self) -> str:
+        """已经喂入的全部文本"""
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        追加一段文本
+
+        Args:
+            chunk: 新收到的文本
+
+        Returns:
+            List[Dict[str, Any]]: 本次新闭合的问答对象
+        """
+        self._chunks.append(chunk)
+        self._pending += chunk
+        items = []
+        for offset, char in enumerate(chunk):
+            index = self._pos + offset
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    # 只有对象中的字符串可能是键，截取短字符串即可
+                    if index - self._string_start < 64:
+                        self._last_string = self._slice(self._string_start + 1, index)
+                continue
+
+            if not self._started:
+                if char not in '{[':
+                    continue
+                self._started = True
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char == ':':
+                self._key = self._last_string
+            elif char in '{[':
+                self._open(char, index)
+            elif char in '}]':
+                item = self._close(char, index)
+                if item is not None:
+                    items.append(item)
+            elif char == ',':
+                self._key = None
+        self._pos += len(chunk)
+        self._trim_pending()
+        return items
+
+    def _slice(self, start: int, end: int) -> str:
+        return self._pending[start - self._pending_start:end - self._pending_start]
+
+    def _trim_pending(self):
+        """丢弃之后不会再用到的文本：只保留未闭合的问答对象或字符串"""
+        if self._item_start is not None:
+            keep = self._item_start
+        elif self._in_string:
+            keep = self._string_start
+        else:
+            keep = self._pos
+        if keep > self._pending_start:
+            self._pending = self._pending[keep - self._pending_start:]
+            self._pending_start = keep
+
+    def _open(self, char: str, index: int):
+        depth = len(self._stack)
+        if self._array_depth is None and char == '[' and not self.finished:
+            # 顶层数组，或顶层对象中 qa_pairs 键的值
+            if depth == 0 or (depth == 1 and self._stack[0] == '{' and self._key == self.ARRAY_KEY):
+                self._array_depth = depth + 1
+        elif char == '{' and self._array_depth is not None and depth == self._array_depth:
+            self._item_start = index
+        self._stack.append(char)
+        self._key = None
+
+    def _close(self, char: str, index: int) -> Optional[Dict[str, Any]]:
+        if not self._stack:
+            return None
+        self._stack.pop()
+        depth = len(self._stack)
+        if self._array_depth is None:
+            return None
+        if char == ']' and depth == self._array_depth - 1:
+            self._array_depth = None
+            self.finished = True
+            return None
+        if char == '}' and depth == self._array_depth and self._item_start is not None:
+            item_text = self._slice(self._item_start, index + 1)
+            self._item_start = None
+            try:
+                item = json.loads(item_text)
+            except ValueError:
+                item, complete = tolerant_parse(item_text)
+                if not complete:
+                    logging.warning(f"问答对JSON解析失败: {item_text[:100]}")
+                    return None
+            return item if isinstance(item, dict) else None
+        return None
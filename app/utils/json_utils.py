@@ -1,49 +1,11 @@
-import re
 import json
 from typing import Any, Optional
 
+from app.utils.tolerant_json import tolerant_parse
+
 class JsonUtils:
     """JSON工具类，提供JSON格式化和处理功能"""
     
-    @staticmethod
-    def fix_json_format(json_text: str) -> str:
-        """
-        修复常见的JSON格式问题
-        
-        Args:
-            json_text: 需要修复的JSON文本
-            
-        Returns:
-            str: 修复后的JSON文本
-        """
-        if not json_text or not json_text.strip():
-            return "{}"
-            
-        # 1. 替换单引号为双引号
-        result = json_text.replace("'", "\"")
-        
-        # 2. 确保属性名使用双引号
-        result = re.sub(r'([{,])\s*([a-zA-Z0-9_]+)\s*:', r'\1"\2":', result)
-        
-        # 3. 修复尾部逗号问题
-        result = re.sub(r',\s*}', '}', result)
-        result = re.sub(r',\s*]', ']', result)
-        
-        # 4. 删除注释
-        result = re.sub(r'//.*?\n', '\n', result)
-        result = re.sub(r'/\*.*?\*/', '', result, flags=re.DOTALL)
-        
-        # 5. 处理无效的控制字符
-        result = ''.join(ch for ch in result if (ch >= ' ' and ord(ch) < 127) or ch in ['\n', '\r', '\t'])
-        
-        # 6. 替换不规范的转义序列
-        result = re.sub(r'\\([^"\\/bfnrtu])', r'\1', result)
-        
-        # 7. 修复缺少逗号的问题
-        result = re.sub(r'([\}\]])\s*(\")', r'\1,\2', result)
-        
-        return result
-    
     @staticmethod
     def safe_loads(json_text: str, default_value: Any = None) -> Any:
         """
@@ -61,12 +23,9 @@ class JsonUtils:
                 return default_value
             return json.loads(json_text)
         except json.JSONDecodeError:
-            try:
-                # 尝试修复并重新解析
-                fixed_text = JsonUtils.fix_json_format(json_text)
-                return json.loads(fixed_text)
-            except:
-                return default_value
+            # 使用容错解析器解析不规范的JSON
+            result, complete = tolerant_parse(json_text)
+            return result if complete else default_value
     
     @staticmethod
     def safe_dumps(data: Any, ensure_ascii: bool = False, indent: Optional[int] = None) -> str:
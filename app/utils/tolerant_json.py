@@ -0,0 +1,262 @@
+import re
+from typing import Any, List, Optional, Tuple
+
+# 字符串中的合法转义
+_ESCAPES = {'"': '"', "'": "'", '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+# 字符串结束引号之后可能出现的字符，其他字符前的引号视为字符串内容
+_AFTER_STRING = set(',:}]"\'')
+# 未加引号的值在这些字符处结束
+_BARE_VALUE_END = set(',}]\n')
+_BARE_KEY_END = set(':：,{}[]"\'\n\t\r ')
+_NUMBER_PATTERN = re.compile(r'-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?$')
+_LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+class TolerantJSONParser:
+    """
+    容错的JSON解析器，单次扫描解析大模型返回的不规范JSON
+
+    能处理的问题：代码块标记和前后说明文字、尾部逗号和缺少的逗号、未加引号的键和值、单引号字符串、
+    字符串中未转义的引号和换行、无效的转义、注释、多余或缺少的括号以及响应被截断。
+    字符串内容原样保留（包括中文等非ASCII字符）。
+
+    响应被截断时，数组中未闭合的对象和数组被丢弃，其他未闭合的容器自动闭合，
+    因此 {"qa_pairs": [...]} 中已完整生成的问答对都能得到，最后一个不完整的问答对被丢弃。
+    """
+
+    def __init__(self, text: str):
+        self.text = text or ""
+        self.pos = 0
+        self.length = len(self.text)
+        self._stack: List[str] = []
+        self.complete = False  # 顶层JSON是否完整闭合
+
+    def parse(self) -> Any:
+        """
+        解析文本中的第一个JSON对象或数组
+
+        Returns:
+            Any: 解析结果
+
+        Raises:
+            ValueError: 文本中没有JSON对象或数组
+        """
+        starts = [index for index in (self.text.find('{'), self.text.find('[')) if index >= 0]
+        if not starts:
+            raise ValueError("文本中没有JSON对象或数组")
+        self.pos = min(starts)
+        value, self.complete = self._value()
+        return value
+
+    def _skip_whitespace(self):
+        text, length = self.text, self.length
+        while self.pos < length:
+            char = text[self.pos]
+            if char.isspace():
+                self.pos += 1
+            elif char == '/' and text.startswith('//', self.pos):
+                end = text.find('\n', self.pos)
+                self.pos = length if end < 0 else end + 1
+            elif char == '/' and text.startswith('/*', self.pos):
+                end = text.find('*/', self.pos + 2)
+                self.pos = length if end < 0 else end + 2
+            else:
+                return
+
+    def _value(self) -> Tuple[Any, bool]:
+        """解析一个值，返回 (值, 是否完整)"""
+        self._skip_whitespace()
+        if self.pos >= self.length:
+            return None, False
+        char = self.text[self.pos]
+        if char == '{':
+            return self._object()
+        if char == '[':
+            return self._array()
+        if char in '"\'':
+            return self._string(char)
+        return self._bare_value()
+
+    def _closes_outer(self, char: str) -> bool:
+        """右括号与当前容器不匹配但与外层容器匹配时，视为当前容器缺少右括号"""
+        return any(_CLOSERS[opener] == char for opener in self._stack[:-1])
+
+    def _object(self) -> Tuple[dict, bool]:
+        self.pos += 1
+        self._stack.append('{')
+        result = {}
+        try:
+            while True:
+                self._skip_whitespace()
+                if self.pos >= self.length:
+                    return result, False
+                char = self.text[self.pos]
+                if char == '}':
+                    self.pos += 1
+                    return result, True
+                if char in ',;':
+                    self.pos += 1
+                    continue
+                if char == ']':
+                    if self._closes_outer(char):
+                        return result, True
+                    self.pos += 1
+                    continue
+                if char in '"\'':
+                    key, complete = self._string(char)
+                    if not complete:
+                        return result, False
+                elif char in '{[':
+                    # 缺少键名的值，解析后丢弃
+                    _, complete = self._value()
+                    if not complete:
+                        return result, False
+                    continue
+                else:
+                    key = self._bare_key()
+                    if not key:
+                        self.pos += 1
+                        continue
+
+                self._skip_whitespace()
+                if self.pos < self.length and self.text[self.pos] in ':：=':
+                    self.pos += 1
+                    self._skip_whitespace()
+                if self.pos >= self.length:
+                    return result, False
+                if self.text[self.pos] in ',}]':
+                    # 缺少值
+                    continue
+                value, complete = self._value()
+                if not complete:
+                    if isinstance(value, (dict, list)):
+                        result[key] = value
+                    return result, False
+                result[key] = value
+        finally:
+            self._stack.pop()
+
+    def _array(self) -> Tuple[list, bool]:
+        self.pos += 1
+        self._stack.append('[')
+        result = []
+        try:
+            while True:
+                self._skip_whitespace()
+                if self.pos >= self.length:
+                    return result, False
+                char = self.text[self.pos]
+                if char == ']':
+                    self.pos += 1
+                    return result, True
+                if char == ',':
+                    self.pos += 1
+                    continue
+                if char == '}':
+                    if self._closes_outer(char):
+                        return result, True
+                    self.pos += 1
+                    continue
+                value, complete = self._value()
+                if not complete:
+                    # 数组中被截断的元素丢弃
+                    return result, False
+                result.append(value)
+        finally:
+            self._stack.pop()
+
+    def _string(self, quote: str) -> Tuple[str, bool]:
+        text, length = self.text, self.length
+        self.pos += 1
+        parts: List[str] = []
+        while True:
+            # 一次取出到下一个引号或反斜杠之前的内容
+            quote_at = text.find(quote, self.pos)
+            if quote_at < 0:
+                quote_at = length
+            slash_at = text.find('\\', self.pos, quote_at)
+            end = quote_at if slash_at < 0 else slash_at
+            parts.append(text[self.pos:end])
+            self.pos = end
+            if self.pos >= length:
+                return ''.join(parts), False
+            char = text[self.pos]
+            if char == '\\':
+                if self.pos + 1 >= length:
+                    self.pos = length
+                    return ''.join(parts), False
+                parts.append(self._escape())
+                continue
+            # 引号之后是结构字符或换行时字符串结束，否则是字符串中未转义的引号
+            self.pos += 1
+            lookahead = self.pos
+            newline = False
+            while lookahead < length and text[lookahead].isspace():
+                newline = newline or text[lookahead] == '\n'
+                lookahead += 1
+            if newline or lookahead >= length or text[lookahead] in _AFTER_STRING:
+                return ''.join(parts), True
+            parts.append(quote)
+
+    def _escape(self) -> str:
+        text = self.text
+        char = text[self.pos + 1]
+        if char == 'u':
+            code = text[self.pos + 2:self.pos + 6]
+            if len(code) == 4 and all(c in '0123456789abcdefABCDEF' for c in code):
+                self.pos += 6
+                value = int(code, 16)
+                # 代理对
+                if 0xD800 <= value < 0xDC00 and text.startswith('\\u', self.pos):
+                    low = text[self.pos + 2:self.pos + 6]
+                    if len(low) == 4 and all(c in '0123456789abcdefABCDEF' for c in low) and 0xDC00 <= int(low, 16) < 0xE000:
+                        self.pos += 6
+                        return chr(0x10000 + ((value - 0xD800) << 10) + (int(low, 16) - 0xDC00))
+                return chr(value)
+        self.pos += 2
+        # 无效的转义保留被转义的字符
+        return _ESCAPES.get(char, char)
+
+    def _bare_key(self) -> str:
+        start = self.pos
+        while self.pos < self.length and self.text[self.pos] not in _BARE_KEY_END:
+            self.pos += 1
+        return self.text[start:self.pos]
+
+    def _bare_value(self) -> Tuple[Any, bool]:
+        start = self.pos
+        while self.pos < self.length and self.text[self.pos] not in _BARE_VALUE_END:
+            self.pos += 1
+        word = self.text[start:self.pos].strip()
+        complete = self.pos < self.length
+        if word in _LITERALS:
+            return _LITERALS[word], complete
+        if _NUMBER_PATTERN.match(word):
+            return (float(word) if any(c in word for c in '.eE') else int(word)), complete
+        return word, complete
+
+
+def tolerant_loads(text: str) -> Any:
+    """
+    容错解析JSON文本，见 TolerantJSONParser
+
+    Raises:
+        ValueError: 文本中没有JSON对象或数组
+    """
+    return TolerantJSONParser(text).parse()
+
+
+def tolerant_parse(text: str) -> Tuple[Optional[Any], bool]:
+    """
+    容错解析JSON文本
+
+    Returns:
+        Tuple[Optional[Any], bool]: 解析结果（没有JSON时为None）和JSON是否完整闭合
+    """
+    parser = TolerantJSONParser(text)
+    try:
+        value = parser.parse()
+    except ValueError:
+        return None, False
+    return value, parser.complete
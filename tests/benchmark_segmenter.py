@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+句子切分与标题识别的微基准：对比原实现与 app.core.segmenter
+
+用法: python tests/benchmark_segmenter.py [重复次数]
+"""
+
+import os
+import re
+import sys
+import timeit
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.segmenter import is_header_line, split_markdown_sentences
+
+
+def legacy_split_sentences(text):
+    """原 MarkdownSplitter._split_into_sentences_improved"""
+    paragraphs = text.split('\n\n')
+    sentences = []
+    for paragraph in paragraphs:
+        if not paragraph.strip():
+            continue
+        para_sentences = re.split(r'([。！？.!?]+\s*)', paragraph)
+        current_sentence = ''
+        for i in range(0, len(para_sentences), 2):
+            if i < len(para_sentences):
+                current_sentence += para_sentences[i]
+                if i + 1 < len(para_sentences):
+                    current_sentence += para_sentences[i + 1]
+                if current_sentence.strip():
+                    sentences.append(current_sentence + '\n')
+                    current_sentence = ''
+        if current_sentence.strip():
+            sentences.append(current_sentence + '\n')
+        if sentences:
+            sentences.append('\n')
+    return sentences
+
+
+def legacy_is_header_line(line):
+    """原 MarkdownSplitter._is_header_line"""
+    header_match = re.match(r'^(#{1,6})\s+(.+)', line.strip())
+    if header_match:
+        return True, len(header_match.group(1)), header_match.group(2).strip()
+    return False, 0, ""
+
+
+def build_corpus(paragraphs=400):
+    """中英文混合语料，包含缩写、小数、行内代码和链接"""
+    parts = []
+    for i in range(paragraphs):
+        parts.append(f"## 第{i}节 Section {i}")
+        parts.append(
+            f"机器学习是人工智能的一个分支。它让计算机从数据中学习！模型的准确率达到了 9{i % 10}.5% 吗？"
+            f"See Fig. {i} and e.g. the `model.fit()` call in [docs](https://example.com/a.b?x={i}). "
+            f"Dr. Smith said the results were promising. Version 3.{i % 7} was released in Jan. 2024! "
+            f"下一步是部署到生产环境，并持续监控（包括延迟、吞吐量等指标）。"
+        )
+    return "\n\n".join(parts)
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    corpus = build_corpus()
+    lines = corpus.split('\n')
+    print(f"语料: {len(corpus)} 字符, {len(lines)} 行, 重复 {repeat} 次")
+
+    cases = [
+        ("句子切分 原实现", lambda: legacy_split_sentences(corpus)),
+        ("句子切分 segmenter", lambda: split_markdown_sentences(corpus)),
+        ("标题识别 原实现", lambda: [legacy_is_header_line(line) for line in lines]),
+        ("标题识别 segmenter", lambda: [is_header_line(line) for line in lines]),
+    ]
+    for name, func in cases:
+        seconds = min(timeit.repeat(func, number=repeat, repeat=3)) / repeat
+        print(f"{name:<20} {seconds * 1000:8.3f} ms/次")
+
+    legacy = legacy_split_sentences(corpus)
+    current = split_markdown_sentences(corpus)
+    print(f"句子数: 原实现 {len(legacy)}, segmenter {len(current)}（不再在小数、缩写、代码和链接处切分）")
+
+
+if __name__ == "__main__":
+    main()
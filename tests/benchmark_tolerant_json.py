@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+问答对JSON解析的基准：在模拟的大模型不规范输出语料上对比原修复链与 app.utils.tolerant_json，
+统计解析出的问答对数、保留中文的问答对数和耗时
+
+用法: python tests/benchmark_tolerant_json.py [重复次数]
+"""
+
+import os
+import re
+import sys
+import json
+import logging
+import timeit
+from typing import Dict, Any, List
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.dataset_service import DatasetService
+
+standardize_qa_pair = DatasetService.standardize_qa_pair
+
+# ---- 原实现：DatasetService.parse_qa_pairs 及其 fix_* 修复链 ----
+
+
+def legacy_parse_qa_pairs(generated_text: str, file_path: str) -> List[Dict[str, Any]]:
+    """
+    解析大模型返回的问答对，先简单处理返回的格式问题，如果返回的JSON格式不正确，则尝试多次修复，
+    最后回退到按“问题/答案”行提取
+
+    Args:
+        generated_text: 大模型返回的文本
+        file_path: 来源文件路径
+
+    Returns:
+        List[Dict[str, Any]]: 标准化后的问答对
+    """
+    # 去除可能的Markdown代码块标记
+    if generated_text.startswith("```"):
+        # 查找第一个和最后一个```
+        first_ticks = generated_text.find("\n", generated_text.find("```"))
+        last_ticks = generated_text.rfind("```")
+        if first_ticks != -1 and last_ticks != -1:
+            # 提取```之间的内容
+            generated_text = generated_text[first_ticks+1:last_ticks].strip()
+
+    try:
+        # 检查返回结果是否被截断
+        is_truncated = not generated_text.strip().endswith('}') and '{' in generated_text
+        if is_truncated:
+            logging.warning(f"大模型返回结果可能被截断: 文件 {file_path}")
+            generated_text = legacy_fix_truncated_json(generated_text)
+        result = json.loads(generated_text)
+    except json.JSONDecodeError as e:
+        logging.error(f"JSON解析错误: {str(e)}")
+        # 尝试更高级的JSON修复
+        try:
+            result = json.loads(legacy_fix_complex_json_format(generated_text))
+        except Exception:
+            result = None
+
+    if result is not None:
+        if isinstance(result, dict) and isinstance(result.get('qa_pairs'), list):
+            qa_pairs = []
+            for qa_pair in result['qa_pairs']:
+                if isinstance(qa_pair, dict) and "question" in qa_pair and "answer" in qa_pair:
+                    # 标准化处理QA对字段
+                    standardized_qa_pair = standardize_qa_pair(qa_pair)
+                    standardized_qa_pair["source"] = file_path
+                    qa_pairs.append(standardized_qa_pair)
+            return qa_pairs
+        logging.warning(f"API返回的JSON缺少'qa_pairs'字段或格式不符合预期")
+        return []
+
+    # 如果JSON修复失败，回退到基本的问答提取
+    questions = []
+    answers = []
+    current_answer = ""
+
+    for line in generated_text.split("\n"):
+        if line.startswith("问题") or line.startswith("Q:"):
+            if current_answer and questions:
+                answers.append(current_answer.strip())
+                current_answer = ""
+            questions.append(line.split(":", 1)[1].strip())
+        elif line.startswith("答案") or line.startswith("A:"):
+            current_answer = line.split(":", 1)[1].strip()
+        elif current_answer:
+            current_answer += " " + line.strip()
+
+    if current_answer:
+        answers.append(current_answer.strip())
+
+    # 将提取的问答对添加到结果中
+    return [
+        standardize_qa_pair({
+            "question": question,
+            "answer": answer,
+            "source": file_path,
+            "label": "未分类"
+        })
+        for question, answer in zip(questions, answers)
+    ]
+
+
+def legacy_fix_json_format(json_text):
+    """修复常见的JSON格式问题"""
+
+    # 如果输入为空，返回有效的空JSON对象
+    if not json_text or not json_text.strip():
+        return "{}"
+
+    # 1. 替换单引号为双引号
+    result = json_text.replace("'", "\"")
+
+    # 2. 确保属性名使用双引号
+    result = re.sub(r'([{,])\s*([a-zA-Z0-9_]+)\s*:', r'\1"\2":', result)
+
+    # 3. 修复尾部逗号问题
+    result = re.sub(r',\s*}', '}', result)
+    result = re.sub(r',\s*]', ']', result)
+
+    # 4. 删除注释
+    result = re.sub(r'//.*?\n', '\n', result)
+    result = re.sub(r'/\*.*?\*/', '', result, flags=re.DOTALL)
+
+    # 5. 全面处理无效的控制字符（包括不可见控制字符和无效Unicode）
+    # 仅保留合法的字符：可打印字符、换行、回车、制表符
+    result = ''.join(ch for ch in result if (ch >= ' ' and ord(ch) < 127) or ch in ['\n', '\r', '\t'])
+
+    # 6. 替换不规范的转义序列
+    result = re.sub(r'\\([^"\\/bfnrtu])', r'\1', result)
+
+    # 7. 修复常见编码问题，替换非ASCII字符
+    result = re.sub(r'[\x80-\xff]', ' ', result)
+
+    # 8. 修复缺少逗号的问题 - 在任何一个右括号或右引号后面跟着左引号的地方插入逗号
+    result = re.sub(r'([\}\]])\s*(\")', r'\1,\2', result)
+    result = re.sub(r'(\")(\s*\"[^\"]*\":\s*)', r'\1,\2', result)  # "key": "value" "key2": "value2" => "key": "value", "key2": "value2"
+
+    return result
+
+
+def legacy_fix_truncated_json(json_text):
+    """修复被截断的JSON字符串"""
+
+    if not json_text:
+        return json_text
+
+    # 移除首尾空白
+    json_text = json_text.strip()
+
+    # 如果JSON以{开始但没有以}结束，说明可能被截断
+    if json_text.startswith('{') and not json_text.endswith('}'):
+        # 尝试找到最后一个完整的对象或数组
+
+        # 1. 找到最后一个完整的键值对
+        last_complete_pair_pos = -1
+        brace_count = 0
+        in_string = False
+        escape_next = False
+
+        for i, char in enumerate(json_text):
+            if escape_next:
+                escape_next = False
+                continue
+
+            if char == '\\':
+                escape_next = True
+                continue
+
+            if char == '"' and not escape_next:
+                in_string = not in_string
+                continue
+
+            if in_string:
+                continue
+
+            if char == '{':
+                brace_count += 1
+            elif char == '}':
+                brace_count -= 1
+                if brace_count == 1:  # 回到主对象层级
+                    last_complete_pair_pos = i
+            elif char == ',' and brace_count == 1:
+                last_complete_pair_pos = i
+
+        # 2. 如果找到了最后完整的位置，截断到那里
+        if last_complete_pair_pos > 0:
+            # 检查最后是否是逗号，如果是则移除它
+            truncated = json_text[:last_complete_pair_pos].rstrip()
+            if truncated.endswith(','):
+                truncated = truncated[:-1]
+            json_text = truncated
+
+        # 3. 处理未闭合的字符串
+        quote_count = json_text.count('"')
+        # 计算转义字符的影响
+        escaped_quotes = len(re.findall(r'\\"', json_text))
+        actual_quotes = quote_count - escaped_quotes
+
+        if actual_quotes % 2 != 0:
+            # 有未闭合的字符串，在适当位置添加闭合引号
+            json_text += '"'
+
+        # 4. 添加缺失的右花括号和方括号
+        open_braces = json_text.count('{') - json_text.count('}')
+        open_brackets = json_text.count('[') - json_text.count(']')
+
+        # 先闭合数组，再闭合对象
+        json_text += ']' * open_brackets
+        json_text += '}' * open_braces
+
+    return json_text
+
+
+def legacy_fix_complex_json_format(json_text):
+    """处理更复杂的JSON格式问题"""
+
+    # 0. 尝试保存原始输入，以便在所有修复尝试失败时使用基本文本提取
+    original_text = json_text
+
+    # 1. 首先应用基本修复
+    result = legacy_fix_json_format(json_text)
+
+    # 2. 尝试从文本中提取JSON部分
+    # 查找 { 开始到最后一个 } 的内容
+    json_match = re.search(r'({.*})', result, re.DOTALL)
+    if json_match:
+        result = json_match.group(1)
+
+    # 3. 检查并补全缺失的引号
+    # 查找可能缺少引号的键
+    result = re.sub(r'([{,])\s*([a-zA-Z0-9_]+)\s*:', r'\1"\2":', result)
+
+    # 4. 修复未终止的字符串（如果引号数量为奇数）
+    # 计算双引号出现次数
+    quote_count = result.count('"')
+    if quote_count % 2 != 0:
+        # 找到最后一个未闭合的引号位置
+        open_quotes = []
+        for i, char in enumerate(result):
+            if char == '"' and (i == 0 or result[i-1] != '\\'):
+                if len(open_quotes) == 0:
+                    open_quotes.append(i)
+                else:
+                    open_quotes.pop()
+
+        # 如果存在未闭合的引号，在其后添加一个闭合引号
+        if open_quotes:
+            last_open = open_quotes[-1]
+            next_comma = result.find(',', last_open)
+            next_closing = result.find('}', last_open)
+            next_bracket = result.find(']', last_open)
+
+            insertion_point = len(result)
+            if next_comma > 0:
+                insertion_point = min(insertion_point, next_comma)
+            if next_closing > 0:
+                insertion_point = min(insertion_point, next_closing)
+            if next_bracket > 0:
+                insertion_point = min(insertion_point, next_bracket)
+
+            result = result[:insertion_point] + '"' + result[insertion_point:]
+
+    # 5. 添加缺失的逗号
+    # 更复杂的逗号修复 - 使用正则表达式查找缺失逗号的模式
+    # 在右括号或引号后面跟着左引号的地方添加逗号
+    result = re.sub(r'(["\d}])\s*(")', r'\1,\2', result)
+    # 修复JSON对象中键值对之间缺少的逗号
+    result = re.sub(r'(:\s*["\w\d.\[\]{}]+)\s+(")', r'\1,\2', result)
+
+    # 5.5 修复缺少冒号分隔符的情况 - 处理 "Expecting ':' delimiter" 错误
+    # 查找键名后面缺少冒号的模式
+    result = re.sub(r'(["]\s*[a-zA-Z0-9_]+\s*["]\s*)(\s*["{[])', r'\1:\2', result)
+    # 查找键值对中间缺少冒号的模式 - 引号内的键名与引号值之间
+    result = re.sub(r'(["]\s*[a-zA-Z0-9_]+\s*["]\s*)([^:{\[])', r'\1:\2', result)
+    # 处理无引号的键名和值之间缺少冒号的情况
+    result = re.sub(r'([a-zA-Z0-9_"]+)\s+([a-zA-Z0-9_"{[])', r'\1:\2', result)
+
+    # 6. 修复嵌套结构中的错误
+    # 添加缺失的右括号
+    # 计算左右括号数量
+    left_braces = result.count('{')
+    right_braces = result.count('}')
+    if left_braces > right_braces:
+        result += '}' * (left_braces - right_braces)
+
+    # 计算左右方括号数量
+    left_brackets = result.count('[')
+    right_brackets = result.count(']')
+    if left_brackets > right_brackets:
+        result += ']' * (left_brackets - right_brackets)
+
+    # 7. 如果JSON格式仍有问题，尝试提取问答对
+    try:
+        # 尝试解析修复后的结果
+        json.loads(result)
+    except Exception:
+        # 如果仍然解析失败，尝试提取文本中的问答对
+        try:
+            # 清除之前的修复尝试，从原始文本中提取问答对
+            qa_pairs = legacy_extract_qa_pairs_from_text(original_text)
+            if qa_pairs:
+                return json.dumps({"qa_pairs": qa_pairs}, ensure_ascii=False)
+        except Exception:
+            pass
+
+    # 8. 最后，尝试一次自动修复 - 将结果解析为Python对象然后重新序列化为JSON
+    try:
+        # 尝试解析修复后的结果
+        parsed_data = json.loads(result)
+        # 然后重新序列化为标准JSON，确保格式正确
+        result = json.dumps(parsed_data, ensure_ascii=False)
+    except Exception:
+        # 如果仍然解析失败，保留现有的修复结果
+        pass
+
+    return result
+
+
+def legacy_extract_qa_pairs_from_text(text):
+    """从非JSON文本中提取问答对"""
+
+    # 如果文本为空，返回空列表
+    if not text or not text.strip():
+        return []
+
+    qa_pairs = []
+
+    # 首先尝试使用常见问答格式（问题：答案：）
+    questions = []
+    answers = []
+    current_answer = ""
+    current_question = None
+
+    # 处理中文冒号和英文冒号
+    for line in text.split('\n'):
+        # 去除首尾空白
+        line = line.strip()
+        if not line:
+            continue
+
+        # 检查是否是问题行
+        q_match = re.search(r'^(问题|Q|Question)[:：]?\s*(.*)', line, re.IGNORECASE)
+        if q_match:
+            # 如果已有问题和答案，保存前一对
+            if current_question and current_answer:
+                qa_pairs.append({
+                    "question": current_question.strip(),
+                    "answer": current_answer.strip()
+                })
+
+            # 开始新的问答对
+            current_question = q_match.group(2).strip()
+            current_answer = ""
+            continue
+
+        # 检查是否是答案行
+        a_match = re.search(r'^(答案|A|Answer)[:：]?\s*(.*)', line, re.IGNORECASE)
+        if a_match:
+            # 如果已有问题，设置答案
+            if current_question:
+                current_answer = a_match.group(2).strip()
+            continue
+
+        # 如果不是问题或答案开头，添加到当前答案
+        if current_question and line:
+            if current_answer:
+                current_answer += " " + line
+            else:
+                current_answer = line
+
+    # 添加最后一对问答
+    if current_question and current_answer:
+        qa_pairs.append({
+            "question": current_question.strip(),
+            "answer": current_answer.strip()
+        })
+
+    # 如果没有找到问答对，尝试其他提取方法
+    if not qa_pairs:
+        # 寻找可能的问题-答案模式
+        pairs = re.findall(r'["《]([^"》]+)["》][：:]\s*["《]([^"》]+)["》]', text)
+        for q, a in pairs:
+            qa_pairs.append({
+                "question": q.strip(),
+                "answer": a.strip()
+            })
+
+    return qa_pairs
+
+
+# ---- 语料 ----
+
+PAIRS = [
+    ("什么是机器学习？", "机器学习是人工智能的一个分支，让计算机从数据中学习规律。"),
+    ("模型的准确率如何计算？", "准确率 = 预测正确的样本数 / 总样本数，例如 95.5%。"),
+    ("What is \"overfitting\"?", "模型在训练集上表现好、在测试集上表现差的现象。"),
+    ("如何部署到生产环境？", "先导出模型，再用 `serve --port 8080` 启动服务，并监控延迟。"),
+]
+
+
+def _pairs_json(pairs, indent=None):
+    return json.dumps({"qa_pairs": [{"question": q, "answer": a, "label": "概念"} for q, a in pairs]},
+                      ensure_ascii=False, indent=indent)
+
+
+def build_corpus():
+    """按大模型常见的输出问题构造的样本，每个样本为 (名称, 文本, 可恢复的问答对数)"""
+    valid = _pairs_json(PAIRS, indent=2)
+    items = [json.dumps({"question": q, "answer": a}, ensure_ascii=False) for q, a in PAIRS]
+    return [
+        ("合法JSON", valid, 4),
+        ("代码块标记", "```json\n" + valid + "\n```", 4),
+        ("前后说明文字", "以下是生成的问答对：\n" + valid + "\n希望对你有帮助！", 4),
+        ("尾部逗号", valid.replace('"\n    }', '",\n    }').replace("}\n  ]", "},\n  ]"), 4),
+        ("未加引号的键", re.sub(r'"(qa_pairs|question|answer|label)":', r"\1:", valid), 4),
+        ("单引号", "{'qa_pairs': [" + ", ".join(
+            "{'question': '%s', 'answer': '%s'}" % (q.replace('\\"', '"'), a) for q, a in PAIRS) + "]}", 4),
+        ("未转义的引号", '{"qa_pairs": [{"question": "什么是"迁移学习"？", "answer": "把一个任务上学到的"知识"用到另一个任务。"}, '
+                     + items[0] + "]}", 2),
+        ("字符串中的换行", valid.replace("。", "。\n", 1), 4),
+        ("缺少逗号", '{"qa_pairs": [' + "\n".join(items) + "]}", 4),
+        ("无效转义", valid.replace("例如", "例如 \\(示例\\)"), 4),
+        ("注释", valid.replace('{\n  "qa_pairs"', '{\n  // 生成结果\n  "qa_pairs"'), 4),
+        ("顶层数组", "[" + ", ".join(items) + "]", 4),
+        ("截断在答案中", valid[:valid.rindex("监控")], 3),
+        ("截断在对象之间", valid[:valid.rindex("{")], 3),
+    ]
+
+
+def parse_current(text):
+    return DatasetService.parse_qa_pairs(text, "doc.md")
+
+
+def parse_legacy(text):
+    try:
+        return legacy_parse_qa_pairs(text, "doc.md")
+    except Exception:
+        return []
+
+
+def _has_chinese(text):
+    return any("\u4e00" <= ch <= "\u9fff" for ch in text)
+
+
+def evaluate(parse, corpus):
+    """返回 (问答对数, 保留中文的问答对数, 完全恢复的样本数)"""
+    pairs = chinese = recovered = 0
+    for _, text, expected in corpus:
+        result = parse(text)
+        pairs += len(result)
+        chinese += sum(1 for item in result if _has_chinese(item["question"] + item["answer"]))
+        recovered += len(result) == expected
+    return pairs, chinese, recovered
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    logging.disable(logging.CRITICAL)
+    corpus = build_corpus()
+    expected = sum(item[2] for item in corpus)
+    print(f"语料: {len(corpus)} 个样本, 可恢复 {expected} 个问答对, 重复 {repeat} 次")
+
+    for name, parse in [("原实现", parse_legacy), ("tolerant_json", parse_current)]:
+        pairs, chinese, recovered = evaluate(parse, corpus)
+        seconds = min(timeit.repeat(lambda: [parse(text) for _, text, _ in corpus], number=repeat, repeat=3)) / repeat
+        print(f"{name:<14} 问答对 {pairs:3d}, 保留中文 {chinese:3d}, 完全恢复样本 {recovered:2d}/{len(corpus)}, "
+              f"{seconds * 1000:7.3f} ms/轮")
+
+    for sample, text, count in corpus:
+        print(f"  {sample:<10} 期望 {count}, 原实现 {len(parse_legacy(text))}, tolerant_json {len(parse_current(text))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试公共配置：分段缓存和响应缓存写入临时目录，不写入仓库的 output 目录；
+按模型共享的限流器和自适应并发在测试之间不共用
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core import split_cache, llm_cache, rate_limiter
+
+
+@pytest.fixture(scope="session", autouse=True)
+def worker_output_dir(tmp_path_factory):
+    """分段进程池的工作进程从环境变量读取配置，进程池可能跨测试复用，整个会话使用同一个临时目录"""
+    output_dir = str(tmp_path_factory.mktemp("worker_output"))
+    previous = os.environ.get("OUTPUT_DIR")
+    os.environ["OUTPUT_DIR"] = output_dir
+    yield output_dir
+    if previous is None:
+        os.environ.pop("OUTPUT_DIR", None)
+    else:
+        os.environ["OUTPUT_DIR"] = previous
+
+
+@pytest.fixture(autouse=True)
+def isolated_output_dir(tmp_path_factory, monkeypatch):
+    """每个测试使用独立的输出目录，并重新创建共享缓存"""
+    output_dir = str(tmp_path_factory.mktemp("output"))
+    monkeypatch.setattr(settings, "OUTPUT_DIR", output_dir)
+    monkeypatch.setattr(split_cache, "_default_cache", None)
+    monkeypatch.setattr(llm_cache, "_default_cache", None)
+    return output_dir
+
+
+@pytest.fixture(autouse=True)
+def isolated_model_limits(monkeypatch):
+    """每个测试使用新的按模型共享的限流器和自适应并发"""
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    monkeypatch.setattr(rate_limiter, "_concurrency", {})
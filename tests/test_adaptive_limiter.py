@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试自适应限流：限流响应头、AIMD并发调整以及限流和服务端错误的退避重试
+"""
+
+import os
+import sys
+import time
+import asyncio
+from types import SimpleNamespace
+
+import openai
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.model_router import ModelBackend, ModelRouter
+from app.core.rate_limiter import (
+    AdaptiveConcurrency, RateLimiter, backoff_delay, parse_duration, retry_after_seconds
+)
+
+
+def test_parse_rate_limit_headers():
+    assert parse_duration("6m0s") == 360.0
+    assert parse_duration("1.5s") == 1.5
+    assert parse_duration("20ms") == 0.02
+    assert parse_duration("2") == 2.0
+    assert parse_duration("soon") is None
+    assert retry_after_seconds({"retry-after-ms": "250", "retry-after": "3"}) == 0.25
+    assert retry_after_seconds({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) is None
+    for attempt in range(6):
+        assert 0 <= backoff_delay(attempt, 1.0, 10.0) <= min(10.0, 2 ** attempt)
+    assert backoff_delay(0, 1.0, 10.0, retry_after=3.0) >= 3.0
+
+
+def test_limiter_learns_limits_from_headers():
+    limiter = RateLimiter()
+    pause = limiter.update_from_headers({
+        "x-ratelimit-limit-requests": "60", "x-ratelimit-remaining-requests": "10",
+        "x-ratelimit-limit-tokens": "1000", "x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "1.5s",
+    })
+    assert (limiter.rpm, limiter.tpm) == (60, 1000)
+    assert pause == 1.5
+    assert 10 <= limiter._requests < 10.1 and limiter._tokens < 1
+    # 配置的限额更低时保留配置
+    configured = RateLimiter(rpm=30)
+    configured.update_from_headers({"x-ratelimit-limit-requests": "60"})
+    assert configured.rpm == 30
+
+
+def test_concurrency_increases_when_saturated_and_halves_on_throttle():
+    async def main():
+        slots = AdaptiveConcurrency(2, maximum=8)
+        # 只有两个请求时并发没有用满，上限不增加
+        for _ in range(5):
+            await slots.acquire()
+            slots.on_success()
+            slots.release()
+        assert slots.limit == 2
+        # 并发用满时每轮成功后增加
+        for _ in range(20):
+            held = int(slots.limit)
+            for _ in range(held):
+                await slots.acquire()
+            slots.on_success()
+            for _ in range(held):
+                slots.release()
+        ramped = slots.limit
+        slots.on_throttle()
+        slots.on_throttle()
+        return ramped, slots.limit
+
+    ramped, throttled = asyncio.run(main())
+    assert ramped > 4
+    # 同一时间段内的多次限流只减半一次
+    assert throttled == ramped / 2
+
+
+def test_waiters_are_released_in_limit():
+    async def main():
+        slots = AdaptiveConcurrency(2, maximum=2)
+        running = []
+        peak = 0
+
+        async def task():
+            nonlocal peak
+            await slots.acquire()
+            running.append(1)
+            peak = max(peak, len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+            slots.release()
+
+        await asyncio.gather(*(task() for _ in range(8)))
+        return peak
+
+    assert asyncio.run(main()) == 2
+
+
+class FlakyAPI:
+    """前几次返回429或500，之后返回带限流响应头的正常结果"""
+
+    def __init__(self, failures):
+        self.failures = list(failures)
+        self.calls = []
+
+    async def completions(self, request):
+        self.calls.append(time.monotonic())
+        if self.failures:
+            status = self.failures.pop(0)
+            return web.json_response({"error": {"message": "slow down"}}, status=status,
+                                     headers={"retry-after-ms": "50"})
+        return web.json_response({
+            "id": "1", "object": "chat.completion", "created": 0, "model": "fake",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+        }, headers={"x-ratelimit-limit-requests": "120", "x-ratelimit-remaining-requests": "100"})
+
+
+def _run_against(api, monkeypatch, key):
+    monkeypatch.setattr(settings, "DATASET_RETRY_BASE_DELAY", 0.01)
+    monkeypatch.setattr(settings, "DATASET_RETRY_MAX_DELAY", 0.2)
+
+    async def main():
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", api.completions)
+        server = TestServer(app)
+        await server.start_server()
+        backend = ModelBackend({"name": key, "model": key, "apiEndpoint": str(server.make_url("/v1")),
+                                "apiKey": "k", "concurrency": 4})
+        router = ModelRouter([backend], max_attempts=4)
+        try:
+            async def request(backend):
+                response = await backend.client.chat.completions.create(
+                    model=backend.model, messages=[{"role": "user", "content": "hi"}]
+                )
+                return response.choices[0].message.content
+            return await router.call(request), backend
+        finally:
+            await router.close()
+            await server.close()
+
+    return asyncio.run(main())
+
+
+def test_router_backs_off_and_retries_same_backend(monkeypatch):
+    api = FlakyAPI([429, 500])
+    result, backend = _run_against(api, monkeypatch, "flaky-model")
+
+    assert result == "ok" and len(api.calls) == 3
+    # 429 按 retry-after 等待后重试
+    assert api.calls[1] - api.calls[0] >= 0.05
+    # 成功响应的限流响应头修正了限流器，429使并发减半但不计入熔断
+    assert backend.limiter.rpm == 120
+    assert backend.slots.limit == 2
+    assert backend.breaker.failures == 0
+
+
+def test_bad_request_is_not_retried(monkeypatch):
+    api = FlakyAPI([400])
+    try:
+        _run_against(api, monkeypatch, "bad-request-model")
+        assert False, "应当抛出异常"
+    except openai.BadRequestError:
+        pass
+    assert len(api.calls) == 1
+
+
+def _local_backend(name, concurrency, maximum):
+    client = SimpleNamespace(close=lambda: asyncio.sleep(0))
+    return ModelBackend({"name": name, "model": name, "apiEndpoint": f"http://{name}",
+                         "concurrency": concurrency, "maxConcurrency": maximum}, client=client)
+
+
+def test_router_ramps_up_concurrency_when_saturated():
+    backend = _local_backend("ramp-model", 2, 6)
+    router = ModelRouter([backend])
+    active = []
+
+    async def request(backend):
+        active.append(backend.slots.active)
+        await asyncio.sleep(0.005)
+        return "ok"
+
+    async def main():
+        await asyncio.gather(*(router.call(request) for _ in range(60)))
+
+    asyncio.run(main())
+    # 请求持续排队时，成功的请求在释放名额之前计入，上限逐步增加
+    assert backend.slots.limit > 3
+    assert max(active) > 2
+    assert backend.slots.active == 0
+
+
+def test_backends_of_same_model_share_concurrency():
+    first = _local_backend("shared-model", 2, 6)
+    second = _local_backend("shared-model", 2, 6)
+    assert first.slots is second.slots
+    # 调整后的上限在下一个任务中保留
+    first.slots.limit = 4.5
+    assert _local_backend("shared-model", 2, 6).slots.limit == 4.5
+    # 配置变化时重新创建
+    assert _local_backend("shared-model", 3, 6).slots is not first.slots
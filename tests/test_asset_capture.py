@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试图片采集：按内容去重、大小限制和链接改写
+"""
+
+import os
+import sys
+import json
+import asyncio
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp
+from aiohttp import web
+
+from app.core.config import settings
+from app.services.asset_service import MediaStore
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"0" * 100
+
+
+def _route(body, content_type):
+    async def handler(request):
+        return web.Response(body=body, content_type=content_type)
+    return handler
+
+
+async def _serve():
+    app = web.Application()
+    app.router.add_get("/a.png", _route(PNG, "image/png"))
+    app.router.add_get("/copy.png", _route(PNG, "image/png"))
+    app.router.add_get("/img_(1).png", _route(PNG + b"1", "image/png"))
+    app.router.add_get("/big.png", _route(b"1" * 5000, "image/png"))
+    app.router.add_get("/page.html", _route(b"<html></html>", "text/html"))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_localize_markdown_dedupes_and_respects_caps(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "OUTPUT_DIR", str(tmp_path))
+    markdown_dir = tmp_path / "p1" / "markdown"
+    markdown_dir.mkdir(parents=True)
+
+    async def main():
+        runner, base = await _serve()
+        try:
+            store = MediaStore("p1", max_bytes=1000)
+            markdown = (
+                f"![a](/a.png)\n![b]({base}/copy.png \"t\")\n"
+                f"![c](big.png)\n![d](page.html)\n![e](data:image/png;base64,AAAA)"
+            )
+            async with aiohttp.ClientSession() as session:
+                return await store.localize_markdown(session, markdown, f"{base}/docs/", str(markdown_dir)), store
+        finally:
+            await runner.cleanup()
+
+    (rewritten, stats), store = asyncio.run(main())
+    store.save_index()
+
+    lines = rewritten.split("\n")
+    assert lines[0].startswith("![a](../media/") and lines[0].endswith(".png)")
+    # 内容相同的图片指向同一个文件
+    assert lines[1] == lines[0].replace("![a]", "![b]")[:-1] + ' "t")'
+    # 超过大小限制、非图片和data URI保持原样
+    assert lines[2:] == ["![c](big.png)", "![d](page.html)", "![e](data:image/png;base64,AAAA)"]
+    assert stats == {"images": 4, "localized": 2, "failed": 2}
+
+    media_files = [f for f in os.listdir(tmp_path / "p1" / "media") if f.endswith(".png")]
+    assert len(media_files) == 1
+    with open(tmp_path / "p1" / "media" / "media_index.json", encoding="utf-8") as f:
+        index = json.load(f)
+    assert len(index["urls"]) == 2 and len(index["files"]) == 1
+
+
+def test_localize_markdown_file_rewrites_in_place(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "OUTPUT_DIR", str(tmp_path))
+    markdown_dir = tmp_path / "p1" / "markdown"
+    markdown_dir.mkdir(parents=True)
+    path = markdown_dir / "large.md"
+    path.write_text("# 标题\n\n![a](/a.png) 与 ![c](big.png)\n\n正文\n", encoding="utf-8")
+
+    async def main():
+        runner, base = await _serve()
+        try:
+            store = MediaStore("p1", max_bytes=1000)
+            async with aiohttp.ClientSession() as session:
+                return await store.localize_markdown_file(session, str(path), f"{base}/docs/", str(markdown_dir))
+        finally:
+            await runner.cleanup()
+
+    stats = asyncio.run(main())
+    lines = path.read_text(encoding="utf-8").split("\n")
+    assert stats == {"images": 2, "localized": 1, "failed": 1}
+    assert lines[:2] == ["# 标题", ""] and lines[3:] == ["", "正文", ""]
+    assert lines[2].startswith("![a](../media/") and lines[2].endswith(".png) 与 ![c](big.png)")
+    assert os.listdir(markdown_dir) == ["large.md"]
+
+
+def test_localize_markdown_handles_parentheses_and_angle_brackets(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "OUTPUT_DIR", str(tmp_path))
+    markdown_dir = tmp_path / "p1" / "markdown"
+    markdown_dir.mkdir(parents=True)
+
+    async def main():
+        runner, base = await _serve()
+        try:
+            store = MediaStore("p1", max_bytes=1000)
+            markdown = f"见 ![p]({base}/img_(1).png \"t\") 和 ![q](</img_(1).png>)。"
+            async with aiohttp.ClientSession() as session:
+                return await store.localize_markdown(session, markdown, f"{base}/docs/", str(markdown_dir))
+        finally:
+            await runner.cleanup()
+
+    rewritten, stats = asyncio.run(main())
+    assert stats == {"images": 2, "localized": 2, "failed": 0}
+    media_files = [f for f in os.listdir(tmp_path / "p1" / "media") if f.endswith(".png")]
+    assert len(media_files) == 1
+    local = f"../media/{media_files[0]}"
+    assert rewritten == f"见 ![p]({local} \"t\") 和 ![q]({local})。"
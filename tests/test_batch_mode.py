@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+使用本地模拟的批量接口测试批量模式：提交请求文件、轮询状态、读取结果写入数据集
+"""
+
+import os
+import sys
+import json
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.job_scheduler import JobScheduler, JOB_CANCELLED, JOB_PAUSED
+from app.services import dataset_service
+from app.services.batch_service import BATCH_STATE_SUFFIX
+from app.services.dataset_service import DatasetService, conversion_state
+
+
+class MockBatchAPI:
+    """模拟 /v1/files 和 /v1/batches 接口，第二次查询时任务完成"""
+
+    def __init__(self):
+        self.files = {}
+        self.batches = {}
+        self.polls = 0
+        self.submitted = 0
+        self.hold = False  # 为True时任务一直处于运行中
+        self.cancelled = []
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/files", self.create_file)
+        app.router.add_get("/v1/files/{file_id}/content", self.file_content)
+        app.router.add_post("/v1/batches", self.create_batch)
+        app.router.add_get("/v1/batches/{batch_id}", self.retrieve_batch)
+        app.router.add_post("/v1/batches/{batch_id}/cancel", self.cancel_batch)
+        return app
+
+    async def create_file(self, request):
+        form = await request.post()
+        file_id = f"file-{len(self.files) + 1}"
+        self.files[file_id] = form["file"].file.read().decode("utf-8")
+        return web.json_response({"id": file_id, "object": "file", "bytes": len(self.files[file_id]),
+                                  "created_at": 0, "filename": "batch_input.jsonl", "purpose": form["purpose"]})
+
+    async def file_content(self, request):
+        return web.Response(text=self.files[request.match_info["file_id"]])
+
+    async def create_batch(self, request):
+        body = await request.json()
+        self.submitted += 1
+        batch_id = f"batch-{self.submitted}"
+        self.batches[batch_id] = {"id": batch_id, "object": "batch", "endpoint": body["endpoint"],
+                                  "input_file_id": body["input_file_id"], "completion_window": "24h",
+                                  "status": "validating", "created_at": 0}
+        return web.json_response(self.batches[batch_id])
+
+    async def retrieve_batch(self, request):
+        batch = self.batches[request.match_info["batch_id"]]
+        self.polls += 1
+        if self.hold:
+            batch["status"] = "in_progress"
+        elif batch["status"] == "validating":
+            batch["status"] = "in_progress"
+        elif batch["status"] == "in_progress":
+            batch["status"] = "completed"
+            batch["output_file_id"] = self._write_output(batch["input_file_id"])
+        return web.json_response(batch)
+
+    async def cancel_batch(self, request):
+        batch = self.batches[request.match_info["batch_id"]]
+        self.cancelled.append(batch["id"])
+        batch["status"] = "cancelled"
+        return web.json_response(batch)
+
+    def _write_output(self, input_file_id):
+        lines = []
+        for line in self.files[input_file_id].splitlines():
+            request = json.loads(line)
+            name = request["body"]["messages"][1]["content"]
+            if name == "doc1":
+                lines.append({"custom_id": request["custom_id"], "response": {"status_code": 500, "body": {}},
+                              "error": {"message": "server error"}})
+                continue
+            content = json.dumps({"qa_pairs": [{"question": f"{name}?", "answer": name}]})
+            lines.append({"custom_id": request["custom_id"], "response": {"status_code": 200, "body": {
+                "choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": "stop"}]
+            }}})
+        file_id = f"file-{len(self.files) + 1}"
+        self.files[file_id] = "\n".join(json.dumps(line) for line in lines) + "\n"
+        return file_id
+
+
+def _make_files(tmp_path):
+    files = []
+    for i in range(3):
+        path = tmp_path / f"doc{i}.md"
+        path.write_text(f"doc{i}", encoding="utf-8")
+        files.append(str(path))
+    return files
+
+
+def _run(api, files, tmp_path, monkeypatch):
+    async def send_json(data, project_id=None):
+        pass
+
+    async def main():
+        server = TestServer(api.app())
+        await server.start_server()
+        try:
+            model = {"model": "fake", "apiEndpoint": str(server.make_url("/v1")), "apiKey": "k"}
+            monkeypatch.setattr(DatasetService, "get_default_model_config", staticmethod(lambda: model))
+            conversion_state["p1_qa.jsonl"] = {"progress": 0, "total": len(files)}
+            return await DatasetService.convert_files_to_dataset(files, "qa.jsonl", "p1", batch_mode=True)
+        finally:
+            await server.close()
+
+    monkeypatch.setattr(settings, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "DATASET_BATCH_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(dataset_service.manager, "send_json", send_json)
+    monkeypatch.setattr(dataset_service.SystemService, "get_prompts", staticmethod(lambda: {"data": "生成问答"}))
+    monkeypatch.setattr(DatasetService, "update_markdown_dataset_status", staticmethod(lambda files, project_id=None: True))
+    monkeypatch.setattr(DatasetService, "add_missing_ids", staticmethod(lambda output_file, project_id=None: {}))
+    return asyncio.run(main())
+
+
+def _read_rows(output_path):
+    with open(output_path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_batch_mode_against_mock_endpoint(tmp_path, monkeypatch):
+    api = MockBatchAPI()
+    files = _make_files(tmp_path)
+    output_path = _run(api, files, tmp_path, monkeypatch)
+
+    assert api.submitted == 1 and api.polls == 2
+    submitted = [json.loads(line) for line in api.files["file-1"].splitlines()]
+    assert [item["custom_id"] for item in submitted] == ["file-0", "file-1", "file-2"]
+    assert submitted[0]["url"] == "/v1/chat/completions" and submitted[0]["body"]["model"] == "fake"
+
+    rows = _read_rows(output_path)
+    # doc1 的请求失败，其余文件的结果按文件顺序写入
+    assert [row["answer"] for row in rows] == ["doc0", "doc2"]
+    assert rows[0]["source"] == files[0] and rows[0]["label"] == "未分类"
+    assert not os.path.exists(output_path + BATCH_STATE_SUFFIX)
+
+
+def test_resume_waits_for_submitted_batch(tmp_path, monkeypatch):
+    api = MockBatchAPI()
+    files = _make_files(tmp_path)
+    # 上一次运行提交了批量任务后中断
+    api.files["file-1"] = "".join(json.dumps({"custom_id": f"file-{i}", "body": {"messages": [
+        {"role": "system", "content": "生成问答"}, {"role": "user", "content": f"doc{i}"}
+    ]}}) + "\n" for i in (0, 2))
+    api.batches["batch-7"] = {"id": "batch-7", "object": "batch", "endpoint": "/v1/chat/completions",
+                              "input_file_id": "file-1", "completion_window": "24h",
+                              "status": "in_progress", "created_at": 0}
+    state_path = os.path.join(str(tmp_path), "p1", "qa.jsonl" + BATCH_STATE_SUFFIX)
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump({"batch_id": "batch-7", "requests": {"file-0": files[0], "file-2": files[2]}}, f)
+
+    output_path = _run(api, files[::2], tmp_path, monkeypatch)
+
+    assert api.submitted == 0
+    assert [row["answer"] for row in _read_rows(output_path)] == ["doc0", "doc2"]
+
+
+def test_files_missing_from_saved_batch_are_submitted(tmp_path, monkeypatch):
+    api = MockBatchAPI()
+    files = _make_files(tmp_path)
+    # 上一次运行只为doc0提交了批量任务，这次转换还包含doc2
+    api.files["file-1"] = json.dumps({"custom_id": "file-0", "body": {"messages": [
+        {"role": "system", "content": "生成问答"}, {"role": "user", "content": "doc0"}
+    ]}}) + "\n"
+    api.batches["batch-7"] = {"id": "batch-7", "object": "batch", "endpoint": "/v1/chat/completions",
+                              "input_file_id": "file-1", "completion_window": "24h",
+                              "status": "in_progress", "created_at": 0}
+    state_path = os.path.join(str(tmp_path), "p1", "qa.jsonl" + BATCH_STATE_SUFFIX)
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump({"batch_id": "batch-7", "requests": {"file-0": files[0]}}, f)
+
+    output_path = _run(api, files[::2], tmp_path, monkeypatch)
+
+    # 只为没有包含在已提交任务中的doc2提交新任务
+    assert api.submitted == 1
+    submitted = [json.loads(line) for line in api.files["file-2"].splitlines()]
+    assert [item["body"]["messages"][1]["content"] for item in submitted] == ["doc2"]
+    assert [row["answer"] for row in _read_rows(output_path)] == ["doc0", "doc2"]
+    assert not os.path.exists(state_path)
+
+
+def test_cancel_stops_provider_batch_and_removes_state(tmp_path, monkeypatch):
+    api = MockBatchAPI()
+    api.hold = True
+    files = _make_files(tmp_path)
+    state_path = os.path.join(str(tmp_path), "p1", "qa.jsonl" + BATCH_STATE_SUFFIX)
+
+    async def send_json(data, project_id=None):
+        pass
+
+    async def wait_for(condition):
+        for _ in range(500):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        assert False, "等待超时"
+
+    async def main():
+        server = TestServer(api.app())
+        await server.start_server()
+        try:
+            model = {"model": "fake", "apiEndpoint": str(server.make_url("/v1")), "apiKey": "k"}
+            monkeypatch.setattr(DatasetService, "get_default_model_config", staticmethod(lambda: model))
+            scheduler = JobScheduler()
+            scheduler.register_handler("dataset", DatasetService.convert_files_to_dataset_task,
+                                       on_cancel=DatasetService.cancel_conversion_job)
+            monkeypatch.setattr(dataset_service, "scheduler", scheduler)
+
+            job_id = DatasetService.submit_conversion_job(files, "qa.jsonl", "p1", batch_mode=True)["job_id"]
+            await wait_for(lambda: api.polls >= 2)
+            # 暂停时保留批量任务，恢复后继续等待
+            assert scheduler.pause(job_id)
+            await wait_for(lambda: scheduler.get_job(job_id)["status"] == JOB_PAUSED)
+            assert api.cancelled == [] and os.path.exists(state_path)
+
+            assert scheduler.resume(job_id)
+            polls = api.polls
+            await wait_for(lambda: api.polls > polls)
+            assert scheduler.cancel(job_id)
+            await wait_for(lambda: api.cancelled and not os.path.exists(state_path))
+            assert scheduler.get_job(job_id)["status"] == JOB_CANCELLED
+        finally:
+            await server.close()
+
+    monkeypatch.setattr(settings, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "DATASET_BATCH_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(dataset_service.manager, "send_json", send_json)
+    monkeypatch.setattr(dataset_service.SystemService, "get_prompts", staticmethod(lambda: {"data": "生成问答"}))
+    asyncio.run(main())
+
+    # 恢复后继续等待同一个批量任务，没有重复提交
+    assert api.submitted == 1 and api.cancelled == ["batch-1"]
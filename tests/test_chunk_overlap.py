@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试分段重叠区域：按句子边界取整、只记录偏移，以及数据集生成时的上文
+"""
+
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.markdown_splitter import MarkdownSplitter
+from app.core.split_pool import write_chunk_file, save_chunk_tree
+from app.services.dataset_service import DatasetService
+
+
+def _document():
+    return "\n\n".join(
+        f"## 小节{i}\n\n" + " ".join(f"Section {i} sentence {j} has words." for j in range(40))
+        for i in range(5)
+    )
+
+
+def test_find_overlap_start_uses_sentence_boundaries():
+    splitter = MarkdownSplitter()
+    text = "第一句。第二句！Third one. Fourth one"
+    assert text[splitter.find_overlap_start(text, overlap_sentences=1):] == "Fourth one"
+    assert text[splitter.find_overlap_start(text, overlap_sentences=2):] == "Third one. Fourth one"
+    assert splitter.find_overlap_start(text, overlap_tokens=1000) == 0
+    assert splitter.find_overlap_start(text) == len(text)
+
+
+def test_chunks_record_overlap_offsets():
+    splitter = MarkdownSplitter(max_tokens=400, min_tokens=100, overlap_tokens=30)
+    chunks = splitter.create_chunks(_document())
+    assert len(chunks) > 2
+    assert "overlap" not in chunks[0].metadata
+
+    for previous, chunk in zip(chunks, chunks[1:]):
+        overlap = chunk.metadata["overlap"]
+        assert overlap["order"] == previous.order and overlap["end"] == len(previous.content)
+        assert overlap["tokens"] >= 30
+        text = MarkdownSplitter.get_overlap_text(chunks, chunk)
+        assert previous.content.endswith(text) and text not in chunk.content
+
+    streamed = list(MarkdownSplitter(max_tokens=400, min_tokens=100, overlap_sentences=2).iter_chunks(_document().split("\n")))
+    assert all(chunk.metadata["overlap"]["order"] == chunk.order - 1 for chunk in streamed[1:])
+
+
+def test_dataset_context_from_saved_overlap(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_OVERLAP_SENTENCES", 1)
+    splitter = MarkdownSplitter(max_tokens=400, min_tokens=100, overlap_sentences=1)
+    chunks = splitter.create_chunks(_document())
+    paths = [write_chunk_file(str(tmp_path), "page", chunk) for chunk in chunks]
+    save_chunk_tree(str(tmp_path), "page", chunks, paths)
+
+    for previous, path in zip(chunks, paths[1:]):
+        assert DatasetService.get_previous_chunk_context(path) == previous.content.rsplit(". ", 1)[-1].strip()
+    assert DatasetService.get_previous_chunk_context(paths[0]) == ""
+
+    # 名字像分段文件、但不在层级结构中的普通文件没有上文
+    (tmp_path / "report-2023.md").write_text("去年的报告。最后一句话。", encoding="utf-8")
+    (tmp_path / "report-2024.md").write_text("今年的报告。", encoding="utf-8")
+    assert DatasetService.get_previous_chunk_context(str(tmp_path / "report-2024.md")) == ""
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试分段层级结构：节点Token汇总、按预算选择粒度、保存与读取
+"""
+
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.markdown_splitter import MarkdownChunk
+from app.core.chunk_tree import build_chunk_tree, select_chunk_groups, load_chunk_tree, collect_leaves
+from app.core.split_pool import split_markdown_file
+
+
+def _chunk(order, tokens, stack):
+    return MarkdownChunk(content="", title=stack[-1][1], order=order, estimated_tokens=tokens,
+                         start_line=0, end_line=0, metadata={'header_stack': stack})
+
+
+def _chunks():
+    return [
+        _chunk(1, 100, [(1, "指南")]),
+        _chunk(2, 300, [(1, "指南"), (2, "安装")]),
+        _chunk(3, 200, [(1, "指南"), (2, "安装"), (3, "Linux")]),
+        _chunk(4, 400, [(1, "指南"), (2, "使用")]),
+        _chunk(5, 500, [(1, "指南"), (2, "使用")]),
+    ]
+
+
+def test_tree_sums_tokens_and_records_paths():
+    tree = build_chunk_tree(_chunks(), [f"out/doc-{i}.md" for i in range(1, 6)], title="doc")
+    guide = tree['children'][0]
+    install, usage = guide['children']
+
+    assert tree['tokens'] == 1500 and guide['tokens'] == 1500
+    assert install['tokens'] == 500 and usage['tokens'] == 900
+    assert install['children'][0]['path'] == "指南/安装/Linux"
+    assert [leaf['order'] for leaf in usage['chunks']] == [4, 5]
+    assert usage['chunks'][0] == {"order": 4, "title": "使用", "tokens": 400, "path": "指南/使用", "file": "doc-4.md"}
+    assert [leaf['order'] for leaf in collect_leaves(tree)] == [1, 2, 3, 4, 5]
+
+
+def test_select_groups_by_budget():
+    tree = build_chunk_tree(_chunks())
+    assert [group['chunks'] for group in select_chunk_groups(tree, 2000)] == [[1, 2, 3, 4, 5]]
+    groups = select_chunk_groups(tree, 600)
+    assert [group['chunks'] for group in groups] == [[1], [2, 3], [4], [5]]
+    assert groups[1]['path'] == "指南/安装"
+
+
+def test_split_markdown_file_writes_tree(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_TREE_ENABLED", True)
+    source = tmp_path / "book.md"
+    source.write_text("\n\n".join(f"## 第{i}章\n\n" + "内容 " * 400 for i in range(4)), encoding="utf-8")
+
+    paths = split_markdown_file(str(source), str(tmp_path), "book", max_tokens=600, min_tokens=100)
+    tree = load_chunk_tree(str(tmp_path), "book")
+
+    assert len(paths) > 1 and tree is not None
+    leaves = collect_leaves(tree)
+    assert [leaf['file'] for leaf in leaves] == [os.path.basename(path) for path in paths]
+    assert tree['tokens'] == sum(leaf['tokens'] for leaf in leaves)
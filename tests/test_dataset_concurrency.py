@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试数据集生成的并发调用和按模型限流
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+from types import SimpleNamespace
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.rate_limiter import RateLimiter
+from app.core import model_router
+from app.services import dataset_service
+from app.services.dataset_service import DatasetService, conversion_state
+
+
+class FakeCompletions:
+    def __init__(self, delay):
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+
+    async def create(self, model, messages, stream=False):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        name = messages[1]["content"]
+        text = json.dumps({"qa_pairs": [{"question": f"{name}?", "answer": name}]}, ensure_ascii=False)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text), finish_reason="stop")],
+            usage=SimpleNamespace(total_tokens=10)
+        )
+
+
+class FakeClient:
+    completions = None
+
+    def __init__(self, api_key=None, base_url=None, **kwargs):
+        self.chat = SimpleNamespace(completions=FakeClient.completions)
+
+    async def close(self):
+        pass
+
+
+def _configure(tmp_path, monkeypatch, model_config):
+    async def send_json(data, project_id=None):
+        pass
+
+    monkeypatch.setattr(settings, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "DATASET_STREAMING", False)
+    monkeypatch.setattr(model_router, "AsyncOpenAI", FakeClient)
+    monkeypatch.setattr(DatasetService, "get_model_configs", staticmethod(lambda: []))
+    monkeypatch.setattr(dataset_service.manager, "send_json", send_json)
+    monkeypatch.setattr(DatasetService, "get_default_model_config", staticmethod(lambda: model_config))
+    monkeypatch.setattr(dataset_service.SystemService, "get_prompts", staticmethod(lambda: {"data": "生成问答"}))
+    monkeypatch.setattr(DatasetService, "update_markdown_dataset_status", staticmethod(lambda files, project_id=None: True))
+    monkeypatch.setattr(DatasetService, "add_missing_ids", staticmethod(lambda output_file, project_id=None: {}))
+
+
+def test_files_are_processed_concurrently_in_order(tmp_path, monkeypatch):
+    _configure(tmp_path, monkeypatch, {"model": "fake", "apiEndpoint": "http://fake", "apiKey": "k",
+                                                "concurrency": 3, "maxConcurrency": 3})
+    FakeClient.completions = FakeCompletions(delay=0.05)
+    files = []
+    for i in range(9):
+        path = tmp_path / f"doc{i}.md"
+        path.write_text(f"doc{i}", encoding="utf-8")
+        files.append(str(path))
+    conversion_state["p1_qa.jsonl"] = {"progress": 0, "total": len(files)}
+
+    started = time.monotonic()
+    output_path = asyncio.run(DatasetService.convert_files_to_dataset(files, "qa.jsonl", "p1"))
+    elapsed = time.monotonic() - started
+
+    assert FakeClient.completions.max_active == 3
+    assert elapsed < 9 * 0.05
+    with open(output_path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert [row["answer"] for row in rows] == [f"doc{i}" for i in range(9)]
+    assert conversion_state["p1_qa.jsonl"]["progress"] == 9
+
+
+def test_rate_limiter_waits_for_token_budget():
+    async def main():
+        limiter = RateLimiter(tpm=6000)  # 每秒补充100个Token
+        started = time.monotonic()
+        await limiter.acquire(6000)
+        await limiter.acquire(30)
+        return time.monotonic() - started
+
+    assert 0.25 <= asyncio.run(main()) < 1.0
+
+
+def test_rate_limiter_credits_unused_tokens():
+    async def main():
+        limiter = RateLimiter(rpm=600, tpm=600)
+        await limiter.acquire(600)
+        # 实际只用了100个Token，剩余额度立即可用
+        limiter.record_usage(600, 100)
+        started = time.monotonic()
+        await limiter.acquire(400)
+        return time.monotonic() - started
+
+    assert asyncio.run(main()) < 0.1
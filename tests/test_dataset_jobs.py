@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试数据集生成任务的暂停、恢复和取消，以及保存到任务表的进度统计
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+from types import SimpleNamespace
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core import model_router
+from app.core.job_scheduler import JobScheduler, JOB_PAUSED, JOB_COMPLETED, JOB_CANCELLED
+from app.core.qa_journal import QAJournal, JOURNAL_SUFFIX
+from app.services import dataset_service
+from app.services.dataset_service import DatasetService, conversion_state
+
+
+class GatedCompletions:
+    """blocked中的文件一直等待，直到被取消或blocked被清空；其他文件立即返回一个问答对"""
+
+    def __init__(self, blocked=()):
+        self.blocked = set(blocked)
+        self.calls = []
+        self.cancelled = []
+
+    async def create(self, model, messages, stream=False):
+        content = messages[1]["content"]
+        self.calls.append(content)
+        try:
+            while content in self.blocked:
+                await asyncio.sleep(0.01)
+        except asyncio.CancelledError:
+            self.cancelled.append(content)
+            raise
+        text = json.dumps({"qa_pairs": [{"question": f"{content}?", "answer": content}]}, ensure_ascii=False)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text), finish_reason="stop")],
+            usage=SimpleNamespace(total_tokens=10)
+        )
+
+
+class FakeClient:
+    completions = None
+
+    def __init__(self, api_key=None, base_url=None, **kwargs):
+        self.chat = SimpleNamespace(completions=FakeClient.completions)
+
+    async def close(self):
+        pass
+
+
+def _setup(tmp_path, monkeypatch, completions):
+    async def send_json(data, project_id=None):
+        pass
+
+    monkeypatch.setattr(settings, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "DATASET_STREAMING", False)
+    monkeypatch.setattr(settings, "JOB_PROGRESS_SAVE_INTERVAL", 0)
+    monkeypatch.setattr(model_router, "AsyncOpenAI", FakeClient)
+    monkeypatch.setattr(dataset_service.manager, "send_json", send_json)
+    monkeypatch.setattr(DatasetService, "get_default_model_config",
+                        staticmethod(lambda: {"model": "fake", "apiEndpoint": "http://jobs", "apiKey": "k"}))
+    monkeypatch.setattr(DatasetService, "get_model_configs", staticmethod(lambda: []))
+    monkeypatch.setattr(dataset_service.SystemService, "get_prompts", staticmethod(lambda: {"data": "生成问答"}))
+    monkeypatch.setattr(DatasetService, "update_markdown_dataset_status", staticmethod(lambda files, project_id=None: True))
+    monkeypatch.setattr(DatasetService, "add_missing_ids", staticmethod(lambda output_file, project_id=None: {}))
+    scheduler = JobScheduler()
+    scheduler.register_handler("dataset", DatasetService.convert_files_to_dataset_task)
+    monkeypatch.setattr(dataset_service, "scheduler", scheduler)
+    FakeClient.completions = completions
+    conversion_state.clear()
+
+    files = []
+    for i in range(4):
+        path = tmp_path / f"doc{i}.md"
+        path.write_text(f"doc{i}", encoding="utf-8")
+        files.append(str(path))
+    return scheduler, files
+
+
+async def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待超时"
+        await asyncio.sleep(0.01)
+
+
+def test_pause_keeps_finished_files_and_resume_completes(tmp_path, monkeypatch):
+    completions = GatedCompletions(blocked={"doc2", "doc3"})
+    scheduler, files = _setup(tmp_path, monkeypatch, completions)
+    output_path = os.path.join(str(tmp_path), "p1", "qa.jsonl")
+
+    async def main():
+        job_id = DatasetService.submit_conversion_job(files, "qa.jsonl", "p1")["job_id"]
+        await _wait_for(lambda: scheduler.get_job(job_id)["progress"]["current"] == 2)
+        await _wait_for(lambda: len(completions.calls) == 4)
+        assert scheduler.pause(job_id)
+        await _wait_for(lambda: scheduler.get_job(job_id)["status"] == JOB_PAUSED)
+        paused = scheduler.get_job(job_id)
+        # 进行中的请求被中断，已完成的文件保留在生成日志中
+        assert sorted(completions.cancelled) == ["doc2", "doc3"]
+        assert sorted(QAJournal(output_path + JOURNAL_SUFFIX).load()) == files[:2]
+        assert DatasetService.get_conversion_state("qa.jsonl", "p1")["status"] == JOB_PAUSED
+
+        completions.blocked.clear()
+        assert scheduler.resume(job_id)
+        await _wait_for(lambda: scheduler.get_job(job_id)["status"] == JOB_COMPLETED)
+        return paused, scheduler.get_job(job_id)
+
+    paused, finished = asyncio.run(main())
+    assert paused["progress"] == {"current": 2, "total": 4, "successful": 2, "pairs": 2, "tokens": 20}
+    # 恢复后已完成的文件不再请求，Token数累计
+    assert sorted(completions.calls) == ["doc0", "doc1", "doc2", "doc2", "doc3", "doc3"]
+    assert finished["progress"] == {"current": 4, "total": 4, "successful": 4, "pairs": 4, "tokens": 40}
+    with open(output_path, encoding="utf-8") as f:
+        assert [json.loads(line)["answer"] for line in f] == ["doc0", "doc1", "doc2", "doc3"]
+
+
+def test_cancel_aborts_in_flight_requests(tmp_path, monkeypatch):
+    completions = GatedCompletions(blocked={"doc0", "doc1", "doc2", "doc3"})
+    scheduler, files = _setup(tmp_path, monkeypatch, completions)
+
+    async def main():
+        job_id = DatasetService.submit_conversion_job(files, "qa.jsonl", "p1")["job_id"]
+        await _wait_for(lambda: len(completions.calls) == 4)
+        started = time.monotonic()
+        assert scheduler.cancel(job_id)
+        await _wait_for(lambda: scheduler.get_job(job_id)["status"] == JOB_CANCELLED)
+        return job_id, time.monotonic() - started
+
+    job_id, elapsed = asyncio.run(main())
+    assert elapsed < 1.0
+    assert sorted(completions.cancelled) == ["doc0", "doc1", "doc2", "doc3"]
+    assert not os.path.exists(os.path.join(str(tmp_path), "p1", "qa.jsonl"))
+
+    # 服务重启后内存中的转换状态丢失，从任务表读取
+    conversion_state.clear()
+    restored = JobScheduler()
+    monkeypatch.setattr(dataset_service, "scheduler", restored)
+    state = DatasetService.get_conversion_state("qa.jsonl", "p1")
+    assert state["status"] == JOB_CANCELLED and state["job_id"] == job_id
+    assert state["total"] == 4
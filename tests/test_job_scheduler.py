@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试任务调度器的优先级、项目公平性、暂停恢复和任务表持久化
+"""
+
+import os
+import sys
+import json
+import asyncio
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.job_scheduler import (
+    JobScheduler, PRIORITY_INTERACTIVE, PRIORITY_BULK,
+    JOB_COMPLETED, JOB_QUEUED, JOB_CANCELLED, JOB_PAUSED
+)
+
+
+def _configure(tmp_path, monkeypatch, concurrency=1, per_project=1, interactive_slots=0):
+    monkeypatch.setattr(settings, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "JOB_MAX_CONCURRENCY", concurrency)
+    monkeypatch.setattr(settings, "JOB_MAX_PER_PROJECT", per_project)
+    monkeypatch.setattr(settings, "JOB_INTERACTIVE_SLOTS", interactive_slots)
+
+
+def test_priority_and_project_fairness(tmp_path, monkeypatch):
+    _configure(tmp_path, monkeypatch)
+    order = []
+
+    async def handler(name):
+        order.append(name)
+        await asyncio.sleep(0)
+
+    async def main():
+        scheduler = JobScheduler()
+        scheduler.register_handler("work", handler)
+        # 第一个任务立即运行，其余排队
+        scheduler.submit("work", {"name": "a-bulk-1"}, project_id="a", priority=PRIORITY_BULK)
+        scheduler.submit("work", {"name": "a-bulk-2"}, project_id="a", priority=PRIORITY_BULK)
+        scheduler.submit("work", {"name": "b-small"}, project_id="b", priority=PRIORITY_INTERACTIVE)
+        scheduler.submit("work", {"name": "c-bulk"}, project_id="c", priority=PRIORITY_BULK)
+        while any(j["status"] != JOB_COMPLETED for j in scheduler.list_jobs()):
+            await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert order == ["a-bulk-1", "b-small", "a-bulk-2", "c-bulk"]
+
+
+def test_running_jobs_are_requeued_after_restart(tmp_path, monkeypatch):
+    _configure(tmp_path, monkeypatch)
+    started = []
+
+    async def slow(name):
+        started.append(name)
+        await asyncio.sleep(10)
+
+    async def first_run():
+        scheduler = JobScheduler()
+        scheduler.register_handler("work", slow)
+        running = scheduler.submit("work", {"name": "x"}, project_id="p")
+        queued = scheduler.submit("work", {"name": "y"}, project_id="p")
+        cancelled = scheduler.submit("work", {"name": "z"}, project_id="p")
+        await asyncio.sleep(0.01)
+        assert scheduler.cancel(cancelled["job_id"])
+        await scheduler.shutdown()
+        return running["job_id"], queued["job_id"], cancelled["job_id"]
+
+    running_id, queued_id, cancelled_id = asyncio.run(first_run())
+
+    restored = JobScheduler()
+    restored.load()
+    assert restored.get_job(running_id)["status"] == JOB_QUEUED
+    assert restored.get_job(running_id)["restarts"] == 1
+    assert restored.get_job(queued_id)["status"] == JOB_QUEUED
+    assert restored.get_job(cancelled_id)["status"] == JOB_CANCELLED
+    assert started == ["x"]
+
+
+def test_pause_and_resume(tmp_path, monkeypatch):
+    _configure(tmp_path, monkeypatch)
+    started = []
+
+    async def slow(name):
+        started.append(name)
+        await asyncio.sleep(10)
+
+    async def first_run():
+        scheduler = JobScheduler()
+        scheduler.register_handler("work", slow)
+        running = scheduler.submit("work", {"name": "x"}, project_id="p")
+        queued = scheduler.submit("work", {"name": "y"}, project_id="p")
+        await asyncio.sleep(0.01)
+        # 暂停排队中的任务不会运行，暂停运行中的任务被中断
+        assert scheduler.pause(queued["job_id"])
+        assert scheduler.pause(running["job_id"])
+        await asyncio.sleep(0.01)
+        assert scheduler.get_job(running["job_id"])["status"] == JOB_PAUSED
+        assert started == ["x"]
+        # 恢复后重新运行处理函数
+        assert scheduler.resume(running["job_id"])
+        assert not scheduler.resume(running["job_id"])
+        await asyncio.sleep(0.01)
+        assert started == ["x", "x"]
+        await scheduler.shutdown()
+        return queued["job_id"]
+
+    queued_id = asyncio.run(first_run())
+
+    # 暂停的任务在服务重启后仍保持暂停，可以取消
+    restored = JobScheduler()
+    restored.load()
+    assert restored.get_job(queued_id)["status"] == JOB_PAUSED
+    assert restored.cancel(queued_id)
+    assert restored.get_job(queued_id)["status"] == JOB_CANCELLED
+
+
+def test_cancel_hook_runs_for_running_and_queued_jobs(tmp_path, monkeypatch):
+    _configure(tmp_path, monkeypatch)
+    cleaned = []
+
+    async def slow(name):
+        await asyncio.sleep(10)
+
+    async def cleanup(name):
+        cleaned.append(name)
+
+    async def main():
+        scheduler = JobScheduler()
+        scheduler.register_handler("work", slow, on_cancel=cleanup)
+        running = scheduler.submit("work", {"name": "running"}, project_id="a")["job_id"]
+        queued = scheduler.submit("work", {"name": "queued"}, project_id="a")["job_id"]
+        paused = scheduler.submit("work", {"name": "paused"}, project_id="a")["job_id"]
+        await asyncio.sleep(0.01)
+        assert scheduler.pause(paused)
+        assert scheduler.cancel(queued)
+        assert scheduler.cancel(paused)
+        assert scheduler.cancel(running)
+        while len(cleaned) < 3:
+            await asyncio.sleep(0.01)
+        assert scheduler.get_job(running)["status"] == JOB_CANCELLED
+
+    asyncio.run(main())
+    assert sorted(cleaned) == ["paused", "queued", "running"]
+
+
+def test_interactive_jobs_do_not_wait_for_bulk_jobs(tmp_path, monkeypatch):
+    _configure(tmp_path, monkeypatch, concurrency=1, per_project=1, interactive_slots=1)
+    started = []
+    release = {}
+
+    async def work(name):
+        started.append(name)
+        release[name] = asyncio.Event()
+        await release[name].wait()
+
+    async def main():
+        scheduler = JobScheduler()
+        scheduler.register_handler("work", work)
+        # 批量任务占满普通并发和项目上限
+        scheduler.submit("work", {"name": "bulk-1"}, project_id="a", priority=PRIORITY_BULK)
+        scheduler.submit("work", {"name": "bulk-2"}, project_id="b", priority=PRIORITY_BULK)
+        # 同一项目的小任务在交互式通道中立即运行，第二个小任务等待通道空闲
+        scheduler.submit("work", {"name": "small-1"}, project_id="a", priority=PRIORITY_INTERACTIVE)
+        scheduler.submit("work", {"name": "small-2"}, project_id="a", priority=PRIORITY_INTERACTIVE)
+        await asyncio.sleep(0.01)
+        assert started == ["bulk-1", "small-1"]
+        release["small-1"].set()
+        await asyncio.sleep(0.01)
+        assert started == ["bulk-1", "small-1", "small-2"]
+        release["small-2"].set()
+        release["bulk-1"].set()
+        await asyncio.sleep(0.01)
+        assert started == ["bulk-1", "small-1", "small-2", "bulk-2"]
+        release["bulk-2"].set()
+        while any(j["status"] != JOB_COMPLETED for j in scheduler.list_jobs()):
+            await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+
+
+def test_progress_updates_do_not_rewrite_params(tmp_path, monkeypatch):
+    _configure(tmp_path, monkeypatch)
+    monkeypatch.setattr(settings, "JOB_PROGRESS_SAVE_INTERVAL", 0)
+    scheduler_ref = []
+
+    async def work(files):
+        scheduler_ref[0].report_progress(1, len(files), "进行中")
+
+    async def main():
+        scheduler = JobScheduler()
+        scheduler_ref.append(scheduler)
+        scheduler.register_handler("work", work)
+        job_id = scheduler.submit("work", {"files": [f"f{i}.md" for i in range(100)]}, project_id="p")["job_id"]
+        while scheduler.get_job(job_id)["status"] != JOB_COMPLETED:
+            await asyncio.sleep(0.01)
+        return job_id
+
+    job_id = asyncio.run(main())
+
+    with open(tmp_path / settings.JOBS_FILE, encoding="utf-8") as f:
+        jobs = json.load(f)
+    assert "params" not in jobs[0]
+    assert jobs[0]["progress"]["total"] == 100
+
+    # 参数只在提交时单独保存，重启后仍能按参数查找任务
+    restored = JobScheduler()
+    assert restored.find_job("work", "p", files=[f"f{i}.md" for i in range(100)])["job_id"] == job_id
+
+
+def test_legacy_jobs_file_with_params_is_loaded(tmp_path, monkeypatch):
+    _configure(tmp_path, monkeypatch)
+    legacy = [{
+        "job_id": "work_p_1", "kind": "work", "project_id": "p", "priority": 5, "description": "",
+        "params": {"name": "old"}, "status": JOB_QUEUED, "message": "", "progress": {"current": 0, "total": 0},
+        "seq": 1, "restarts": 0, "created_at": 0, "started_at": None, "finished_at": None
+    }]
+    with open(tmp_path / settings.JOBS_FILE, "w", encoding="utf-8") as f:
+        json.dump(legacy, f)
+    names = []
+
+    async def work(name):
+        names.append(name)
+
+    async def main():
+        scheduler = JobScheduler()
+        scheduler.register_handler("work", work)
+        scheduler.start()
+        while scheduler.get_job("work_p_1")["status"] != JOB_COMPLETED:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert names == ["old"]
+    assert JobScheduler().find_job("work", "p", name="old")["job_id"] == "work_p_1"
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试问答对的增量JSON解析和流式生成
+"""
+
+import os
+import sys
+import json
+import asyncio
+from types import SimpleNamespace
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openai
+
+from app.core.config import settings
+from app.core import model_router
+from app.core.rate_limiter import RateLimiter
+from app.utils.json_stream import QAPairStreamParser
+from app.services import dataset_service
+from app.services.dataset_service import DatasetService, conversion_state
+
+RESPONSE = '```json\n' + json.dumps({
+    "qa_pairs": [
+        {"question": "什么是{括号}?", "answer": "字符串中的 \"引号\" 和 ] 不影响解析", "label": "a"},
+        {"question": "嵌套?", "answer": "是", "metadata": {"label": "b", "tags": ["x", "y"]}},
+        {"question": "第三个?", "answer": "最后一个"}
+    ]
+}, ensure_ascii=False) + '\n```'
+
+
+def test_pairs_are_emitted_as_soon_as_they_close():
+    parser = QAPairStreamParser()
+    emitted = []
+    for i in range(0, len(RESPONSE), 7):
+        emitted.append(parser.feed(RESPONSE[i:i + 7]))
+
+    items = [item for batch in emitted for item in batch]
+    assert [item["question"] for item in items] == ["什么是{括号}?", "嵌套?", "第三个?"]
+    assert items[1]["metadata"]["tags"] == ["x", "y"]
+    # 第一个问答对在响应结束前就已经返回
+    first_batch = next(i for i, batch in enumerate(emitted) if batch)
+    assert first_batch < len(emitted) // 2
+    assert parser.finished
+    assert parser.text == RESPONSE
+    # 已闭合的问答对不再保留在待解析文本中
+    assert parser._pending == ""
+
+
+def test_truncated_response_keeps_closed_pairs():
+    parser = QAPairStreamParser()
+    cut = RESPONSE.index("第三个")
+    items = parser.feed(RESPONSE[:cut])
+    assert [item["question"] for item in items] == ["什么是{括号}?", "嵌套?"]
+    assert not parser.finished
+
+
+def test_top_level_array():
+    parser = QAPairStreamParser()
+    assert parser.feed('[{"question": "q", "answer": "a"}, {"question": "q2"') == [{"question": "q", "answer": "a"}]
+
+
+def test_generate_streams_pairs(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATASET_STREAMING", True)
+    pieces = [RESPONSE[i:i + 11] for i in range(0, len(RESPONSE), 11)]
+
+    async def stream():
+        for piece in pieces:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece), finish_reason=None)])
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None), finish_reason="stop")])
+
+    async def create(model, messages, stream=False):
+        assert stream is True
+        return stream_iter
+
+    stream_iter = stream()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    doc = tmp_path / "doc.md"
+    doc.write_text("内容", encoding="utf-8")
+    seen = []
+
+    async def on_pair(qa_pair):
+        seen.append(qa_pair["question"])
+
+    qa_pairs = asyncio.run(DatasetService.generate_qa_pairs(
+        client, RateLimiter(), "fake", "生成问答", str(doc), on_pair=on_pair
+    ))
+    assert seen == ["什么是{括号}?", "嵌套?", "第三个?"]
+    assert [pair["label"] for pair in qa_pairs] == ["a", "b", "未分类"]
+    assert all(pair["source"] == str(doc) for pair in qa_pairs)
+
+
+class FlakyStreamCompletions:
+    """第一次请求流式返回一个问答对后连接中断，之后的请求返回完整响应"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, model, messages, stream=False):
+        self.calls += 1
+        fail = self.calls == 1
+        cut = RESPONSE.index("嵌套")
+
+        async def chunks():
+            for piece in ([RESPONSE[:cut]] if fail else [RESPONSE]):
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece), finish_reason=None)])
+            if fail:
+                raise openai.APIError("connection reset", request=None, body=None)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None), finish_reason="stop")])
+        return chunks()
+
+
+class FakeClient:
+    completions = None
+
+    def __init__(self, api_key=None, base_url=None, **kwargs):
+        self.chat = SimpleNamespace(completions=FakeClient.completions)
+
+    async def close(self):
+        pass
+
+
+def test_retry_after_partial_stream_does_not_inflate_progress(tmp_path, monkeypatch):
+    messages = []
+
+    async def send_json(data, project_id=None):
+        messages.append(data)
+
+    monkeypatch.setattr(settings, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "DATASET_STREAMING", True)
+    monkeypatch.setattr(settings, "DATASET_RETRY_BASE_DELAY", 0.0)
+    monkeypatch.setattr(model_router, "AsyncOpenAI", FakeClient)
+    monkeypatch.setattr(dataset_service.manager, "send_json", send_json)
+    monkeypatch.setattr(DatasetService, "get_default_model_config",
+                        staticmethod(lambda: {"model": "fake", "apiEndpoint": "http://stream-retry", "apiKey": "k"}))
+    monkeypatch.setattr(DatasetService, "get_model_configs", staticmethod(lambda: []))
+    monkeypatch.setattr(dataset_service.SystemService, "get_prompts", staticmethod(lambda: {"data": "生成问答"}))
+    monkeypatch.setattr(DatasetService, "update_markdown_dataset_status", staticmethod(lambda files, project_id=None: True))
+    monkeypatch.setattr(DatasetService, "add_missing_ids", staticmethod(lambda output_file, project_id=None: {}))
+    FakeClient.completions = FlakyStreamCompletions()
+    doc = tmp_path / "doc.md"
+    doc.write_text("内容", encoding="utf-8")
+    conversion_state["p1_qa.jsonl"] = {"progress": 0, "total": 1}
+
+    asyncio.run(DatasetService.convert_files_to_dataset([str(doc)], "qa.jsonl", "p1"))
+
+    assert FakeClient.completions.calls == 2
+    generated = [data["generated"] for data in messages if "generated" in data]
+    # 失败的尝试推送过1个问答对，重试成功后生成数从1开始重新累计到3，而不是4
+    assert generated == [1, 1, 2, 3]
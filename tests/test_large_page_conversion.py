@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试大页面流式转换与整体转换的结果一致
+"""
+
+import os
+import sys
+import asyncio
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from app.services.crawler_engine_service import (
+    BeautifulSoupCrawler, MarkdownStreamCleaner, create_markdown_converter
+)
+from app.core.markdown_blocks import extract_blocks, complete_blocks
+
+SAMPLE_HTML = """<!DOCTYPE html>
+<html><body>
+<!-- 注释 -->
+<div><h1>标题</h1><p>第一段  内容</p>
+
+<section><h2>小节</h2><ul><li>一</li><li>二</li></ul>
+<pre class="highlight"><code class="language-python">print("hi")</code></pre></section>
+<table><tr><th>A</th><th>B</th></tr><tr><td>1</td><td>2</td></tr></table>
+</div>
+<script>var x = 1;</script>
+尾部文本
+</body></html>
+"""
+
+
+def test_stream_cleaner_matches_clean_markdown():
+    crawler = BeautifulSoupCrawler(session=None)
+    text = "\n\n  a  \n\n\n b\n \nc\n\n"
+    expected = crawler._clean_markdown(text)
+    for size in (1, 2, 3, 7, len(text)):
+        cleaner = MarkdownStreamCleaner()
+        out = "".join(cleaner.feed(text[i:i + size]) for i in range(0, len(text), size))
+        out += cleaner.close()
+        assert out == expected
+
+
+def test_streamed_file_matches_whole_document(tmp_path):
+    crawler = BeautifulSoupCrawler(session=None)
+    expected = crawler._clean_markdown(
+        create_markdown_converter().convert_soup(BeautifulSoup(SAMPLE_HTML, 'html.parser'))
+    )
+
+    output_path = tmp_path / "page.md"
+    crawler._stream_markdown_to_file(BeautifulSoup(SAMPLE_HTML, 'html.parser'), str(output_path))
+    with open(output_path, 'r', encoding='utf-8') as f:
+        assert f.read() == expected
+
+
+def test_converter_blocks_match_markdown_structure():
+    crawler = BeautifulSoupCrawler(session=None)
+    expected = crawler._clean_markdown(
+        create_markdown_converter().convert_soup(BeautifulSoup(SAMPLE_HTML, 'html.parser'))
+    )
+
+    markdown, blocks = crawler._convert_with_blocks(BeautifulSoup(SAMPLE_HTML, 'html.parser'))
+    assert markdown == expected
+
+    lines = markdown.split('\n')
+    scanned = extract_blocks(lines, len)
+    fields = ('type', 'start_line', 'end_line', 'start', 'end', 'level', 'text', 'language')
+    assert [{k: b.get(k) for k in fields} for b in blocks] == [{k: b.get(k) for k in fields} for b in scanned]
+    assert complete_blocks(lines, blocks, len) == scanned
+
+
+def test_converter_keeps_code_language_and_table_rows():
+    html = (
+        '<pre><code class="language-python">a = 1</code></pre>'
+        '<table><tr><td colspan="2">x | y<br>z</td></tr><tr><td>1</td><td>2</td></tr></table>'
+    )
+    markdown = create_markdown_converter().convert_soup(BeautifulSoup(html, 'html.parser'))
+    assert "```python\na = 1\n```" in markdown
+    table_rows = [line for line in markdown.split("\n") if line.startswith("|")]
+    assert table_rows == ["|  |  |", "| --- | --- |", "| x \\| y z | |", "| 1 | 2 |"]
+
+
+def _fetch(body, content_type):
+    async def page(request):
+        return web.Response(body=body, headers={"Content-Type": content_type})
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/page", page)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            async with aiohttp.ClientSession() as session:
+                return await BeautifulSoupCrawler(session).fetch_page(str(server.make_url("/page")))
+        finally:
+            await server.close()
+
+    return asyncio.run(main())
+
+
+def test_fetch_page_without_charset_in_content_type():
+    html = "<html><head><title>中文标题</title></head><body><p>正文</p></body></html>"
+    result = _fetch(html.encode("utf-8"), "text/html")
+    assert result["success"] and result["title"] == "中文标题"
+
+    # 没有charset时使用页面meta声明的编码
+    gbk_html = '<html><head><meta charset="gbk"><title>中文标题</title></head></html>'
+    result = _fetch(gbk_html.encode("gbk"), "text/html")
+    assert result["success"] and result["title"] == "中文标题"
+
+    result = _fetch(gbk_html.encode("gbk"), "text/html; charset=gbk")
+    assert result["title"] == "中文标题"
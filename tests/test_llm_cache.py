@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试大模型响应缓存：键的组成、命中、跳过缓存和容量淘汰
+"""
+
+import os
+import sys
+import json
+import asyncio
+from types import SimpleNamespace
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.rate_limiter import RateLimiter
+from app.core.llm_cache import LLMResponseCache
+from app.services.dataset_service import DatasetService
+
+
+class FakeClient:
+    base_url = "http://fake/v1/"
+
+    def __init__(self, finish_reason="stop"):
+        self.calls = 0
+        self.finish_reason = finish_reason
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, stream=False):
+        self.calls += 1
+        text = json.dumps({"qa_pairs": [{"question": "q?", "answer": f"answer {self.calls}"}]})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text),
+                                                        finish_reason=self.finish_reason)], usage=None)
+
+
+def _generate(client, cache, file_path, system_prompt="生成问答", bypass_cache=False):
+    return asyncio.run(DatasetService.generate_qa_pairs(
+        client, RateLimiter(), "fake-model", system_prompt, file_path, cache=cache, bypass_cache=bypass_cache
+    ))
+
+
+def test_key_depends_on_model_prompt_content_and_params():
+    base = LLMResponseCache.make_key("m", "u", "system", "content", {"stream": False})
+    assert base == LLMResponseCache.make_key("m", "u", "system", "content", {"stream": False})
+    assert base != LLMResponseCache.make_key("m2", "u", "system", "content", {"stream": False})
+    assert base != LLMResponseCache.make_key("m", "u", "system!", "content", {"stream": False})
+    assert base != LLMResponseCache.make_key("m", "u", "system", "content!", {"stream": False})
+    assert base != LLMResponseCache.make_key("m", "u", "system", "content", {"stream": False, "temperature": 0.2})
+
+
+def test_cached_response_skips_model_call(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATASET_STREAMING", False)
+    cache = LLMResponseCache(str(tmp_path / "cache"))
+    doc = tmp_path / "doc.md"
+    doc.write_text("内容", encoding="utf-8")
+    client = FakeClient()
+
+    first = _generate(client, cache, str(doc))
+    second = _generate(client, cache, str(doc))
+    assert client.calls == 1
+    assert first[0]["answer"] == second[0]["answer"] == "answer 1"
+
+    # 修改提示词后重新调用
+    _generate(client, cache, str(doc), system_prompt="新的提示词")
+    assert client.calls == 2
+
+    # 跳过缓存时重新调用，并用新的响应更新缓存
+    assert _generate(client, cache, str(doc), bypass_cache=True)[0]["answer"] == "answer 3"
+    assert _generate(client, cache, str(doc))[0]["answer"] == "answer 3"
+    assert client.calls == 3
+
+
+def test_truncated_response_is_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATASET_STREAMING", False)
+    cache = LLMResponseCache(str(tmp_path / "cache"))
+    doc = tmp_path / "doc.md"
+    doc.write_text("内容", encoding="utf-8")
+    client = FakeClient(finish_reason="length")
+
+    _generate(client, cache, str(doc))
+    _generate(client, cache, str(doc))
+    assert client.calls == 2
+
+
+def test_eviction_keeps_entry_limit(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "cache"), max_entries=3)
+    for i in range(6):
+        cache.put(f"key{i}", f"response {i}")
+    assert len(os.listdir(tmp_path / "cache")) == 3
+
+
+def test_put_does_not_rescan_cache_dir(tmp_path, monkeypatch):
+    cache = LLMResponseCache(str(tmp_path / "cache"), max_entries=3)
+    cache.put("key0", "response 0")
+    assert cache.get("key0") is not None
+
+    scans = []
+    real_scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scans.append(path) or real_scandir(path))
+    for i in range(1, 6):
+        cache.put(f"key{i}", f"response {i}")
+        # 每次写入后都重新访问第一条，使其保持最近使用
+        assert cache.get("key0") is not None
+
+    assert scans == []
+    assert sorted(os.listdir(tmp_path / "cache")) == ["key0.json", "key4.json", "key5.json"]
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试结构块提取以及分段器使用结构块时的行为
+"""
+
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.markdown_blocks import extract_blocks
+from app.core.markdown_splitter import MarkdownSplitter
+
+DOC = """# 标题
+
+第一段内容。
+第二行。
+
+```python
+# 不是标题
+
+print("hi")
+```
+
+| a | b |
+| --- | --- |
+| 1 | 2 |
+## 小节
+
+- 列表一
+- 列表二
+"""
+
+
+def test_extract_blocks_types_and_offsets():
+    blocks = extract_blocks(DOC.split("\n"))
+    assert [b["type"] for b in blocks] == ["heading", "paragraph", "code", "table", "heading", "list"]
+    code = blocks[2]
+    assert code["language"] == "python"
+    assert (code["start_line"], code["end_line"]) == (5, 9)
+    assert DOC[code["start"]:code["end"]] == '```python\n# 不是标题\n\nprint("hi")\n```'
+    assert blocks[4]["level"] == 2 and blocks[4]["text"] == "小节"
+    assert all(b["tokens"] >= 0 for b in blocks)
+
+
+def test_block_aware_split_keeps_code_blocks_whole():
+    splitter = MarkdownSplitter(max_tokens=60, min_tokens=1)
+    body = "\n\n".join(f"段落{i}的内容比较长，用来占用足够多的token数量。" for i in range(6))
+    code = "```python\n" + "\n\n".join(f"x{i} = {i}" for i in range(8)) + "\n```"
+    content = f"# 文档\n\n{body}\n\n{code}\n\n{body}\n"
+
+    sections = splitter._split_by_header_blocks(content.split("\n"), extract_blocks(content.split("\n")))
+    assert sections == [dict(s, units=sections[0]["units"]) for s in splitter._split_by_headers(content)]
+
+    chunks = splitter.create_chunks(content, blocks=extract_blocks(content.split("\n")))
+    assert len(chunks) > 1
+    for chunk in chunks:
+        # 每个分段中的代码围栏都是成对的
+        assert chunk.content.count("```") % 2 == 0
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试多模型分配：出错时换模型重试、熔断和按延迟分配
+"""
+
+import os
+import sys
+import random
+import asyncio
+from types import SimpleNamespace
+
+import openai
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.model_router import (
+    CircuitBreaker, ModelBackend, ModelRouter, create_model_router, CIRCUIT_OPEN, CIRCUIT_HALF_OPEN
+)
+
+
+def _backend(name, concurrency=2):
+    client = SimpleNamespace(close=lambda: asyncio.sleep(0))
+    return ModelBackend({"name": name, "model": name, "apiEndpoint": f"http://{name}", "concurrency": concurrency},
+                        client=client)
+
+
+def test_failover_to_another_backend():
+    bad, good = _backend("bad"), _backend("good")
+    router = ModelRouter([bad, good], max_attempts=2)
+    calls = []
+
+    async def request(backend):
+        calls.append(backend.name)
+        if backend is bad:
+            raise openai.APIError("boom", request=None, body=None)
+        return backend.name
+
+    async def main():
+        return await asyncio.gather(*(router.call(request) for _ in range(10)))
+
+    random.seed(0)
+    results = asyncio.run(main())
+    assert results == ["good"] * 10
+    assert bad.error_rate > 0 and good.error_rate == 0
+
+
+def test_unrelated_errors_are_not_retried():
+    backend = _backend("a")
+    router = ModelRouter([backend, _backend("b")])
+    calls = []
+
+    async def request(backend):
+        calls.append(backend.name)
+        raise FileNotFoundError("missing.md")
+
+    try:
+        asyncio.run(router.call(request))
+        assert False, "应当抛出异常"
+    except FileNotFoundError:
+        pass
+    assert len(calls) == 1 and backend.breaker.failures == 0
+
+
+def test_circuit_breaker_opens_and_probes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CIRCUIT_OPEN
+
+    # 冷却结束后只放行一个试探请求
+    assert breaker.allow() and breaker.state == CIRCUIT_HALF_OPEN
+    breaker.begin()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and breaker.failures == 0
+
+
+def test_open_backend_is_skipped():
+    a, b = _backend("a"), _backend("b")
+    a.breaker.reset_seconds = 60
+    for _ in range(a.breaker.failure_threshold):
+        a.breaker.record_failure()
+    router = ModelRouter([a, b])
+    assert all(router.choose() is b for _ in range(20))
+    assert router.choose(exclude=[b]) is None
+
+
+def test_faster_backend_gets_more_requests():
+    fast, slow = _backend("fast"), _backend("slow")
+    fast.latency, slow.latency = 0.1, 1.0
+    router = ModelRouter([fast, slow])
+    random.seed(1)
+    picks = [router.choose().name for _ in range(1000)]
+    assert picks.count("fast") > 800
+
+
+def test_create_router_uses_routing_models():
+    default = {"id": "1", "name": "default", "model": "m1", "apiEndpoint": "http://a", "apiKey": "k", "isDefault": True}
+    models = [
+        default,
+        {"id": "2", "name": "extra", "model": "m2", "apiEndpoint": "http://b", "apiKey": "k2", "routing": True},
+        {"id": "3", "name": "no-key", "model": "m3", "apiEndpoint": "http://c", "apiKey": "", "routing": True},
+        {"id": "4", "name": "not-routed", "model": "m4", "apiEndpoint": "http://d", "apiKey": "k4"},
+    ]
+    router = create_model_router(default, models)
+    assert [backend.name for backend in router.backends] == ["default", "extra"]
+    assert router.primary.model == "m1"
+    asyncio.run(router.close())
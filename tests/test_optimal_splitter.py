@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试动态规划分段：标题处切分、结构块不被拆开、分段大小均衡
+"""
+
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.optimal_splitter import OptimalMarkdownSplitter, create_splitter
+from app.core.markdown_splitter import MarkdownSplitter
+
+
+def _document():
+    parts = ["# 指南"]
+    for c in range(6):
+        parts.append(f"## 章节{c}")
+        for p in range(3):
+            parts.append(f"chapter {c} paragraph {p} " + "text " * 70)
+        parts.append("```python\n" + "\n".join(f"value_{c}_{i} = {i}" for i in range(20)) + "\n```")
+    return "\n\n".join(parts)
+
+
+def test_chunks_start_at_headings_and_keep_code_blocks():
+    splitter = OptimalMarkdownSplitter(max_tokens=1000, min_tokens=200)
+    content = _document()
+    chunks = splitter.create_chunks(content)
+
+    assert len(chunks) > 1
+    assert all(chunk.content.startswith("#") for chunk in chunks)
+    for chunk in chunks:
+        assert chunk.content.count("```") % 2 == 0
+        assert chunk.estimated_tokens <= 1000
+        assert chunk.metadata["split_method"] == "optimal"
+
+    joined = "\n".join(chunk.content for chunk in chunks)
+    assert joined.count("paragraph") == 18 and joined.count("value_") == 120
+
+    # 分段大小比贪心分段更均衡
+    tokens = [chunk.estimated_tokens for chunk in chunks]
+    assert max(tokens) - min(tokens) < 600
+
+
+def test_oversized_paragraph_is_split_into_pieces():
+    splitter = OptimalMarkdownSplitter(max_tokens=300, min_tokens=50)
+    sentence = "This is a sentence with several words. "
+    content = "# 标题\n\n" + sentence * 120
+    chunks = splitter.create_chunks(content)
+
+    assert len(chunks) > 1
+    assert all(chunk.estimated_tokens <= 300 for chunk in chunks)
+    assert sum(chunk.content.count("sentence") for chunk in chunks) == 120
+
+
+def test_create_splitter_engine_selection():
+    assert isinstance(create_splitter(1000, 100, engine="optimal"), OptimalMarkdownSplitter)
+    splitter = create_splitter(1000, 100, engine="heuristic")
+    assert type(splitter) is MarkdownSplitter
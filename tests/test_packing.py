@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试小文件合并为一个请求：按Token预算分组、按doc_id对应回文件、缺失的文件单独重新生成
+"""
+
+import os
+import re
+import sys
+import json
+import asyncio
+from types import SimpleNamespace
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core import model_router
+from app.core.token_counter import get_token_counter
+from app.services import dataset_service
+from app.services.dataset_service import DatasetService, conversion_state
+
+DOC_PATTERN = re.compile(r"【文档 (D\d+) 开始】\n(.*?)\n【文档 \1 结束】", re.S)
+
+
+class PackingCompletions:
+    """合并请求中按文档返回带doc_id的问答对，skip中的文档不返回；单个文件的请求直接返回"""
+
+    def __init__(self, skip=()):
+        self.skip = set(skip)
+        self.requests = []
+
+    async def create(self, model, messages, stream=False):
+        content = messages[1]["content"]
+        documents = DOC_PATTERN.findall(content)
+        self.requests.append([name for _, name in documents] or [content])
+        if documents:
+            items = [{"question": f"{name}?", "answer": name, "doc_id": doc_id}
+                     for doc_id, name in documents if name not in self.skip]
+        else:
+            items = [{"question": f"{content}?", "answer": content}]
+        text = json.dumps({"qa_pairs": items}, ensure_ascii=False)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text), finish_reason="stop")],
+            usage=SimpleNamespace(total_tokens=10)
+        )
+
+
+class FakeClient:
+    completions = None
+
+    def __init__(self, api_key=None, base_url=None, **kwargs):
+        self.chat = SimpleNamespace(completions=FakeClient.completions)
+
+    async def close(self):
+        pass
+
+
+def _make_files(tmp_path, contents):
+    files = []
+    for i, content in enumerate(contents):
+        path = tmp_path / f"doc{i}.md"
+        path.write_text(content, encoding="utf-8")
+        files.append(str(path))
+    return files
+
+
+def test_pack_files_respects_budget_and_order(tmp_path):
+    small = "小文件内容 " * 5
+    files = _make_files(tmp_path, [small, small, small * 10, small, small, small])
+    files.append(str(tmp_path / "missing.md"))
+    # 预算可容纳两个小文件，不足以容纳大文件
+    budget = get_token_counter().count(small) * 2
+    groups = DatasetService.pack_files(files, token_budget=budget, max_files=2)
+    names = [[os.path.basename(path) for path, _ in group] for group in groups]
+    assert names == [["doc0.md", "doc1.md"], ["doc2.md"], ["doc3.md", "doc4.md"], ["doc5.md"], ["missing.md"]]
+    assert groups[-1][0][1] is None
+
+
+def test_packed_pairs_map_back_to_source(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATASET_STREAMING", False)
+    files = _make_files(tmp_path, ["alpha", "beta"])
+    documents = [(path, DatasetService.build_user_content(path)) for path in files]
+    client = SimpleNamespace(chat=SimpleNamespace(completions=PackingCompletions()))
+
+    file_pairs = asyncio.run(DatasetService.generate_packed_qa_pairs(
+        client, model_router.RateLimiter(), "fake", "生成问答", documents
+    ))
+    assert [[pair["answer"] for pair in file_pairs[path]] for path in files] == [["alpha"], ["beta"]]
+    assert file_pairs[files[1]][0]["source"] == files[1]
+    assert "doc_id" not in file_pairs[files[0]][0]
+
+
+def test_convert_packs_files_and_retries_missing(tmp_path, monkeypatch):
+    async def send_json(data, project_id=None):
+        pass
+
+    monkeypatch.setattr(settings, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "DATASET_STREAMING", False)
+    monkeypatch.setattr(settings, "DATASET_PACK_TOKENS", 1000)
+    monkeypatch.setattr(settings, "DATASET_PACK_MAX_FILES", 3)
+    monkeypatch.setattr(model_router, "AsyncOpenAI", FakeClient)
+    monkeypatch.setattr(dataset_service.manager, "send_json", send_json)
+    monkeypatch.setattr(DatasetService, "get_default_model_config",
+                        staticmethod(lambda: {"model": "fake", "apiEndpoint": "http://pack", "apiKey": "k"}))
+    monkeypatch.setattr(DatasetService, "get_model_configs", staticmethod(lambda: []))
+    monkeypatch.setattr(dataset_service.SystemService, "get_prompts", staticmethod(lambda: {"data": "生成问答"}))
+    monkeypatch.setattr(DatasetService, "update_markdown_dataset_status", staticmethod(lambda files, project_id=None: True))
+    monkeypatch.setattr(DatasetService, "add_missing_ids", staticmethod(lambda output_file, project_id=None: {}))
+
+    FakeClient.completions = PackingCompletions(skip={"doc1"})
+    files = _make_files(tmp_path, [f"doc{i}" for i in range(6)])
+    conversion_state["p1_qa.jsonl"] = {"progress": 0, "total": len(files)}
+    output_path = asyncio.run(DatasetService.convert_files_to_dataset(files, "qa.jsonl", "p1"))
+
+    # 6个文件合并为2个请求，合并请求中缺失的doc1单独重新生成
+    assert sorted(FakeClient.completions.requests) == [["doc0", "doc1", "doc2"], ["doc1"], ["doc3", "doc4", "doc5"]]
+    with open(output_path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert [row["answer"] for row in rows] == [f"doc{i}" for i in range(6)]
+    assert [row["source"] for row in rows] == files
+    assert conversion_state["p1_qa.jsonl"]["progress"] == 6
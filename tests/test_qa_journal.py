@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试数据集生成日志：完成标记、未写完的记录、提交后的清理以及中断后恢复
+"""
+
+import os
+import sys
+import json
+import asyncio
+from types import SimpleNamespace
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.qa_journal import QAJournal, JOURNAL_SUFFIX
+from app.core import model_router
+from app.services import dataset_service
+from app.services.dataset_service import DatasetService, conversion_state
+
+
+def test_only_marked_files_are_completed(tmp_path):
+    path = str(tmp_path / "qa.jsonl.journal")
+    journal = QAJournal(path, fsync_batch=1)
+    journal.record("a.md", [{"question": "q", "answer": "a"}])
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        # 崩溃前只写了问答对，没有完成标记；最后一行没有写完
+        f.write(json.dumps({"file": "b.md", "pairs": []}) + "\n")
+        f.write('{"file": "c.md", "pai')
+
+    assert QAJournal(path).load() == {"a.md": [{"question": "q", "answer": "a"}]}
+
+
+def test_commit_removes_journal(tmp_path):
+    path = str(tmp_path / "qa.jsonl.journal")
+    journal = QAJournal(path)
+    journal.record("a.md", [])
+    journal.commit()
+    assert not os.path.exists(path)
+    assert QAJournal(path).load() == {}
+
+
+def test_resume_skips_completed_files(tmp_path, monkeypatch):
+    calls = []
+
+    async def create(model, messages, stream=False):
+        name = messages[1]["content"]
+        calls.append(name)
+        text = json.dumps({"qa_pairs": [{"question": f"{name}?", "answer": name}]})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text), finish_reason="stop")],
+                               usage=None)
+
+    class FakeClient:
+        def __init__(self, api_key=None, base_url=None, **kwargs):
+            self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+        async def close(self):
+            pass
+
+    async def send_json(data, project_id=None):
+        pass
+
+    monkeypatch.setattr(settings, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "DATASET_STREAMING", False)
+    monkeypatch.setattr(model_router, "AsyncOpenAI", FakeClient)
+    monkeypatch.setattr(DatasetService, "get_model_configs", staticmethod(lambda: []))
+    monkeypatch.setattr(dataset_service.manager, "send_json", send_json)
+    monkeypatch.setattr(DatasetService, "get_default_model_config",
+                        staticmethod(lambda: {"model": "fake", "apiEndpoint": "http://journal", "apiKey": "k"}))
+    monkeypatch.setattr(dataset_service.SystemService, "get_prompts", staticmethod(lambda: {"data": "生成问答"}))
+    monkeypatch.setattr(DatasetService, "update_markdown_dataset_status", staticmethod(lambda files, project_id=None: True))
+    monkeypatch.setattr(DatasetService, "add_missing_ids", staticmethod(lambda output_file, project_id=None: {}))
+
+    files = []
+    for i in range(4):
+        path = tmp_path / f"doc{i}.md"
+        path.write_text(f"doc{i}", encoding="utf-8")
+        files.append(str(path))
+
+    # 上一次运行在完成前两个文件后中断
+    output_path = os.path.join(str(tmp_path), "p1", "qa.jsonl")
+    journal = QAJournal(output_path + JOURNAL_SUFFIX)
+    for i in range(2):
+        journal.record(files[i], [{"question": "old?", "answer": f"doc{i}", "source": files[i]}])
+    journal.close()
+
+    conversion_state["p1_qa.jsonl"] = {"progress": 0, "total": len(files)}
+    asyncio.run(DatasetService.convert_files_to_dataset(files, "qa.jsonl", "p1"))
+
+    assert sorted(calls) == ["doc2", "doc3"]
+    with open(output_path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert [row["answer"] for row in rows] == ["doc0", "doc1", "doc2", "doc3"]
+    assert not os.path.exists(output_path + JOURNAL_SUFFIX)
+
+
+def test_crash_before_commit_does_not_duplicate_pairs(tmp_path, monkeypatch):
+    test_resume_skips_completed_files(tmp_path, monkeypatch)
+    output_path = os.path.join(str(tmp_path), "p1", "qa.jsonl")
+    with open(output_path, encoding="utf-8") as f:
+        first_run = f.read()
+
+    # 第二次转换把结果写入数据集后、写入提交标记前崩溃
+    files = [str(tmp_path / f"doc{i}.md") for i in range(4)]
+    journal = QAJournal(output_path + JOURNAL_SUFFIX)
+    for i in range(4):
+        journal.record(files[i], [{"question": "new?", "answer": f"new{i}", "source": files[i]}])
+    journal.begin_commit(os.path.getsize(output_path))
+    with open(output_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"question": "new?", "answer": "new0", "source": files[0]}) + "\n")
+    journal.close()
+
+    conversion_state["p1_qa.jsonl"] = {"progress": 0, "total": len(files)}
+    asyncio.run(DatasetService.convert_files_to_dataset(files, "qa.jsonl", "p1"))
+
+    with open(output_path, encoding="utf-8") as f:
+        content = f.read()
+    assert content.startswith(first_run)
+    rows = [json.loads(line) for line in content[len(first_run):].splitlines()]
+    assert [row["answer"] for row in rows] == ["new0", "new1", "new2", "new3"]
+    assert not os.path.exists(output_path + JOURNAL_SUFFIX)
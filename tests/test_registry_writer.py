@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试注册表批量写入器与逐条写入的结果一致
+"""
+
+import os
+import sys
+import json
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services.registry_service import RegistryWriter
+
+
+def _read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_batched_updates_match_per_file_semantics(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "OUTPUT_DIR", str(tmp_path))
+    project_dir = tmp_path / "p1"
+    project_dir.mkdir()
+    with open(project_dir / "crawled_urls.json", "w", encoding="utf-8") as f:
+        json.dump([{"id": 1, "url": "https://a.com/x"}, {"id": 2, "url": "https://a.com/y"}], f)
+    with open(project_dir / "markdown_manager.json", "w", encoding="utf-8") as f:
+        json.dump([{"id": 1, "url": "https://a.com/x", "filePath": "old/x.md", "isDataset": True}], f)
+
+    writer = RegistryWriter("p1", flush_interval=3600, batch_size=1000)
+    writer.update_markdown_registry("https://a.com/x", "out\\x.md")
+    writer.update_markdown_registry_for_chunk("https://a.com/y", "out/y-1.md")
+    writer.update_markdown_registry_for_chunk("https://a.com/y", "out/y-2.md")
+    writer.update_crawled_url_filepath("https://a.com/y", "out/y-1.md")
+
+    # 落盘之前文件保持不变
+    assert len(_read(project_dir / "markdown_manager.json")) == 1
+    assert writer.flush()
+
+    registry = _read(project_dir / "markdown_manager.json")
+    assert [item["filePath"] for item in registry] == ["out/x.md", "out/y-1.md", "out/y-2.md"]
+    assert [item["id"] for item in registry] == [1, 2, 3]
+    assert registry[0]["isDataset"] is False
+
+    crawled = _read(project_dir / "crawled_urls.json")
+    assert crawled[1]["filePath"] == "out/y-1.md"
+    assert "filePath" not in crawled[0]
+    assert writer.pending_count() == 0
+
+
+def test_flushes_when_batch_size_reached(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "OUTPUT_DIR", str(tmp_path))
+    writer = RegistryWriter("p2", flush_interval=3600, batch_size=2)
+    writer.update_markdown_registry("https://a.com/1", "out/1.md")
+    assert not os.path.exists(tmp_path / "p2" / "markdown_manager.json")
+    writer.update_markdown_registry("https://a.com/2", "out/2.md")
+    assert len(_read(tmp_path / "p2" / "markdown_manager.json")) == 2
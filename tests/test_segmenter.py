@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试句子与标题识别：中英文句末标点、小数、缩写、行内代码和链接
+"""
+
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.segmenter import is_header_line, split_sentences, split_markdown_sentences
+from app.core.markdown_splitter import MarkdownSplitter
+
+
+def test_chinese_sentence_boundaries():
+    assert split_sentences("第一句。第二句！第三句？”最后") == ["第一句。", "第二句！", "第三句？”", "最后"]
+
+
+def test_decimals_and_abbreviations_do_not_split():
+    text = "Version 3.14 is out, e.g. on Linux. Dr. Smith and J. Doe agree! Next..."
+    assert split_sentences(text) == [
+        "Version 3.14 is out, e.g. on Linux. ",
+        "Dr. Smith and J. Doe agree! ",
+        "Next..."
+    ]
+
+
+def test_inline_code_and_links_do_not_split():
+    text = "Call `model.fit(). Then` twice. See [docs](https://example.com/a.b?x=1) now. Done"
+    assert split_sentences(text) == [
+        "Call `model.fit(). Then` twice. ",
+        "See [docs](https://example.com/a.b?x=1) now. ",
+        "Done"
+    ]
+
+
+def test_markdown_sentences_keep_splitter_format():
+    text = "第一句。第二句。\n\nOne. Two."
+    assert split_markdown_sentences(text) == ["第一句。\n", "第二句。\n", "\n", "One. \n", "Two.\n", "\n"]
+    assert MarkdownSplitter()._split_into_sentences_improved(text) == split_markdown_sentences(text)
+
+
+def test_header_detection():
+    assert is_header_line("  ## 安装步骤  ") == (True, 2, "安装步骤")
+    assert is_header_line("#没有空格") == (False, 0, "")
+    assert is_header_line("正文 # 不是标题") == (False, 0, "")
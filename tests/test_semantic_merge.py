@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试语义评分器的缓存、分批以及分段器使用向量相似度
+"""
+
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.embedding_scorer import EmbeddingScorer
+from app.core.markdown_splitter import MarkdownSplitter
+
+TOPICS = ["python", "database", "network"]
+
+
+class KeywordScorer(EmbeddingScorer):
+    """按主题关键词出现次数构造向量，用于替代真实模型"""
+
+    def __init__(self, batch_size=2):
+        super().__init__(batch_size=batch_size, cache_size=16)
+        self.batches = []
+
+    def _encode(self, texts):
+        self.batches.append(len(texts))
+        return [[text.count(topic) for topic in TOPICS] for text in texts]
+
+
+def test_embed_batches_and_caches_by_content():
+    scorer = KeywordScorer(batch_size=2)
+    vectors = scorer.embed(["python python", "database", "python python", "network"])
+    assert scorer.batches == [2, 1]
+    assert vectors[0] == vectors[2] == [1.0, 0.0, 0.0]
+
+    scorer.embed(["database", "network"])
+    assert scorer.batches == [2, 1]
+    assert scorer.similarity(vectors[0], vectors[1]) == 0.0
+
+
+def test_splitter_uses_embeddings_for_similarity():
+    scorer = KeywordScorer(batch_size=8)
+    splitter = MarkdownSplitter(max_tokens=2000, min_tokens=10, embedding_scorer=scorer)
+    same = [{'content': 'python tips', 'header_stack': [(1, 'A')]}, {'content': 'more python', 'header_stack': [(1, 'B')]}]
+    other = {'content': 'database', 'header_stack': [(1, 'A')]}
+    splitter._attach_embeddings(same + [other])
+
+    assert splitter._calculate_semantic_similarity(same[0], same[1]) == 1.0
+    # 标题相同但内容无关
+    assert splitter._calculate_semantic_similarity(same[0], other) == 0.0
+
+    scorer.batches = []
+    content = "\n\n".join(f"## {topic} {i}\n\n" + f"{topic} text " * 3 for i in range(4) for topic in TOPICS)
+    chunks = splitter.create_chunks(content)
+    assert scorer.batches == [8, 4]
+    assert all('embedding' not in chunk.metadata for chunk in chunks)
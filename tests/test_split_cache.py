@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试分段缓存：命中结果与重新分段一致、参数区分缓存键、LRU淘汰
+"""
+
+import os
+import sys
+import time
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core import split_cache
+from app.core.markdown_splitter import MarkdownSplitter
+from app.core.split_cache import SplitCache
+
+
+def _document(seed=0):
+    return "\n\n".join(
+        f"## 小节{i}\n\n" + f"section {seed} {i} content words " * 40
+        for i in range(8)
+    )
+
+
+class CountingSplitter(MarkdownSplitter):
+    calls = 0
+
+    def create_chunks(self, content, blocks=None):
+        CountingSplitter.calls += 1
+        return super().create_chunks(content, blocks)
+
+
+def test_cache_hit_returns_identical_chunks(tmp_path):
+    cache = SplitCache(str(tmp_path))
+    splitter = CountingSplitter(max_tokens=500, min_tokens=100, overlap_sentences=1)
+    content = _document()
+
+    first = cache.get_or_split(splitter, content)
+    second = cache.get_or_split(splitter, content)
+
+    assert CountingSplitter.calls == 1
+    assert second == first
+    # 分段内容以偏移保存，缓存文件远小于原文
+    entry_size = sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path))
+    assert entry_size < len(content)
+
+    cache.get_or_split(CountingSplitter(max_tokens=600, min_tokens=100), content)
+    assert CountingSplitter.calls == 2
+
+
+def test_lru_eviction_by_entry_count(tmp_path):
+    cache = SplitCache(str(tmp_path), max_entries=2)
+    splitter = MarkdownSplitter(max_tokens=500, min_tokens=100)
+    keys = []
+    for seed in range(3):
+        content = _document(seed)
+        keys.append(cache.make_key(splitter, content))
+        cache.get_or_split(splitter, content)
+        if seed == 1:
+            # 访问第一条，使其成为最近使用
+            time.sleep(0.01)
+            assert cache.get(keys[0], _document(0)) is not None
+        time.sleep(0.01)
+
+    remaining = sorted(name[:-5] for name in os.listdir(tmp_path))
+    assert remaining == sorted([keys[0], keys[2]])
+
+
+def test_put_does_not_rescan_cache_dir(tmp_path, monkeypatch):
+    cache = SplitCache(str(tmp_path), max_entries=3)
+    splitter = MarkdownSplitter(max_tokens=500, min_tokens=100)
+    cache.get_or_split(splitter, _document(0))
+
+    scans = []
+    real_scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scans.append(path) or real_scandir(path))
+    for seed in range(1, 6):
+        cache.get_or_split(splitter, _document(seed))
+
+    # 条数和总大小在内存中维护，写入时不再扫描目录
+    assert scans == []
+    assert len(os.listdir(tmp_path)) == 3
+
+
+def test_key_tracks_model_files_and_splitter_code(tmp_path, monkeypatch):
+    cache = SplitCache(str(tmp_path / "cache"))
+    content = _document()
+    splitter = MarkdownSplitter(max_tokens=500, min_tokens=100)
+    tokenizer = tmp_path / "tokenizer.json"
+    tokenizer.write_text('{"v": 1}', encoding="utf-8")
+    monkeypatch.setattr(settings, "TOKENIZER_FILE", str(tokenizer))
+    base = cache.make_key(splitter, content)
+    assert cache.make_key(splitter, content) == base
+
+    # 替换分词器文件后缓存键变化
+    tokenizer.write_text('{"v": 22}', encoding="utf-8")
+    replaced = cache.make_key(splitter, content)
+    assert replaced != base
+
+    # 语义分段时向量模型文件参与缓存键
+    splitter.embedding_scorer = object()
+    model = tmp_path / "model.onnx"
+    model.write_bytes(b"1")
+    monkeypatch.setattr(settings, "EMBEDDING_MODEL_FILE", str(model))
+    semantic = cache.make_key(splitter, content)
+    model.write_bytes(b"22")
+    assert cache.make_key(splitter, content) != semantic
+
+    # 分段模块源码变化后缓存键变化
+    monkeypatch.setattr(split_cache, "splitter_code_version", lambda: "changed")
+    splitter.embedding_scorer = None
+    assert cache.make_key(splitter, content) != replaced
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试进程池批量分段与单进程分段结果一致且顺序不变，以及工作进程崩溃后重建进程池
+"""
+
+import os
+import sys
+import asyncio
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core import split_pool
+from app.core.markdown_splitter import MarkdownSplitter
+from app.core.markdown_blocks import extract_blocks
+
+
+def _document(index):
+    sections = [f"## 第{index}篇 小节{i}\n\n" + f"doc {index} section {i} text " * 80 for i in range(6)]
+    return f"# 文档{index}\n\n" + "\n\n".join(sections)
+
+
+def test_batch_split_matches_sequential_in_order(monkeypatch):
+    monkeypatch.setattr(settings, "SPLIT_POOL_WORKERS", 2)
+    # 工作进程重新读取配置，通过环境变量关闭分段缓存
+    monkeypatch.setenv("SPLIT_CACHE_ENABLED", "false")
+    monkeypatch.setattr(settings, "SPLIT_CACHE_ENABLED", False)
+    contents = [_document(i) for i in range(4)]
+    try:
+        results = split_pool.split_markdown_batch(contents, max_tokens=600, min_tokens=100, strategy="aggressive")
+        blocks = extract_blocks(contents[0].split('\n'), len)
+        chunks = asyncio.run(split_pool.split_markdown_async(contents[0], 480, 70, blocks=blocks))
+    finally:
+        split_pool.shutdown_split_pool()
+
+    splitter = MarkdownSplitter(max_tokens=480, min_tokens=70)
+    expected = [splitter.create_chunks(content) for content in contents]
+    assert [[c.content for c in r] for r in results] == [[c.content for c in e] for e in expected]
+    assert all(f"doc {i} section" in results[i][0].content for i in range(4))
+    assert [c.content for c in chunks] == [c.content for c in expected[0]]
+
+
+def test_single_worker_runs_inline(monkeypatch):
+    monkeypatch.setattr(settings, "SPLIT_POOL_WORKERS", 1)
+    monkeypatch.setattr(settings, "SPLIT_CACHE_ENABLED", False)
+    assert split_pool.get_split_pool() is None
+    results = split_pool.split_markdown_batch([_document(0), ""], max_tokens=600, min_tokens=100)
+    assert len(results) == 2 and results[0] and results[1] == []
+
+
+def crash_once(flag_path, value):
+    """第一次调用时让工作进程异常退出，之后正常返回"""
+    if not os.path.exists(flag_path):
+        open(flag_path, "w").close()
+        os._exit(1)
+    return value * 2
+
+
+def test_broken_pool_is_rebuilt_and_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SPLIT_POOL_WORKERS", 2)
+    flag = str(tmp_path / "crashed")
+    try:
+        results = split_pool.run_batch(crash_once, [(flag, 1), (flag, 2), (flag, 3)])
+        # 再次崩溃后异步接口同样重建进程池
+        os.remove(flag)
+        value = asyncio.run(split_pool._run_in_pool(crash_once, flag, 5))
+    finally:
+        split_pool.shutdown_split_pool()
+    assert results == [(2, None), (4, None), (6, None)]
+    assert value == 10
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试分段器在大量小节和超长段落下的耗时与内容完整性
+"""
+
+import os
+import sys
+import time
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.markdown_splitter import MarkdownSplitter
+
+
+def _many_small_sections(count):
+    return "\n\n".join(f"## 小节{i}\n\n第{i}段 paragraph text {i}。" for i in range(count))
+
+
+def test_small_sections_merge_keeps_every_paragraph():
+    splitter = MarkdownSplitter(max_tokens=2000, min_tokens=300)
+    content = _many_small_sections(3000)
+
+    started = time.time()
+    chunks = splitter.create_chunks(content)
+    elapsed = time.time() - started
+
+    joined = "\n".join(chunk.content for chunk in chunks)
+    for i in range(0, 3000, 97):
+        assert f"paragraph text {i}。" in joined
+    assert all(chunk.estimated_tokens == splitter.estimate_tokens(chunk.content) for chunk in chunks)
+    assert elapsed < 10
+
+
+def test_long_section_split_by_paragraphs_and_words():
+    splitter = MarkdownSplitter(max_tokens=500, min_tokens=50)
+    paragraphs = [f"paragraph {i} " + "word " * 40 for i in range(400)]
+    long_line = "token " * 3000
+    content = "# 标题\n\n" + "\n\n".join(paragraphs) + "\n\n" + long_line
+
+    chunks = splitter.create_chunks(content)
+
+    joined = "\n".join(chunk.content for chunk in chunks)
+    assert chunks[0].content.startswith("# 标题")
+    for i in range(400):
+        assert f"paragraph {i} " in joined
+    assert joined.count("token") == 3000
+    assert all("pending" not in chunk.metadata for chunk in chunks)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试流式分段：按行读取、边读边产出分段且不丢失内容
+"""
+
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.markdown_splitter import MarkdownSplitter
+from app.core.split_pool import split_markdown_file
+
+
+def _book_lines(chapters):
+    for c in range(chapters):
+        yield f"# 第{c}章\n"
+        yield "\n"
+        for p in range(5):
+            yield f"chapter {c} paragraph {p} " + "text " * 60 + "\n"
+            yield "\n"
+        yield "```python\n"
+        yield "# 代码里的井号不是标题\n"
+        yield "\n"
+        yield f"print({c})\n"
+        yield "```\n"
+        yield "\n"
+
+
+def test_iter_chunks_yields_before_input_is_exhausted():
+    consumed = 0
+
+    def lines():
+        nonlocal consumed
+        for line in _book_lines(200):
+            consumed += 1
+            yield line
+
+    total_lines = sum(1 for _ in _book_lines(200))
+    splitter = MarkdownSplitter(max_tokens=1000, min_tokens=200)
+    chunks = splitter.iter_chunks(lines())
+    first = next(chunks)
+    assert first.order == 1 and first.content.startswith("# 第0章")
+    assert consumed < total_lines // 10
+
+    rest = list(chunks)
+    joined = "\n".join(chunk.content for chunk in [first] + rest)
+    for c in range(200):
+        assert f"chapter {c} paragraph 4 " in joined
+        assert f"print({c})" in joined
+    assert [chunk.order for chunk in rest] == list(range(2, len(rest) + 2))
+    assert all(chunk.estimated_tokens <= 1000 for chunk in [first] + rest)
+
+
+def test_headerless_text_is_cut_at_blank_lines():
+    splitter = MarkdownSplitter(max_tokens=200, min_tokens=50)
+    lines = [f"line {i} " + "word " * 30 + "\n\n" for i in range(300)]
+    chunks = list(splitter.iter_chunks("".join(lines).splitlines(keepends=True)))
+    assert len(chunks) > 10
+    joined = "\n".join(chunk.content for chunk in chunks)
+    assert all(f"line {i} " in joined for i in range(300))
+
+
+def test_split_markdown_file_writes_chunks(tmp_path):
+    source = tmp_path / "book.md"
+    source.write_text("".join(_book_lines(20)), encoding="utf-8")
+
+    paths = split_markdown_file(str(source), str(tmp_path), "book", max_tokens=1000, min_tokens=200)
+
+    assert len(paths) > 1
+    assert [os.path.basename(p) for p in paths] == [f"book-{i}.md" for i in range(1, len(paths) + 1)]
+    with open(paths[0], encoding="utf-8") as f:
+        assert f.read().startswith("# 第0章")
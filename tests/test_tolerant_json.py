@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试容错JSON解析器和基于它的问答对解析
+"""
+
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.tolerant_json import tolerant_loads, tolerant_parse
+from app.services.dataset_service import DatasetService
+
+
+def test_valid_json_matches_json_module():
+    text = '{"a": [1, -2.5, 3e2, true, false, null], "b": {"c": "\\u4e2d\\u6587\\n\\"q\\""}, "d": "😀"}'
+    assert tolerant_parse(text) == ({"a": [1, -2.5, 300.0, True, False, None], "b": {"c": "中文\n\"q\""}, "d": "😀"}, True)
+
+
+def test_code_fence_trailing_commas_and_comments():
+    text = '```json\n{\n  // 生成的问答对\n  "qa_pairs": [{"question": "问题", "answer": "答案",},],\n}\n```'
+    assert tolerant_loads(text) == {"qa_pairs": [{"question": "问题", "answer": "答案"}]}
+
+
+def test_unquoted_keys_and_single_quotes():
+    text = "{qa_pairs: [{question: '什么是机器学习？', answer: 'It\\'s 人工智能的分支', 分类：'AI'}]}"
+    assert tolerant_loads(text) == {"qa_pairs": [{"question": "什么是机器学习？", "answer": "It's 人工智能的分支", "分类": "AI"}]}
+
+
+def test_unescaped_quotes_newlines_and_missing_commas():
+    text = '{"qa_pairs": [{"question": "什么是"深度学习"？", "answer": "第一行\n第二行 \\( 无效转义 \\)"}\n{"question": "q2"\n"answer": "a2"}]}'
+    assert tolerant_loads(text)["qa_pairs"] == [
+        {"question": "什么是\"深度学习\"？", "answer": "第一行\n第二行 ( 无效转义 )"},
+        {"question": "q2", "answer": "a2"},
+    ]
+
+
+def test_truncated_response_keeps_complete_pairs():
+    text = '{"qa_pairs": [{"question": "问题一", "answer": "答案一"}, {"question": "问题二", "answer": "答案被'
+    assert tolerant_parse(text) == ({"qa_pairs": [{"question": "问题一", "answer": "答案一"}]}, False)
+
+
+def test_mismatched_brackets_and_surrounding_text():
+    assert tolerant_loads('结果如下：[{"question": "q", "answer": "a"]} 以上') == [{"question": "q", "answer": "a"}]
+    assert tolerant_parse("没有JSON") == (None, False)
+
+
+def test_parse_qa_pairs_preserves_chinese():
+    text = "{'qa_pairs': [{'question': '什么是“大模型”？', 'answer': '参数规模很大的模型', 'label': '概念',}, {'question': '截断"
+    qa_pairs = DatasetService.parse_qa_pairs(text, "doc.md")
+    assert len(qa_pairs) == 1
+    assert qa_pairs[0]["question"] == "什么是“大模型”？" and qa_pairs[0]["label"] == "概念"
+    assert qa_pairs[0]["source"] == "doc.md"